@@ -1,6 +1,5 @@
 import discord
 from datetime import datetime
-import aiosqlite
 
 # Bot Status Message Channel ID
 BOT_STATUS_CHANNEL_ID = 1354920943503409323
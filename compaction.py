@@ -0,0 +1,142 @@
+"""
+Retention and compaction of the activity logs
+message_log and user_reactions rows older than the retention horizon are
+folded into per-user daily counters and deleted in small batches, and the
+freed pages are given back to the file system with incremental vacuum
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+logger = logging.getLogger('compaction')
+
+DEFAULT_RETENTION_DAYS = 90
+# /useractivity counts the last 7 days from the raw logs
+MIN_RETENTION_DAYS = 7
+DEFAULT_BATCH_SIZE = 2000
+# Pages freed per pass by incremental vacuum
+DEFAULT_VACUUM_PAGES = 2000
+
+# Per-user daily counters of the compacted log rows
+USER_DAILY_ACTIVITY_TABLE = '''
+    CREATE TABLE IF NOT EXISTS user_daily_activity (
+        user_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        message_count INTEGER DEFAULT 0,
+        reaction_count INTEGER DEFAULT 0,
+        PRIMARY KEY (user_id, date)
+    ) WITHOUT ROWID
+'''
+
+# Raw log tables and the counter each one is folded into
+COMPACTED_LOGS = (
+    ("message_log", "message_count"),
+    ("user_reactions", "reaction_count"),
+)
+
+# Active user sets of the stats rollups; their counts stay in the rollups
+ROLLUP_USER_SETS = (
+    ("stats_hourly_users", "hour"),
+    ("stats_daily_users", "date"),
+)
+
+
+class LogCompactor:
+    """Folds old activity log rows into per-user daily counters"""
+
+    def __init__(self, pool=None, retention_days: int = DEFAULT_RETENTION_DAYS,
+                 batch_size: int = DEFAULT_BATCH_SIZE, vacuum_pages: int = DEFAULT_VACUUM_PAGES):
+        self.pool = pool
+        self.retention_days = max(retention_days, MIN_RETENTION_DAYS)
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+        self.lock = asyncio.Lock()
+        self.stats: Dict[str, int] = {
+            "runs": 0,
+            "rows_compacted": 0,
+            "batches": 0,
+        }
+
+    async def _get_pool(self):
+        if self.pool is None:
+            from db_pool import get_db_pool
+            self.pool = await get_db_pool()
+        return self.pool
+
+    async def compact(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Compact everything older than the retention horizon
+
+        Returns the number of rows removed per table.
+        """
+        async with self.lock:
+            pool = await self._get_pool()
+            now = now or datetime.now(timezone.utc)
+            # Cut at a day boundary so every folded day is complete
+            cutoff = (now - timedelta(days=self.retention_days)).strftime("%Y-%m-%d")
+
+            removed = {}
+            for table, column in COMPACTED_LOGS:
+                removed[table] = await self._compact_log(pool, table, column, cutoff)
+
+            for table, key in ROLLUP_USER_SETS:
+                async with pool.transaction() as db:
+                    cursor = await db.execute(f'DELETE FROM {table} WHERE {key} < ?', (cutoff,))
+                    removed[table] = cursor.rowcount
+
+            await self._vacuum(pool)
+
+            self.stats["runs"] += 1
+            self.stats["rows_compacted"] += removed["message_log"] + removed["user_reactions"]
+            logger.info(f"Compacted activity logs older than {cutoff}: {removed}")
+            return removed
+
+    async def _compact_log(self, pool, table: str, column: str, cutoff: str) -> int:
+        total = 0
+        while True:
+            # Fold and delete one bounded batch of the oldest rows per transaction
+            async with pool.transaction() as db:
+                await db.execute(f'''
+                    INSERT INTO user_daily_activity (user_id, date, {column})
+                    SELECT user_id, substr(timestamp, 1, 10), COUNT(*) FROM {table}
+                    WHERE id IN (SELECT id FROM {table} WHERE timestamp < ? ORDER BY timestamp LIMIT ?)
+                    GROUP BY user_id, substr(timestamp, 1, 10)
+                    ON CONFLICT(user_id, date) DO UPDATE SET
+                    {column} = {column} + excluded.{column}
+                ''', (cutoff, self.batch_size))
+                cursor = await db.execute(f'''
+                    DELETE FROM {table}
+                    WHERE id IN (SELECT id FROM {table} WHERE timestamp < ? ORDER BY timestamp LIMIT ?)
+                ''', (cutoff, self.batch_size))
+                deleted = cursor.rowcount
+
+            total += deleted
+            self.stats["batches"] += 1
+            if deleted < self.batch_size:
+                return total
+            # Let other writes in between batches
+            await asyncio.sleep(0)
+
+    async def _vacuum(self, pool):
+        # Incremental vacuum only works once auto_vacuum is set, which takes
+        # a full VACUUM on databases created without it
+        auto_vacuum = await pool.fetchval('PRAGMA auto_vacuum', default=0)
+        if auto_vacuum != 2:
+            logger.info("Enabling incremental auto_vacuum")
+            await pool.maintenance('PRAGMA auto_vacuum = INCREMENTAL')
+            await pool.maintenance('VACUUM')
+        await pool.maintenance(f'PRAGMA incremental_vacuum({int(self.vacuum_pages)})')
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get statistics about the compaction runs"""
+        return dict(self.stats)
+
+
+# Singleton log compactor instance
+log_compactor = LogCompactor()
+
+# Helper function to get the log compactor
+async def get_log_compactor() -> LogCompactor:
+    """Get the shared activity log compactor"""
+    return log_compactor
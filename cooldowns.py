@@ -0,0 +1,87 @@
+"""
+Shared cooldowns and rate limits for commands and XP
+Each key, such as ("coinflip", user_id), keeps only the monotonic time at
+which its limit is fully recovered. Keys are dropped once that time has
+passed, so memory only grows with the users that are currently limited
+"""
+
+import heapq
+import logging
+import time
+from typing import Callable, Dict, Hashable, List, Tuple
+
+logger = logging.getLogger('cooldowns')
+
+
+class Cooldowns:
+    """Per-key cooldowns with optional bursts, expired through a heap
+
+    A key allows burst uses and then one more use every seconds, like a
+    token bucket holding burst tokens; with the default burst of 1 it is a
+    plain cooldown.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        # When each key's limit is fully recovered
+        self.recovered_at: Dict[Hashable, float] = {}
+        # (recovered_at, key) entries; an entry is stale once the key was used again
+        self.expiry_heap: List[Tuple[float, Hashable]] = []
+        self.stats: Dict[str, int] = {
+            "allowed": 0,
+            "limited": 0,
+            "expired": 0,
+        }
+
+    def _expire(self, now: float):
+        while self.expiry_heap and self.expiry_heap[0][0] <= now:
+            recovered_at, key = heapq.heappop(self.expiry_heap)
+            if self.recovered_at.get(key) == recovered_at:
+                del self.recovered_at[key]
+                self.stats["expired"] += 1
+
+    def remaining(self, key: Hashable, seconds: float, burst: int = 1) -> float:
+        """Seconds until key can be used again, without using it"""
+        now = self.clock()
+        recovered_at = self.recovered_at.get(key, now)
+        return max(0.0, recovered_at - (burst - 1) * seconds - now)
+
+    def hit(self, key: Hashable, seconds: float, burst: int = 1) -> float:
+        """Use key if its limit allows it
+
+        Returns 0 if the use was allowed and recorded, otherwise the seconds
+        until it will be allowed.
+        """
+        now = self.clock()
+        self._expire(now)
+        recovered_at = max(self.recovered_at.get(key, now), now)
+        wait = recovered_at - (burst - 1) * seconds - now
+        if wait > 0:
+            self.stats["limited"] += 1
+            return wait
+
+        recovered_at += seconds
+        self.recovered_at[key] = recovered_at
+        heapq.heappush(self.expiry_heap, (recovered_at, key))
+        self.stats["allowed"] += 1
+        return 0.0
+
+    def reset(self, key: Hashable):
+        """Lift any limit on key"""
+        self.recovered_at.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self.recovered_at)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get statistics about the cooldowns"""
+        return {**self.stats, "active_keys": len(self.recovered_at), "heap_size": len(self.expiry_heap)}
+
+
+# Singleton cooldowns instance
+cooldowns = Cooldowns()
+
+# Helper function to get the cooldowns
+async def get_cooldowns() -> Cooldowns:
+    """Get the shared cooldowns"""
+    return cooldowns
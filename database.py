@@ -0,0 +1,151 @@
+"""
+Data access layer for the bot's SQLite database
+Every command and event handler goes through the shared connection pool:
+reads use pooled read-only connections and writes go to the single writer
+"""
+
+import contextlib
+import logging
+import re
+from typing import Any, List, Optional
+
+import aiosqlite
+
+from db_pool import get_db_pool
+
+logger = logging.getLogger('database')
+
+# Pool used by the data access layer, or None for the shared pool
+pool = None
+
+# Statements that only read and can run on a pooled read-only connection
+_READ_STATEMENT = re.compile(r"^\s*(SELECT|EXPLAIN)\b|^\s*PRAGMA\b[^=]*$", re.IGNORECASE)
+
+
+async def get_pool():
+    """Get the connection pool used by the data access layer"""
+    return pool if pool is not None else await get_db_pool()
+
+
+def is_read_statement(sql: str) -> bool:
+    """Whether a statement only reads and never changes the database"""
+    return bool(_READ_STATEMENT.match(sql))
+
+
+class ResultCursor:
+    """Rows of a finished query, read with the usual cursor methods"""
+
+    def __init__(self, rows: List[tuple], description=None):
+        self.rows = rows
+        self.position = 0
+        self.description = description
+        self.rowcount = -1
+
+    async def fetchone(self) -> Optional[tuple]:
+        if self.position >= len(self.rows):
+            return None
+        row = self.rows[self.position]
+        self.position += 1
+        return row
+
+    async def fetchmany(self, size: int = 1) -> List[tuple]:
+        rows = self.rows[self.position:self.position + size]
+        self.position += len(rows)
+        return rows
+
+    async def fetchall(self) -> List[tuple]:
+        rows = self.rows[self.position:]
+        self.position = len(self.rows)
+        return rows
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> tuple:
+        row = await self.fetchone()
+        if row is None:
+            raise StopAsyncIteration
+        return row
+
+
+class Session:
+    """Connection-like handle for a block of database work
+
+    Reads borrow a pooled read-only connection only while the query runs and
+    return a ResultCursor, so no connection is held across Discord calls.
+    Writes are sent to the writer and are committed before execute()
+    returns, so commit() has nothing left to do. Use transaction() when
+    several writes must succeed or fail together.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def execute(self, sql: str, parameters: tuple = ()):
+        """Execute a statement on a reader or the writer depending on what it does"""
+        if is_read_statement(sql):
+            async with self.pool.connection() as connection:
+                cursor = await connection.execute(sql, parameters)
+                rows = await cursor.fetchall()
+                return ResultCursor(rows, cursor.description)
+        return await self.pool.execute(sql, parameters)
+
+    async def executemany(self, sql: str, parameters_list: list) -> aiosqlite.Cursor:
+        """Execute a write statement for many parameter sets"""
+        return await self.pool.execute_many(sql, parameters_list)
+
+    async def commit(self):
+        """Writes are already committed by the writer; kept for existing callers"""
+
+
+@contextlib.asynccontextmanager
+async def session():
+    """Context manager for a block of reads and writes on the shared pool"""
+    yield Session(await get_pool())
+
+
+@contextlib.asynccontextmanager
+async def transaction():
+    """Context manager running a block of statements as one atomic write
+
+    Yields the writer's connection; see DatabasePool.transaction().
+    """
+    pool = await get_pool()
+    async with pool.transaction() as connection:
+        yield connection
+
+
+async def execute(sql: str, parameters: tuple = ()) -> aiosqlite.Cursor:
+    """Execute a single write statement"""
+    pool = await get_pool()
+    return await pool.execute(sql, parameters)
+
+
+async def execute_many(sql: str, parameters_list: list) -> aiosqlite.Cursor:
+    """Execute a single write statement for many parameter sets"""
+    pool = await get_pool()
+    return await pool.execute_many(sql, parameters_list)
+
+
+async def fetchone(sql: str, parameters: tuple = ()) -> Optional[tuple]:
+    """Run a query and fetch one row"""
+    pool = await get_pool()
+    return await pool.fetchone(sql, parameters)
+
+
+async def fetchall(sql: str, parameters: tuple = ()) -> List[tuple]:
+    """Run a query and fetch all rows"""
+    pool = await get_pool()
+    return await pool.fetchall(sql, parameters)
+
+
+async def fetchmany(sql: str, parameters: tuple = (), size: int = 100) -> List[tuple]:
+    """Run a query and fetch at most size rows"""
+    pool = await get_pool()
+    return await pool.fetchmany(sql, parameters, size)
+
+
+async def fetchval(sql: str, parameters: tuple = (), default: Any = None) -> Any:
+    """Run a query and return the first column of the first row"""
+    pool = await get_pool()
+    return await pool.fetchval(sql, parameters, default)
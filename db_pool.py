@@ -1,30 +1,47 @@
 """
 SQLite connection pool implementation for the Discord bot
 This module helps prevent database locking issues by managing connections efficiently
+Pooled connections are read-only; all writes go through the single database writer
 """
 
 import aiosqlite
 import asyncio
 import contextlib
+from collections import deque
 import time
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Awaitable, Callable, Dict, List, Optional, Any
+
+from db_writer import DatabaseWriter
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('db_pool')
 
+
+class _Rollback(Exception):
+    """Raised inside the writer to roll back a transaction block"""
+
+
+# Upper bounds (in milliseconds) of the connection wait time histogram buckets
+WAIT_HISTOGRAM_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
 class DatabasePool:
-    """A simple connection pool for SQLite to avoid database locking issues"""
+    """A pool of read-only SQLite connections in front of a single writer"""
     
     def __init__(self, database_path: str, max_connections: int = 5, timeout: float = 30.0):
         self.database_path = database_path
         self.max_connections = max_connections
         self.timeout = timeout
+        self.writer = DatabaseWriter(database_path, timeout)
         self.connections: List[aiosqlite.Connection] = []
         self.available: List[bool] = []
-        self.connection_locks: List[asyncio.Lock] = []
+        # Indexes of idle connections, and futures of acquires waiting for one
+        # in FIFO order; release() hands a connection straight to a waiter
+        self.idle: deque = deque()
+        self.waiters: deque = deque()
+        self.waiting = 0
         self.pool_lock = asyncio.Lock()
         self.initialized = False
         self.stats: Dict[str, int] = {
@@ -32,7 +49,10 @@ class DatabasePool:
             "connections_used": 0,
             "connection_wait_time": 0,
             "max_wait_time": 0,
+            "waits": 0,
+            "timeouts": 0,
         }
+        self.wait_histogram: List[int] = [0] * (len(WAIT_HISTOGRAM_BUCKETS_MS) + 1)
     
     async def initialize(self):
         """Initialize the connection pool with a set of connections"""
@@ -44,6 +64,8 @@ class DatabasePool:
                 return
                 
             logger.info(f"Initializing database pool with {self.max_connections} connections to {self.database_path}")
+            # The writer sets up WAL mode before the readers connect
+            await self.writer.start()
             for _ in range(self.max_connections):
                 connection = await aiosqlite.connect(self.database_path)
                 # Enable foreign keys
@@ -53,10 +75,12 @@ class DatabasePool:
                 # Set busy timeout
                 await connection.execute(f"PRAGMA busy_timeout = {int(self.timeout * 1000)}")
                 await connection.commit()
+                # Only the writer may change the database
+                await connection.execute("PRAGMA query_only = ON")
                 
+                self.idle.append(len(self.connections))
                 self.connections.append(connection)
                 self.available.append(True)
-                self.connection_locks.append(asyncio.Lock())
                 self.stats["connections_created"] += 1
             
             self.initialized = True
@@ -68,44 +92,83 @@ class DatabasePool:
             await self.initialize()
         
         start_time = time.time()
-        while True:
-            # First try to get an available connection without waiting
-            async with self.pool_lock:
-                for i, available in enumerate(self.available):
-                    if available:
-                        self.available[i] = False
-                        self.stats["connections_used"] += 1
-                        wait_time = time.time() - start_time
-                        self.stats["connection_wait_time"] += wait_time
-                        if wait_time > self.stats["max_wait_time"]:
-                            self.stats["max_wait_time"] = wait_time
-                        
-                        if wait_time > 1.0:  # Log if wait was longer than 1 second
-                            logger.warning(f"Connection {i} acquired after waiting {wait_time:.2f}s")
-                        return i, self.connections[i]
-            
-            # If all connections are busy, wait a bit and try again
+        if self.idle:
+            # Take an idle connection without waiting if there is one
+            index = self.idle.popleft()
+        else:
+            # Otherwise wait in line until a connection is released
+            index = await self._wait_for_connection(start_time)
+        
+        self.available[index] = False
+        self.stats["connections_used"] += 1
+        wait_time = time.time() - start_time
+        self._record_wait(wait_time)
+        
+        if wait_time > 1.0:  # Log if wait was longer than 1 second
+            logger.warning(f"Connection {index} acquired after waiting {wait_time:.2f}s")
+        return index, self.connections[index]
+    
+    async def _wait_for_connection(self, start_time: float) -> int:
+        self.stats["waits"] += 1
+        self.waiting += 1
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            # asyncio.wait doesn't cancel the future, so a connection handed
+            # over just as the timeout fires is still seen and used
+            await asyncio.wait((waiter,), timeout=self.timeout)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The caller went away after being given a connection
+                self._hand_over(waiter.result())
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            self.waiting -= 1
+
+        if not waiter.done():
+            waiter.cancel()
+            self.stats["timeouts"] += 1
             wait_time = time.time() - start_time
-            if wait_time > self.timeout:
-                raise TimeoutError(f"Timeout waiting for database connection ({wait_time:.2f}s)")
-            
-            if wait_time > 5.0:  # Log warning if waiting more than 5 seconds
-                logger.warning(f"Waiting for database connection for {wait_time:.2f}s")
-                
-            await asyncio.sleep(0.1)  # Small sleep to avoid CPU spinning
+            raise TimeoutError(f"Timeout waiting for database connection ({wait_time:.2f}s)")
+        return waiter.result()
+
+    def _hand_over(self, index: int):
+        """Give an idle connection to the longest waiting acquire, or park it"""
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(index)
+                return
+        self.idle.append(index)
+
+    def _record_wait(self, wait_time: float):
+        """Add a connection wait time to the stats and histogram"""
+        self.stats["connection_wait_time"] += wait_time
+        if wait_time > self.stats["max_wait_time"]:
+            self.stats["max_wait_time"] = wait_time
+        
+        wait_ms = wait_time * 1000
+        for bucket, upper_bound in enumerate(WAIT_HISTOGRAM_BUCKETS_MS):
+            if wait_ms <= upper_bound:
+                self.wait_histogram[bucket] += 1
+                return
+        self.wait_histogram[-1] += 1
     
     async def release(self, index: int):
         """Release a connection back to the pool"""
-        async with self.pool_lock:
-            if 0 <= index < len(self.available):
-                self.available[index] = True
-                logger.debug(f"Released connection {index} back to the pool")
-            else:
-                logger.error(f"Attempted to release invalid connection index: {index}")
+        if 0 <= index < len(self.available) and not self.available[index]:
+            self.available[index] = True
+            # Hands the connection straight to the longest waiting acquire, if any
+            self._hand_over(index)
+            logger.debug(f"Released connection {index} back to the pool")
+        else:
+            logger.error(f"Attempted to release invalid connection index: {index}")
     
     @contextlib.asynccontextmanager
     async def connection(self):
-        """Context manager for acquiring and releasing a connection"""
+        """Context manager for acquiring and releasing a read-only connection"""
         index = -1
         try:
             index, connection = await self.acquire()
@@ -115,28 +178,84 @@ class DatabasePool:
                 await self.release(index)
     
     async def execute(self, sql: str, parameters: tuple = (), commit: bool = True) -> Optional[Any]:
-        """Execute a SQL query and optionally commit the changes"""
-        async with self.connection() as connection:
-            try:
-                cursor = await connection.execute(sql, parameters)
-                if commit:
-                    await connection.commit()
-                return cursor
-            except Exception as e:
-                logger.error(f"Database error executing {sql[:50]}...: {str(e)}")
-                raise
+        """Execute a write statement through the writer
+
+        Writes are always committed by the writer's group commit; commit is
+        kept for compatibility with existing callers.
+        """
+        if not self.initialized:
+            await self.initialize()
+        try:
+            return await self.writer.execute(sql, parameters)
+        except Exception as e:
+            logger.error(f"Database error executing {sql[:50]}...: {str(e)}")
+            raise
     
     async def execute_many(self, sql: str, parameters_list: list, commit: bool = True) -> Optional[Any]:
-        """Execute a SQL query with multiple parameter sets"""
-        async with self.connection() as connection:
-            try:
-                cursor = await connection.executemany(sql, parameters_list)
-                if commit:
-                    await connection.commit()
-                return cursor
-            except Exception as e:
-                logger.error(f"Database error in execute_many {sql[:50]}...: {str(e)}")
-                raise
+        """Execute a write statement with multiple parameter sets through the writer"""
+        if not self.initialized:
+            await self.initialize()
+        try:
+            return await self.writer.execute_many(sql, parameters_list)
+        except Exception as e:
+            logger.error(f"Database error in execute_many {sql[:50]}...: {str(e)}")
+            raise
+    
+    async def write(self, job: Callable[[aiosqlite.Connection], Awaitable[Any]]) -> Any:
+        """Run an async function with the write connection as one atomic unit"""
+        if not self.initialized:
+            await self.initialize()
+        return await self.writer.run(job)
+    
+    async def maintenance(self, sql: str) -> Optional[Any]:
+        """Run a statement outside of any transaction through the writer, e.g. VACUUM"""
+        if not self.initialized:
+            await self.initialize()
+        return await self.writer.maintenance(sql)
+    
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        """Context manager running a block of statements as one atomic write
+
+        Yields the writer's connection once the writer has started its
+        BEGIN IMMEDIATE batch. The block runs in its own savepoint and is
+        committed with the batch when it exits, or rolled back if it raises.
+        The writer is held for the whole block, so keep it to database work:
+        don't await Discord calls in it, don't commit, and don't use
+        execute() from inside it.
+        """
+        if not self.initialized:
+            await self.initialize()
+        loop = asyncio.get_running_loop()
+        leased = loop.create_future()
+        finished = loop.create_future()
+        
+        async def job(connection):
+            leased.set_result(connection)
+            if not await finished:
+                raise _Rollback()
+        
+        write_task = asyncio.ensure_future(self.writer.run(job))
+        try:
+            await asyncio.wait([leased, write_task], return_when=asyncio.FIRST_COMPLETED)
+            if not leased.done():
+                # The writer failed before the block could start
+                await write_task
+        except BaseException:
+            # Cancelled while waiting for the writer: roll back as soon as it starts
+            finished.set_result(False)
+            write_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+            raise
+        
+        try:
+            yield leased.result()
+        except BaseException:
+            finished.set_result(False)
+            with contextlib.suppress(_Rollback):
+                await write_task
+            raise
+        finished.set_result(True)
+        await write_task
     
     async def fetchone(self, sql: str, parameters: tuple = ()) -> Optional[tuple]:
         """Execute a query and fetch one result"""
@@ -158,6 +277,21 @@ class DatabasePool:
                 logger.error(f"Database error in fetchall {sql[:50]}...: {str(e)}")
                 raise
     
+    async def fetchmany(self, sql: str, parameters: tuple = (), size: int = 100) -> List[tuple]:
+        """Execute a query and fetch at most size results"""
+        async with self.connection() as connection:
+            try:
+                cursor = await connection.execute(sql, parameters)
+                return await cursor.fetchmany(size)
+            except Exception as e:
+                logger.error(f"Database error in fetchmany {sql[:50]}...: {str(e)}")
+                raise
+    
+    async def fetchval(self, sql: str, parameters: tuple = (), default: Any = None) -> Any:
+        """Execute a query and return the first column of the first result"""
+        row = await self.fetchone(sql, parameters)
+        return row[0] if row else default
+    
     async def close(self):
         """Close all connections in the pool"""
         if not self.initialized:
@@ -170,7 +304,11 @@ class DatabasePool:
             
             self.connections = []
             self.available = []
-            self.connection_locks = []
+            self.idle = deque()
+            for waiter in self.waiters:
+                waiter.cancel()
+            self.waiters = deque()
+            await self.writer.close()
             self.initialized = False
             logger.info("All database connections closed")
     
@@ -182,8 +320,17 @@ class DatabasePool:
                 "active_connections": self.available.count(False),
                 "idle_connections": self.available.count(True),
                 "total_connections": len(self.connections),
+                "waiting": self.waiting,
+                "wait_histogram_ms": self._histogram_labels(),
+                "writer": self.writer.get_stats(),
             }
         return stats
+    
+    def _histogram_labels(self) -> Dict[str, int]:
+        """Connection wait time histogram keyed by bucket label"""
+        labels = [f"<={bound}" for bound in WAIT_HISTOGRAM_BUCKETS_MS]
+        labels.append(f">{WAIT_HISTOGRAM_BUCKETS_MS[-1]}")
+        return dict(zip(labels, self.wait_histogram))
 
 # Singleton database pool instance
 db_pool = DatabasePool("leveling.db")
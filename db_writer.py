@@ -0,0 +1,201 @@
+"""
+Single writer for the SQLite database
+One task owns the only connection that writes. Write jobs are queued and
+group-committed so writers never fight over the SQLite lock
+"""
+
+import aiosqlite
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger('db_writer')
+
+# Job kinds accepted by the writer
+EXECUTE = "execute"
+EXECUTE_MANY = "execute_many"
+RUN = "run"
+MAINTENANCE = "maintenance"
+
+
+class DatabaseWriter:
+    """Owns the write connection and applies queued write jobs in batches
+
+    Every job runs inside its own savepoint, so a failing job is rolled back
+    on its own while the rest of the batch is still committed together.
+    """
+
+    def __init__(self, database_path: str, timeout: float = 30.0, max_batch: int = 100):
+        self.database_path = database_path
+        self.timeout = timeout
+        self.max_batch = max_batch
+        self.connection: Optional[aiosqlite.Connection] = None
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.writer_task: Optional[asyncio.Task] = None
+        self.start_lock = asyncio.Lock()
+        self.stats: Dict[str, int] = {
+            "jobs": 0,
+            "job_errors": 0,
+            "commits": 0,
+            "commit_errors": 0,
+            "largest_batch": 0,
+        }
+
+    async def start(self):
+        """Open the write connection and start the writer task"""
+        async with self.start_lock:
+            if self.writer_task is not None:
+                return
+
+            connection = await aiosqlite.connect(self.database_path, isolation_level=None)
+            await connection.execute("PRAGMA foreign_keys = ON")
+            await connection.execute("PRAGMA journal_mode = WAL")
+            await connection.execute(f"PRAGMA busy_timeout = {int(self.timeout * 1000)}")
+            self.connection = connection
+            self.writer_task = asyncio.create_task(self._writer_loop())
+            logger.info(f"Database writer started for {self.database_path}")
+
+    async def _submit(self, kind: str, payload: Tuple) -> Any:
+        if self.writer_task is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((kind, payload, future))
+        return await future
+
+    async def execute(self, sql: str, parameters: tuple = ()) -> aiosqlite.Cursor:
+        """Run one write statement and wait until it is committed"""
+        return await self._submit(EXECUTE, (sql, parameters))
+
+    async def execute_many(self, sql: str, parameters_list: list) -> aiosqlite.Cursor:
+        """Run one write statement for many parameter sets and wait until it is committed"""
+        return await self._submit(EXECUTE_MANY, (sql, parameters_list))
+
+    async def run(self, job: Callable[[aiosqlite.Connection], Awaitable[Any]]) -> Any:
+        """Run an async function with the write connection as one atomic unit
+
+        The function must not commit or roll back itself; raising an
+        exception rolls back everything it did. Returns its result.
+        """
+        return await self._submit(RUN, (job,))
+
+    async def maintenance(self, sql: str) -> aiosqlite.Cursor:
+        """Run a statement that can't run in a transaction, such as VACUUM"""
+        return await self._submit(MAINTENANCE, (sql,))
+
+    async def _writer_loop(self):
+        while True:
+            job = await self.queue.get()
+            if job is None:
+                return
+
+            # Group every job that is already waiting into the same commit
+            batch = [job]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    job = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if job is None:
+                    stop = True
+                    break
+                batch.append(job)
+
+            # Maintenance jobs run on their own, between group commits
+            group = []
+            for job in batch:
+                if job[0] != MAINTENANCE:
+                    group.append(job)
+                    continue
+                await self._run_group(group)
+                group = []
+                await self._run_maintenance(job)
+            await self._run_group(group)
+            if stop:
+                return
+
+    async def _run_group(self, group: List[Tuple]):
+        if not group:
+            return
+        try:
+            await self._run_batch(group)
+        except Exception as e:
+            logger.error(f"Database writer failed on a batch of {len(group)} jobs: {e}")
+
+    async def _run_maintenance(self, job: Tuple):
+        _, (sql,), future = job
+        if future.cancelled():
+            return
+        try:
+            result = await self.connection.execute(sql)
+        except Exception as e:
+            logger.error(f"Database maintenance failed on {sql[:50]}: {e}")
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    async def _run_batch(self, batch: List[Tuple]):
+        connection = self.connection
+        self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+        outcomes = []
+
+        try:
+            await connection.execute("BEGIN IMMEDIATE")
+            for kind, payload, future in batch:
+                # The caller stopped waiting, so the write is dropped
+                if future.cancelled():
+                    continue
+                self.stats["jobs"] += 1
+                await connection.execute("SAVEPOINT write_job")
+                try:
+                    result = await self._run_job(connection, kind, payload)
+                except Exception as e:
+                    await connection.execute("ROLLBACK TO SAVEPOINT write_job")
+                    await connection.execute("RELEASE SAVEPOINT write_job")
+                    self.stats["job_errors"] += 1
+                    outcomes.append((future, None, e))
+                    continue
+                await connection.execute("RELEASE SAVEPOINT write_job")
+                outcomes.append((future, result, None))
+            await connection.execute("COMMIT")
+            self.stats["commits"] += 1
+        except Exception as e:
+            # Nothing in the batch was committed, so every job fails
+            self.stats["commit_errors"] += 1
+            if connection.in_transaction:
+                await connection.execute("ROLLBACK")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            raise
+
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    async def _run_job(self, connection: aiosqlite.Connection, kind: str, payload: Tuple) -> Any:
+        if kind == EXECUTE:
+            return await connection.execute(*payload)
+        if kind == EXECUTE_MANY:
+            return await connection.executemany(*payload)
+        job, = payload
+        return await job(connection)
+
+    async def close(self):
+        """Apply the queued jobs, stop the writer task and close the connection"""
+        if self.writer_task is not None:
+            self.queue.put_nowait(None)
+            await self.writer_task
+            self.writer_task = None
+        if self.connection is not None:
+            await self.connection.close()
+            self.connection = None
+            logger.info("Database writer stopped")
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get statistics about the writer"""
+        return {**self.stats, "queued_jobs": self.queue.qsize()}
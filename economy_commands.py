@@ -2,10 +2,13 @@ import time
 import discord
 import random
 import asyncio
-import aiosqlite
+import database
+from leaderboard_view import LeaderboardView
+from bulk_economy import grant_coins_to_all
+from cooldowns import cooldowns
 from discord import app_commands
 from discord.ext import commands
-from datetime import datetime, timedelta
+from datetime import datetime
 
 # Game settings
 COINFLIP_MULTIPLIER = 2
@@ -30,86 +33,76 @@ GAMBLING_CHANNEL_ID = 1353821379497033849
 WIN_CHANCE = 0.40  # 40% chance of winning
 GREEN_CHANCE = 0.05  # 5% chance of green
 
-# Store user cooldowns
-user_cooldowns = {}
-
 # Helper function to check if user is on cooldown
 def check_cooldown(user_id, command_name, cooldown_seconds):
     """Check if user is on cooldown for a specific command."""
-    now = datetime.now()
-    
-    # Generate key for cooldown storage
-    cooldown_key = f"{user_id}_{command_name}"
-    
-    # Check if user has a cooldown for this command
-    if cooldown_key in user_cooldowns:
-        # Get the time when cooldown expires
-        cooldown_expires = user_cooldowns[cooldown_key]
-        
-        # Check if cooldown has expired
-        if now < cooldown_expires:
-            # Calculate remaining cooldown
-            remaining = (cooldown_expires - now).total_seconds()
-            return True, int(remaining)
-    
-    # Set new cooldown
-    user_cooldowns[cooldown_key] = now + timedelta(seconds=cooldown_seconds)
+    remaining = cooldowns.hit((command_name, user_id), cooldown_seconds)
+    if remaining > 0:
+        return True, int(remaining)
     return False, 0
 
 # Helper function to get user coins
 async def get_user_coins(user_id):
-    """Get a user's coin balance from the database."""
-    async with aiosqlite.connect("leveling.db") as db:
-        cursor = await db.execute('SELECT coins FROM users WHERE user_id = ?', (user_id,))
-        result = await cursor.fetchone()
-        
-        if result:
-            return result[0]
-        else:
-            # Create user if not exists with default coins
-            await db.execute('INSERT INTO users (user_id, coins, xp, level) VALUES (?, ?, ?, ?)', 
-                           (user_id, 100, 0, 1))
-            await db.commit()
-            return 100
+    """Get a user's coin balance from the shared user cache."""
+    from user_cache import get_user_cache
+    user_cache = await get_user_cache()
+    state = await user_cache.get(user_id)
+    
+    if state:
+        return state["coins"]
+    else:
+        # Create user if not exists with default coins
+        await user_cache.apply(user_id, reason="starting_balance", coins=100)
+        return 100
+
+# Helper function to take a bet or price from a user's coins
+async def try_debit(user_id, amount, transaction_type="game"):
+    """Take coins from a user only if they can afford it.
+
+    Returns the new balance, or None if the balance is too low.
+    """
+    from user_cache import get_user_cache
+    user_cache = await get_user_cache()
+    # New users get their starting coins first
+    await get_user_coins(user_id)
+    return await user_cache.try_debit(user_id, amount, transaction_type)
+
+# Helper function to move coins between users
+async def transfer_coins(sender_id, recipient_id, amount):
+    """Move coins from one user to another if the sender can afford it.
+
+    Returns the new (sender, recipient) balances, or None if the balance is too low.
+    """
+    from user_cache import get_user_cache
+    user_cache = await get_user_cache()
+    await get_user_coins(sender_id)
+    await get_user_coins(recipient_id)
+    return await user_cache.transfer(sender_id, recipient_id, amount, "transfer")
 
 # Helper function to update user coins
 async def update_user_coins(user_id, amount, transaction_type="game"):
-    """Update a user's coin balance in the database."""
+    """Update a user's coin balance through the shared user cache."""
     try:
-        async with aiosqlite.connect("leveling.db") as db:
-            cursor = await db.execute('SELECT coins FROM users WHERE user_id = ?', (user_id,))
-            result = await cursor.fetchone()
-            
-            if result:
-                new_coins = result[0] + amount
-                # Ensure balance doesn't go below 0
-                if new_coins < 0:
-                    new_coins = 0
-                    
-                await db.execute('UPDATE users SET coins = ? WHERE user_id = ?', (new_coins, user_id))
+        from user_cache import get_user_cache
+        user_cache = await get_user_cache()
+        state = await user_cache.get(user_id)
+        
+        if state:
+            new_coins = state["coins"] + amount
+            # Ensure balance doesn't go below 0
+            if new_coins < 0:
+                new_coins = 0
                 
-                # Record transaction if the database has a transactions table
-                try:
-                    await db.execute(
-                        'INSERT INTO transactions (user_id, amount, transaction_type) VALUES (?, ?, ?)',
-                        (user_id, amount, transaction_type)
-                    )
-                except:
-                    # Transactions table might not exist
-                    pass
+            await user_cache.apply(user_id, reason=transaction_type, coins=new_coins - state["coins"])
+            return new_coins
+        else:
+            # Create user if not exists with default coins + amount
+            starting_coins = 100 + amount
+            if starting_coins < 0:
+                starting_coins = 0
                 
-                await db.commit()
-                return new_coins
-            else:
-                # Create user if not exists with default coins + amount
-                starting_coins = 100 + amount
-                if starting_coins < 0:
-                    starting_coins = 0
-                    
-                await db.execute('INSERT INTO users (user_id, coins, xp, level) VALUES (?, ?, ?, ?)', 
-                               (user_id, starting_coins, 0, 1))
-                await db.commit()
-                return starting_coins
+            await user_cache.apply(user_id, reason=transaction_type, coins=starting_coins)
+            return starting_coins
     except Exception as e:
         print(f"Error updating coins: {e}")
         return None
@@ -240,9 +233,9 @@ class EconomyCommands(commands.Cog):
             )
             return
         
-        # Check if user has enough coins
-        coins = await get_user_coins(user_id)
-        if coins < amount:
+        # Take the bet if the user has enough coins
+        if await try_debit(user_id, amount, "coinflip_bet") is None:
+            coins = await get_user_coins(user_id)
             await interaction.response.send_message(
                 f"❌ You don't have enough coins! You need {amount} coins but only have {coins}.",
                 ephemeral=True
@@ -262,9 +255,6 @@ class EconomyCommands(commands.Cog):
             color=choice_color
         )
         
-        # Deduct bet amount
-        await update_user_coins(user_id, -amount, "coinflip_bet")
-        
         # Add suspense field
         embed.add_field(
             name="🎲 Bet Details",
@@ -435,9 +425,9 @@ class EconomyCommands(commands.Cog):
             )
             return
         
-        # Check if user has enough coins
-        coins = await get_user_coins(user_id)
-        if coins < amount:
+        # Take the bet if the user has enough coins
+        if await try_debit(user_id, amount, "roulette_bet") is None:
+            coins = await get_user_coins(user_id)
             await interaction.response.send_message(
                 f"❌ You don't have enough coins! You need {amount} coins but only have {coins}.",
                 ephemeral=True
@@ -472,9 +462,6 @@ class EconomyCommands(commands.Cog):
             inline=False
         )
         
-        # Deduct bet amount
-        await update_user_coins(user_id, -amount, "roulette_bet")
-        
         # Send initial message
         await interaction.response.send_message(embed=embed)
         
@@ -689,18 +676,16 @@ class EconomyCommands(commands.Cog):
             await interaction.response.send_message("❌ Transfer amount must be positive!", ephemeral=True)
             return
         
-        # Check if sender has enough coins
-        sender_coins = await get_user_coins(sender_id)
-        if sender_coins < amount:
+        # Perform the transfer if the sender has enough coins
+        balances = await transfer_coins(sender_id, recipient_id, amount)
+        if balances is None:
+            sender_coins = await get_user_coins(sender_id)
             await interaction.response.send_message(
                 f"❌ You don't have enough coins! You need {amount} coins but only have {sender_coins}.",
                 ephemeral=True
             )
             return
-
-        # Perform the transfer
-        new_sender_coins = await update_user_coins(sender_id, -amount, "transfer_sent")
-        new_recipient_coins = await update_user_coins(recipient_id, amount, "transfer_received")
+        new_sender_coins, new_recipient_coins = balances
         
         # Create the transfer success embed
         embed = discord.Embed(
@@ -766,36 +751,19 @@ class EconomyCommands(commands.Cog):
             await interaction.response.send_message("❌ You don't have permission to use this command!", ephemeral=True)
             return
             
-        # Fetch top 10 users with most coins
-        async with aiosqlite.connect("leveling.db") as db:
-            cursor = await db.execute(
-                'SELECT user_id, coins FROM users ORDER BY coins DESC LIMIT 10'
-            )
-            results = await cursor.fetchall()
-            
-        if not results:
-            await interaction.response.send_message("No users found in the database.", ephemeral=True)
-            return
-            
-        # Create the leaderboard embed
-        embed = discord.Embed(
-            title="👑 Wealth Leaderboard 💰",
-            description="__Top 10 Richest Members__",
-            color=discord.Color.gold()
-        )
+        await interaction.response.defer()
         
         # Medal emojis for top 3
         medals = ["🥇", "🥈", "🥉"]
         
-        # Total coins in top 10
-        total_coins = sum(coins for _, coins in results)
-        
-        # Add each user to the embed
-        for i, (user_id, coins) in enumerate(results, 1):
-            try:
-                user = interaction.guild.get_member(user_id)
-                username = user.display_name if user else f"User ID: {user_id}"
-                
+        def format_page(entries):
+            fields = []
+            # Total coins on this page
+            total_coins = sum(coins for _, _, _, (coins,) in entries)
+            share_of = "top 10 wealth" if entries[0][0] == 1 else "this page's wealth"
+            
+            # Add each user to the embed
+            for i, user_id, username, (coins,) in entries:
                 # Add appropriate medal or number
                 if i <= 3:
                     prefix = medals[i-1]
@@ -807,11 +775,10 @@ class EconomyCommands(commands.Cog):
                 
                 # Special formatting for different positions
                 if i == 1:
-                    embed.add_field(
-                        name=f"{prefix} {username} 👑",
-                        value=f"**{coins:,}** coins\n*({percentage:.1f}% of top 10 wealth)*",
-                        inline=False
-                    )
+                    fields.append((
+                        f"{prefix} {username} 👑",
+                        f"**{coins:,}** coins\n*({percentage:.1f}% of {share_of})*"
+                    ))
                 else:
                     # Add an appropriate coin emoji based on amount
                     if coins >= 5000:
@@ -823,30 +790,29 @@ class EconomyCommands(commands.Cog):
                     else:
                         coin_emoji = "🪙"
                         
-                    embed.add_field(
-                        name=f"{prefix} {username}",
-                        value=f"{coin_emoji} **{coins:,}** coins\n*({percentage:.1f}% of top 10 wealth)*",
-                        inline=False
-                    )
-            except Exception as e:
-                embed.add_field(
-                    name=f"#{i} User ID: {user_id}",
-                    value=f"**{coins:,}** coins (Error: {str(e)})",
-                    inline=False
-                )
-        
-        # Add total summary field
-        embed.add_field(
-            name="📊 Economy Stats",
-            value=f"Total wealth: **{total_coins:,}** coins\nAverage wealth: **{total_coins // len(results):,}** coins",
-            inline=False
+                    fields.append((
+                        f"{prefix} {username}",
+                        f"{coin_emoji} **{coins:,}** coins\n*({percentage:.1f}% of {share_of})*"
+                    ))
+            
+            # Add total summary field
+            fields.append((
+                "📊 Economy Stats",
+                f"Total wealth: **{total_coins:,}** coins\nAverage wealth: **{total_coins // len(entries):,}** coins"
+            ))
+            return fields
+        
+        # Create the leaderboard, ten members per page
+        view = LeaderboardView(
+            self.bot, "coins",
+            title="👑 Wealth Leaderboard 💰",
+            description="__Richest Members__",
+            color=discord.Color.gold(),
+            format_page=format_page,
+            guild=interaction.guild,
+            viewer_id=interaction.user.id
         )
-                
-        # Add footer
-        embed.set_footer(text=f"Requested by {interaction.user.display_name} • Updated {datetime.now().strftime('%H:%M:%S')}")
-        
-        # Send the embed
-        await interaction.response.send_message(embed=embed)
+        await view.send(interaction, "No users found in the database.")
         
     @app_commands.command(name="addcoinall", description="Add coins to all members in the server")
     async def addcoinall(self, interaction: discord.Interaction, amount: int):
@@ -882,8 +848,6 @@ class EconomyCommands(commands.Cog):
         
         # Get all members in the guild
         try:
-            # Connect to database and get all users first
-            user_count = 0
             start_time = time.time()
             
             # Update the embed to show progress
@@ -900,16 +864,19 @@ class EconomyCommands(commands.Cog):
             progress_embed.set_footer(text=f"Started by {interaction.user.display_name} • Please wait...")
             await interaction.edit_original_response(embed=progress_embed)
             
-            async with aiosqlite.connect("leveling.db") as db:
-                # Get all users already in database
-                cursor = await db.execute('SELECT user_id FROM users')
-                existing_users = await cursor.fetchall()
-                existing_user_ids = [user[0] for user in existing_users]
-                
-                # Update coins for existing users
-                for user_id in existing_user_ids:
-                    await update_user_coins(user_id, amount, "addcoinall")
-                    user_count += 1
+            # Show each stage of the distribution in the status field
+            stage_messages = {
+                "flushing": "Saving recent balance changes...",
+                "updating": "Distributing coins to users...",
+            }
+            
+            async def show_progress(stage, count):
+                if stage in stage_messages:
+                    progress_embed.set_field_at(0, name="🔄 Process Status", value=stage_messages[stage], inline=False)
+                    await interaction.edit_original_response(embed=progress_embed)
+            
+            # Add the coins to every registered user in one update
+            user_count = await grant_coins_to_all(amount, "addcoinall", progress=show_progress)
             
             # Calculate time taken
             elapsed_time = time.time() - start_time
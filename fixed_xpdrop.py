@@ -51,27 +51,18 @@ async def xpdrop(interaction: discord.Interaction):
             level, prestige, xp, coins = user_data
             xp += xp_won
             
-        # Check if level up happens after XP drop
-        leveled_up = False
-        levels_gained = 0
-        coins_awarded = 0
-        
-        # Get level up coins from xp_settings
+        # Resolve level-ups and prestige through the leveling engine
         level_up_coins = xp_settings.get("level_up_coins", 150)  # Default to 150 if not found
+        result = resolve_level_ups(level, prestige, xp)
+        level, xp = result["level"], result["xp"]
+        coins_awarded = result["coins_awarded"]
+        coins += coins_awarded
+        leveled_up = result["levels_gained"] > 0
         
-        while xp >= calculate_xp_needed(level):
-            xp -= calculate_xp_needed(level)
-            level += 1
-            coins += level_up_coins
-            coins_awarded += level_up_coins
-            levels_gained += 1
-            leveled_up = True
-            
-            if level >= 101:
-                level = 1
-                prestige += 1
-                # Send a simple prestige message
-                await interaction.channel.send(f"⭐ **PRESTIGE UP!** ⭐ {user.mention} reached Prestige Level {prestige}! (+{level_up_coins} 🪙)")
+        if result["prestiges_gained"]:
+            prestige = result["prestige"]
+            # Send a simple prestige message
+            await interaction.channel.send(f"⭐ **PRESTIGE UP!** ⭐ {user.mention} reached Prestige Level {prestige}! (+{level_up_coins} 🪙)")
         
         if leveled_up:
             # Send a simple level up message
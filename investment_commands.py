@@ -1,10 +1,12 @@
 import discord
 import asyncio
-import aiosqlite
-import random
+import database
 from datetime import datetime, timedelta
 from discord import app_commands, ui
 from discord.ext import commands, tasks
+from user_cache import user_cache
+from outbox import outbox
+from investment_engine import accrue_until_warning, InvestmentEngine, take_collected_coins, WARNING_THRESHOLD
 
 # Investment types and their properties with cool emojis
 INVESTMENTS = {
@@ -112,6 +114,9 @@ RISK_EVENTS = {
 # Set up tasks
 investment_tasks = {}
 
+# Advances the due investments in the periodic update
+investment_engine = InvestmentEngine(INVESTMENTS, RISK_EVENTS)
+
 # Button class for emergency response to risk events
 class EmergencyResponseView(ui.View):
     def __init__(self, user_id, investment_type, event_type):
@@ -217,7 +222,7 @@ class EmergencyResponseView(ui.View):
         
     async def handle_response(self, interaction, response_cost, maintenance_level, response_type):
         # Check if user has enough coins
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             # First check current maintenance level
             cursor = await db.execute('''
                 SELECT maintenance
@@ -244,45 +249,40 @@ class EmergencyResponseView(ui.View):
                 )
                 return
             
-            # Now check if user has enough coins
-            cursor = await db.execute('SELECT coins FROM users WHERE user_id = ?', (self.user_id,))
-            result = await cursor.fetchone()
-            
-            if not result or result[0] < response_cost:
-                await interaction.response.send_message(
-                    f"You don't have enough coins for a {response_type.lower()} emergency response! Cost: {response_cost} coins.",
-                    ephemeral=True
-                )
-                return
-            
-            # IMPORTANT: Emergency responses don't automatically fix the business
-            # They just make it active again so the user can manually repair it
-            # with the /investment maintain command
-            
-            # Deduct the cost
-            await db.execute(
-                'UPDATE users SET coins = coins - ? WHERE user_id = ?',
-                (response_cost, self.user_id)
+        # IMPORTANT: Emergency responses don't automatically fix the business
+        # They just make it active again so the user can manually repair it
+        # with the /investment maintain command
+        
+        # Deduct the cost only if the balance covers it, including rewards still in the write buffer
+        if await user_cache.try_debit(self.user_id, response_cost, reason="investment_emergency") is None:
+            await interaction.response.send_message(
+                f"You don't have enough coins for a {response_type.lower()} emergency response! Cost: {response_cost} coins.",
+                ephemeral=True
             )
-            
-            # Set the business as active, but DON'T increase maintenance
-            # This ensures the user must manually repair with /investment maintain
-            await db.execute('''
-                UPDATE investments
-                SET active = 1
-                WHERE user_id = ? AND investment_type = ?
-            ''', (self.user_id, self.investment_type))
-            
-            # Log the emergency response
-            await db.execute('''
-                INSERT INTO investment_logs 
-                (user_id, investment_type, event_type, description, coins_affected, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (self.user_id, self.investment_type, "emergency_response", 
-                 f"{response_type} emergency response to {self.event_type} - Business reactivated but needs maintenance", 
-                 -response_cost, discord.utils.utcnow().timestamp()))
-            
-            await db.commit()
+            return
+        
+        try:
+            async with database.transaction() as db:
+                # Set the business as active, but DON'T increase maintenance
+                # This ensures the user must manually repair with /investment maintain
+                await db.execute('''
+                    UPDATE investments
+                    SET active = 1
+                    WHERE user_id = ? AND investment_type = ?
+                ''', (self.user_id, self.investment_type))
+                
+                # Log the emergency response
+                await db.execute('''
+                    INSERT INTO investment_logs 
+                    (user_id, investment_type, event_type, description, coins_affected, timestamp)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (self.user_id, self.investment_type, "emergency_response", 
+                     f"{response_type} emergency response to {self.event_type} - Business reactivated but needs maintenance", 
+                     -response_cost, discord.utils.utcnow().timestamp()))
+        except Exception:
+            # Refund the cost if the business couldn't be reactivated
+            await user_cache.apply(self.user_id, reason="investment_refund", coins=response_cost)
+            raise
             
         # Disable all buttons
         for child in self.children:
@@ -313,7 +313,7 @@ class EmergencyResponseView(ui.View):
 
 async def setup_investment_tables():
     """Create necessary database tables for investments if they don't exist."""
-    async with aiosqlite.connect("leveling.db") as db:
+    async with database.session() as db:
         # Create investments table to track user investments
         await db.execute('''
             CREATE TABLE IF NOT EXISTS investments (
@@ -344,311 +344,301 @@ async def setup_investment_tables():
         
         await db.commit()
 
+def accrue_investment(inv_type, maintenance, collected_coins, last_update_time, now):
+    """Bring one investment up to date; see investment_engine.accrue_until_warning()"""
+    investment = INVESTMENTS[inv_type]
+    return accrue_until_warning(maintenance, collected_coins, last_update_time, now,
+                  investment["hourly_return"], investment["max_holding"], investment["maintenance_drain"])
+
+async def settle_user_investments(user_id):
+    """Materialize a user's active investments before they are shown or changed
+    
+    Only the user's own rows are read and written. Investments are only
+    advanced while their maintenance stays above the warning threshold; the
+    hours after that, with their risk events, reminders and shutdowns, are
+    left to the periodic update_investments() pass.
+    """
+    now = datetime.now().timestamp()
+    investments = await database.fetchall('''
+        SELECT id, investment_type, maintenance, collected_coins, last_update_time
+        FROM investments
+        WHERE user_id = ? AND active = 1
+    ''', (user_id,))
+    
+    updates = []
+    for inv_id, inv_type, maintenance, collected_coins, last_update_time in investments:
+        if inv_type not in INVESTMENTS:
+            continue
+        new_maintenance, new_coins, new_update_time, hours = accrue_investment(
+            inv_type, maintenance, collected_coins, last_update_time, now)
+        if hours == 0:
+            continue
+        updates.append((new_maintenance, new_coins, new_update_time,
+                        inv_id, last_update_time, collected_coins))
+    
+    if not updates:
+        return
+    
+    # Rows changed by a concurrent update keep their new state
+    async with database.transaction() as db:
+        await db.executemany('''
+            UPDATE investments
+            SET maintenance = ?, collected_coins = ?, last_update_time = ?
+            WHERE id = ? AND last_update_time = ? AND collected_coins = ?
+        ''', updates)
+
 async def update_investments():
-    """Update all active investments with hourly income and maintenance drain."""
+    """Periodic pass over investments that reached the warning zone.
+    
+    Income and drain are accrued lazily by settle_user_investments(), so only
+    investments at or below the warning threshold are written here, where
+    reminders, risk events and shutdowns happen. All due investments are
+    advanced at once by the investment engine.
+    """
     now = datetime.now().timestamp()
     one_hour_ago = (datetime.now() - timedelta(hours=1)).timestamp()
     
     # Get all active investments
-    async with aiosqlite.connect("leveling.db") as db:
-        cursor = await db.execute('''
-            SELECT id, user_id, investment_type, maintenance, collected_coins, last_update_time
-            FROM investments
-            WHERE active = 1 AND last_update_time < ?
-        ''', (one_hour_ago,))
+    columns = investment_engine.load(await database.fetchall('''
+        SELECT id, user_id, investment_type, maintenance, collected_coins, last_update_time
+        FROM investments
+        WHERE active = 1 AND last_update_time < ?
+    ''', (one_hour_ago,)))
+    
+    # Collect every change and write them together in one transaction
+    updates = []
+    logs = []
+    notifications = []
+    for outcome in investment_engine.step(columns, now):
+        new_maintenance = outcome["drained_maintenance"]
+        if new_maintenance > WARNING_THRESHOLD:
+            continue  # Healthy investments are accrued lazily
         
-        investments = await cursor.fetchall()
-        for inv_id, user_id, inv_type, maintenance, collected_coins, last_update_time in investments:
-            if inv_type not in INVESTMENTS:
-                continue
+        i = outcome["index"]
+        inv_id, user_id, inv_type = columns.ids[i], columns.user_ids[i], columns.types[i]
+        investment = INVESTMENTS[inv_type]
+        drain_per_hour = investment["maintenance_drain"]
+        
+        # Send maintenance reminder if maintenance just dropped below 50% or continues to decline
+        if outcome["reminder"]:
+            try:
+                # Calculate hours until shutdown
+                hours_until_zero = new_maintenance / drain_per_hour
                 
-            investment = INVESTMENTS[inv_type]
-            hours_passed = (now - last_update_time) / 3600  # Convert seconds to hours
-            
-            if hours_passed < 1:
-                continue  # Skip if less than an hour has passed
+                # Create embedded message with alert
+                if new_maintenance <= 25:
+                    # Critical alert - maintenance below 25%
+                    embed = discord.Embed(
+                        title="🔴 CRITICAL Maintenance Alert!",
+                        description=f"Your {INVESTMENTS[inv_type]['name']} needs urgent maintenance!",
+                        color=discord.Color.red()
+                    )
+                    embed.add_field(
+                        name="⚠️ Current Maintenance",
+                        value=f"**{new_maintenance:.1f}%** (Critical level)",
+                        inline=True
+                    )
+                else:
+                    # Warning alert - maintenance between 25% and 50%
+                    embed = discord.Embed(
+                        title="🟠 Maintenance Warning",
+                        description=f"Your {INVESTMENTS[inv_type]['name']} needs maintenance soon.",
+                        color=discord.Color.orange()
+                    )
+                    embed.add_field(
+                        name="⚠️ Current Maintenance",
+                        value=f"**{new_maintenance:.1f}%**",
+                        inline=True
+                    )
                 
-            # Calculate how many full hours have passed
-            full_hours_passed = int(hours_passed)
-            
-            # Calculate new maintenance level
-            drain_per_hour = investment["maintenance_drain"]
-            new_maintenance = max(0, maintenance - (drain_per_hour * full_hours_passed))
-            
-            # Calculate coins earned (only if maintenance is at least 25%)
-            new_coins = collected_coins
-            if maintenance >= 25:
-                hourly_return = investment["hourly_return"]
-                coins_earned = hourly_return * full_hours_passed
-                max_holding = investment["max_holding"]
-                new_coins = min(max_holding, collected_coins + coins_earned)
+                embed.add_field(
+                    name="⏰ Time Until Shutdown",
+                    value=f"~{hours_until_zero:.1f} hours",
+                    inline=True
+                )
+                
+                # Add maintenance instructions
+                cost_to_repair = int(investment["hourly_return"] * 0.5)  # 50% of hourly income for repair (matching maintain action cost)
+                embed.add_field(
+                    name="🔧 Repair Instructions",
+                    value=f"Use `/investment maintain {inv_type}` to restore maintenance. Cost: **{cost_to_repair}** coins.",
+                    inline=False
+                )
+                
+                # Queue the DM once the updates are committed
+                notifications.append((user_id, {"embed": embed}))
+            except Exception as e:
+                print(f"Failed to send maintenance reminder DM to user {user_id}: {e}")
+        
+        # State after any risk event
+        new_maintenance, new_coins = columns.maintenance[i], columns.coins[i]
+        risk_event = outcome["risk_event"]
+        risk_type = outcome["risk_type"]
+
+        # Handle the risk event if one occurred
+        if risk_event:
+            # Log the risk event
+            logs.append((user_id, inv_type, f"{risk_type}_risk_event", risk_event, -outcome["coins_at_risk"], now))
             
-            # Send maintenance reminder if maintenance is between 0% and 50%
-            if 0 < new_maintenance <= 50 and (maintenance > 50 or maintenance > new_maintenance):
-                # Only send reminder if maintenance just dropped below 50% or if it continues to decline
+            # Different effects based on event type
+            if risk_type == "earthquake":
+                # Earthquakes are more severe - complete shutdown
                 try:
-                    # Get instance of bot from the global namespace 
-                    from main import bot
-                    
-                    # Calculate hours until shutdown
-                    hours_until_critical = new_maintenance / drain_per_hour
-                    hours_until_zero = new_maintenance / drain_per_hour
+                    # Create embedded message with earthquake alert
+                    embed = discord.Embed(
+                        title="🌋 CATASTROPHIC: Earthquake Disaster!",
+                        description=f"**{risk_event}**",
+                        color=discord.Color.dark_red()
+                    )
                     
-                    # Create embedded message with alert
-                    if new_maintenance <= 25:
-                        # Critical alert - maintenance below 25%
-                        embed = discord.Embed(
-                            title="🔴 CRITICAL Maintenance Alert!",
-                            description=f"Your {INVESTMENTS[inv_type]['name']} needs urgent maintenance!",
-                            color=discord.Color.red()
-                        )
-                        embed.add_field(
-                            name="⚠️ Current Maintenance",
-                            value=f"**{new_maintenance:.1f}%** (Critical level)",
-                            inline=True
-                        )
-                    else:
-                        # Warning alert - maintenance between 25% and 50%
-                        embed = discord.Embed(
-                            title="🟠 Maintenance Warning",
-                            description=f"Your {INVESTMENTS[inv_type]['name']} needs maintenance soon.",
-                            color=discord.Color.orange()
-                        )
-                        embed.add_field(
-                            name="⚠️ Current Maintenance",
-                            value=f"**{new_maintenance:.1f}%**",
-                            inline=True
-                        )
+                    embed.add_field(
+                        name="🏢 Affected Business",
+                        value=f"{INVESTMENTS[inv_type]['name']}",
+                        inline=True
+                    )
                     
                     embed.add_field(
-                        name="⏰ Time Until Shutdown",
-                        value=f"~{hours_until_zero:.1f} hours",
+                        name="💰 Losses",
+                        value=f"All accumulated coins lost",
                         inline=True
                     )
                     
-                    # Add maintenance instructions
-                    cost_to_repair = int(investment["hourly_return"] * 0.5)  # 50% of hourly income for repair (matching maintain action cost)
                     embed.add_field(
-                        name="🔧 Repair Instructions",
-                        value=f"Use `/investment maintain {inv_type}` to restore maintenance. Cost: **{cost_to_repair}** coins.",
+                        name="⚠️ Business Status",
+                        value="COMPLETELY DESTROYED - Needs rebuilding",
                         inline=False
                     )
                     
-                    # Get the user and send DM
-                    user = await bot.fetch_user(user_id)
-                    await user.send(embed=embed)
-                except Exception as e:
-                    print(f"Failed to send maintenance reminder DM to user {user_id}: {e}")
-            
-            # Check for risk events if maintenance is low
-            risk_event = None
-            risk_type = None
-            
-            # Different risk thresholds for different event types
-            if 0 < new_maintenance < 10:
-                # Very high risk of catastrophic events (like earthquakes)
-                earthquake_chance = 0.10  # 10% chance of earthquake when < 10% maintenance
-                if random.random() < earthquake_chance:
-                    # Find an earthquake event specifically
-                    earthquake_events = [event for event in RISK_EVENTS[inv_type] if "earthquake" in event.lower()]
-                    if earthquake_events:
-                        risk_event = random.choice(earthquake_events)
-                        risk_type = "earthquake"
-            
-            # Regular risk events if no earthquake and maintenance is low
-            if risk_event is None and 0 < new_maintenance < 25:
-                # Higher chance of general risk event when maintenance is very low
-                risk_chance = (25 - new_maintenance) / 25  # 0-24% maintenance → 0-96% chance
-                if random.random() < risk_chance:
-                    # Filter out earthquake events for regular risk events
-                    regular_events = [event for event in RISK_EVENTS[inv_type] if "earthquake" not in event.lower()]
-                    # Trigger a risk event
-                    risk_event = random.choice(regular_events if regular_events else RISK_EVENTS[inv_type])
-                    risk_type = "regular"
-                    
-            # Handle the risk event if one occurred
-            if risk_event:
-                # Log the risk event
-                await db.execute('''
-                    INSERT INTO investment_logs 
-                    (user_id, investment_type, event_type, description, coins_affected, timestamp)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (user_id, inv_type, f"{risk_type}_risk_event", risk_event, -new_coins, now))
-                
-                # Different effects based on event type
-                if risk_type == "earthquake":
-                    # Earthquakes are more severe - complete shutdown
-                    new_maintenance = 0
-                    new_coins = 0
+                    embed.add_field(
+                        name="🔧 Recovery Options",
+                        value=f"Your business must be rebuilt from scratch.\nUse `/investment buy {inv_type}` to rebuild.",
+                        inline=False
+                    )
                     
-                    # Try to send earthquake emergency DM
-                    try:
-                        # Get instance of bot from the global namespace 
-                        from main import bot
-                        
-                        # Create embedded message with earthquake alert
-                        embed = discord.Embed(
-                            title="🌋 CATASTROPHIC: Earthquake Disaster!",
-                            description=f"**{risk_event}**",
-                            color=discord.Color.dark_red()
-                        )
-                        
-                        embed.add_field(
-                            name="🏢 Affected Business",
-                            value=f"{INVESTMENTS[inv_type]['name']}",
-                            inline=True
-                        )
-                        
-                        embed.add_field(
-                            name="💰 Losses",
-                            value=f"All accumulated coins lost",
-                            inline=True
-                        )
-                        
-                        embed.add_field(
-                            name="⚠️ Business Status",
-                            value="COMPLETELY DESTROYED - Needs rebuilding",
-                            inline=False
-                        )
-                        
-                        embed.add_field(
-                            name="🔧 Recovery Options",
-                            value=f"Your business must be rebuilt from scratch.\nUse `/investment buy {inv_type}` to rebuild.",
-                            inline=False
-                        )
-                        
-                        # Add a striking image or icon to emphasize severity
-                        embed.set_thumbnail(url="https://cdn-icons-png.flaticon.com/512/2824/2824298.png")
-                        
-                        # Get the user and send DM
-                        user = await bot.fetch_user(user_id)
-                        await user.send(
-                            content=f"<@{user_id}> **🌋 EARTHQUAKE DISASTER ALERT!**", 
-                            embed=embed
-                        )
-                    except Exception as e:
-                        print(f"Failed to send earthquake disaster DM to user {user_id}: {e}")
-                else:
-                    # Regular events reduce maintenance and coins but don't completely zero them
-                    new_maintenance = max(0, new_maintenance - 15)  # Lose 15% maintenance
-                    new_coins = max(0, int(new_coins * 0.5))  # Lose 50% of accumulated coins
+                    # Add a striking image or icon to emphasize severity
+                    embed.set_thumbnail(url="https://cdn-icons-png.flaticon.com/512/2824/2824298.png")
                     
-                    # Try to send DM with emergency response button
-                    try:
-                        # Get instance of bot from the global namespace 
-                        from main import bot
-                        
-                        # Create embedded message with alert
-                        embed = discord.Embed(
-                            title="🚨 URGENT: Business Emergency!",
-                            description=f"**{risk_event}**",
-                            color=discord.Color.red()
-                        )
-                        
-                        embed.add_field(
-                            name="🏢 Affected Business",
-                            value=f"{INVESTMENTS[inv_type]['name']}",
-                            inline=True
-                        )
-                        
-                        embed.add_field(
-                            name="💰 Losses",
-                            value=f"{int(collected_coins * 0.5)} coins lost",
-                            inline=True
-                        )
-                        
-                        embed.add_field(
-                            name="⚠️ Damage Level",
-                            value=f"Business damaged to {new_maintenance:.1f}% condition",
-                            inline=True
-                        )
-                        
-                        embed.add_field(
-                            name="⏰ Time Sensitive",
-                            value="Choose your emergency response option below!",
-                            inline=False
-                        )
-                        
-                        # Add description of different response options
-                        embed.add_field(
-                            name="Response Options",
-                            value="• **Quick Response ($$$)**: Fastest but most expensive\n"
-                                 "• **Standard Response ($$)**: Balanced approach\n"
-                                 "• **Basic Response ($)**: Minimal fix, affordable\n"
-                                 "• **Ignore**: Business remains damaged",
-                            inline=False
-                        )
-                        
-                        # Create emergency response view
-                        view = EmergencyResponseView(user_id, inv_type, risk_event)
-                        
-                        # Get the user and send DM
-                        user = await bot.fetch_user(user_id)
-                        await user.send(content=f"<@{user_id}> **EMERGENCY ALERT!**", embed=embed, view=view)
-                    except Exception as e:
-                        print(f"Failed to send emergency DM to user {user_id}: {e}")
-            
-            # Update the investment
-            await db.execute('''
-                UPDATE investments
-                SET maintenance = ?, collected_coins = ?, last_update_time = ?
-                WHERE id = ?
-            ''', (new_maintenance, new_coins, now, inv_id))
-            
-            # If maintenance reached 0, deactivate the investment
-            if new_maintenance <= 0:
-                await db.execute('''
-                    UPDATE investments
-                    SET active = 0
-                    WHERE id = ?
-                ''', (inv_id,))
-                
-                # Log the shutdown
-                await db.execute('''
-                    INSERT INTO investment_logs 
-                    (user_id, investment_type, event_type, description, coins_affected, timestamp)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (user_id, inv_type, "shutdown", 
-                     f"Your {investment['name']} has shut down due to lack of maintenance.", 
-                     0, now))
-                
-                # Send DM notification about shutdown
+                    # Queue the DM once the updates are committed
+                    notifications.append((user_id, {
+                        "content": f"<@{user_id}> **🌋 EARTHQUAKE DISASTER ALERT!**", 
+                        "embed": embed
+                    }))
+                except Exception as e:
+                    print(f"Failed to send earthquake disaster DM to user {user_id}: {e}")
+            else:
+                # Regular events reduce maintenance and coins but don't completely zero them
                 try:
-                    # Get instance of bot from the global namespace 
-                    from main import bot
-                    
-                    # Create embedded message with shutdown alert
+                    # Create embedded message with alert
                     embed = discord.Embed(
-                        title="🚫 Business Shutdown Alert!",
-                        description=f"Your {INVESTMENTS[inv_type]['name']} has shut down due to lack of maintenance!",
-                        color=discord.Color.dark_red()
+                        title="🚨 URGENT: Business Emergency!",
+                        description=f"**{risk_event}**",
+                        color=discord.Color.red()
                     )
                     
                     embed.add_field(
-                        name="💼 Business",
-                        value=f"{INVESTMENTS[inv_type]['emoji']} {INVESTMENTS[inv_type]['name']}",
+                        name="🏢 Affected Business",
+                        value=f"{INVESTMENTS[inv_type]['name']}",
                         inline=True
                     )
                     
                     embed.add_field(
-                        name="🔧 Maintenance",
-                        value="0% (Critical Failure)",
+                        name="💰 Losses",
+                        value=f"{outcome['coins_lost']} coins lost",
                         inline=True
                     )
                     
                     embed.add_field(
-                        name="🔄 Recovery Instructions",
-                        value=f"Use `/investment buy {inv_type}` to reopen your business for **{INVESTMENTS[inv_type]['cost']}** coins.",
+                        name="⚠️ Damage Level",
+                        value=f"Business damaged to {new_maintenance:.1f}% condition",
+                        inline=True
+                    )
+                    
+                    embed.add_field(
+                        name="⏰ Time Sensitive",
+                        value="Choose your emergency response option below!",
+                        inline=False
+                    )
+                    
+                    # Add description of different response options
+                    embed.add_field(
+                        name="Response Options",
+                        value="• **Quick Response ($$$)**: Fastest but most expensive\n"
+                             "• **Standard Response ($$)**: Balanced approach\n"
+                             "• **Basic Response ($)**: Minimal fix, affordable\n"
+                             "• **Ignore**: Business remains damaged",
                         inline=False
                     )
                     
-                    # Get the user and send DM
-                    user = await bot.fetch_user(user_id)
-                    await user.send(embed=embed)
+                    # Create emergency response view
+                    view = EmergencyResponseView(user_id, inv_type, risk_event)
+                    
+                    # Queue the DM once the updates are committed
+                    notifications.append((user_id, {"content": f"<@{user_id}> **EMERGENCY ALERT!**", "embed": embed, "view": view}))
                 except Exception as e:
-                    print(f"Failed to send shutdown DM to user {user_id}: {e}")
+                    print(f"Failed to send emergency DM to user {user_id}: {e}")
         
-        await db.commit()
+        # Update the investment, deactivating it if maintenance reached 0
+        updates.append((new_maintenance, new_coins, columns.updated[i], 0 if outcome["shutdown"] else 1,
+                        inv_id, outcome["previous_update_time"], outcome["previous_coins"]))
+        
+        if outcome["shutdown"]:
+            # Log the shutdown
+            logs.append((user_id, inv_type, "shutdown", 
+                         f"Your {investment['name']} has shut down due to lack of maintenance.", 
+                         0, now))
+            
+            # Send DM notification about shutdown
+            try:
+                # Create embedded message with shutdown alert
+                embed = discord.Embed(
+                    title="🚫 Business Shutdown Alert!",
+                    description=f"Your {INVESTMENTS[inv_type]['name']} has shut down due to lack of maintenance!",
+                    color=discord.Color.dark_red()
+                )
+                
+                embed.add_field(
+                    name="💼 Business",
+                    value=f"{INVESTMENTS[inv_type]['emoji']} {INVESTMENTS[inv_type]['name']}",
+                    inline=True
+                )
+                
+                embed.add_field(
+                    name="🔧 Maintenance",
+                    value="0% (Critical Failure)",
+                    inline=True
+                )
+                
+                embed.add_field(
+                    name="🔄 Recovery Instructions",
+                    value=f"Use `/investment buy {inv_type}` to reopen your business for **{INVESTMENTS[inv_type]['cost']}** coins.",
+                    inline=False
+                )
+                
+                # Queue the DM once the updates are committed
+                notifications.append((user_id, {"embed": embed}))
+            except Exception as e:
+                print(f"Failed to send shutdown DM to user {user_id}: {e}")
+    
+    if not updates:
+        return
+    
+    # A row collected or settled since it was read is skipped and picked up
+    # again by the next run instead of restoring its old coins
+    async with database.transaction() as db:
+        await db.executemany('''
+            UPDATE investments
+            SET maintenance = ?, collected_coins = ?, last_update_time = ?, active = ?
+            WHERE id = ? AND last_update_time = ? AND collected_coins = ?
+        ''', updates)
+        if logs:
+            await db.executemany('''
+                INSERT INTO investment_logs 
+                (user_id, investment_type, event_type, description, coins_affected, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', logs)
+    
+    for user_id, message in notifications:
+        outbox.send_dm(user_id, **message)
 
 class InvestmentCommands(commands.Cog):
     def __init__(self, bot):
@@ -694,8 +684,8 @@ class InvestmentCommands(commands.Cog):
         # Set up database tables if they don't exist yet
         await setup_investment_tables()
         
-        # Force update investments for this user before proceeding
-        await update_investments()
+        # Bring this user's investments up to date before proceeding
+        await settle_user_investments(user_id)
         
         if action == "info":
             # Show general information about investments
@@ -789,7 +779,7 @@ class InvestmentCommands(commands.Cog):
             
         elif action == "status":
             # Show the user's current investments and their status
-            async with aiosqlite.connect("leveling.db") as db:
+            async with database.session() as db:
                 cursor = await db.execute('''
                     SELECT investment_type, maintenance, collected_coins, purchase_time, active
                     FROM investments
@@ -878,7 +868,7 @@ class InvestmentCommands(commands.Cog):
         # Handle different actions
         if action == "buy":
             # Check if user already has this investment
-            async with aiosqlite.connect("leveling.db") as db:
+            async with database.session() as db:
                 cursor = await db.execute('''
                     SELECT id, active FROM investments
                     WHERE user_id = ? AND investment_type = ?
@@ -896,17 +886,16 @@ class InvestmentCommands(commands.Cog):
                 # If they had one but it's inactive, they can repurchase it
                 if existing and existing[1] == 0:
                     # Check if user has enough coins
-                    cursor = await db.execute('SELECT coins FROM users WHERE user_id = ?', (user_id,))
-                    result = await cursor.fetchone()
+                    user = await user_cache.get(user_id)
                     
-                    if not result:
+                    if not user:
                         await interaction.response.send_message(
                             "You don't have an account yet! Earn some coins first by chatting.",
                             ephemeral=True
                         )
                         return
                         
-                    coins = result[0]
+                    coins = user["coins"]
                     cost = investment["cost"] // 2  # 50% discount for repurchase
                     
                     if coins < cost:
@@ -919,20 +908,24 @@ class InvestmentCommands(commands.Cog):
                     # Purchase the investment
                     now = datetime.now().timestamp()
                     
-                    # Deduct the cost
-                    await db.execute(
-                        'UPDATE users SET coins = coins - ? WHERE user_id = ?',
-                        (cost, user_id)
-                    )
+                    # Deduct the cost only if the balance still covers it
+                    if await user_cache.try_debit(user_id, cost, reason="investment_reopen") is None:
+                        await interaction.response.send_message(
+                            f"You don't have enough coins to reopen this business! You need {cost} coins.",
+                            ephemeral=True
+                        )
+                        return
                     
                     # Reactivate the investment
-                    await db.execute('''
-                        UPDATE investments
-                        SET active = 1, maintenance = 100, collected_coins = 0, purchase_time = ?, last_update_time = ?
-                        WHERE id = ?
-                    ''', (now, now, existing[0]))
-                    
-                    await db.commit()
+                    try:
+                        await db.execute('''
+                            UPDATE investments
+                            SET active = 1, maintenance = 100, collected_coins = 0, purchase_time = ?, last_update_time = ?
+                            WHERE id = ?
+                        ''', (now, now, existing[0]))
+                    except Exception:
+                        await user_cache.apply(user_id, reason="investment_refund", coins=cost)
+                        raise
                     
                     embed = discord.Embed(
                         title="🏬 Business Reopened!",
@@ -964,17 +957,16 @@ class InvestmentCommands(commands.Cog):
                 # Otherwise, purchase a new investment
                 
                 # Check if user has enough coins
-                cursor = await db.execute('SELECT coins FROM users WHERE user_id = ?', (user_id,))
-                result = await cursor.fetchone()
+                user = await user_cache.get(user_id)
                 
-                if not result:
+                if not user:
                     await interaction.response.send_message(
                         "You don't have an account yet! Earn some coins first by chatting.",
                         ephemeral=True
                     )
                     return
                     
-                coins = result[0]
+                coins = user["coins"]
                 cost = investment["cost"]
                 
                 if coins < cost:
@@ -987,20 +979,24 @@ class InvestmentCommands(commands.Cog):
                 # Purchase the investment
                 now = datetime.now().timestamp()
                 
-                # Deduct the cost
-                await db.execute(
-                    'UPDATE users SET coins = coins - ? WHERE user_id = ?',
-                    (cost, user_id)
-                )
+                # Deduct the cost only if the balance still covers it
+                if await user_cache.try_debit(user_id, cost, reason="investment_purchase") is None:
+                    await interaction.response.send_message(
+                        f"You don't have enough coins to buy this business! You need {cost} coins.",
+                        ephemeral=True
+                    )
+                    return
                 
                 # Create the investment
-                await db.execute('''
-                    INSERT INTO investments
-                    (user_id, investment_type, purchase_time, maintenance, collected_coins, last_update_time, active)
-                    VALUES (?, ?, ?, 100, 0, ?, 1)
-                ''', (user_id, business_type, now, now))
-                
-                await db.commit()
+                try:
+                    await db.execute('''
+                        INSERT INTO investments
+                        (user_id, investment_type, purchase_time, maintenance, collected_coins, last_update_time, active)
+                        VALUES (?, ?, ?, 100, 0, ?, 1)
+                    ''', (user_id, business_type, now, now))
+                except Exception:
+                    await user_cache.apply(user_id, reason="investment_refund", coins=cost)
+                    raise
                 
                 embed = discord.Embed(
                     title=f"🎉 {investment['emoji']} Business Purchased!",
@@ -1036,7 +1032,7 @@ class InvestmentCommands(commands.Cog):
                 
         elif action == "collect":
             # Collect coins from the investment
-            async with aiosqlite.connect("leveling.db") as db:
+            async with database.session() as db:
                 cursor = await db.execute('''
                     SELECT id, collected_coins, maintenance, active
                     FROM investments
@@ -1071,20 +1067,17 @@ class InvestmentCommands(commands.Cog):
                 # The user gets all coins (no automatic maintenance repair)
                 coins_to_user = collected_coins
                 
-                # Add the coins to user balance
-                await db.execute(
-                    'UPDATE users SET coins = coins + ? WHERE user_id = ?',
-                    (coins_to_user, user_id)
-                )
-                
-                # Reset the collected coins in the investment but don't change maintenance
-                await db.execute('''
-                    UPDATE investments
-                    SET collected_coins = 0
-                    WHERE id = ?
-                ''', (inv_id,))
+                # Reset the collected coins in the investment but don't change maintenance,
+                # unless a concurrent collect already took them
+                if not await take_collected_coins(inv_id, collected_coins):
+                    await interaction.response.send_message(
+                        f"Your {investment['name']} income was just collected! Try again in a moment.",
+                        ephemeral=True
+                    )
+                    return
                 
-                await db.commit()
+                # Add the coins to user balance
+                await user_cache.apply(user_id, reason="investment_collect", coins=coins_to_user)
                 
                 embed = discord.Embed(
                     title=f"💰 {investment['emoji']} Income Collected!",
@@ -1117,7 +1110,7 @@ class InvestmentCommands(commands.Cog):
                 
         elif action == "maintain":
             # Perform maintenance on the investment
-            async with aiosqlite.connect("leveling.db") as db:
+            async with database.session() as db:
                 cursor = await db.execute('''
                     SELECT id, maintenance, active
                     FROM investments
@@ -1155,8 +1148,8 @@ class InvestmentCommands(commands.Cog):
                 maintenance_cost = int((maintenance_needed / 100) * investment["max_holding"])
                 
                 # Check if user has enough coins
-                cursor = await db.execute('SELECT coins FROM users WHERE user_id = ?', (user_id,))
-                user_coins = (await cursor.fetchone())[0]
+                user = await user_cache.get(user_id)
+                user_coins = user["coins"] if user else 0
                 
                 # Create embed with maintenance information
                 embed = discord.Embed(
@@ -1188,20 +1181,25 @@ class InvestmentCommands(commands.Cog):
                         
                     @discord.ui.button(label="Confirm Repair", style=discord.ButtonStyle.green)
                     async def confirm_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-                        # Deduct the cost
-                        await db.execute(
-                            'UPDATE users SET coins = coins - ? WHERE user_id = ?',
-                            (maintenance_cost, user_id)
-                        )
+                        # The balance may have changed while the confirmation was open,
+                        # so only deduct the cost if it still covers it
+                        if await user_cache.try_debit(user_id, maintenance_cost, reason="investment_repair") is None:
+                            await interaction.response.send_message(
+                                f"You no longer have the **{maintenance_cost}** coins needed for this repair.",
+                                ephemeral=True
+                            )
+                            return
                         
                         # Update the maintenance to 100%
-                        await db.execute('''
-                            UPDATE investments
-                            SET maintenance = 100
-                            WHERE id = ?
-                        ''', (inv_id,))
-                        
-                        await db.commit()
+                        try:
+                            await db.execute('''
+                                UPDATE investments
+                                SET maintenance = 100
+                                WHERE id = ?
+                            ''', (inv_id,))
+                        except Exception:
+                            await user_cache.apply(user_id, reason="investment_refund", coins=maintenance_cost)
+                            raise
                         
                         # Create response embed
                         result_embed = discord.Embed(
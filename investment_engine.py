@@ -0,0 +1,266 @@
+"""
+Investment accrual and simulation
+An investment's maintenance and collected coins follow from the values saved
+at its last update and the whole hours passed since, so they can be brought
+up to date lazily when a user looks at or uses their investments. The
+periodic pass loads the due investments into columns and advances them all
+at once, drawing risk events from a seedable random generator, which also
+lets the economy be replayed deterministically over simulated weeks
+"""
+
+import math
+import random
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import database
+
+SECONDS_PER_HOUR = 3600
+
+# Income stops below this maintenance level
+PAUSE_THRESHOLD = 25
+# Owners are warned and risk events can happen at or below this level
+WARNING_THRESHOLD = 50
+# Regular risk events can happen below the pause threshold, with a chance
+# growing as maintenance drops; earthquakes only below this level
+EARTHQUAKE_THRESHOLD = 10
+EARTHQUAKE_CHANCE = 0.10
+# Effects of a regular risk event
+RISK_MAINTENANCE_LOSS = 15
+RISK_COIN_LOSS = 0.5
+
+
+def earning_hours(maintenance: float, maintenance_drain: float, hours: int) -> int:
+    """How many of the next hours start with enough maintenance to earn income"""
+    if hours <= 0 or maintenance < PAUSE_THRESHOLD:
+        return 0
+    if maintenance_drain <= 0:
+        return hours
+    return min(hours, math.floor((maintenance - PAUSE_THRESHOLD) / maintenance_drain) + 1)
+
+
+def accrue(maintenance: float, collected_coins: int, last_update_time: float, now: float,
+           hourly_return: int, max_holding: int, maintenance_drain: float) -> Tuple[float, int, float, int]:
+    """Bring an investment up to date for the whole hours passed since its last update
+
+    Each hour drains maintenance and earns income if it started at or above
+    the pause threshold, capped at the investment's storage. The update time
+    only moves forward by whole hours, so the result is the same whether it
+    is settled every hour or once after a week.
+
+    Returns (maintenance, collected_coins, last_update_time, hours).
+    """
+    hours = int((now - last_update_time) // SECONDS_PER_HOUR)
+    return _advance(maintenance, collected_coins, last_update_time, hours,
+                    hourly_return, max_holding, maintenance_drain)
+
+
+def healthy_hours(maintenance: float, maintenance_drain: float, hours: int) -> int:
+    """How many of the next hours end with maintenance still above the warning threshold"""
+    if hours <= 0 or maintenance <= WARNING_THRESHOLD:
+        return 0
+    if maintenance_drain <= 0:
+        return hours
+    return min(hours, math.ceil((maintenance - WARNING_THRESHOLD) / maintenance_drain) - 1)
+
+
+def accrue_until_warning(maintenance: float, collected_coins: int, last_update_time: float, now: float,
+                         hourly_return: int, max_holding: int, maintenance_drain: float) -> Tuple[float, int, float, int]:
+    """Like accrue(), but stops at the last hour that ends above the warning threshold
+
+    The hours after that are left to the periodic pass, which rolls risk
+    events and reminds the owner for them, so settling an investment often
+    can't skip past its warnings.
+    """
+    hours = int((now - last_update_time) // SECONDS_PER_HOUR)
+    return _advance(maintenance, collected_coins, last_update_time,
+                    healthy_hours(maintenance, maintenance_drain, hours),
+                    hourly_return, max_holding, maintenance_drain)
+
+
+def _advance(maintenance: float, collected_coins: int, last_update_time: float, hours: int,
+             hourly_return: int, max_holding: int, maintenance_drain: float) -> Tuple[float, int, float, int]:
+    if hours <= 0:
+        return maintenance, collected_coins, last_update_time, 0
+
+    earned = hourly_return * earning_hours(maintenance, maintenance_drain, hours)
+    new_coins = max(collected_coins, min(max_holding, collected_coins + earned))
+    new_maintenance = max(0, maintenance - maintenance_drain * hours)
+    return new_maintenance, new_coins, last_update_time + hours * SECONDS_PER_HOUR, hours
+
+
+async def take_collected_coins(inv_id: int, collected_coins: int) -> bool:
+    """Empty an investment's storage if it still holds the coins read before
+
+    Returns False if another collect, settle or risk event changed the
+    storage in between, so the same coins are never paid out twice.
+    """
+    async with database.transaction() as db:
+        cursor = await db.execute(
+            'UPDATE investments SET collected_coins = 0 WHERE id = ? AND collected_coins = ?',
+            (inv_id, collected_coins))
+        return cursor.rowcount == 1
+
+
+class InvestmentColumns:
+    """Investments stored column by column, one list per field"""
+
+    def __init__(self):
+        self.ids: List[int] = []
+        self.user_ids: List[int] = []
+        self.types: List[str] = []
+        self.maintenance: List[float] = []
+        self.coins: List[int] = []
+        self.updated: List[float] = []
+        self.hourly_return: List[int] = []
+        self.max_holding: List[int] = []
+        self.drain: List[float] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class InvestmentEngine:
+    """Advances many investments at once with a seedable random generator
+
+    investments maps each investment type to its settings (hourly_return,
+    max_holding, maintenance_drain) and risk_events maps it to the risk event
+    descriptions; those mentioning an earthquake are the catastrophic ones.
+    """
+
+    def __init__(self, investments: Dict[str, Dict[str, Any]], risk_events: Dict[str, List[str]],
+                 seed: Optional[int] = None):
+        self.investments = investments
+        self.rng = random.Random(seed)
+        self.earthquakes = {kind: [event for event in events if "earthquake" in event.lower()]
+                            for kind, events in risk_events.items()}
+        self.regular_events = {kind: [event for event in events if "earthquake" not in event.lower()] or events
+                               for kind, events in risk_events.items()}
+
+    def load(self, rows: Iterable[tuple]) -> InvestmentColumns:
+        """Load (id, user_id, investment_type, maintenance, collected_coins, last_update_time) rows
+
+        Rows of unknown investment types are skipped.
+        """
+        columns = InvestmentColumns()
+        for inv_id, user_id, inv_type, maintenance, coins, updated in rows:
+            settings = self.investments.get(inv_type)
+            if settings is None:
+                continue
+            columns.ids.append(inv_id)
+            columns.user_ids.append(user_id)
+            columns.types.append(inv_type)
+            columns.maintenance.append(maintenance)
+            columns.coins.append(coins)
+            columns.updated.append(updated)
+            columns.hourly_return.append(settings["hourly_return"])
+            columns.max_holding.append(settings["max_holding"])
+            columns.drain.append(settings["maintenance_drain"])
+        return columns
+
+    def step(self, columns: InvestmentColumns, now: float) -> List[Dict[str, Any]]:
+        """Advance every investment to now and roll risk events for the low ones
+
+        The columns are updated in place. Returns an outcome for each
+        investment that had at least one whole hour to accrue, with its state
+        before the step, its maintenance after the drain but before any risk
+        event, whether its owner should be reminded, the risk event that hit
+        it and whether it shut down.
+        """
+        count = len(columns)
+        hours = [int((now - updated) // SECONDS_PER_HOUR) for updated in columns.updated]
+        earning = [earning_hours(maintenance, drain, passed)
+                   for maintenance, drain, passed in zip(columns.maintenance, columns.drain, hours)]
+        drained = [max(0, maintenance - drain * passed)
+                   for maintenance, drain, passed in zip(columns.maintenance, columns.drain, hours)]
+        earned = [max(coins, min(max_holding, coins + hourly_return * hours_earning))
+                  for coins, max_holding, hourly_return, hours_earning
+                  in zip(columns.coins, columns.max_holding, columns.hourly_return, earning)]
+        # Draw for every row, due or not, so a seeded run doesn't depend on which rows were due
+        quake_draws = [self.rng.random() for _ in range(count)]
+        risk_draws = [self.rng.random() for _ in range(count)]
+        pick_draws = [self.rng.random() for _ in range(count)]
+
+        outcomes = []
+        for i in range(count):
+            if hours[i] <= 0:
+                continue
+            maintenance, coins = drained[i], earned[i]
+            risk_type = None
+            risk_event = None
+            events: List[str] = []
+            if 0 < maintenance < EARTHQUAKE_THRESHOLD and quake_draws[i] < EARTHQUAKE_CHANCE:
+                events = self.earthquakes.get(columns.types[i], [])
+                risk_type = "earthquake" if events else None
+            if risk_type is None and 0 < maintenance < PAUSE_THRESHOLD:
+                if risk_draws[i] < (PAUSE_THRESHOLD - maintenance) / PAUSE_THRESHOLD:
+                    events = self.regular_events.get(columns.types[i], [])
+                    risk_type = "regular" if events else None
+            if risk_type is not None:
+                risk_event = events[int(pick_draws[i] * len(events))]
+
+            coins_at_risk = coins
+            if risk_type == "earthquake":
+                maintenance, coins = 0, 0
+            elif risk_type == "regular":
+                maintenance = max(0, maintenance - RISK_MAINTENANCE_LOSS)
+                coins = max(0, int(coins * (1 - RISK_COIN_LOSS)))
+
+            outcomes.append({
+                "index": i,
+                "hours": hours[i],
+                "previous_maintenance": columns.maintenance[i],
+                "previous_coins": columns.coins[i],
+                "previous_update_time": columns.updated[i],
+                "drained_maintenance": drained[i],
+                "reminder": 0 < drained[i] <= WARNING_THRESHOLD and columns.maintenance[i] > drained[i],
+                "risk_type": risk_type,
+                "risk_event": risk_event,
+                "coins_at_risk": coins_at_risk,
+                "coins_lost": coins_at_risk - coins,
+                "shutdown": maintenance <= 0,
+            })
+            columns.maintenance[i] = maintenance
+            columns.coins[i] = coins
+            columns.updated[i] += hours[i] * SECONDS_PER_HOUR
+        return outcomes
+
+    def replay(self, rows: Iterable[tuple], start: float, hours: int, interval_hours: float = 0.5,
+               on_step: Optional[Callable[[InvestmentColumns, float], None]] = None) -> Dict[str, Any]:
+        """Simulate investments for a number of hours without touching the database
+
+        Steps every interval_hours like the periodic pass. on_step is called
+        after each step with the columns and the simulated time and can
+        model owners collecting or repairing by changing the columns. Shut
+        down investments stop being simulated. With a seeded engine the
+        report is the same on every run.
+        """
+        columns = self.load(rows)
+        active = [True] * len(columns)
+        report = {"steps": 0, "income": 0, "regular_events": 0, "earthquakes": 0,
+                  "coins_lost": 0, "reminders": 0, "shutdowns": 0}
+        steps = int(hours / interval_hours)
+        for step in range(1, steps + 1):
+            now = start + step * interval_hours * SECONDS_PER_HOUR
+            for outcome in self.step(columns, now):
+                i = outcome["index"]
+                if not active[i]:
+                    continue
+                report["income"] += outcome["coins_at_risk"] - outcome["previous_coins"]
+                report["coins_lost"] += outcome["coins_lost"]
+                report["reminders"] += outcome["reminder"]
+                if outcome["risk_type"] == "earthquake":
+                    report["earthquakes"] += 1
+                elif outcome["risk_type"] == "regular":
+                    report["regular_events"] += 1
+                if outcome["shutdown"]:
+                    report["shutdowns"] += 1
+                    active[i] = False
+            # Shut down investments no longer accrue
+            for i, is_active in enumerate(active):
+                if not is_active:
+                    columns.updated[i] = now
+            report["steps"] += 1
+            if on_step is not None:
+                on_step(columns, now)
+        report["final"] = columns
+        return report
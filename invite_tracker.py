@@ -5,12 +5,13 @@ This module tracks who invited whom and logs invite activity
 
 import discord
 import asyncio
-import aiosqlite
+import database
 import datetime
 from discord import app_commands
 from discord.ext import commands
 from typing import Dict, Optional, List, Tuple
 from db_pool import get_db_pool
+from user_names import user_names
 
 # Invite tracking cache
 guild_invites = {}
@@ -84,7 +85,7 @@ async def setup_invite_tables():
             pass
         
         # Fallback to direct connection if db_pool failed
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             # Check if we already have the old invite_tracking and invite_cache tables
             cursor = await db.execute("SELECT name FROM sqlite_master WHERE type='table' AND (name='invite_tracking' OR name='invite_cache')")
             existing_tables = [row[0] async for row in cursor]
@@ -204,7 +205,7 @@ async def update_invite_data(user_id, inviter_id, guild_id, invite_code=None, is
             print(f"⚠️ Couldn't use DB pool for update_invite_data, falling back to direct connection: {e}")
     
         # Fallback to direct connection
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             # Add the invite record
             await db.execute('''
                 INSERT INTO invites (user_id, inviter_id, guild_id, join_time, invite_code, is_fake)
@@ -277,7 +278,7 @@ async def mark_user_left(user_id, guild_id):
             print(f"⚠️ Couldn't use DB pool for mark_user_left, falling back to direct connection: {e}")
         
         # Fallback to direct connection
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             # Find their most recent invite
             cursor = await db.execute('''
                 SELECT id, inviter_id, is_fake
@@ -454,7 +455,7 @@ async def get_invite_counts(user_id, guild_id=None):
             print(f"⚠️ Couldn't use DB pool for get_invite_counts, falling back to direct connection: {e}")
     
         # Fallback to direct connection
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             query = '''
                 SELECT guild_id, regular, leaves, fake, bonus
                 FROM invite_counts
@@ -518,7 +519,7 @@ async def get_invite_counts(user_id, guild_id=None):
 
 async def set_user_invites(user_id, guild_id, count):
     """Manually set a user's invite count."""
-    async with aiosqlite.connect("leveling.db") as db:
+    async with database.session() as db:
         # First check if user exists in the invite_counts table
         cursor = await db.execute('''
             SELECT regular, bonus
@@ -565,7 +566,7 @@ async def reset_user_invites(user_id, guild_id):
         print(f"⚠️ Couldn't use DB pool for reset_user_invites, falling back to direct connection: {e}")
         
         # Fallback to direct connection
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             await db.execute('''
                 UPDATE invite_counts
                 SET regular = 0, leaves = 0, fake = 0, bonus = 0
@@ -599,7 +600,7 @@ async def reset_all_invites(guild_id):
         print(f"⚠️ Couldn't use DB pool for reset_all_invites, falling back to direct connection: {e}")
         
         # Fallback to direct connection
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             await db.execute('''
                 UPDATE invite_counts
                 SET regular = 0, leaves = 0, fake = 0, bonus = 0
@@ -620,7 +621,7 @@ async def reset_all_invites(guild_id):
 
 async def add_user_bonus_invites(user_id, guild_id, amount):
     """Add bonus invites to a user."""
-    async with aiosqlite.connect("leveling.db") as db:
+    async with database.session() as db:
         await db.execute('''
             INSERT INTO invite_counts (user_id, guild_id, bonus)
             VALUES (?, ?, ?)
@@ -632,7 +633,7 @@ async def add_user_bonus_invites(user_id, guild_id, amount):
 
 async def get_invited_users(inviter_id, guild_id=None, include_leaves=False):
     """Get a list of users invited by a specific user."""
-    async with aiosqlite.connect("leveling.db") as db:
+    async with database.session() as db:
         query = '''
             SELECT user_id, join_time, is_left
             FROM invites
@@ -656,7 +657,7 @@ async def get_invited_users(inviter_id, guild_id=None, include_leaves=False):
 
 async def get_top_inviters(guild_id, limit=10):
     """Get the top inviters for a guild."""
-    async with aiosqlite.connect("leveling.db") as db:
+    async with database.session() as db:
         cursor = await db.execute('''
             SELECT user_id, regular, leaves, bonus
             FROM invite_counts
@@ -680,7 +681,7 @@ async def get_top_inviters(guild_id, limit=10):
 
 async def get_all_invites_leaderboard(limit=100):
     """Get the top inviters across all guilds."""
-    async with aiosqlite.connect("leveling.db") as db:
+    async with database.session() as db:
         cursor = await db.execute('''
             SELECT user_id, SUM(regular) as total_regular, SUM(leaves) as total_leaves, SUM(bonus) as total_bonus
             FROM invite_counts
@@ -706,7 +707,7 @@ async def log_invite_reward(user_id, reward_type, reward_amount, invite_count):
     """Log an invite reward given to a user."""
     now = datetime.datetime.now().timestamp()
     
-    async with aiosqlite.connect("leveling.db") as db:
+    async with database.session() as db:
         await db.execute('''
             INSERT INTO invite_reward_logs (user_id, reward_type, reward_amount, invite_count, timestamp)
             VALUES (?, ?, ?, ?, ?)
@@ -716,7 +717,7 @@ async def log_invite_reward(user_id, reward_type, reward_amount, invite_count):
 
 async def get_reward_logs(user_id=None, limit=20):
     """Get reward logs, optionally filtered by user."""
-    async with aiosqlite.connect("leveling.db") as db:
+    async with database.session() as db:
         query = '''
             SELECT user_id, reward_type, reward_amount, invite_count, timestamp
             FROM invite_reward_logs
@@ -746,7 +747,7 @@ async def get_reward_logs(user_id=None, limit=20):
 
 async def get_user_inviter(user_id, guild_id):
     """Find who invited a specific user."""
-    async with aiosqlite.connect("leveling.db") as db:
+    async with database.session() as db:
         cursor = await db.execute('''
             SELECT inviter_id, join_time, invite_code
             FROM invites
@@ -848,7 +849,7 @@ class InviteTracker(commands.Cog):
             # Handle normal invite case where an inviter was found
             if inviter_id:
                 try:
-                    inviter = await self.bot.fetch_user(inviter_id)
+                    inviter = await user_names.fetch_user(self.bot, inviter_id)
                     
                     if is_fake:
                         await logs_channel.send(f"{member.mention} joined using their own invite")
@@ -899,7 +900,7 @@ class InviteTracker(commands.Cog):
             if inviter_info and inviter_info["inviter_id"]:
                 inviter_id = inviter_info["inviter_id"]
                 try:
-                    inviter = await self.bot.fetch_user(inviter_id)
+                    inviter = await user_names.fetch_user(self.bot, inviter_id)
                     
                     # Get inviter's updated stats
                     counts = await get_invite_counts(inviter_id, member.guild.id)
@@ -989,12 +990,9 @@ class InviteTracker(commands.Cog):
             )
             
             leaderboard_text = ""
+            names = await user_names.get_names(self.bot, [inviter["user_id"] for inviter in top_inviters], interaction.guild)
             for idx, inviter in enumerate(top_inviters, 1):
-                try:
-                    user = await self.bot.fetch_user(inviter["user_id"])
-                    username = user.name if user else f"Unknown User ({inviter['user_id']})"
-                except:
-                    username = f"Unknown User ({inviter['user_id']})"
+                username = names[inviter["user_id"]]
                 
                 leaderboard_text += f"**{idx}.** {username}: **{inviter['total']}** invites "
                 leaderboard_text += f"({inviter['regular']} regular, {inviter['leaves']} left, {inviter['bonus']} bonus)\n"
@@ -1039,12 +1037,9 @@ class InviteTracker(commands.Cog):
             )
             
             leaderboard_text = ""
+            names = await user_names.get_names(self.bot, [inviter["user_id"] for inviter in top_inviters], interaction.guild)
             for idx, inviter in enumerate(top_inviters, 1):
-                try:
-                    user = await self.bot.fetch_user(inviter["user_id"])
-                    username = user.name if user else f"Unknown User ({inviter['user_id']})"
-                except:
-                    username = f"Unknown User ({inviter['user_id']})"
+                username = names[inviter["user_id"]]
                 
                 leaderboard_text += f"**{idx}.** {username}: **{inviter['total']}** invites "
                 leaderboard_text += f"({inviter['regular']} regular, {inviter['leaves']} left, {inviter['bonus']} bonus)\n"
@@ -1074,7 +1069,7 @@ class InviteTracker(commands.Cog):
                 return
             
             try:
-                inviter = await self.bot.fetch_user(inviter_info["inviter_id"])
+                inviter = await user_names.fetch_user(self.bot, inviter_info["inviter_id"])
                 inviter_name = inviter.name if inviter else f"Unknown User ({inviter_info['inviter_id']})"
                 inviter_mention = inviter.mention if inviter else f"Unknown User ({inviter_info['inviter_id']})"
             except:
@@ -1339,12 +1334,9 @@ class InviteTracker(commands.Cog):
                 color=discord.Color.blue()
             )
             
+            names = await user_names.get_names(self.bot, [log["user_id"] for log in logs], interaction.guild)
             for log in logs:
-                try:
-                    user = await self.bot.fetch_user(log["user_id"])
-                    username = user.name if user else f"Unknown User ({log['user_id']})"
-                except:
-                    username = f"Unknown User ({log['user_id']})"
+                username = names[log["user_id"]]
                 
                 reward_time = datetime.datetime.fromtimestamp(log["timestamp"])
                 field_name = f"{username} - {log['reward_type']} reward"
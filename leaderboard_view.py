@@ -0,0 +1,93 @@
+"""
+Paginated leaderboard messages
+A page is read from the in-memory rankings and its names are resolved with
+one batched lookup, so flipping through a leaderboard never sorts the users
+table or fetches users one by one
+"""
+
+import math
+from typing import Callable, List, Optional, Tuple
+
+import discord
+
+from rankings import rankings
+from user_names import user_names
+
+# Turns (position, user_id, name, score) entries into embed fields (name, value)
+PageFormatter = Callable[[List[Tuple[int, int, str, tuple]]], List[Tuple[str, str]]]
+
+
+class LeaderboardView(discord.ui.View):
+    """Leaderboard embed with buttons to move between pages"""
+
+    def __init__(self, bot, board: str, title: str, description: str, color: discord.Color,
+                 format_page: PageFormatter, guild: Optional[discord.Guild] = None,
+                 viewer_id: Optional[int] = None, page_size: int = 10):
+        super().__init__(timeout=180)  # 3 minute timeout
+        self.bot = bot
+        self.board = board
+        self.title = title
+        self.description = description
+        self.color = color
+        self.format_page = format_page
+        self.guild = guild
+        self.viewer_id = viewer_id
+        self.page_size = page_size
+        self.page = 0
+        self.page_count = 1
+
+    async def build_embed(self) -> Optional[discord.Embed]:
+        """Embed of the current page, or None if nobody is ranked yet"""
+        ranked_users = await rankings.count(self.board)
+        if ranked_users == 0:
+            return None
+        self.page_count = math.ceil(ranked_users / self.page_size)
+        self.page = min(self.page, self.page_count - 1)
+
+        start = self.page * self.page_size
+        top_users = await rankings.top(self.board, self.page_size, start)
+        names = await user_names.get_names(self.bot, [user_id for user_id, _ in top_users], self.guild)
+        entries = [(start + idx, user_id, names[user_id], score)
+                   for idx, (user_id, score) in enumerate(top_users, 1)]
+
+        embed = discord.Embed(title=self.title, description=self.description, color=self.color)
+        for name, value in self.format_page(entries):
+            embed.add_field(name=name, value=value, inline=False)
+
+        footer = f"Page {self.page + 1}/{self.page_count}"
+        if self.viewer_id is not None:
+            position, _ = await rankings.rank(self.board, self.viewer_id)
+            if position:
+                footer += f" • Your rank: #{position} of {ranked_users}"
+        embed.set_footer(text=footer)
+
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.page_count - 1
+        return embed
+
+    async def send(self, interaction: discord.Interaction, empty_message: str):
+        """Send the first page as the response to a deferred interaction"""
+        embed = await self.build_embed()
+        if embed is None:
+            await interaction.followup.send(empty_message, ephemeral=True)
+            return
+        if self.page_count == 1:
+            await interaction.followup.send(embed=embed)
+        else:
+            await interaction.followup.send(embed=embed, view=self)
+
+    async def _show_page(self, interaction: discord.Interaction, page: int):
+        self.page = max(page, 0)
+        embed = await self.build_embed()
+        if embed is None:
+            await interaction.response.edit_message(content="The leaderboard is empty.", embed=None, view=None)
+            return
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary, emoji="◀️")
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show_page(interaction, self.page - 1)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary, emoji="▶️")
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show_page(interaction, self.page + 1)
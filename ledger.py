@@ -0,0 +1,232 @@
+"""
+Append-only coin ledger with periodic balance snapshots
+Every change to a user's coins is recorded as a row in coin_transactions,
+written by the write buffer in the same transaction as the balance change.
+Snapshots copy all balances at a known ledger position, so a balance at any
+point in time is one snapshot row plus the ledger rows after it
+"""
+
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger('ledger')
+
+DEFAULT_KEEP_SNAPSHOTS = 30
+
+TRANSACTIONS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS coin_transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        amount INTEGER NOT NULL,
+        reason TEXT NOT NULL,
+        created_at REAL NOT NULL
+    )
+'''
+
+BALANCE_SNAPSHOTS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS balance_snapshots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        taken_at REAL NOT NULL,
+        last_transaction_id INTEGER NOT NULL,
+        user_count INTEGER NOT NULL,
+        total_coins INTEGER NOT NULL
+    )
+'''
+
+# One row per user and snapshot, looked up by user first
+BALANCE_SNAPSHOT_ROWS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS balance_snapshot_rows (
+        user_id INTEGER NOT NULL,
+        snapshot_id INTEGER NOT NULL,
+        coins INTEGER NOT NULL,
+        PRIMARY KEY (user_id, snapshot_id)
+    ) WITHOUT ROWID
+'''
+
+LEDGER_TABLES = [
+    TRANSACTIONS_TABLE,
+    'CREATE INDEX IF NOT EXISTS idx_coin_transactions_user ON coin_transactions (user_id, id)',
+    'CREATE INDEX IF NOT EXISTS idx_coin_transactions_time ON coin_transactions (created_at)',
+    # The ledger is append-only
+    '''
+        CREATE TRIGGER IF NOT EXISTS coin_transactions_no_update BEFORE UPDATE ON coin_transactions
+        BEGIN SELECT RAISE(ABORT, 'coin_transactions is append-only'); END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS coin_transactions_no_delete BEFORE DELETE ON coin_transactions
+        BEGIN SELECT RAISE(ABORT, 'coin_transactions is append-only'); END
+    ''',
+    BALANCE_SNAPSHOTS_TABLE,
+    BALANCE_SNAPSHOT_ROWS_TABLE,
+    'CREATE INDEX IF NOT EXISTS idx_balance_snapshot_rows_snapshot ON balance_snapshot_rows (snapshot_id)',
+]
+
+# Older databases have a coin_transactions table with another layout,
+# which is kept under this name so the ledger can take its place
+LEGACY_TRANSACTIONS_TABLE = 'coin_transactions_legacy'
+
+
+async def rename_legacy_transactions(db):
+    """Move a coin_transactions table without the ledger's columns out of the way
+
+    Runs inside migration 5 on the writer's connection, before LEDGER_TABLES.
+    """
+    cursor = await db.execute('PRAGMA table_info(coin_transactions)')
+    columns = {row[1] for row in await cursor.fetchall()}
+    if columns and not {"reason", "created_at"} <= columns:
+        await db.execute(f'ALTER TABLE coin_transactions RENAME TO {LEGACY_TRANSACTIONS_TABLE}')
+        logger.info(f"Renamed the old coin_transactions table to {LEGACY_TRANSACTIONS_TABLE}")
+
+
+INSERT_TRANSACTION = 'INSERT INTO coin_transactions (user_id, amount, reason, created_at) VALUES (?, ?, ?, ?)'
+
+# Records the same change for every user, e.g. a server-wide grant
+INSERT_TRANSACTION_FOR_ALL = '''
+    INSERT INTO coin_transactions (user_id, amount, reason, created_at)
+    SELECT user_id, ?, ?, ? FROM users
+'''
+
+# Records every balance being reset to 0, before the reset itself
+INSERT_TRANSACTION_FOR_RESET = '''
+    INSERT INTO coin_transactions (user_id, amount, reason, created_at)
+    SELECT user_id, -coins, ?, ? FROM users WHERE coins != 0
+'''
+
+
+class Ledger:
+    """Balance snapshots, historical balances and reconciliation over the coin ledger"""
+
+    def __init__(self, pool=None, buffer=None, keep_snapshots: int = DEFAULT_KEEP_SNAPSHOTS):
+        self.pool = pool
+        self.buffer = buffer
+        self.keep_snapshots = keep_snapshots
+        self.stats: Dict[str, int] = {
+            "snapshots": 0,
+            "snapshots_pruned": 0,
+            "reconciliations": 0,
+        }
+
+    async def _get_pool(self):
+        if self.pool is None:
+            from db_pool import get_db_pool
+            self.pool = await get_db_pool()
+        return self.pool
+
+    async def _get_buffer(self):
+        if self.buffer is None:
+            from write_buffer import get_write_buffer
+            self.buffer = await get_write_buffer()
+        return self.buffer
+
+    async def take_snapshot(self, now: Optional[float] = None) -> int:
+        """Copy every user's balance at the current end of the ledger
+
+        Buffered changes are written first and the flush lock is held, so
+        the balances and the ledger position match. Snapshots beyond
+        keep_snapshots are pruned. Returns the new snapshot's ID.
+        """
+        now = time.time() if now is None else now
+        pool = await self._get_pool()
+        buffer = await self._get_buffer()
+        await buffer.flush()
+        async with buffer.flush_lock:
+            async with pool.transaction() as db:
+                cursor = await db.execute('SELECT COALESCE(MAX(id), 0) FROM coin_transactions')
+                last_transaction_id = (await cursor.fetchone())[0]
+                cursor = await db.execute('''
+                    INSERT INTO balance_snapshots (taken_at, last_transaction_id, user_count, total_coins)
+                    SELECT ?, ?, COUNT(*), COALESCE(SUM(coins), 0) FROM users
+                ''', (now, last_transaction_id))
+                snapshot_id = cursor.lastrowid
+                await db.execute('''
+                    INSERT INTO balance_snapshot_rows (user_id, snapshot_id, coins)
+                    SELECT user_id, ?, coins FROM users
+                ''', (snapshot_id,))
+
+                # Keep the newest snapshots only; the ledger itself is never pruned
+                cursor = await db.execute(
+                    'SELECT id FROM balance_snapshots ORDER BY id DESC LIMIT 1 OFFSET ?',
+                    (max(self.keep_snapshots, 1) - 1,))
+                oldest_kept = await cursor.fetchone()
+                if oldest_kept:
+                    await db.execute('DELETE FROM balance_snapshot_rows WHERE snapshot_id < ?', oldest_kept)
+                    cursor = await db.execute('DELETE FROM balance_snapshots WHERE id < ?', oldest_kept)
+                    self.stats["snapshots_pruned"] += max(cursor.rowcount, 0)
+
+        self.stats["snapshots"] += 1
+        logger.info(f"Took balance snapshot {snapshot_id} at ledger position {last_transaction_id}")
+        return snapshot_id
+
+    async def balance_at(self, user_id: int, when: float) -> Optional[int]:
+        """A user's coin balance at a point in time
+
+        Returns None if no snapshot was taken before that time, as balances
+        from before the ledger existed are unknown.
+        """
+        pool = await self._get_pool()
+        snapshot = await pool.fetchone(
+            'SELECT id, last_transaction_id FROM balance_snapshots WHERE taken_at <= ? ORDER BY id DESC LIMIT 1',
+            (when,))
+        if snapshot is None:
+            return None
+        snapshot_id, last_transaction_id = snapshot
+        coins = await pool.fetchval(
+            'SELECT coins FROM balance_snapshot_rows WHERE user_id = ? AND snapshot_id = ?',
+            (user_id, snapshot_id), 0)
+        change = await pool.fetchval('''
+            SELECT COALESCE(SUM(amount), 0) FROM coin_transactions
+            WHERE user_id = ? AND id > ? AND created_at <= ?
+        ''', (user_id, last_transaction_id, when), 0)
+        return coins + change
+
+    async def history(self, user_id: int, limit: int = 20) -> List[Tuple[int, int, str, float]]:
+        """A user's latest ledger rows as (id, amount, reason, created_at), newest first"""
+        pool = await self._get_pool()
+        return await pool.fetchall('''
+            SELECT id, amount, reason, created_at FROM coin_transactions
+            WHERE user_id = ? ORDER BY id DESC LIMIT ?
+        ''', (user_id, limit))
+
+    async def reconcile(self) -> List[Tuple[int, int, int]]:
+        """Compare every balance with the latest snapshot plus the ledger since
+
+        Returns (user_id, coins, expected) for each user whose balance was
+        changed without a ledger row.
+        """
+        pool = await self._get_pool()
+        buffer = await self._get_buffer()
+        await buffer.flush()
+        async with buffer.flush_lock:
+            snapshot = await pool.fetchone(
+                'SELECT id, last_transaction_id FROM balance_snapshots ORDER BY id DESC LIMIT 1')
+            snapshot_id, last_transaction_id = snapshot if snapshot else (0, 0)
+            mismatches = await pool.fetchall('''
+                SELECT users.user_id, users.coins,
+                       COALESCE(snapshot.coins, 0) + COALESCE(changes.total, 0) AS expected
+                FROM users
+                LEFT JOIN balance_snapshot_rows AS snapshot
+                    ON snapshot.user_id = users.user_id AND snapshot.snapshot_id = ?
+                LEFT JOIN (
+                    SELECT user_id, SUM(amount) AS total FROM coin_transactions
+                    WHERE id > ? GROUP BY user_id
+                ) AS changes ON changes.user_id = users.user_id
+                WHERE users.coins != expected
+            ''', (snapshot_id, last_transaction_id))
+        self.stats["reconciliations"] += 1
+        if mismatches:
+            logger.warning(f"{len(mismatches)} balances don't match the ledger")
+        return mismatches
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get statistics about the ledger"""
+        return dict(self.stats)
+
+
+# Singleton ledger instance
+ledger = Ledger()
+
+# Helper function to get the ledger
+async def get_ledger() -> Ledger:
+    """Get the shared coin ledger"""
+    return ledger
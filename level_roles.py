@@ -0,0 +1,116 @@
+"""
+Cached mapping of level thresholds to level roles
+The level_roles table is loaded once into sorted arrays so level-ups can
+resolve their role with a bisect instead of querying the database
+"""
+
+import asyncio
+import logging
+from bisect import bisect_right
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger('level_roles')
+
+# Default level roles mapping (for levels 5, 10, 15, etc. up to 100)
+# Used to seed the level_roles table and as a fallback while it is empty
+DEFAULT_LEVEL_ROLES: Dict[int, int] = {
+    5: 1339331106557657089,
+    10: 1339332632860950589,
+    15: 1339333949201186878,
+    20: 1339571891848876075,
+    25: 1339572201430454272,
+    30: 1339572204433838142,
+    35: 1339572206895894602,
+    40: 1339572209848680458,
+    45: 1339572212285575199,
+    50: 1339572214881714176,
+    55: 1339574559136944240,
+    60: 1339574564685873245,
+    65: 1339574564983804018,
+    70: 1339574565780590632,
+    75: 1339574566669783180,
+    80: 1339574568276332564,
+    85: 1339574568586842112,
+    90: 1339574569417048085,
+    95: 1339576526458322954,
+    100: 1339576529377820733
+}
+
+
+class LevelRoles:
+    """Level thresholds and their role IDs, kept sorted for bisect lookups"""
+
+    def __init__(self, pool=None):
+        self.pool = pool
+        self.levels: List[int] = []
+        self.role_ids: List[int] = []
+        self.loaded = False
+        self.lock = asyncio.Lock()
+
+    async def _get_pool(self):
+        if self.pool is None:
+            from db_pool import get_db_pool
+            self.pool = await get_db_pool()
+        return self.pool
+
+    async def load(self):
+        """Load the mapping from the database, falling back to the defaults"""
+        async with self.lock:
+            if self.loaded:
+                return
+            pool = await self._get_pool()
+            rows = await pool.fetchall('SELECT level, role_id FROM level_roles ORDER BY level')
+
+            # If no roles in database, use the default mapping
+            mapping = dict(rows) if rows else DEFAULT_LEVEL_ROLES
+            self.levels = sorted(mapping)
+            self.role_ids = [mapping[level] for level in self.levels]
+            self.loaded = True
+            logger.info(f"Loaded {len(self.levels)} level roles")
+
+    def invalidate(self):
+        """Reload the mapping on next use, e.g. after /lvlrole changed the table"""
+        self.loaded = False
+
+    async def get_mapping(self) -> Dict[int, int]:
+        """Get the level threshold to role ID mapping"""
+        if not self.loaded:
+            await self.load()
+        return dict(zip(self.levels, self.role_ids))
+
+    async def role_for_level(self, level: int) -> Optional[Tuple[int, int]]:
+        """Get the (threshold, role_id) of the highest level role for a level"""
+        if not self.loaded:
+            await self.load()
+        index = bisect_right(self.levels, level) - 1
+        if index < 0:
+            return None
+        return self.levels[index], self.role_ids[index]
+
+    async def roles_for_level(self, level: int, remove_lower: bool = True) -> Tuple[Optional[Tuple[int, int]], Set[int]]:
+        """Get the level role a user at this level should have and the ones to remove
+
+        Returns the (threshold, role_id) to add, or None below the first
+        threshold, and the role IDs of the other level roles. With
+        remove_lower False only roles above the level are removed.
+        """
+        current = await self.role_for_level(level)
+        if current is None and remove_lower:
+            return None, set()
+
+        if remove_lower:
+            remove = set(self.role_ids)
+        else:
+            remove = set(self.role_ids[bisect_right(self.levels, level):])
+        if current is not None:
+            remove.discard(current[1])
+        return current, remove
+
+
+# Singleton level roles instance
+level_roles = LevelRoles()
+
+# Helper function to get the level roles cache
+async def get_level_roles() -> LevelRoles:
+    """Get the shared level roles cache"""
+    return level_roles
@@ -0,0 +1,97 @@
+"""
+Leveling engine for XP, levels and prestige
+Level-ups are computed in constant time from a precomputed cumulative XP
+table instead of looping level by level
+"""
+
+from bisect import bisect_right
+from typing import Dict, List
+
+# Reaching level 101 resets the user to level 1 and adds a prestige
+MAX_LEVEL = 100
+
+DEFAULT_XP_BASE = 50
+DEFAULT_LEVEL_UP_COINS = 150
+
+# Cumulative XP tables keyed by the level_up_xp_base setting
+_cumulative_tables: Dict[int, List[int]] = {}
+
+
+def xp_needed(level: int, base: int = DEFAULT_XP_BASE) -> int:
+    """XP needed to go from the given level to the next one"""
+    level = int(level)
+
+    # Level 1 doesn't require XP (you start at level 1)
+    if level == 1:
+        return 0
+
+    return int(base * level)
+
+
+def cumulative_xp_table(base: int = DEFAULT_XP_BASE) -> List[int]:
+    """Total XP needed to reach each level from level 1 with 0 XP
+
+    Index i holds the XP for level i, up to MAX_LEVEL + 1 which marks a full
+    prestige cycle. Index 0 is unused and mirrors level 1.
+    """
+    base = int(base)
+    table = _cumulative_tables.get(base)
+    if table is None:
+        table = [0, 0]
+        for level in range(1, MAX_LEVEL + 1):
+            table.append(table[-1] + xp_needed(level, base))
+        _cumulative_tables[base] = table
+    return table
+
+
+def apply_xp(level: int, prestige: int, xp: int, xp_gained: int = 0,
+             base: int = DEFAULT_XP_BASE, level_up_coins: int = DEFAULT_LEVEL_UP_COINS) -> Dict[str, int]:
+    """Add XP to a user and resolve all resulting level-ups and prestiges
+
+    Returns the new level, prestige and leftover XP together with the number
+    of levels and prestiges gained and the coins awarded for them.
+    """
+    table = cumulative_xp_table(base)
+    cycle = table[MAX_LEVEL + 1]
+    start_level = min(max(int(level), 1), MAX_LEVEL + 1)
+
+    # Position of the user within the current prestige cycle
+    position = table[start_level] + max(int(xp) + int(xp_gained), 0)
+    prestiges_gained = position // cycle if cycle > 0 else 0
+    position -= prestiges_gained * cycle
+
+    # Highest level whose cumulative XP has been reached
+    new_level = bisect_right(table, position, 1, MAX_LEVEL + 1) - 1
+    levels_gained = new_level - start_level + prestiges_gained * MAX_LEVEL
+
+    return {
+        "level": new_level,
+        "prestige": int(prestige) + prestiges_gained,
+        "xp": position - table[new_level],
+        "levels_gained": levels_gained,
+        "prestiges_gained": prestiges_gained,
+        "coins_awarded": max(levels_gained, 0) * level_up_coins,
+    }
+
+
+def add_levels(level: int, prestige: int, amount: int,
+               level_up_coins: int = DEFAULT_LEVEL_UP_COINS) -> Dict[str, int]:
+    """Add whole levels to a user, wrapping into prestige past MAX_LEVEL"""
+    total = int(level) - 1 + int(amount)
+    prestiges_gained = total // MAX_LEVEL
+    return {
+        "level": total % MAX_LEVEL + 1,
+        "prestige": int(prestige) + prestiges_gained,
+        "levels_gained": int(amount),
+        "prestiges_gained": prestiges_gained,
+        "coins_awarded": int(amount) * level_up_coins,
+    }
+
+
+def remove_levels(level: int, amount: int) -> Dict[str, int]:
+    """Remove whole levels from a user without going below level 1"""
+    new_level = max(1, int(level) - int(amount))
+    return {
+        "level": new_level,
+        "levels_removed": int(level) - new_level,
+    }
@@ -1,12 +1,15 @@
 """
 Enhanced leveling settings manager for persistence between bot restarts
-This module provides reliable loading and saving of leveling settings
+This module provides reliable loading and saving of leveling settings.
+Loaded settings are held in memory by leveling_settings, which is updated
+on every save and tells its subscribers about each changed value
 """
 
 import os
-import aiosqlite 
+import database
 import shutil
 from datetime import datetime
+from typing import Callable, Dict, List, Mapping, Optional
 
 # Default settings used when database is empty or corrupted
 DEFAULT_SETTINGS = [
@@ -27,6 +30,58 @@ DEFAULT_SETTINGS = [
 # Convert to dictionary for easier access
 DEFAULT_SETTINGS_DICT = {name: value for name, value in DEFAULT_SETTINGS}
 
+# Called with the setting name and its new value
+SettingsSubscriber = Callable[[str, int], None]
+
+
+class LevelingSettings:
+    """All leveling settings in memory, kept in step with the leveling_settings table"""
+
+    def __init__(self):
+        self.values: Dict[str, int] = dict(DEFAULT_SETTINGS_DICT)
+        self.loaded = False
+        self.subscribers: List[SettingsSubscriber] = []
+
+    def subscribe(self, callback: SettingsSubscriber):
+        """Call callback with each setting that changes from now on"""
+        self.subscribers.append(callback)
+
+    def _notify(self, setting_name: str, value: int):
+        for callback in self.subscribers:
+            try:
+                callback(setting_name, value)
+            except Exception as e:
+                print(f"⚠️ Settings subscriber failed for {setting_name}: {e}")
+
+    def update(self, settings: Mapping[str, int]):
+        """Replace the cached values with settings loaded from the database"""
+        self.loaded = True
+        for setting_name, value in settings.items():
+            value = int(value)
+            if self.values.get(setting_name) != value:
+                self.values[setting_name] = value
+                self._notify(setting_name, value)
+
+    def get_int(self, setting_name: str, default_value: Optional[int] = None) -> Optional[int]:
+        """A setting's value, falling back to default_value and then the built-in default"""
+        if setting_name in self.values:
+            return self.values[setting_name]
+        if default_value is not None:
+            return default_value
+        return DEFAULT_SETTINGS_DICT.get(setting_name)
+
+    def get_bool(self, setting_name: str, default_value: bool = False) -> bool:
+        """A setting stored as 0 or 1"""
+        return bool(self.get_int(setting_name, int(default_value)))
+
+    def as_dict(self) -> Dict[str, int]:
+        """A copy of every setting"""
+        return dict(self.values)
+
+
+# Shared in-memory settings
+leveling_settings = LevelingSettings()
+
 
 async def backup_database():
     """Create a timestamped backup of the leveling database"""
@@ -49,7 +104,7 @@ async def backup_database():
 async def ensure_settings_table():
     """Create the settings table if it doesn't exist"""
     try:
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS leveling_settings (
                     setting_name TEXT PRIMARY KEY,
@@ -67,7 +122,7 @@ async def ensure_settings_table():
 async def populate_default_settings():
     """Populate the settings table with default values if empty"""
     try:
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             # Check if table is empty
             cursor = await db.execute('SELECT COUNT(*) FROM leveling_settings')
             count = await cursor.fetchone()
@@ -102,7 +157,7 @@ async def load_settings():
         await populate_default_settings()
         
         # Now load the settings
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             cursor = await db.execute('SELECT setting_name, value FROM leveling_settings')
             all_settings = await cursor.fetchall()
             
@@ -125,6 +180,7 @@ async def load_settings():
                 settings_dict['level_up_coins'] = DEFAULT_SETTINGS_DICT['level_up_coins']
             
             print(f"✅ Successfully loaded {len(settings_dict)} settings from database")
+            leveling_settings.update(settings_dict)
             return settings_dict
             
     except Exception as e:
@@ -140,7 +196,7 @@ async def save_setting(setting_name, value):
         
         print(f"📝 Attempting to save setting: {setting_name} = {value}")
         
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             # Update with UPSERT pattern - update if exists, insert if not
             await db.execute('''
                 INSERT INTO leveling_settings (setting_name, value) 
@@ -158,6 +214,8 @@ async def save_setting(setting_name, value):
             else:
                 print(f"⚠️ Could not verify setting {setting_name} in database after save")
             
+            # Only update the cache once the new value is committed
+            leveling_settings.update({setting_name: value})
             print(f"✅ Successfully saved setting {setting_name} = {value}")
             return True
     except Exception as e:
@@ -171,7 +229,7 @@ async def reset_settings():
         # First backup the current database
         await backup_database()
         
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             # Delete all existing settings
             await db.execute('DELETE FROM leveling_settings')
             
@@ -183,6 +241,7 @@ async def reset_settings():
                 )
             
             await db.commit()
+            leveling_settings.update(DEFAULT_SETTINGS_DICT)
             print("✅ Reset all settings to default values")
             return True
     except Exception as e:
@@ -192,8 +251,11 @@ async def reset_settings():
 
 async def get_setting(setting_name, default_value=None):
     """Get a single setting by name with a default fallback"""
+    # Served from memory once the settings were loaded
+    if leveling_settings.loaded:
+        return leveling_settings.get_int(setting_name, default_value)
     try:
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             cursor = await db.execute(
                 'SELECT value FROM leveling_settings WHERE setting_name = ?', 
                 (setting_name,)
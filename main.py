@@ -1,6 +1,6 @@
 import discord
 import random
-import aiosqlite
+import database
 import os
 import asyncio
 import time
@@ -12,6 +12,21 @@ from discord import app_commands
 from discord.ext import commands, tasks
 from datetime import datetime, timedelta, timezone
 import bot_status
+import leveling
+from user_cache import user_cache
+from level_roles import level_roles, DEFAULT_LEVEL_ROLES
+import stats_rollups
+from rankings import rankings
+from compaction import log_compactor
+from ledger import ledger, INSERT_TRANSACTION_FOR_RESET
+from user_names import user_names
+from leaderboard_view import LeaderboardView
+from outbox import outbox
+from cooldowns import cooldowns
+from permission_index import permission_index
+from leveling_settings_manager import leveling_settings, load_settings, save_setting
+from scheduler import scheduler
+from reaction_router import reaction_router
 
 # Global dictionary to store warnings (will be replaced with DB storage in a future update)
 warnings_db = {}
@@ -29,7 +44,6 @@ intents.reactions = True
 bot = commands.Bot(command_prefix="!", intents=intents)
 
 # Global caches for various features
-user_xp_cooldown = {}  # XP cooldown dictionary to track when users last earned XP
 invite_cache = {}      # Cache to track invites for attribution
 
 # XP settings (configurable via /setxp)
@@ -165,73 +179,34 @@ async def check_permissions(interaction: discord.Interaction, command_name: str)
         await interaction.response.send_message("❌ This command can only be used in a server.", ephemeral=True)
         return False
     
-    # Get the proper member object for role-based checking
+    # Get the member's roles for role-based checking
     try:
-        # Check if we have a Member object already
-        if isinstance(interaction.user, discord.Member):
-            member = interaction.user
-        else:
-            # We have a User object, need to fetch the Member object
-            try:
-                member = await interaction.guild.fetch_member(interaction.user.id)
-            except discord.errors.NotFound:
-                await interaction.response.send_message("❌ Couldn't find you in this server. Try using the command in the server.", ephemeral=True)
-                return False
-        
-        if not member:
-            await interaction.response.send_message("❌ Couldn't verify your server roles. Try using the command in the server.", ephemeral=True)
-            return False
+        member_id = interaction.user.id
+        # Roles are cached per member until they change, so the member is only fetched once
+        if not permission_index.knows_member(member_id):
+            # Check if we have a Member object already
+            if isinstance(interaction.user, discord.Member):
+                member = interaction.user
+            else:
+                # We have a User object, need to fetch the Member object
+                try:
+                    member = await interaction.guild.fetch_member(member_id)
+                except discord.errors.NotFound:
+                    await interaction.response.send_message("❌ Couldn't find you in this server. Try using the command in the server.", ephemeral=True)
+                    return False
             
-        # Now that we have a valid member object with roles, proceed with permission checks
-        
-        # Special handling for owner - can use all commands except backup/permission
-        if command_name not in ["backup", "permission"]:
-            # Check if user has the owner role (using member instead of interaction.user)
-            user_roles = [role.name.lower() for role in member.roles]
-            if "owner" in user_roles:
-                return True
-                
-        # Check if command exists in permissions dictionary
-        if command_name in command_permissions:
-            permissions = command_permissions[command_name]
+            if not member:
+                await interaction.response.send_message("❌ Couldn't verify your server roles. Try using the command in the server.", ephemeral=True)
+                return False
             
-            # "everyone" permission check
-            if "everyone" in permissions:
-                return True
+            permission_index.remember_member(member_id, [role.id for role in member.roles],
+                                             [role.name for role in member.roles])
             
-            # Role-based permission check
-            user_role_ids = [role.id for role in member.roles]
-            user_role_names = [role.name.lower() for role in member.roles]
+        # Check the member's roles against the precompiled permissions (owner role,
+        # public commands, role IDs and role groups); decisions are cached per command
+        if permission_index.member_allows(member_id, command_name):
+            return True
             
-            # First check directly assigned permissions
-            # Convert role IDs to integers for comparison if they're stored as strings
-            for permission in permissions:
-                # Skip "everyone" string
-                if permission == "everyone":
-                    continue
-                    
-                # Convert permission to int for comparison if it's a string that looks like an integer
-                if isinstance(permission, str) and permission.isdigit():
-                    permission_int = int(permission)
-                    if permission_int in user_role_ids:
-                        return True
-                # Direct integer comparison
-                elif permission in user_role_ids:
-                    return True
-            
-            # Check for role section assignments from the database
-            for role_id in user_role_ids:
-                if role_id in role_section_assignments:
-                    for section in role_section_assignments[role_id]:
-                        if section in ROLE_PERMISSIONS and command_name in ROLE_PERMISSIONS[section]:
-                            return True
-            
-            # Traditional check for role group permissions (based on role names)
-            for role_name in user_role_names:
-                role_group = role_name.replace(' ', '_').lower()
-                if role_group in ROLE_PERMISSIONS and command_name in ROLE_PERMISSIONS[role_group]:
-                    return True
-        
         # If we get here, user doesn't have permission
         await interaction.response.send_message("❌ You don't have permission to use this command!", ephemeral=True)
         return False
@@ -387,7 +362,7 @@ bot_status_message_id = None  # Will store the current status message ID
 # Function to create and initialize the bot status table
 async def setup_bot_status_table():
     try:
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             # Create bot status message table
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS bot_status (
@@ -450,7 +425,7 @@ async def setup_db():
         print("Database setup completed using setup_db_updated function")
         
         # Add server stats tables
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             # Create server stats table
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS server_stats (
@@ -478,7 +453,7 @@ async def setup_db():
         
     # Fallback to original setup if the import fails
     try:
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             # Create the level_roles table to handle level role assignments
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS level_roles (
@@ -529,37 +504,13 @@ async def setup_db():
             count = await cursor.fetchone()
             
             if count and count[0] == 0:
-                # Default level roles mapping (for levels 5, 10, 15, etc. up to 100)
-                default_level_roles = {
-                    5: 1339331106557657089,
-                    10: 1339332632860950589,
-                    15: 1339333949201186878,
-                    20: 1339571891848876075,
-                    25: 1339572201430454272,
-                    30: 1339572204433838142,
-                    35: 1339572206895894602,
-                    40: 1339572209848680458,
-                    45: 1339572212285575199,
-                    50: 1339572214881714176,
-                    55: 1339574559136944240,
-                    60: 1339574564685873245,
-                    65: 1339574564983804018,
-                    70: 1339574565780590632,
-                    75: 1339574566669783180,
-                    80: 1339574568276332564,
-                    85: 1339574568586842112,
-                    90: 1339574569417048085,
-                    95: 1339576526458322954,
-                    100: 1339576529377820733
-                }
-                
                 # Insert default level roles
-                for level, role_id in default_level_roles.items():
+                for level, role_id in DEFAULT_LEVEL_ROLES.items():
                     await db.execute(
                         'INSERT INTO level_roles (level, role_id) VALUES (?, ?)',
                         (level, role_id)
                     )
-                print(f"Initialized default level roles in database: {len(default_level_roles)} roles")
+                print(f"Initialized default level roles in database: {len(DEFAULT_LEVEL_ROLES)} roles")
             # Create users table
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS users (
@@ -651,7 +602,7 @@ async def setup_db():
         import os
         os.makedirs("./data", exist_ok=True)
         # Try again after creating directory
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             # Create users table
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS users (
@@ -762,7 +713,7 @@ async def send_database_to_user(user_id):
     """Send the database file to the specified user ID via Discord"""
     try:
         # Get the user object
-        user = await bot.fetch_user(user_id)
+        user = await user_names.fetch_user(bot, user_id)
         if not user:
             print(f"❌ Could not find user with ID {user_id}")
             return False
@@ -852,7 +803,7 @@ async def backup_database():
                     print(f"Error removing old backup {old_file}: {e}")
         
         # Count users and shop items
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             # Count users
             cursor_users = await db.execute('SELECT COUNT(*) FROM users')
             users_count = (await cursor_users.fetchone())[0]
@@ -886,7 +837,7 @@ async def load_shop_items():
     SHOP_ITEMS = []
     
     try:
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             cursor = await db.execute('SELECT name, code, cost, cap_type, cap_value, emoji, max_per_user FROM shop_items')
             rows = await cursor.fetchall()
             
@@ -908,7 +859,7 @@ async def load_shop_items():
 async def load_command_permissions():
     global command_permissions
     try:
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             cursor = await db.execute('SELECT command_name, permission_value FROM command_permissions')
             rows = await cursor.fetchall()
             
@@ -937,38 +888,39 @@ async def load_command_permissions():
                     command_permissions[command_name].append(permission_value)
                     
             print(f"✅ Loaded permissions for {len(command_permissions)} commands from database")
+        rebuild_permission_index()
     except Exception as e:
         print(f"Error loading command permissions: {e}")
 
+# Keep xp_settings, the message XP config and the voice rewards in step with the settings cache
+def apply_leveling_setting(setting_name, value):
+    xp_settings[setting_name] = value
+    if setting_name == "xp_min":
+        xp_config["min_xp"] = value
+    elif setting_name == "xp_max":
+        xp_config["max_xp"] = value
+    elif setting_name == "cooldown_seconds":
+        xp_config["cooldown"] = value
+    elif setting_name == "voice_xp_per_minute":
+        voice_rewards["xp_per_minute"] = value
+    elif setting_name == "voice_coins_per_minute":
+        voice_rewards["coins_per_minute"] = value
+
+leveling_settings.subscribe(apply_leveling_setting)
+
 # Function to load XP settings from the database
 async def load_xp_settings():
     """Load XP settings from the database with improved persistence"""
     global xp_config, voice_rewards, xp_settings
     
     try:
-        # Use our improved settings manager module
-        from leveling_settings_manager import load_settings, backup_database
-        
-        # Create a backup first
-        await backup_database()
-        
-        # Load all settings
+        # Load all settings into the shared settings cache (reading them needs no backup)
         settings_dict = await load_settings()
         
-        # Store in global xp_settings variable
-        xp_settings = settings_dict
-        
-        # Also update the specific settings in xp_config and voice_rewards for backward compatibility
-        if "xp_min" in settings_dict:
-            xp_config["min_xp"] = settings_dict["xp_min"]
-        if "xp_max" in settings_dict:
-            xp_config["max_xp"] = settings_dict["xp_max"]
-        if "cooldown_seconds" in settings_dict:
-            xp_config["cooldown"] = settings_dict["cooldown_seconds"]
-        if "voice_xp_per_minute" in settings_dict:
-            voice_rewards["xp_per_minute"] = settings_dict["voice_xp_per_minute"]
-        if "voice_coins_per_minute" in settings_dict:
-            voice_rewards["coins_per_minute"] = settings_dict["voice_coins_per_minute"]
+        # Apply every value, including those the cache already held, to xp_settings,
+        # xp_config and voice_rewards
+        for setting_name, value in settings_dict.items():
+            apply_leveling_setting(setting_name, value)
             
         print(f"✅ Successfully loaded XP settings with level_up_coins={settings_dict.get('level_up_coins', 'N/A')}")
         print(f"✅ Loaded XP config: min_xp={xp_config.get('min_xp', 'N/A')}, max_xp={xp_config.get('max_xp', 'N/A')}")
@@ -999,7 +951,7 @@ async def load_xp_settings():
 async def load_role_section_assignments():
     global role_section_assignments
     try:
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             cursor = await db.execute('SELECT role_id, section_name FROM role_section_assignments')
             rows = await cursor.fetchall()
             
@@ -1020,6 +972,7 @@ async def load_role_section_assignments():
                     role_section_assignments[role_id].append(section_name)
                     
             print(f"✅ Loaded section assignments for {len(role_section_assignments)} roles from database")
+        rebuild_permission_index()
     except Exception as e:
         print(f"Error loading role section assignments: {e}")
 
@@ -1027,12 +980,18 @@ async def load_role_section_assignments():
 # Global dictionary to track role section assignments
 role_section_assignments = {}
 
+# Recompile the permission index after command_permissions or role_section_assignments change
+def rebuild_permission_index():
+    permission_index.rebuild(command_permissions, role_section_assignments, ROLE_PERMISSIONS)
+
+rebuild_permission_index()
+
 # Function to load activity event state from database
 async def load_activity_event_state():
     """Load activity event state from the database for persistence across bot restarts"""
     global activity_event
     try:
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             # Create table if it doesn't exist (this is a safety check)
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS activity_event_state (
@@ -1089,53 +1048,138 @@ async def load_activity_event_state():
                 if active:
                     print(f"📥 Restored active event: Prize={prize}, Ends at={end_time}")
                     
-                    # Schedule the end of the event
-                    if end_time and end_time > discord.utils.utcnow():
-                        # Calculate seconds remaining
-                        time_left = (end_time - discord.utils.utcnow()).total_seconds()
-                        
-                        # Schedule the end of the event
-                        bot.loop.create_task(end_activity_event_after(time_left))
+                    # Events started before the scheduler existed have no stored end job yet
+                    if end_time and not scheduler.pending("activity_event_end"):
+                        await scheduler.schedule("activity_event_end", end_time.timestamp(),
+                                                 {"end_time": end_time.isoformat()})
             
             print(f"📥 Loaded activity event state from database: Active={activity_event['active']}")
     except Exception as e:
         print(f"Error loading activity event state: {e}")
 
-async def end_activity_event_after(seconds):
-    """End the activity event after the specified number of seconds"""
-    await asyncio.sleep(seconds)
+# Seconds between leaderboard reminders during an activity event
+ACTIVITY_REMINDER_INTERVAL = 900
+
+def next_activity_reminder(now, end_time):
+    """When the next activity event reminder is due: every 15 minutes, then 5 minutes and 1 minute before the end"""
+    if now + ACTIVITY_REMINDER_INTERVAL < end_time - 300:
+        return now + ACTIVITY_REMINDER_INTERVAL
+    if now < end_time - 301:
+        return end_time - 300
+    if now < end_time - 61:
+        return end_time - 60
+    return None
+
+def is_current_activity_event(payload):
+    """Whether a scheduled job belongs to the activity event that is running now"""
+    end_time = activity_event["end_time"]
+    return activity_event["active"] and end_time is not None and end_time.isoformat() == payload.get("end_time")
+
+async def activity_event_reminder_job(job):
+    """Send the activity event reminder that is due and schedule the next one"""
+    payload = job.payload
+    if not is_current_activity_event(payload):
+        return
+    event_channel = bot.get_channel(payload["channel_id"])
+    end_time = datetime.fromisoformat(payload["end_time"])
+    remaining_seconds = int((end_time - discord.utils.utcnow()).total_seconds())
+    prize = payload["prize"]
+    
+    if event_channel and remaining_seconds > 300:
+        # Format remaining time
+        hours, remainder = divmod(remaining_seconds, 3600)
+        minutes, seconds = divmod(remainder, 60)
+        
+        if hours > 0:
+            time_format = f"{hours}h {minutes}m"
+        elif minutes > 0:
+            time_format = f"{minutes}m {seconds}s"
+        else:
+            time_format = f"{seconds}s"
+        
+        # Get current activity leaderboard top 3
+        top_users = [(user_id, coins) for user_id, (coins,) in await rankings.top("activity", 3) if coins > 0]
+        
+        # Format leaderboard
+        leaderboard_text = ""
+        if top_users:
+            names = await user_names.get_names(bot, [user_id for user_id, _ in top_users], event_channel.guild)
+            for i, (user_id, coins) in enumerate(top_users):
+                username = names[user_id]
+                medal = ["🥇", "🥈", "🥉"][i]
+                leaderboard_text += f"{medal} **{username}**: {coins} coins\n"
+        else:
+            leaderboard_text = "No participants yet!"
+            
+        # Send notification with time remaining and current top 3
+        reminder_embed = discord.Embed(
+            title="⏰ ACTIVITY EVENT REMINDER",
+            description=f"**{time_format} remaining** in the current activity event!\n\n🎁 **Prize:** {prize}\n\n📊 **Current Leaders:**\n{leaderboard_text}\n\n💬 Keep chatting to earn more activity coins!",
+            color=0x2F3136,
+            timestamp=discord.utils.utcnow()
+        )
+        await event_channel.send(embed=reminder_embed)
+    elif event_channel and remaining_seconds > 60:
+        # Send a 5-minute warning
+        warning_embed = discord.Embed(
+            title="⏰ 5-MINUTE WARNING!",
+            description=f"**Only 5 minutes remaining** in the activity event!\n\n🎁 **Prize:** {prize}\n\n💬 Keep chatting to earn more activity coins!",
+            color=0xFFA500,  # Orange
+            timestamp=discord.utils.utcnow()
+        )
+        await event_channel.send(embed=warning_embed)
+    elif event_channel and remaining_seconds > 0:
+        # Send a final 1-minute warning
+        final_warning_embed = discord.Embed(
+            title="⏰ FINAL WARNING!",
+            description=f"**Only 1 minute remaining** in the activity event!\n\n🎁 **Prize:** {prize}\n\n💬 Last chance to earn activity coins!",
+            color=0xFF2D74,
+            timestamp=discord.utils.utcnow()
+        )
+        await event_channel.send(embed=final_warning_embed)
     
-    # End the event
+    next_reminder = next_activity_reminder(time.time(), end_time.timestamp())
+    if next_reminder is not None:
+        await scheduler.schedule("activity_event_reminder", next_reminder, payload)
+
+async def activity_event_end_job(job):
+    """End the activity event the job was scheduled for"""
+    if is_current_activity_event(job.payload):
+        await end_activity_event(job.payload.get("channel_id"))
+
+scheduler.register("activity_event_reminder", activity_event_reminder_job)
+scheduler.register("activity_event_end", activity_event_end_job)
+
+async def end_activity_event(channel_id=None):
+    """End the activity event and announce the winner"""
     global activity_event
+    prize = activity_event["prize"]
     activity_event["active"] = False
     activity_event["end_time"] = None
     activity_event["prize"] = None
     
     # Update database
     try:
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             await db.execute(
                 'UPDATE activity_event_state SET active = 0, end_time = NULL, prize = NULL WHERE id = 1'
             )
             await db.commit()
             
         # Get final results
-        async with aiosqlite.connect("leveling.db") as db:
-            cursor = await db.execute(
-                'SELECT user_id, activity_coins FROM users ORDER BY activity_coins DESC LIMIT 1'
-            )
-            winner = await cursor.fetchone()
+        top_users = await rankings.top("activity", 1)
+        winner = (top_users[0][0], top_users[0][1][0]) if top_users else None
             
         if winner:
-            user = await bot.fetch_user(winner[0])
+            user = await user_names.fetch_user(bot, winner[0])
             coins = int(winner[1])
             
-            # Find an appropriate channel to announce the winner
+            # Announce the winner where the event was started
+            announcement_channel = bot.get_channel(channel_id) if channel_id else None
             guild = bot.get_guild(1337974948364566598)  # Main guild ID
-            announcement_channel = None
             
-            # Try to find appropriate channel
-            if guild:
+            # Otherwise try to find an appropriate channel
+            if not announcement_channel and guild:
                 # Try commands channel first
                 announcement_channel = guild.get_channel(1354491891579752448)  # commands channel
                 
@@ -1146,7 +1190,7 @@ async def end_activity_event_after(seconds):
             if announcement_channel:
                 result_embed = discord.Embed(
                     title="🎊 ACTIVITY EVENT ENDED!",
-                    description=f"```diff\n+ Congratulations to our winner!\n```\n👑 **Winner:** {user.mention}\n🪙 **Coins Earned:** {coins:,}\n🎁 **Prize:** {activity_event['prize']}",
+                    description=f"```diff\n+ Congratulations to our winner!\n```\n👑 **Winner:** {user.mention}\n🪙 **Coins Earned:** {coins:,}\n🎁 **Prize:** {prize}",
                     color=discord.Color.gold(),
                     timestamp=discord.utils.utcnow()
                 )
@@ -1172,10 +1216,28 @@ xp_enabled = True
 async def auto_backup_task():
     await backup_database()
 
+# Fold old message and reaction logs into daily counters
+@tasks.loop(hours=6)
+async def log_compaction_task():
+    try:
+        removed = await log_compactor.compact()
+        print(f"✅ Compacted activity logs: {removed['message_log']} messages, {removed['user_reactions']} reactions")
+    except Exception as e:
+        print(f"❌ Error compacting activity logs: {e}")
+
+# Snapshot every balance so historical balances are one lookup plus the ledger since
+@tasks.loop(hours=24)
+async def balance_snapshot_task():
+    try:
+        snapshot_id = await ledger.take_snapshot()
+        print(f"✅ Took balance snapshot {snapshot_id}")
+    except Exception as e:
+        print(f"❌ Error taking balance snapshot: {e}")
+
 # Setup daily quest tables
 async def setup_daily_quest_tables():
     try:
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             # Create daily quests tables
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS daily_quests (
@@ -1222,6 +1284,9 @@ async def setup_daily_quest_tables():
 # Bot Events and Setup
 @bot.event
 async def on_ready():
+    # Start sending queued DMs and notifications
+    outbox.start(bot)
+    
     await setup_db()
     await setup_daily_quest_tables()  # Set up daily quest tables
     
@@ -1267,7 +1332,15 @@ async def on_ready():
     await load_xp_settings()  # Load XP settings from database
     await load_role_section_assignments()  # Load role section assignments from database
     # Voice sessions have been removed
+    # Restore giveaways, countdowns and activity event timers that were pending before a restart
+    await scheduler.restore()
+    for job in scheduler.pending("giveaway_end"):
+        giveaways[job.id] = job.payload
+    for job in scheduler.pending("countdown_tick"):
+        active_countdowns[job.payload["countdown_id"]] = {**job.payload, "job_id": job.id}
     await load_activity_event_state()  # Load activity event state from database
+    # Start after the event state is loaded so an overdue end job sees the event
+    scheduler.start()
     try:
         commands = await bot.tree.sync()
         print(f"✅ Synced {len(commands)} command(s)")
@@ -1281,7 +1354,7 @@ async def on_ready():
         global bot_status_message_id
         
         # Try to load existing status message ID from database
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             cursor = await db.execute("SELECT message_id FROM bot_status WHERE id = 1")
             result = await cursor.fetchone()
             if result and result[0]:
@@ -1298,7 +1371,7 @@ async def on_ready():
             bot_status_message_id = new_message_id
             
             # Save message ID to database
-            async with aiosqlite.connect("leveling.db") as db:
+            async with database.session() as db:
                 await db.execute(
                     "INSERT OR REPLACE INTO bot_status (id, message_id, updated_at) VALUES (1, ?, CURRENT_TIMESTAMP)",
                     (bot_status_message_id,)
@@ -1314,6 +1387,14 @@ async def on_ready():
     # Start the automatic backup task in the background
     auto_backup_task.start()
     
+    # Start compacting the activity logs in the background
+    if not log_compaction_task.is_running():
+        log_compaction_task.start()
+    
+    # Start snapshotting coin balances in the background
+    if not balance_snapshot_task.is_running():
+        balance_snapshot_task.start()
+    
     # Send the moderation panel to the designated channel
     try:
         await send_moderation_panel()
@@ -1354,6 +1435,25 @@ async def on_member_join(member):
             # Fallback to plain text welcome if image fails
             await welcome_channel.send(f"Hey {member.mention}! Welcome to our community! 🎉\nEnjoy your stay and have fun in The Grid!")
 
+# Cached permission decisions are dropped when the roles they were based on change
+@bot.event
+async def on_member_update(before, after):
+    if before.roles != after.roles:
+        permission_index.forget_member(after.id)
+
+@bot.event
+async def on_member_remove(member):
+    permission_index.forget_member(member.id)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    if before.name != after.name:
+        permission_index.forget_members()
+
+@bot.event
+async def on_guild_role_delete(role):
+    permission_index.forget_members()
+
 @bot.tree.command(name="startxp", description="Start gaining XP from chat")
 async def startxp(interaction: discord.Interaction):
     allowed_roles = [1338482857974169683]
@@ -1371,6 +1471,16 @@ async def stopxp(interaction: discord.Interaction):
     xp_enabled = False
     await interaction.followup.send("✅ XP gain has been disabled!")
 
+# Add or remove a user's activity coins through the user cache, never going below 0
+# Returns the new total, or None if the user doesn't exist
+async def change_activity_coins(user_id, amount):
+    state = await user_cache.get(user_id)
+    if state is None:
+        return None
+    # The floor is applied to the cached total with no await before the change is queued
+    state = await user_cache.apply(user_id, activity_coins=max(amount, -state["activity_coins"]))
+    return state["activity_coins"] if state else None
+
 @bot.tree.command(name="rac", description="Remove activity coins from a user")
 @app_commands.describe(
     user="The user to remove coins from",
@@ -1386,25 +1496,14 @@ async def rac(interaction: discord.Interaction, user: discord.Member, amount: fl
     
     try:
         if activity_event["active"]:
-            async with aiosqlite.connect("leveling.db") as db:
-                # Ensure amount doesn't go below 0
-                await db.execute('''
-                    UPDATE users 
-                    SET activity_coins = MAX(0, activity_coins - ?) 
-                    WHERE user_id = ?
-                ''', (amount, user.id))
-                await db.commit()
-                
-                # Get updated amount for DM
-                cursor = await db.execute('SELECT activity_coins FROM users WHERE user_id = ?', (user.id,))
-                result = await cursor.fetchone()
-                new_amount = result[0] if result else 0
-                
-                # Send DM to command user
-                try:
-                    await interaction.user.send(f"✅ Removed {amount} activity coins from {user.name}. Their new total is {new_amount}")
-                except:
-                    pass  # Silently fail if DM fails
+            # Ensure amount doesn't go below 0
+            new_amount = await change_activity_coins(user.id, -amount) or 0
+            
+            # Send DM to command user
+            try:
+                await interaction.user.send(f"✅ Removed {amount} activity coins from {user.name}. Their new total is {new_amount}")
+            except:
+                pass  # Silently fail if DM fails
                     
             await interaction.followup.send("✅ Operation completed.", ephemeral=True)
         else:
@@ -1429,18 +1528,11 @@ async def setxp(interaction: discord.Interaction,
         await interaction.followup.send("❌ Minimum XP cannot be greater than maximum XP!", ephemeral=True)
         return
     
-    # Update both global XP settings and database settings
-    global xp_config
-    xp_config["min_xp"] = min_xp
-    xp_config["max_xp"] = max_xp
-    xp_config["cooldown"] = cooldown
-    
-    # Update the database settings
-    async with aiosqlite.connect("leveling.db") as db:
-        await db.execute('UPDATE leveling_settings SET value = ? WHERE setting_name = ?', (min_xp, "xp_min"))
-        await db.execute('UPDATE leveling_settings SET value = ? WHERE setting_name = ?', (max_xp, "xp_max"))
-        await db.execute('UPDATE leveling_settings SET value = ? WHERE setting_name = ?', (cooldown, "cooldown_seconds"))
-        await db.commit()
+    # Save the settings; the settings cache updates xp_config as each one is saved
+    for setting_name, value in (("xp_min", min_xp), ("xp_max", max_xp), ("cooldown_seconds", cooldown)):
+        if not await save_setting(setting_name, value):
+            await interaction.followup.send(f"❌ Failed to save the {setting_name} setting!", ephemeral=True)
+            return
     
     await interaction.followup.send(f"✅ XP settings updated!\n"
                                    f"• Message XP range: {min_xp}-{max_xp} XP\n"
@@ -1453,32 +1545,24 @@ async def setxp(interaction: discord.Interaction,
 async def leaderboard(interaction: discord.Interaction):
     try:
         await interaction.response.defer()
-        async with aiosqlite.connect("leveling.db") as db:
-            cursor = await db.execute(
-                'SELECT user_id, level, prestige, xp FROM users ORDER BY prestige DESC, level DESC, xp DESC LIMIT 10'
-            )
-            top_users = await cursor.fetchall()
 
-        if not top_users:
-            await interaction.followup.send("No users in the leaderboard yet!", ephemeral=True)
-            return
+        def format_page(entries):
+            fields = []
+            for idx, user_id, name, (prestige, level, xp) in entries:
+                stars = "★" * prestige if prestige > 0 else ""
+                fields.append((f"#{idx} {name} {stars}", f"Level: {level} | XP: {xp}"))
+            return fields
 
-        embed = discord.Embed(
+        view = LeaderboardView(
+            bot, "xp",
             title="🏆 XP Leaderboard",
-            description="Top 10 Users",
-            color=discord.Color.gold()
+            description="Top Users",
+            color=discord.Color.gold(),
+            format_page=format_page,
+            guild=interaction.guild,
+            viewer_id=interaction.user.id
         )
-
-        for idx, (user_id, level, prestige, xp) in enumerate(top_users, 1):
-            user = await bot.fetch_user(user_id)
-            stars = "★" * prestige if prestige > 0 else ""
-            embed.add_field(
-                name=f"#{idx} {user.name} {stars}",
-                value=f"Level: {level} | XP: {xp}",
-                inline=False
-            )
-
-        await interaction.followup.send(embed=embed)
+        await view.send(interaction, "No users in the leaderboard yet!")
     except Exception as e:
         await interaction.followup.send(f"An error occurred while fetching leaderboard data: {str(e)}", ephemeral=True)
 
@@ -1516,20 +1600,8 @@ async def stop_xp_event(message):
 
 # XP Calculation Formula with progressive scaling
 def calculate_xp_needed(level):
-    # Ensure level is an integer
-    level = int(level)
-    
-    # Level 1 doesn't require XP (you start at level 1)
-    if level == 1:
-        return 0
-    
-    # Get the base XP value from the settings table - default to 50 if not available
-    # We use a hardcoded default of 50 for simplicity
-    # This is a simpler version used for performance reasons in tight loops
-    base_xp = 50
-    
-    # Return level multiplied by the base XP value, ensuring it's an integer
-    return int(base_xp * level)
+    # Use the configured base XP value, falling back to the engine default
+    return leveling.xp_needed(level, xp_settings.get("level_up_xp_base", leveling.DEFAULT_XP_BASE))
 
 # Async version of calculate_xp_needed that uses database settings
 async def calculate_xp_needed_async(level):
@@ -1540,26 +1612,55 @@ async def calculate_xp_needed_async(level):
     if level == 1:
         return 0
     
-    # Fetch the base XP per level from the settings
-    try:
-        async with aiosqlite.connect("leveling.db") as db:
-            cursor = await db.execute('SELECT value FROM leveling_settings WHERE setting_name = ?', 
-                                     ("level_up_xp_base",))
-            result = await cursor.fetchone()
-            if result:
-                # Ensure we have an integer value
-                base_xp = int(result[0])
-            else:
-                # Fallback to default if setting not found
-                base_xp = 50
-    except Exception as e:
-        # Log the error for debugging
-        print(f"Error getting level_up_xp_base setting: {e}")
-        # Fallback to default if there was an error
-        base_xp = 50
-    
-    # Return level multiplied by the base XP value (ensuring it's an integer)
-    return int(base_xp * level)
+    # The base XP per level comes from the in-memory settings
+    base_xp = leveling_settings.get_int("level_up_xp_base", 50)
+    
+    return leveling.xp_needed(level, base_xp)
+
+# Apply an XP gain to the current level, prestige and XP using the leveling engine
+def resolve_level_ups(level, prestige, xp, xp_gained=0):
+    return leveling.apply_xp(
+        level, prestige, xp, xp_gained,
+        xp_settings.get("level_up_xp_base", leveling.DEFAULT_XP_BASE),
+        xp_settings.get("level_up_coins", 150))
+
+# Grant XP (and optionally coins) to a user through the user cache and leveling engine
+async def grant_xp(user_id, xp_amount, coins=0, reason="xp_reward"):
+    """Add XP to a user, resolving level-ups and prestige in one step.
+    Returns the leveling result with the user's new coin balance under "coins"."""
+    state = await user_cache.get(user_id, create=True)
+    result = resolve_level_ups(state["level"], state["prestige"], state["xp"], xp_amount)
+    result["coins"] = state["coins"] + result["coins_awarded"] + coins
+    await user_cache.apply(
+        user_id,
+        reason=reason,
+        level=result["level"] - state["level"],
+        prestige=result["prestige"] - state["prestige"],
+        xp=result["xp"] - state["xp"],
+        coins=result["coins_awarded"] + coins)
+    return result
+
+# Give a member the level role for their level and remove their other level roles
+async def sync_level_roles(member, level, remove_lower=True):
+    """Returns the level of the role that applies (0 if none), the role added
+    (None if nothing was added) and the list of removed roles.
+    With remove_lower=False only level roles above the member's level are removed."""
+    current, remove_ids = await level_roles.roles_for_level(level, remove_lower)
+    
+    # Remove old level roles the member still has
+    roles_to_remove = [role for role in member.roles if role.id in remove_ids]
+    if roles_to_remove:
+        await member.remove_roles(*roles_to_remove)
+    
+    # Add the new role if the member doesn't already have it
+    added_role = None
+    if current is not None:
+        new_role = member.guild.get_role(current[1])
+        if new_role and new_role not in member.roles:
+            await member.add_roles(new_role)
+            added_role = new_role
+    
+    return (current[0] if current else 0), added_role, roles_to_remove
 
 
 
@@ -1567,7 +1668,7 @@ async def calculate_xp_needed_async(level):
 @bot.event
 async def on_message(message):
     # Declare global variables needed in this function
-    global xp_settings, xp_enabled, activity_event, xp_config, user_xp_cooldown, role_section_assignments
+    global xp_settings, xp_enabled, activity_event, xp_config, role_section_assignments
     
     # Ignore messages from bots
     if message.author.bot:
@@ -1583,12 +1684,7 @@ async def on_message(message):
                 amount = float(parts[2])
                 
                 if activity_event["active"]:
-                    async with aiosqlite.connect("leveling.db") as db:
-                        await db.execute(
-                            'UPDATE users SET activity_coins = activity_coins + ? WHERE user_id = ?',
-                            (amount, target.id)
-                        )
-                        await db.commit()
+                    await change_activity_coins(target.id, amount)
                     await message.delete()
                 else:
                     await message.delete()
@@ -1614,14 +1710,8 @@ async def on_message(message):
                 amount = float(parts[2])
                 
                 if activity_event["active"]:
-                    async with aiosqlite.connect("leveling.db") as db:
-                        # Ensure amount doesn't go below 0
-                        await db.execute('''
-                            UPDATE users 
-                            SET activity_coins = MAX(0, activity_coins - ?) 
-                            WHERE user_id = ?
-                        ''', (amount, target_id))
-                        await db.commit()
+                    # Ensure amount doesn't go below 0
+                    await change_activity_coins(target_id, -amount)
                 await message.delete()
             else:
                 await message.delete()
@@ -1629,33 +1719,14 @@ async def on_message(message):
             print(f"Error in removeactivitycoins: {e}")
             await message.delete()
             
-    # Track daily message count and update last_updated timestamp
-    today = datetime.now().strftime("%Y-%m-%d")
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
     # Use the database pool to avoid locking issues
     from db_pool import get_db_pool
+    from write_buffer import get_write_buffer
     
-    try:
-        # Get the database pool
-        db_pool = await get_db_pool()
-        
-        # Update server stats with message count and last_updated timestamp
-        await db_pool.execute('''
-            INSERT INTO server_stats (date, message_count, last_updated)
-            VALUES (?, 1, ?)
-            ON CONFLICT(date) DO UPDATE SET
-            message_count = message_count + 1,
-            last_updated = ?
-        ''', (today, current_time, current_time))
-        
-        # Log message details for hourly statistics
-        await db_pool.execute('''
-            INSERT INTO message_log (user_id, channel_id)
-            VALUES (?, ?)
-        ''', (message.author.id, message.channel.id))
-    except Exception as e:
-        print(f"Error in on_message database operations: {str(e)}")
+    # Track daily message count and log the message for hourly statistics.
+    # These rows are buffered and committed in batches by the write buffer.
+    write_buffer = await get_write_buffer()
+    write_buffer.log_message(message.author.id, message.channel.id)
 
     # Check for command-like message patterns and respond accordingly
     # This replaces traditional slash commands with natural language detection
@@ -1778,28 +1849,25 @@ async def on_message(message):
         # Get our database pool singleton
         db_pool = await get_db_pool()
         
-        # Get user data from database using the connection pool
-        user = await db_pool.fetchone(
-            'SELECT level, prestige, xp, total_messages, coins FROM users WHERE user_id = ?',
-            (user_id,))
+        # Get user data from the shared user cache (loaded from the database once)
+        state = await user_cache.get(user_id)
+        user = None
+        if state is not None:
+            user = (state["level"], state["prestige"], state["xp"], state["total_messages"], state["coins"])
+        stored_user = user or (1, 0, 0, 0, 0)
         
         # Handle XP gain if enabled
         if xp_enabled:
             # Check cooldown - each user can gain XP based on the configured cooldown
-            current_time = time.time()
-            if user_id in user_xp_cooldown and current_time - user_xp_cooldown[user_id] < xp_config["cooldown"]:
+            if cooldowns.hit(("xp", user_id), xp_config["cooldown"]) > 0:
                 # User is on cooldown, don't award XP
                 xp_gain = 0
             else:
-                # User is not on cooldown, award XP and set cooldown
+                # User is not on cooldown, award XP (the cooldown starts now)
                 xp_gain = random.randint(xp_config["min_xp"], xp_config["max_xp"])
-                user_xp_cooldown[user_id] = current_time
             
             if user is None:
-                # Create new user record
-                await db_pool.execute(
-                    'INSERT INTO users (user_id, level, prestige, xp, total_messages, coins, invites, activity_coins) VALUES (?, 1, 0, ?, 1, 0, 0, 0)',
-                    (user_id, xp_gain))
+                # New user record is created by the write buffer on flush
                 user = (1, 0, xp_gain, 1, 0)
                 level, prestige, xp, total_messages, coins = user
             else:
@@ -1811,6 +1879,31 @@ async def on_message(message):
             level, prestige, xp, total_messages, coins = user
             total_messages += 1
         
+        # Only process XP level up if XP is enabled and user exists in database    
+        if xp_enabled and user is not None:
+            # Resolve all level-ups and prestiges from this message at once
+            result = resolve_level_ups(level, prestige, xp)
+            level, prestige, xp = result["level"], result["prestige"], result["xp"]
+            levels_gained = result["levels_gained"]
+            coins_awarded = result["coins_awarded"]
+            coins += coins_awarded
+            leveled_up = levels_gained > 0
+
+        # Apply the changes to the cached user right after reading it, before any
+        # awaits, so XP or coins granted meanwhile aren't overwritten or counted twice
+        if user is not None:
+            stored_level, stored_prestige, stored_xp, stored_messages, stored_coins = stored_user
+            await user_cache.apply(
+                user_id,
+                reason="level_up",
+                level=level - stored_level,
+                prestige=prestige - stored_prestige,
+                xp=xp - stored_xp,
+                total_messages=total_messages - stored_messages,
+                coins=coins - stored_coins,
+                # Handle activity tracking - 1 coin per message only when event is active
+                activity_coins=1 if activity_event["active"] else 0)
+        
         # Process message for chat quests
         if user is not None:  # Only process quests if user exists in DB
             try:
@@ -1838,125 +1931,28 @@ async def on_message(message):
                     
                     # Send notification when quest is completed
                     if is_completed and not completed:
-                        try:
-                            await message.author.send(
-                                f"🎉 **Quest Completed!** You've completed your daily chat quest! "
-                                f"Use the /dailyquest command to view and claim your rewards."
-                            )
-                        except:
-                            # Can't DM the user, continue silently
-                            pass
+                        outbox.send_dm(
+                            message.author.id,
+                            f"🎉 **Quest Completed!** You've completed your daily chat quest! "
+                            f"Use the /dailyquest command to view and claim your rewards."
+                        )
             except Exception as e:
                 print(f"Error tracking chat quest progress: {e}")
         
-        # Only process XP level up if XP is enabled and user exists in database    
+        # Announce the level-ups once they are applied
         if xp_enabled and user is not None:
-            leveled_up = False
-            levels_gained = 0
-            coins_awarded = 0
-            
-            # Track how many levels gained in this message
-            # Get level up coins from xp_settings
-            level_up_coins = xp_settings.get("level_up_coins", 150)  # Default to 150 if not found
-            
-            while xp >= calculate_xp_needed(level):
-                xp -= calculate_xp_needed(level)
-                level += 1
-                coins += level_up_coins
-                coins_awarded += level_up_coins
-                levels_gained += 1
-                leveled_up = True
-
-                if level >= 101:
-                    level = 1
-                    prestige += 1
-                    stars = "★" * prestige
-                    # Use the prestige animation instead of simple text
-                    await message.channel.send(f"⭐ **PRESTIGE UP!** ⭐ {message.author.mention} reached Prestige Level {prestige}! (+{level_up_coins} 🪙)")
+            if result["prestiges_gained"]:
+                # Use the prestige animation instead of simple text
+                level_up_coins = xp_settings.get("level_up_coins", 150)  # Default to 150 if not found
+                await message.channel.send(f"⭐ **PRESTIGE UP!** ⭐ {message.author.mention} reached Prestige Level {prestige}! (+{level_up_coins} 🪙)")
             
             # Only show level up message if user actually leveled up
             if leveled_up:
-                # Get level roles from database
-                level_roles_db = await db_pool.fetchall('SELECT level, role_id FROM level_roles ORDER BY level')
-                
-                # Process level roles
-                level_roles = {}
-                
-                # If no roles in database, use the default mapping
-                if not level_roles_db:
-                    # Fallback to hardcoded level roles if database is empty
-                    level_roles = {
-                        5: 1339331106557657089,
-                        10: 1339332632860950589,
-                        15: 1339333949201186878,
-                        20: 1339571891848876075,
-                        25: 1339572201430454272,
-                        30: 1339572204433838142,
-                        35: 1339572206895894602,
-                        40: 1339572209848680458,
-                        45: 1339572212285575199,
-                        50: 1339572214881714176,
-                        55: 1339574559136944240,
-                        60: 1339574564685873245,
-                        65: 1339574564983804018,
-                        70: 1339574565780590632,
-                        75: 1339574566669783180,
-                        80: 1339574568276332564,
-                        85: 1339574568586842112,
-                        90: 1339574569417048085,
-                        95: 1339576526458322954,
-                        100: 1339576529377820733
-                    }
-                else:
-                    # Convert database results to dictionary
-                    for lvl, role_id in level_roles_db:
-                        level_roles[lvl] = role_id
-                
-                # Find the highest level role that applies to the user's current level
-                highest_applicable_level = 0
-                for level_threshold in sorted(level_roles.keys()):
-                    if level >= level_threshold:
-                        highest_applicable_level = level_threshold
-                    else:
-                        break
-                
-                role_message = ""
-                # Check if the user qualifies for any level role
-                if highest_applicable_level > 0:
-                    # Get the new role
-                    new_role = message.guild.get_role(level_roles[highest_applicable_level])
-                    
-                    # Remove any previous level roles
-                    roles_to_remove = []
-                    for lvl, role_id in level_roles.items():
-                        if lvl != highest_applicable_level:  # Don't remove the current level role
-                            role_obj = message.guild.get_role(role_id)
-                            if role_obj and role_obj in message.author.roles:
-                                roles_to_remove.append(role_obj)
-                    
-                    # Remove old roles if any were found
-                    if roles_to_remove:
-                        await message.author.remove_roles(*roles_to_remove)
-                        
-                    # Add the new role if user doesn't already have it
-                    if new_role and new_role not in message.author.roles:
-                        await message.author.add_roles(new_role)
-                        role_message = f'🎭 You Unlocked Level {highest_applicable_level} Role! (Previous level roles removed)'
+                # Resolve the level role from the cached mapping (no database reads)
+                await sync_level_roles(message.author, level)
                 
                 # Send level up message with proper coin rewards based on levels gained
                 await message.channel.send(f"🎉 {message.author.mention} leveled up to level {level}! 🚀 (+{coins_awarded} 🪙)")
-
-        # Update database with new user values if the user exists
-        if user is not None:
-            await db_pool.execute(
-                'UPDATE users SET level = ?, xp = ?, total_messages = ?, coins = ?, prestige = ? WHERE user_id = ?',
-                (level, xp, total_messages, coins, prestige, user_id))
-
-            # Handle activity tracking - 1 coin per message only when event is active
-            if activity_event["active"]:
-                await db_pool.execute(
-                    'UPDATE users SET activity_coins = activity_coins + 1 WHERE user_id = ?',
-                    (message.author.id,))
     
     except Exception as e:
         print(f"Error in on_message database operations: {str(e)}")
@@ -1978,27 +1974,18 @@ async def rank(interaction: discord.Interaction,
         await interaction.response.defer()
         member = member or interaction.user
 
-        # Use the database pool for more reliable connections
-        from db_pool import get_db_pool
-        db_pool = await get_db_pool()
-        
-        # Get user data
-        user = await db_pool.fetchone(
-            'SELECT level, prestige, xp, total_messages, coins, invites, activity_coins FROM users WHERE user_id = ?',
-            (member.id, ))
-
-        if user is None:
-            # If user doesn't exist, create new entry with default values
-            level, prestige, xp, total_messages, coins, invites, activity_coins = 1, 0, 0, 0, 0, 0, 0
-            await db_pool.execute(
-                'INSERT INTO users (user_id, level, prestige, xp, total_messages, coins, invites, activity_coins) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
-                (member.id, level, prestige, xp, total_messages, coins, invites, activity_coins))
-        else:
-            level, prestige, xp, total_messages, coins, invites, activity_coins = user
+        # Get user data from the shared user cache, creating the user if needed
+        state = await user_cache.get(member.id, create=True)
+        level, prestige, xp, total_messages, coins, invites, activity_coins = (
+            state["level"], state["prestige"], state["xp"], state["total_messages"],
+            state["coins"], state["invites"], state["activity_coins"])
         
         # Use the async version to get the XP needed based on database settings
         xp_needed = await calculate_xp_needed_async(level)
 
+        # Position on the XP leaderboard
+        position, _ = await rankings.rank("xp", member.id)
+
         # Create stars for prestige level display
         prestige_stars = "★" * min(prestige, 5) + "☆" * (5 - min(prestige, 5))
 
@@ -2016,6 +2003,7 @@ async def rank(interaction: discord.Interaction,
         embed = discord.Embed(title=f"🎮 {member.display_name}'s Profile",
                               color=discord.Color.dark_gray(),
                               description=f"**Prestige Level:** {prestige_stars}\n\n"
+                                         f"**RANK** 🏆 #{position}\n"
                                          f"**LEVEL** ⭐ {level}\n"
                                          f"**XP** 📊 {xp}/{xp_needed}\n"
                                          f"**MESSAGES** 💭 {total_messages}\n"
@@ -2059,68 +2047,23 @@ async def xpdrop(interaction: discord.Interaction):
     # Notify the command user that the event was triggered
     await interaction.followup.send("✅ XP Drop Event triggered in this channel!", ephemeral=True)
     
-    # Define the check function
-    def check(reaction, user):
-        return str(reaction.emoji) == "🎁" and reaction.message.id == msg.id and not user.bot
-    
     try:
         # Wait for someone to react
-        reaction, user = await bot.wait_for("reaction_add", timeout=600, check=check)  # 10 minutes timeout
+        reaction, user = await reaction_router.wait(msg.id, "🎁", timeout=600)  # 10 minutes timeout
         xp_won = random.randint(100, 300)
         
-        # Get user data and update XP in the database
-        from db_pool import get_db_pool
-        db_pool = await get_db_pool()
+        # Add the XP through the leveling engine
+        result = await grant_xp(user.id, xp_won)
+        level, prestige, xp, coins = result["level"], result["prestige"], result["xp"], result["coins"]
         
-        # Get user data
-        user_data = await db_pool.fetchone(
-            'SELECT level, prestige, xp, coins FROM users WHERE user_id = ?',
-            (user.id,)
-        )
+        if result["prestiges_gained"]:
+            # Send a simple prestige message
+            level_up_coins = xp_settings.get("level_up_coins", 150)
+            await interaction.channel.send(f"⭐ **PRESTIGE UP!** ⭐ {user.mention} reached Prestige Level {prestige}! (+{level_up_coins} 🪙)")
         
-        if user_data is None:
-            # User doesn't exist in database, create a new record
-            await db_pool.execute(
-                'INSERT INTO users (user_id, level, prestige, xp, coins, invites, activity_coins) VALUES (?, 1, 0, ?, ?, 0, 0)',
-                (user.id, xp_won, 0)
-            )
-            level, prestige, xp, coins = 1, 0, xp_won, 0
-        else:
-            # User exists, update their XP
-            level, prestige, xp, coins = user_data
-            xp += xp_won
-            
-            # Check if level up happens after XP drop
-            leveled_up = False
-            levels_gained = 0
-            coins_awarded = 0
-            
-            # Get level up coins from xp_settings
-            level_up_coins = xp_settings.get("level_up_coins", 150)  # Default to 150 if not found
-            
-            while xp >= calculate_xp_needed(level):
-                xp -= calculate_xp_needed(level)
-                level += 1
-                coins += level_up_coins
-                coins_awarded += level_up_coins
-                levels_gained += 1
-                leveled_up = True
-                
-                if level >= 101:
-                    level = 1
-                    prestige += 1
-                    # Send a simple prestige message
-                    await interaction.channel.send(f"⭐ **PRESTIGE UP!** ⭐ {user.mention} reached Prestige Level {prestige}! (+{level_up_coins} 🪙)")
-            
-            if leveled_up:
-                # Send a simple level up message
-                await interaction.channel.send(f"🎉 {user.mention} leveled up to level {level}! 🚀 (+{coins_awarded} 🪙)")
-            
-            # Update user data in database using the pool
-            await db_pool.execute(
-                'UPDATE users SET level = ?, prestige = ?, xp = ?, coins = ? WHERE user_id = ?',
-                (level, prestige, xp, coins, user.id)
-            )
+        if result["levels_gained"] > 0:
+            # Send a simple level up message
+            await interaction.channel.send(f"🎉 {user.mention} leveled up to level {level}! 🚀 (+{result['coins_awarded']} 🪙)")
         
         # Create and send the claim announcement
         claim_embed = discord.Embed(
@@ -2198,13 +2141,6 @@ async def start_xp_event(message_or_interaction, channel=None, interval=60, unit
             await response_channel.send("❌ Minimum interval is 1 minute!")
         return
 
-    # Define check function for reaction wait
-    def check(reaction, user):
-        # Using nonlocal to reference the first_message variable that will be defined below
-        nonlocal first_message
-        # Check if this is a valid reaction
-        return reaction.message.id == first_message.id and str(reaction.emoji) == "✅" and not user.bot
-        
     # Initialize first_message variable
     first_message = None
 
@@ -2239,25 +2175,8 @@ async def start_xp_event(message_or_interaction, channel=None, interval=60, unit
         
     # Function to process XP reward
     async def handle_xp_claim(user, xp_amount):
-        async with aiosqlite.connect("leveling.db") as db:
-            # Get current user stats
-            cursor = await db.execute('SELECT level, xp FROM users WHERE user_id = ?', (user.id,))
-            user_data = await cursor.fetchone()
-            
-            if user_data:
-                level, current_xp = user_data
-                new_xp = current_xp + xp_amount
-                
-                # Check for level up
-                while new_xp >= calculate_xp_needed(level):
-                    new_xp -= calculate_xp_needed(level)
-                    level += 1
-                    
-                await db.execute('UPDATE users SET level = ?, xp = ? WHERE user_id = ?', (level, new_xp, user.id))
-            else:
-                await db.execute('INSERT INTO users (user_id, level, xp) VALUES (?, 1, ?)', (user.id, xp_amount))
-            
-            await db.commit()
+        # Add the XP through the leveling engine
+        await grant_xp(user.id, xp_amount)
         
         claim_embed = discord.Embed(
             title="🎉 XP Claimed!",
@@ -2288,7 +2207,7 @@ async def start_xp_event(message_or_interaction, channel=None, interval=60, unit
                         
                         # Create task to wait for reaction
                         reaction_task = asyncio.create_task(
-                            bot.wait_for("reaction_add", check=lambda r, u: str(r.emoji) == "✅" and r.message.id == first_message.id and not u.bot)
+                            reaction_router.wait(first_message.id, "✅")
                         )
                         
                         # Wait for either the minute to pass or a reaction
@@ -2324,7 +2243,7 @@ async def start_xp_event(message_or_interaction, channel=None, interval=60, unit
                             
                             # Wait the final minute for someone to claim
                             try:
-                                reaction, user = await bot.wait_for("reaction_add", timeout=60.0, check=lambda r, u: str(r.emoji) == "✅" and r.message.id == first_message.id and not u.bot)
+                                reaction, user = await reaction_router.wait(first_message.id, "✅", timeout=60.0)
                                 # Handle the reaction (give XP)
                                 xp_amount = random.randint(100, 300)
                                 await handle_xp_claim(user, xp_amount)
@@ -2344,7 +2263,7 @@ async def start_xp_event(message_or_interaction, channel=None, interval=60, unit
                     
                     # Create task to wait for reaction
                     reaction_task = asyncio.create_task(
-                        bot.wait_for("reaction_add", check=lambda r, u: str(r.emoji) == "✅" and r.message.id == first_message.id and not u.bot)
+                        reaction_router.wait(first_message.id, "✅")
                     )
                     
                     # Wait for either the time to pass or a reaction
@@ -2428,42 +2347,15 @@ async def coindrop(interaction: discord.Interaction):
     # Notify the command user that the event was triggered
     await interaction.followup.send("✅ Coin Drop Event triggered in this channel!", ephemeral=True)
     
-    # Define the check function
-    def check(reaction, user):
-        return str(reaction.emoji) == "💰" and reaction.message.id == msg.id and not user.bot
-    
     try:
         # Wait for someone to react
-        reaction, user = await bot.wait_for("reaction_add", timeout=600, check=check)  # 10 minutes timeout
+        reaction, user = await reaction_router.wait(msg.id, "💰", timeout=600)  # 10 minutes timeout
         coins_won = random.randint(100, 300)
         
-        # Get user data and update coins in the database using the connection pool
-        from db_pool import get_db_pool
-        db_pool = await get_db_pool()
-        
-        # Get user data
-        user_data = await db_pool.fetchone(
-            'SELECT level, prestige, xp, coins FROM users WHERE user_id = ?',
-            (user.id,)
-        )
-        
-        if user_data is None:
-            # User doesn't exist in database, create a new record
-            await db_pool.execute(
-                'INSERT INTO users (user_id, level, prestige, xp, coins, invites, activity_coins) VALUES (?, 1, 0, 0, ?, 0, 0)',
-                (user.id, coins_won)
-            )
-            level, prestige, xp, coins = 1, 0, 0, coins_won
-        else:
-            # User exists, update their coins
-            level, prestige, xp, coins = user_data
-            coins += coins_won
-        
-        # Update user data in database using the pool
-        await db_pool.execute(
-            'UPDATE users SET level = ?, prestige = ?, xp = ?, coins = ? WHERE user_id = ?',
-            (level, prestige, xp, coins, user.id)
-        )
+        # Add the coins through the user cache, creating the user if needed
+        await user_cache.get(user.id, create=True)
+        user_data = await user_cache.apply(user.id, reason="coin_drop", coins=coins_won)
+        level, xp, coins = user_data["level"], user_data["xp"], user_data["coins"]
         
         # Create and send the claim announcement
         claim_embed = discord.Embed(
@@ -2506,32 +2398,15 @@ async def coin_drop_event():
         await message.add_reaction("💰")
         
         # Wait for someone to claim it
-        def check(reaction, user):
-            return reaction.message.id == message.id and str(reaction.emoji) == "💰" and not user.bot
-            
         try:
-            reaction, user = await bot.wait_for("reaction_add", timeout=600.0, check=check)
+            reaction, user = await reaction_router.wait(message.id, "💰", timeout=600.0)
             
             # Generate random coin amount (100-300)
             coins = random.randint(100, 300)
             
-            # Add coins to the user who claimed using the connection pool
-            from db_pool import get_db_pool
-            db_pool = await get_db_pool()
-            
-            # First make sure user exists (INSERT OR IGNORE equivalent)
-            user_data = await db_pool.fetchone("SELECT user_id FROM users WHERE user_id = ?", (user.id,))
-            if not user_data:
-                await db_pool.execute(
-                    "INSERT INTO users (user_id, level, prestige, xp, coins, invites, activity_coins) VALUES (?, 1, 0, 0, 0, 0, 0)", 
-                    (user.id,)
-                )
-            
-            # Update the user's coins
-            await db_pool.execute(
-                "UPDATE users SET coins = coins + ? WHERE user_id = ?", 
-                (coins, user.id)
-            )
+            # Add coins to the user who claimed, creating the user if needed
+            await user_cache.get(user.id, create=True)
+            await user_cache.apply(user.id, reason="coin_drop", coins=coins)
             
             # Send success message
             claim_embed = discord.Embed(
@@ -2626,10 +2501,6 @@ async def start_coin_event(message_or_interaction, channel=None, interval=60, un
                 drop_message = await channel.send(embed=embed)
                 await drop_message.add_reaction("💰")
                 
-                # Define check function for this message
-                def check(reaction, user):
-                    return str(reaction.emoji) == "💰" and reaction.message.id == drop_message.id and not user.bot
-                
                 # Set up countdown notifications
                 total_wait_time = 600.0  # 10 minutes in seconds
                 notification_interval = 300  # 5 minutes in seconds
@@ -2645,7 +2516,7 @@ async def start_coin_event(message_or_interaction, channel=None, interval=60, un
                         
                         # Create task to wait for reaction
                         reaction_task = asyncio.create_task(
-                            bot.wait_for("reaction_add", check=check)
+                            reaction_router.wait(drop_message.id, "💰")
                         )
                         
                         # Wait for either the minute to pass or a reaction
@@ -2680,7 +2551,7 @@ async def start_coin_event(message_or_interaction, channel=None, interval=60, un
                             
                             # Wait the final minute for someone to claim
                             try:
-                                reaction, user = await bot.wait_for("reaction_add", timeout=60.0, check=check)
+                                reaction, user = await reaction_router.wait(drop_message.id, "💰", timeout=60.0)
                                 # Handle the reaction (give coins)
                                 await handle_coin_claim(channel, user)
                                 break
@@ -2699,7 +2570,7 @@ async def start_coin_event(message_or_interaction, channel=None, interval=60, un
                     
                     # Create task to wait for reaction
                     reaction_task = asyncio.create_task(
-                        bot.wait_for("reaction_add", check=check)
+                        reaction_router.wait(drop_message.id, "💰")
                     )
                     
                     # Wait for either the time to pass or a reaction
@@ -2748,29 +2619,9 @@ async def start_coin_event(message_or_interaction, channel=None, interval=60, un
         # Calculate coin reward (100-300 coins)
         coins_reward = random.randint(100, 300)
         
-        # Add coins to the user who claimed - using connection pool
-        from db_pool import get_db_pool
-        db_pool = await get_db_pool()
-        
-        # Check if user exists in database
-        user_data = await db_pool.fetchone("SELECT coins FROM users WHERE user_id = ?", (user.id,))
-        
-        if user_data:
-            # User exists, update coins
-            current_coins = user_data[0]
-            new_coins = current_coins + coins_reward
-            
-            # Update user coins using the pool
-            await db_pool.execute(
-                "UPDATE users SET coins = ? WHERE user_id = ?",
-                (new_coins, user.id)
-            )
-        else:
-            # User doesn't exist, create new entry with full fields
-            await db_pool.execute(
-                "INSERT INTO users (user_id, level, prestige, xp, coins, invites, activity_coins) VALUES (?, 1, 0, 0, ?, 0, 0)",
-                (user.id, coins_reward)
-            )
+        # Add coins to the user who claimed, creating the user if needed
+        await user_cache.get(user.id, create=True)
+        await user_cache.apply(user.id, reason="coin_drop", coins=coins_reward)
         
         # Send reward message
         reward_embed = discord.Embed(
@@ -2869,7 +2720,7 @@ async def additem(interaction: discord.Interaction,
     
     # Check if code already exists in database
     try:
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             cursor = await db.execute('SELECT code FROM shop_items WHERE UPPER(code) = UPPER(?)', (code,))
             existing_code = await cursor.fetchone()
             
@@ -2936,7 +2787,7 @@ async def removeitem(interaction: discord.Interaction, code: str):
     await interaction.response.defer(ephemeral=True)
     
     try:
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             # Find the item in the database
             cursor = await db.execute('SELECT name FROM shop_items WHERE UPPER(code) = UPPER(?)', (code,))
             item_data = await cursor.fetchone()
@@ -2993,46 +2844,31 @@ async def buy(interaction: discord.Interaction, code: str, amount: int = 1):
         
     total_cost = item["cost"] * amount
     
-    # Check if user has enough coins using the connection pool
-    from db_pool import get_db_pool
-    db_pool = await get_db_pool()
-    
-    # Get user data
-    user_data = await db_pool.fetchone(
-        'SELECT coins FROM users WHERE user_id = ?',
-        (interaction.user.id,)
-    )
+    # Check the user has an account using the shared user cache
+    user_data = await user_cache.get(interaction.user.id)
     
     if not user_data:
         await interaction.followup.send("❌ You don't have an account yet! Chat in the server to create one.", ephemeral=True)
         return
         
-    user_coins = user_data[0]
-    
-    if user_coins < total_cost:
-        await interaction.followup.send(f"❌ Insufficient balance! You need **{total_cost}** 🪙 but only have **{user_coins}** 🪙", ephemeral=True)
+    # Deduct coins from user's account only if they can afford it
+    if await user_cache.try_debit(interaction.user.id, total_cost, reason="shop_purchase") is None:
+        await interaction.followup.send(f"❌ Insufficient balance! You need **{total_cost}** 🪙 but only have **{user_data['coins']}** 🪙", ephemeral=True)
         return
-        
-    # Deduct coins from user's account using the pool
-    await db_pool.execute(
-        'UPDATE users SET coins = coins - ? WHERE user_id = ?',
-        (total_cost, interaction.user.id)
-    )
     
     # Send notification to admins
-    admin_channel = bot.get_channel(1352717796336996422)
-    if admin_channel:
-        admin_embed = discord.Embed(
-            title="🛍️ New Shop Purchase!",
-            description=f"<@{interaction.user.id}> has purchased:\n**{amount}x {item['name']}**\nCode: `{item['code']}`\nTotal Cost: **{total_cost}** 🪙",
-            color=discord.Color.gold(),
-            timestamp=discord.utils.utcnow()
-        )
-        admin_embed.set_footer(text=f"User ID: {interaction.user.id}")
-        await admin_channel.send(
-            content=f"<@479711321399623681> <@1308527904497340467> - New purchase requires attention!",
-            embed=admin_embed
-        )
+    admin_embed = discord.Embed(
+        title="🛍️ New Shop Purchase!",
+        description=f"<@{interaction.user.id}> has purchased:\n**{amount}x {item['name']}**\nCode: `{item['code']}`\nTotal Cost: **{total_cost}** 🪙",
+        color=discord.Color.gold(),
+        timestamp=discord.utils.utcnow()
+    )
+    admin_embed.set_footer(text=f"User ID: {interaction.user.id}")
+    outbox.send_channel(
+        1352717796336996422,
+        content=f"<@479711321399623681> <@1308527904497340467> - New purchase requires attention!",
+        embed=admin_embed
+    )
     
     # Send confirmation to user
     user_embed = discord.Embed(
@@ -3073,63 +2909,25 @@ async def xp_drop_event():
         await message.add_reaction("✅")
         
         # Wait for someone to claim it
-        def check(reaction, user):
-            return reaction.message.id == message.id and str(reaction.emoji) == "✅" and not user.bot
-            
         try:
-            reaction, user = await bot.wait_for("reaction_add", timeout=600.0, check=check)
+            reaction, user = await reaction_router.wait(message.id, "✅", timeout=600.0)
             
             # Generate random XP amount (500-1000)
             xp_amount = random.randint(500, 1000)
             
-            # Add XP to the user who claimed using the connection pool
-            from db_pool import get_db_pool
-            db_pool = await get_db_pool()
+            # Add XP to the user who claimed through the leveling engine
+            result = await grant_xp(user.id, xp_amount)
             
-            # Get user's current level and XP
-            user_data = await db_pool.fetchone(
-                "SELECT level, xp FROM users WHERE user_id = ?", 
-                (user.id,)
-            )
-            
-            if user_data:
-                level, xp = user_data
-                new_xp = xp + xp_amount
-                
-                # Check if user should level up
-                xp_needed = calculate_xp_needed(level)
-                
-                if new_xp >= xp_needed:
-                    new_level = level + 1
-                    remaining_xp = new_xp - xp_needed
-                    
-                    # Update user level and XP using the pool
-                    await db_pool.execute(
-                        "UPDATE users SET level = ?, xp = ? WHERE user_id = ?", 
-                        (new_level, remaining_xp, user.id)
-                    )
-                    
-                    # Send level up message
-                    level_channel = bot.get_channel(1348430879363735602)  # XP level up channel
-                    if level_channel:
-                        level_embed = discord.Embed(
-                            title="⭐ Level Up!",
-                            description=f"{user.mention} has reached **Level {new_level}**! 🎉",
-                            color=discord.Color.gold()
-                        )
-                        await level_channel.send(embed=level_embed)
-                else:
-                    # Just update XP using the pool
-                    await db_pool.execute(
-                        "UPDATE users SET xp = ? WHERE user_id = ?", 
-                        (new_xp, user.id)
+            if result["levels_gained"] > 0:
+                # Send level up message
+                level_channel = bot.get_channel(1348430879363735602)  # XP level up channel
+                if level_channel:
+                    level_embed = discord.Embed(
+                        title="⭐ Level Up!",
+                        description=f"{user.mention} has reached **Level {result['level']}**! 🎉",
+                        color=discord.Color.gold()
                     )
-            else:
-                # Insert new user with full fields
-                await db_pool.execute(
-                    "INSERT INTO users (user_id, level, prestige, xp, coins, invites, activity_coins) VALUES (?, 1, 0, ?, 0, 0, 0)", 
-                    (user.id, xp_amount)
-                )
+                    await level_channel.send(embed=level_embed)
             
             # Send success message
             claim_embed = discord.Embed(
@@ -3171,17 +2969,6 @@ async def gcreate(interaction: discord.Interaction, duration: str,
             ephemeral=True)
         return
 
-    # Create the giveaway data
-    giveaway_id = len(giveaways) + 1
-    giveaway = {
-        "duration": duration_seconds,
-        "winners": winners,
-        "prize": prize,
-        "started_at": discord.utils.utcnow(),
-        "participants": []
-    }
-    giveaways[giveaway_id] = giveaway
-
     embed = discord.Embed(
         title="🌟 NEW GIVEAWAY! 🌟",
         description=
@@ -3192,34 +2979,50 @@ async def gcreate(interaction: discord.Interaction, duration: str,
 
     msg = await interaction.channel.send(embed=embed)
     await msg.add_reaction("🎉")
-    giveaways[giveaway_id]["message_id"] = msg.id
+
+    # The giveaway ends through a scheduled job; entries are the 🎉 reactions on the message
+    giveaway = {
+        "channel_id": interaction.channel.id,
+        "message_id": msg.id,
+        "winners": winners,
+        "prize": prize,
+        "started_at": discord.utils.utcnow().isoformat(),
+    }
+    giveaway_id = await scheduler.schedule("giveaway_end", time.time() + duration_seconds, giveaway)
+    giveaways[giveaway_id] = giveaway
 
     await interaction.response.send_message(
         f"✅ Giveaway created! React with 🎉 to enter.", ephemeral=True)
 
-    # Add reaction tracking
-    def check(reaction, user):
-        return str(reaction.emoji
-                   ) == "🎉" and reaction.message.id == msg.id and not user.bot
 
+# Users who entered a giveaway by reacting with 🎉 to its message
+async def get_giveaway_participants(giveaway):
+    channel = bot.get_channel(giveaway["channel_id"])
+    if channel is None:
+        return []
     try:
-        while True:
-            reaction, user = await bot.wait_for("reaction_add",
-                                                timeout=duration_seconds,
-                                                check=check)
-            if user.id not in giveaway["participants"]:
-                giveaway["participants"].append(user.id)
-    except asyncio.TimeoutError:
-        pass
+        message = await channel.fetch_message(giveaway["message_id"])
+    except discord.HTTPException:
+        return []
+    for reaction in message.reactions:
+        if str(reaction.emoji) == "🎉":
+            return [user.id async for user in reaction.users() if not user.bot]
+    return []
+
+
+# Draw the winners of a giveaway and announce them
+async def finish_giveaway(giveaway_id, giveaway):
+    giveaways.pop(giveaway_id, None)
+    channel = bot.get_channel(giveaway["channel_id"])
+    if channel is None:
+        return
 
-    # After the giveaway ends
-    if len(giveaway["participants"]) == 0:
-        await interaction.channel.send("❌ No one entered the giveaway!")
-        del giveaways[giveaway_id]
+    participants = await get_giveaway_participants(giveaway)
+    if len(participants) == 0:
+        await channel.send("❌ No one entered the giveaway!")
         return
 
-    winner_ids = random.sample(giveaway["participants"],
-                               min(len(giveaway["participants"]), winners))
+    winner_ids = random.sample(participants, min(len(participants), giveaway["winners"]))
 
     winner_mentions = [f"<@{winner_id}>" for winner_id in winner_ids]
     winner_list = "\n".join(winner_mentions)
@@ -3227,13 +3030,17 @@ async def gcreate(interaction: discord.Interaction, duration: str,
     result_embed = discord.Embed(
         title="🎊 GIVEAWAY ENDED! 🎊",
         description=
-        f"```diff\n+ CONGRATULATIONS TO OUR WINNERS!\n```\n🎯 **Prize:** {prize}\n👑 **Winners ({len(winner_ids)}):**\n{winner_list}\n\n🎉 **Thank you everyone for participating!**\n💫 Stay tuned for more giveaways!",
+        f"```diff\n+ CONGRATULATIONS TO OUR WINNERS!\n```\n🎯 **Prize:** {giveaway['prize']}\n👑 **Winners ({len(winner_ids)}):**\n{winner_list}\n\n🎉 **Thank you everyone for participating!**\n💫 Stay tuned for more giveaways!",
         color=0xFF2D74,
         timestamp=discord.utils.utcnow())
     result_embed.set_footer(text="🌟 Next giveaway coming soon!")
-    await interaction.channel.send(embed=result_embed)
+    await channel.send(embed=result_embed)
+
+
+async def giveaway_end_job(job):
+    await finish_giveaway(job.id, giveaways.get(job.id, job.payload))
 
-    del giveaways[giveaway_id]
+scheduler.register("giveaway_end", giveaway_end_job)
 
 
 # Slash Command: /greroll
@@ -3246,9 +3053,10 @@ async def greroll(interaction: discord.Interaction):
         return
 
     giveaway = giveaways[max(giveaways.keys())]
+    participants = await get_giveaway_participants(giveaway)
     winner_ids = random.sample(
-        giveaway["participants"],
-        min(len(giveaway["participants"]), giveaway["winners"]))
+        participants,
+        min(len(participants), giveaway["winners"]))
 
     winner_mentions = [f"<@{winner_id}>" for winner_id in winner_ids]
     winner_list = "\n".join(winner_mentions)
@@ -3270,24 +3078,16 @@ async def gend(interaction: discord.Interaction):
             "❌ No active giveaways to end.", ephemeral=True)
         return
 
-    giveaway = giveaways[max(giveaways.keys())]
-    winner_ids = random.sample(
-        giveaway["participants"],
-        min(len(giveaway["participants"]), giveaway["winners"]))
-
-    winner_mentions = [f"<@{winner_id}>" for winner_id in winner_ids]
-    winner_list = "\n".join(winner_mentions)
-
-    result_embed = discord.Embed(
-        title="🎊 GIVEAWAY ENDED! 🎊",
-        description=
-        f"```diff\n+ CONGRATULATIONS TO OUR WINNERS!\n```\n🎯 **Prize:** {giveaway['prize']}\n👑 **Winners ({len(winner_ids)}):**\n{winner_list}\n\n🎉 **Thank you everyone for participating!**\n💫 Stay tuned for more giveaways!",
-        color=0xFF2D74,
-        timestamp=discord.utils.utcnow())
-    result_embed.set_footer(text="🌟 Next giveaway coming soon!")
-    await interaction.channel.send(embed=result_embed)
+    # End the latest giveaway now instead of at its scheduled time, unless its job already ran
+    giveaway_id = max(giveaways.keys())
+    giveaway = giveaways[giveaway_id]
+    if not await scheduler.cancel(giveaway_id):
+        await interaction.response.send_message(
+            "❌ That giveaway has already ended.", ephemeral=True)
+        return
 
-    del giveaways[max(giveaways.keys())]
+    await interaction.response.send_message("✅ Ending the giveaway now!", ephemeral=True)
+    await finish_giveaway(giveaway_id, giveaway)
 
 @bot.tree.command(name="gamevote", description="Start a game voting poll (Use s/m/h for seconds/minutes/hours)")
 async def gamevote(interaction: discord.Interaction, duration: str):
@@ -3390,19 +3190,6 @@ voice_join_times = {}
 @bot.tree.command(name="activityleaderboard", description="View the activity coins leaderboard")
 async def activityleaderboard(interaction: discord.Interaction):
     await interaction.response.defer()
-
-    # Use the database pool for more reliable access
-    from db_pool import get_db_pool
-    db_pool = await get_db_pool()
-    
-    # Get top users by activity coins
-    top_users = await db_pool.fetchall(
-        'SELECT user_id, activity_coins FROM users ORDER BY activity_coins DESC LIMIT 10'
-    )
-
-    if not top_users:
-        await interaction.followup.send("No activity data available!", ephemeral=True)
-        return
         
     # Check if there's an active event
     event_status = ""
@@ -3413,21 +3200,19 @@ async def activityleaderboard(interaction: discord.Interaction):
         time_str = f"{hours}h {minutes}m {seconds}s" if hours > 0 else f"{minutes}m {seconds}s"
         event_status = f"🔴 **ACTIVE EVENT IN PROGRESS!**\n⏰ Time remaining: {time_str}\n🎁 Prize: {activity_event['prize']}\n\n"
 
-    embed = discord.Embed(
+    def format_page(entries):
+        return [(f"#{idx} {name}", f"Coins: {coins:.1f} 🪙") for idx, user_id, name, (coins,) in entries]
+
+    view = LeaderboardView(
+        bot, "activity",
         title="🎯 Activity Event Leaderboard",
-        description=f"{event_status}📝 **How to earn coins:**\n> • 1 coin per message\n\n**Top 10 Most Active Users:**",
-        color=discord.Color.gold()
+        description=f"{event_status}📝 **How to earn coins:**\n> • 1 coin per message\n\n**Most Active Users:**",
+        color=discord.Color.gold(),
+        format_page=format_page,
+        guild=interaction.guild,
+        viewer_id=interaction.user.id
     )
-
-    for idx, (user_id, coins) in enumerate(top_users, 1):
-        user = await bot.fetch_user(user_id)
-        embed.add_field(
-            name=f"#{idx} {user.name}",
-            value=f"Coins: {coins:.1f} 🪙",
-            inline=False
-        )
-
-    await interaction.followup.send(embed=embed)
+    await view.send(interaction, "No activity data available!")
 
 @bot.tree.command(name="kick", description="Kick a user from the server")
 async def kick(interaction: discord.Interaction, member: discord.Member, reason: str = None):
@@ -3725,6 +3510,7 @@ async def permission(interaction: discord.Interaction, section: str, role: disco
                     
                     if role.id not in command_permissions[command]:
                         command_permissions[command].append(role.id)
+                    rebuild_permission_index()
                     
                     await interaction.followup.send(
                         f"✅ Added permission for {role.mention} to use `/{command}` as part of the {section.replace('_', ' ').title()} section.",
@@ -3762,6 +3548,7 @@ async def permission(interaction: discord.Interaction, section: str, role: disco
                 
                 if role.id not in command_permissions[cmd_name]:
                     command_permissions[cmd_name].append(role.id)
+            rebuild_permission_index()
             
             # commit already happens in db_pool.execute by default
             
@@ -3809,17 +3596,19 @@ async def givepermission(interaction: discord.Interaction, command_name: str, ro
     # Initialize command in permissions dict if not present
     if command_name not in command_permissions:
         command_permissions[command_name] = []
+        rebuild_permission_index()
     
     try:
         # Convert role.id to string for database storage
         role_id_str = str(role.id)
         
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             # Handle role-based permission
             if remove:
                 if role.id in command_permissions[command_name]:
                     # Remove from in-memory dict
                     command_permissions[command_name].remove(role.id)
+                    rebuild_permission_index()
                     
                     # Remove from database
                     await db.execute(
@@ -3835,6 +3624,7 @@ async def givepermission(interaction: discord.Interaction, command_name: str, ro
                 if role.id not in command_permissions[command_name]:
                     # Add to in-memory dict
                     command_permissions[command_name].append(role.id)
+                    rebuild_permission_index()
                     
                     # Add to database
                     await db.execute(
@@ -3867,14 +3657,16 @@ async def setpublic(interaction: discord.Interaction, command_name: str, remove:
     # Initialize command in permissions dict if not present
     if command_name not in command_permissions:
         command_permissions[command_name] = []
+        rebuild_permission_index()
     
     try:
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             # Handle 'everyone' permission
             if remove:
                 if "everyone" in command_permissions[command_name]:
                     # Remove from in-memory dict
                     command_permissions[command_name].remove("everyone")
+                    rebuild_permission_index()
                     
                     # Remove from database
                     await db.execute(
@@ -3890,6 +3682,7 @@ async def setpublic(interaction: discord.Interaction, command_name: str, remove:
                 if "everyone" not in command_permissions[command_name]:
                     # Add to in-memory dict
                     command_permissions[command_name].append("everyone")
+                    rebuild_permission_index()
                     
                     # Add to database
                     await db.execute(
@@ -4007,95 +3800,45 @@ async def addlevel(interaction: discord.Interaction, member: discord.Member, amo
     try:
         await interaction.response.defer()
         
-        async with aiosqlite.connect("leveling.db") as db:
-            cursor = await db.execute('SELECT level, prestige, xp, coins FROM users WHERE user_id = ?', (member.id,))
-            result = await cursor.fetchone()
+        if amount <= 0:
+            await interaction.followup.send("❌ Amount must be greater than 0.", ephemeral=True)
+            return
+        
+        # Award coins per level gained based on settings
+        level_up_coins = xp_settings.get("level_up_coins", 150)
+        state = await user_cache.get(member.id)
+        
+        if state:
+            level, prestige, xp, coins = state["level"], state["prestige"], state["xp"], state["coins"]
             
-            if result:
-                level, prestige, xp, coins = result
-                new_level = level + amount
-                
-                # Award coins per level gained based on settings
-                level_up_coins = xp_settings.get("level_up_coins", 150)
-                coins_to_add = amount * level_up_coins
-                
-                # Update both level and coins
-                await db.execute('UPDATE users SET level = ?, coins = coins + ? WHERE user_id = ?', 
-                               (new_level, coins_to_add, member.id))
-                
-                # Update coins for use in response message
-                coins += coins_to_add
-            else:
-                # Create new user with default values
-                new_level = amount
-                prestige = 0
-                xp = 0 
-                
-                # Award coins per level based on settings, but start at level 1 (so amount-1 levels gained)
-                # If starting at level 5 with 150 coins/level, they get (5-1)*150 = 600 coins
-                level_up_coins = xp_settings.get("level_up_coins", 150)
-                coins_to_add = max(0, (amount - 1) * level_up_coins)
-                coins = coins_to_add
-                
-                await db.execute('INSERT INTO users (user_id, level, prestige, xp, coins) VALUES (?, ?, ?, ?, ?)', 
-                               (member.id, new_level, prestige, xp, coins))
+            # Add the levels through the leveling engine (wraps into prestige past level 100)
+            result = leveling.add_levels(level, prestige, amount, level_up_coins)
+            new_level = result["level"]
+            coins_to_add = result["coins_awarded"]
             
-            await db.commit()
-        
-        # Level roles mapping
-        level_roles = {
-            5: 1339331106557657089,
-            10: 1339332632860950589,
-            15: 1339333949201186878,
-            20: 1339571891848876075,
-            25: 1339572201430454272,
-            30: 1339572204433838142,
-            35: 1339572206895894602,
-            40: 1339572209848680458,
-            45: 1339572212285575199,
-            50: 1339572214881714176,
-            55: 1339574559136944240,
-            60: 1339574564685873245,
-            65: 1339574564983804018,
-            70: 1339574565780590632,
-            75: 1339574566669783180,
-            80: 1339574568276332564,
-            85: 1339574568586842112,
-            90: 1339574569417048085,
-            95: 1339576526458322954,
-            100: 1339576529377820733
-        }
-
-        # Find the highest level role that applies
-        highest_applicable_level = 0
-        for level_threshold in sorted(level_roles.keys()):
-            if new_level >= level_threshold:
-                highest_applicable_level = level_threshold
-            else:
-                break
-
-        role_changes = []
-        if highest_applicable_level > 0:
-            # Get the new role
-            new_role = interaction.guild.get_role(level_roles[highest_applicable_level])
-            
-            # Remove any previous level roles
-            roles_to_remove = []
-            for lvl, role_id in level_roles.items():
-                if lvl != highest_applicable_level:  # Don't remove the current level role
-                    role_obj = interaction.guild.get_role(role_id)
-                    if role_obj and role_obj in member.roles:
-                        roles_to_remove.append(role_obj)
+            # Update both level and coins
+            await user_cache.apply(member.id, reason="admin_add_levels", level=new_level - level,
+                                   prestige=result["prestige"] - prestige, coins=coins_to_add)
             
-            # Remove old roles if any were found
-            if roles_to_remove:
-                await member.remove_roles(*roles_to_remove)
-                role_changes.append(f"Removed roles: {', '.join([role.name for role in roles_to_remove])}")
+            # Update coins for use in response message
+            coins += coins_to_add
+        else:
+            # Create new user starting at level 1 (so amount-1 levels gained)
+            # If starting at level 5 with 150 coins/level, they get (5-1)*150 = 600 coins
+            result = leveling.add_levels(1, 0, amount - 1, level_up_coins)
+            new_level = result["level"]
+            coins = result["coins_awarded"]
             
-            # Add the new role
-            if new_role and new_role not in member.roles:
-                await member.add_roles(new_role)
-                role_changes.append(f"Added role: {new_role.name}")
+            await user_cache.apply(member.id, reason="admin_add_levels", level=new_level - 1,
+                                   prestige=result["prestige"], coins=coins)
+        
+        # Give the member the level role for their new level
+        role_changes = []
+        role_level, added_role, removed_roles = await sync_level_roles(member, new_level)
+        if removed_roles:
+            role_changes.append(f"Removed roles: {', '.join([role.name for role in removed_roles])}")
+        if added_role:
+            role_changes.append(f"Added role: {added_role.name}")
         
         # Create response embed
         embed = discord.Embed(
@@ -4135,85 +3878,37 @@ async def removelevel(interaction: discord.Interaction, member: discord.Member,
             await interaction.followup.send("❌ Amount must be greater than 0.", ephemeral=True)
             return
         
-        async with aiosqlite.connect("leveling.db") as db:
-            cursor = await db.execute('SELECT level, prestige, xp, coins FROM users WHERE user_id = ?', (member.id,))
-            result = await cursor.fetchone()
-            
-            if not result:
-                await interaction.followup.send(f"❌ {member.mention} doesn't have any levels yet.", ephemeral=True)
-                return
-                
-            level, prestige, xp, coins = result
-            
-            # Calculate new level
-            new_level = max(1, level - amount)  # Ensure level doesn't go below 1
-            levels_removed = level - new_level
-            
-            # Calculate coins to remove (using level_up_coins from settings, but ensure we don't go negative)
-            level_up_coins = xp_settings.get("level_up_coins", 150)
-            coins_to_remove = min(coins, levels_removed * level_up_coins)
-            
-            # Update both level and coins
-            await db.execute('UPDATE users SET level = ?, coins = coins - ? WHERE user_id = ?', 
-                           (new_level, coins_to_remove, member.id))
+        state = await user_cache.get(member.id)
+        
+        if not state:
+            await interaction.followup.send(f"❌ {member.mention} doesn't have any levels yet.", ephemeral=True)
+            return
             
-            # Update coins for use in response message
-            coins -= coins_to_remove
-            await db.commit()
+        level, coins = state["level"], state["coins"]
         
-        # Level roles mapping
-        level_roles = {
-            5: 1339331106557657089,
-            10: 1339332632860950589,
-            15: 1339333949201186878,
-            20: 1339571891848876075,
-            25: 1339572201430454272,
-            30: 1339572204433838142,
-            35: 1339572206895894602,
-            40: 1339572209848680458,
-            45: 1339572212285575199,
-            50: 1339572214881714176,
-            55: 1339574559136944240,
-            60: 1339574564685873245,
-            65: 1339574564983804018,
-            70: 1339574565780590632,
-            75: 1339574566669783180,
-            80: 1339574568276332564,
-            85: 1339574568586842112,
-            90: 1339574569417048085,
-            95: 1339576526458322954,
-            100: 1339576529377820733
-        }
-
-        # Find the highest level role that applies
-        highest_applicable_level = 0
-        for level_threshold in sorted(level_roles.keys()):
-            if new_level >= level_threshold:
-                highest_applicable_level = level_threshold
-            else:
-                break
-
-        role_changes = []
+        # Calculate new level (never below 1)
+        result = leveling.remove_levels(level, amount)
+        new_level = result["level"]
+        levels_removed = result["levels_removed"]
+        
+        # Calculate coins to remove (using level_up_coins from settings, but ensure we don't go negative)
+        level_up_coins = xp_settings.get("level_up_coins", 150)
+        coins_to_remove = min(coins, levels_removed * level_up_coins)
+        
+        # Update both level and coins
+        await user_cache.apply(member.id, reason="admin_remove_levels", level=new_level - level, coins=-coins_to_remove)
+        
+        # Update coins for use in response message
+        coins -= coins_to_remove
         
         # Remove any level roles that the user no longer qualifies for
-        roles_to_remove = []
-        for lvl, role_id in level_roles.items():
-            role_obj = interaction.guild.get_role(role_id)
-            if role_obj and role_obj in member.roles:
-                if lvl > new_level:  # User no longer qualifies for this role
-                    roles_to_remove.append(role_obj)
-        
-        # Remove roles if any were found
-        if roles_to_remove:
-            await member.remove_roles(*roles_to_remove)
-            role_changes.append(f"Removed roles: {', '.join([role.name for role in roles_to_remove])}")
-        
-        # Add the correct role for the new level if it exists
-        if highest_applicable_level > 0:
-            new_role = interaction.guild.get_role(level_roles[highest_applicable_level])
-            if new_role and new_role not in member.roles:
-                await member.add_roles(new_role)
-                role_changes.append(f"Added role: {new_role.name}")
+        # and add the correct role for the new level if it exists
+        role_changes = []
+        role_level, added_role, removed_roles = await sync_level_roles(member, new_level, remove_lower=False)
+        if removed_roles:
+            role_changes.append(f"Removed roles: {', '.join([role.name for role in removed_roles])}")
+        if added_role:
+            role_changes.append(f"Added role: {added_role.name}")
         
         # Create response embed
         embed = discord.Embed(
@@ -4255,18 +3950,8 @@ async def removelevel(interaction: discord.Interaction, member: discord.Member,
 async def addcoin(interaction: discord.Interaction, member: discord.Member, amount: int):
         
     try:
-        async with aiosqlite.connect("leveling.db") as db:
-            cursor = await db.execute('SELECT coins FROM users WHERE user_id = ?', (member.id,))
-            result = await cursor.fetchone()
-            
-            if result:
-                new_coins = result[0] + amount
-                await db.execute('UPDATE users SET coins = ? WHERE user_id = ?', (new_coins, member.id))
-            else:
-                new_coins = amount
-                await db.execute('INSERT INTO users (user_id, coins) VALUES (?, ?)', (member.id, amount))
-            
-            await db.commit()
+        await user_cache.get(member.id, create=True)
+        new_coins = (await user_cache.apply(member.id, reason="admin_add", coins=amount))["coins"]
             
         embed = discord.Embed(
             title="💰 Coins Added",
@@ -4429,7 +4114,7 @@ async def removepermission(interaction: discord.Interaction, section: str, role:
         section_display_name = "Giveaway Manager (GM)"
     
     try:
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             # Get the role ID as string for database operations
             role_id_str = str(role.id)
             
@@ -4448,54 +4133,45 @@ async def removepermission(interaction: discord.Interaction, section: str, role:
             # Get commands for this section
             commands_to_remove = ROLE_PERMISSIONS[section]
             
-            # Begin a transaction for all operations
-            await db.execute('BEGIN TRANSACTION')
+        # Remove the section assignment and its command permissions in one transaction
+        async with database.transaction() as db:
+            await db.execute('DELETE FROM role_section_assignments WHERE role_id = ? AND section_name = ?',
+                          (role_id_str, section))
             
-            try:
-                # Remove the section assignment
-                await db.execute('DELETE FROM role_section_assignments WHERE role_id = ? AND section_name = ?',
-                              (role_id_str, section))
-                
-                # Remove all command permissions that were granted through this section
-                for cmd_name in commands_to_remove:
-                    # Remove from database
-                    await db.execute('DELETE FROM command_permissions WHERE command_name = ? AND permission_value = ?', 
-                                  (cmd_name, role_id_str))
-                    
-                    # Also remove from in-memory dictionary if present
-                    if cmd_name in command_permissions and role.id in command_permissions[cmd_name]:
-                        command_permissions[cmd_name].remove(role.id)
-                
-                # Also remove from in-memory role_section_assignments
-                if role.id in role_section_assignments and section in role_section_assignments[role.id]:
-                    role_section_assignments[role.id].remove(section)
-                    # If no more sections, remove the role entirely
-                    if not role_section_assignments[role.id]:
-                        del role_section_assignments[role.id]
-                
-                # Commit all changes
-                await db.commit()
-                
-                # Send mod log
-                mod_channel = bot.get_channel(MOD_LOGS_CHANNEL)
-                if mod_channel:
-                    log_embed = discord.Embed(
-                        title="Permission Log - Section Removed",
-                        description=f"**Role:** {role.mention}\n**Section:** {section_display_name}\n**Admin:** {interaction.user.mention}",
-                        color=discord.Color.red(),
-                        timestamp=discord.utils.utcnow()
-                    )
-                    await mod_channel.send(embed=log_embed)
-                
-                await interaction.followup.send(
-                    f"✅ Removed all permissions for the {section_display_name} section from {role.mention}.\n"
-                    f"Commands removed: {', '.join(commands_to_remove)}",
-                    ephemeral=True
-                )
-            except Exception as e:
-                # If anything goes wrong, roll back all changes
-                await db.execute('ROLLBACK')
-                raise e
+            # Remove all command permissions that were granted through this section
+            for cmd_name in commands_to_remove:
+                await db.execute('DELETE FROM command_permissions WHERE command_name = ? AND permission_value = ?', 
+                              (cmd_name, role_id_str))
+        
+        # Also remove from in-memory dictionary if present
+        for cmd_name in commands_to_remove:
+            if cmd_name in command_permissions and role.id in command_permissions[cmd_name]:
+                command_permissions[cmd_name].remove(role.id)
+        
+        # Also remove from in-memory role_section_assignments
+        if role.id in role_section_assignments and section in role_section_assignments[role.id]:
+            role_section_assignments[role.id].remove(section)
+            # If no more sections, remove the role entirely
+            if not role_section_assignments[role.id]:
+                del role_section_assignments[role.id]
+        rebuild_permission_index()
+        
+        # Send mod log
+        mod_channel = bot.get_channel(MOD_LOGS_CHANNEL)
+        if mod_channel:
+            log_embed = discord.Embed(
+                title="Permission Log - Section Removed",
+                description=f"**Role:** {role.mention}\n**Section:** {section_display_name}\n**Admin:** {interaction.user.mention}",
+                color=discord.Color.red(),
+                timestamp=discord.utils.utcnow()
+            )
+            await mod_channel.send(embed=log_embed)
+        
+        await interaction.followup.send(
+            f"✅ Removed all permissions for the {section_display_name} section from {role.mention}.\n"
+            f"Commands removed: {', '.join(commands_to_remove)}",
+            ephemeral=True
+        )
             
     except Exception as e:
         await interaction.followup.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
@@ -4512,43 +4188,7 @@ async def rolelvlall(interaction: discord.Interaction):
     await interaction.response.defer()
     
     try:
-        # Get all level roles from database
-        async with aiosqlite.connect("leveling.db") as db:
-            # Get the level roles mapping
-            cursor = await db.execute('SELECT level, role_id FROM level_roles ORDER BY level')
-            level_roles_db = await cursor.fetchall()
-            
-            # If no roles in database, use the default mapping
-            if not level_roles_db:
-                # Fallback to hardcoded level roles if database is empty
-                level_roles = {
-                    5: 1339331106557657089,
-                    10: 1339332632860950589,
-                    15: 1339333949201186878,
-                    20: 1339571891848876075,
-                    25: 1339572201430454272,
-                    30: 1339572204433838142,
-                    35: 1339572206895894602,
-                    40: 1339572209848680458,
-                    45: 1339572212285575199,
-                    50: 1339572214881714176,
-                    55: 1339574559136944240,
-                    60: 1339574564685873245,
-                    65: 1339574564983804018,
-                    70: 1339574565780590632,
-                    75: 1339574566669783180,
-                    80: 1339574568276332564,
-                    85: 1339574568586842112,
-                    90: 1339574569417048085,
-                    95: 1339576526458322954,
-                    100: 1339576529377820733
-                }
-            else:
-                # Convert database results to dictionary
-                level_roles = {}
-                for lvl, role_id in level_roles_db:
-                    level_roles[lvl] = role_id
-            
+        async with database.session() as db:
             # Get all users with level 5 or higher
             cursor = await db.execute('SELECT user_id, level FROM users WHERE level >= 5')
             users = await cursor.fetchall()
@@ -4570,35 +4210,11 @@ async def rolelvlall(interaction: discord.Interaction):
                     if not member:
                         skipped_count += 1
                         continue
-                    
-                    # Find the highest level role that applies
-                    highest_applicable_level = 0
-                    for level_threshold in sorted(level_roles.keys()):
-                        if level >= level_threshold:
-                            highest_applicable_level = level_threshold
-                        else:
-                            break
-                    
-                    if highest_applicable_level > 0:
-                        # Get the appropriate role
-                        new_role = interaction.guild.get_role(level_roles[highest_applicable_level])
-                        
-                        # Remove any previous level roles
-                        roles_to_remove = []
-                        for lvl, role_id in level_roles.items():
-                            if lvl != highest_applicable_level:  # Don't remove the current level role
-                                role_obj = interaction.guild.get_role(role_id)
-                                if role_obj and role_obj in member.roles:
-                                    roles_to_remove.append(role_obj)
-                        
-                        # Remove old roles if any were found
-                        if roles_to_remove:
-                            await member.remove_roles(*roles_to_remove)
-                        
-                        # Add the new role if user doesn't already have it
-                        if new_role and new_role not in member.roles:
-                            await member.add_roles(new_role)
-                            updated_count += 1
+                    
+                    # Resolve the role from the cached level roles mapping
+                    role_level, added_role, removed_roles = await sync_level_roles(member, level)
+                    if added_role:
+                        updated_count += 1
                         
                 except Exception as e:
                     print(f"Error processing user {user_id}: {e}")
@@ -4635,9 +4251,15 @@ async def rolelvlall(interaction: discord.Interaction):
 async def resetlevel(interaction: discord.Interaction):
 
     try:
-        async with aiosqlite.connect("leveling.db") as db:
-            await db.execute('UPDATE users SET level = 1, prestige = 0, xp = 0, coins = 0, activity_coins = 0')
-            await db.commit()
+        # Write out buffered changes first so they don't land on top of the reset
+        from write_buffer import write_buffer
+        await write_buffer.flush()
+        async with write_buffer.flush_lock:
+            async with database.transaction() as db:
+                # Record the coins taken away before resetting them
+                await db.execute(INSERT_TRANSACTION_FOR_RESET, ("resetlevel", time.time()))
+                await db.execute('UPDATE users SET level = 1, prestige = 0, xp = 0, coins = 0, activity_coins = 0')
+            user_cache.clear()
 
         embed = discord.Embed(
             title="🔄 Server Reset",
@@ -4674,31 +4296,6 @@ async def lvlrole(interaction: discord.Interaction,
                   action: str, 
                   level: int = None, 
                   role: discord.Role = None):
-    # Level roles mapping (levels 5, 10, 15, etc. up to 100)
-    # We'll store it in the database but keep this copy for reference
-    level_roles_reference = {
-        5: 1339331106557657089,
-        10: 1339332632860950589,
-        15: 1339333949201186878,
-        20: 1339571891848876075,
-        25: 1339572201430454272,
-        30: 1339572204433838142,
-        35: 1339572206895894602,
-        40: 1339572209848680458,
-        45: 1339572212285575199,
-        50: 1339572214881714176,
-        55: 1339574559136944240,
-        60: 1339574564685873245,
-        65: 1339574564983804018,
-        70: 1339574565780590632,
-        75: 1339574566669783180,
-        80: 1339574568276332564,
-        85: 1339574568586842112,
-        90: 1339574569417048085,
-        95: 1339576526458322954,
-        100: 1339576529377820733
-    }
-    
     try:
         # Check if user has admin permissions
         if not interaction.user.guild_permissions.administrator and interaction.user.id not in [1308527904497340467, 479711321399623681]:
@@ -4707,7 +4304,7 @@ async def lvlrole(interaction: discord.Interaction,
             
         await interaction.response.defer(ephemeral=True)
         
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             # Create table if it doesn't exist
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS level_roles (
@@ -4760,6 +4357,7 @@ async def lvlrole(interaction: discord.Interaction,
                     (level, role.id)
                 )
                 await db.commit()
+                level_roles.invalidate()
                 
                 embed = discord.Embed(
                     title="✅ Level Role Set",
@@ -4796,6 +4394,7 @@ async def lvlrole(interaction: discord.Interaction,
                 # Remove the level role mapping
                 await db.execute('DELETE FROM level_roles WHERE level = ?', (level,))
                 await db.commit()
+                level_roles.invalidate()
                 
                 embed = discord.Embed(
                     title="🗑️ Level Role Removed",
@@ -4934,22 +4533,25 @@ async def activitystart(interaction: discord.Interaction, duration: str,
 
     # Reset activity coins with visual confirmation
     await interaction.response.defer()
-    async with aiosqlite.connect("leveling.db") as db:
-        # Reset all user activity coins
-        await db.execute('UPDATE users SET activity_coins = 0')
-        
-        # Update activity event state in database for persistence
-        end_time = discord.utils.utcnow() + timedelta(seconds=duration_seconds)
-        
-        await db.execute('''
-            UPDATE activity_event_state 
-            SET active = 1, 
-                end_time = ?, 
-                prize = ? 
-            WHERE id = 1
-        ''', (end_time.isoformat(), prize))
-        
-        await db.commit()
+    # Write out buffered changes first so they don't land on top of the reset
+    from write_buffer import write_buffer
+    await write_buffer.flush()
+    async with write_buffer.flush_lock:
+        async with database.transaction() as db:
+            # Reset all user activity coins
+            await db.execute('UPDATE users SET activity_coins = 0')
+            
+            # Update activity event state in database for persistence
+            end_time = discord.utils.utcnow() + timedelta(seconds=duration_seconds)
+            
+            await db.execute('''
+                UPDATE activity_event_state 
+                SET active = 1, 
+                    end_time = ?, 
+                    prize = ? 
+                WHERE id = 1
+            ''', (end_time.isoformat(), prize))
+        user_cache.clear()
 
     # Update in-memory state as well
     activity_event["active"] = True
@@ -4964,136 +4566,13 @@ async def activitystart(interaction: discord.Interaction, duration: str,
         timestamp=discord.utils.utcnow())
     embed.set_footer(text="✨ Start chatting to earn activity coins!")
 
-    # Store the channel where the event was started for notifications
-    event_channel = interaction.channel
-    event_message = await interaction.followup.send(embed=embed)
-    
-    # Calculate notification intervals (every 15 minutes)
-    notification_interval = 900  # 15 minutes in seconds
-    
-    # Wait for event to end with periodic notifications
-    remaining_seconds = duration_seconds
-    while remaining_seconds > 0:
-        # Special case for final minute
-        if remaining_seconds <= 60 and remaining_seconds > 0:
-            # Send a final 1-minute warning
-            final_warning_embed = discord.Embed(
-                title="⏰ FINAL WARNING!",
-                description=f"**Only 1 minute remaining** in the activity event!\n\n🎁 **Prize:** {prize}\n\n💬 Last chance to earn activity coins!",
-                color=0xFF2D74,
-                timestamp=discord.utils.utcnow()
-            )
-            await event_channel.send(embed=final_warning_embed)
-            
-            # Sleep for remaining time
-            await asyncio.sleep(remaining_seconds)
-            remaining_seconds = 0
-            continue
-        
-        # Special case for final 5 minutes
-        if remaining_seconds <= 300 and remaining_seconds > 60:
-            # Send a 5-minute warning
-            warning_embed = discord.Embed(
-                title="⏰ 5-MINUTE WARNING!",
-                description=f"**Only 5 minutes remaining** in the activity event!\n\n🎁 **Prize:** {prize}\n\n💬 Keep chatting to earn more activity coins!",
-                color=0xFFA500,  # Orange
-                timestamp=discord.utils.utcnow()
-            )
-            await event_channel.send(embed=warning_embed)
-            
-            # Set the next notification to be at 1 minute
-            sleep_time = remaining_seconds - 60
-            await asyncio.sleep(sleep_time)
-            remaining_seconds = 60
-            continue
-        
-        # Normal case: Sleep for the shorter of notification_interval or remaining_seconds
-        sleep_time = min(notification_interval, remaining_seconds)
-        await asyncio.sleep(sleep_time)
-        remaining_seconds -= sleep_time
-        
-        # If we've reached a notification point and there's still time left
-        if remaining_seconds > 0 and sleep_time == notification_interval:
-            # Format remaining time
-            hours, remainder = divmod(remaining_seconds, 3600)
-            minutes, seconds = divmod(remainder, 60)
-            
-            if hours > 0:
-                time_format = f"{hours}h {minutes}m"
-            elif minutes > 0:
-                time_format = f"{minutes}m {seconds}s"
-            else:
-                time_format = f"{seconds}s"
-            
-            # Get current activity leaderboard top 3
-            async with aiosqlite.connect("leveling.db") as db:
-                cursor = await db.execute('''
-                    SELECT user_id, activity_coins 
-                    FROM users 
-                    WHERE activity_coins > 0 
-                    ORDER BY activity_coins DESC LIMIT 3
-                ''')
-                top_users = await cursor.fetchall()
-            
-            # Format leaderboard
-            leaderboard_text = ""
-            if top_users:
-                for i, (user_id, coins) in enumerate(top_users):
-                    try:
-                        user = await bot.fetch_user(user_id)
-                        username = user.display_name
-                    except:
-                        username = f"User {user_id}"
-                    
-                    medal = ["🥇", "🥈", "🥉"][i]
-                    leaderboard_text += f"{medal} **{username}**: {coins} coins\n"
-            else:
-                leaderboard_text = "No participants yet!"
-                
-            # Send notification with time remaining and current top 3
-            reminder_embed = discord.Embed(
-                title="⏰ ACTIVITY EVENT REMINDER",
-                description=f"**{time_format} remaining** in the current activity event!\n\n🎁 **Prize:** {prize}\n\n📊 **Current Leaders:**\n{leaderboard_text}\n\n💬 Keep chatting to earn more activity coins!",
-                color=0x2F3136,
-                timestamp=discord.utils.utcnow()
-            )
-            
-            await event_channel.send(embed=reminder_embed)
-    
-    # Update both in-memory and database state
-    activity_event["active"] = False
-    activity_event["end_time"] = None
-    activity_event["prize"] = None
-    
-    # Update database
-    async with aiosqlite.connect("leveling.db") as db:
-        await db.execute('''
-            UPDATE activity_event_state 
-            SET active = 0, 
-                end_time = NULL, 
-                prize = NULL 
-            WHERE id = 1
-        ''')
-        await db.commit()
-
-    # Get final results
-    async with aiosqlite.connect("leveling.db") as db:
-        cursor = await db.execute(
-            'SELECT user_id, activity_coins FROM users ORDER BY activity_coins DESC LIMIT 1'
-        )
-        winner = await cursor.fetchone()
-
-    if winner:
-        user = await bot.fetch_user(winner[0])
-        coins = int(winner[1])
-
-        result_embed = discord.Embed(
-            title="🎊 ACTIVITY EVENT ENDED!",
-            description=
-            f"```diff\n+ Congratulations to our winner!\n```\n👑 **Winner:** {user.mention}\n🎁 **Prize:** {prize}\n💰 **Coins Earned:** {coins}",
-            color=0xFF2D74,
-            timestamp=discord.utils.utcnow())
-        await interaction.channel.send(embed=result_embed)
+    # Reminders and the end of the event are scheduled jobs, so they survive a restart
+    await interaction.followup.send(embed=embed)
+    payload = {"channel_id": interaction.channel.id, "prize": prize, "end_time": end_time.isoformat()}
+    first_reminder = time.time() if duration_seconds <= 300 else next_activity_reminder(time.time(), end_time.timestamp())
+    if first_reminder is not None:
+        await scheduler.schedule("activity_event_reminder", first_reminder, payload)
+    await scheduler.schedule("activity_event_end", end_time.timestamp(), payload)
 
 # Tasks are started in the on_ready function
 # Note: The XP drop event task is defined earlier in this file
@@ -5161,7 +4640,7 @@ class VoiceQuestModal(discord.ui.Modal, title="Configure Voice Quest"):
                 return
                 
             # Save quest to database
-            async with aiosqlite.connect("leveling.db") as db:
+            async with database.session() as db:
                 # Deactivate any existing voice quests
                 await db.execute('UPDATE daily_quests SET active = 0 WHERE quest_type = "voice" AND active = 1')
                 
@@ -5231,7 +4710,7 @@ class ChatQuestModal(discord.ui.Modal, title="Configure Chat Quest"):
                 return
                 
             # Save quest to database
-            async with aiosqlite.connect("leveling.db") as db:
+            async with database.session() as db:
                 # Deactivate any existing chat quests
                 await db.execute('UPDATE daily_quests SET active = 0 WHERE quest_type = "chat" AND active = 1')
                 
@@ -5301,7 +4780,7 @@ class InviteQuestModal(discord.ui.Modal, title="Configure Invite Quest"):
                 return
                 
             # Save quest to database
-            async with aiosqlite.connect("leveling.db") as db:
+            async with database.session() as db:
                 # Deactivate any existing invite quests
                 await db.execute('UPDATE daily_quests SET active = 0 WHERE quest_type = "invite" AND active = 1')
                 
@@ -5370,7 +4849,7 @@ class ReactionQuestModal(discord.ui.Modal, title="Configure Reaction Quest"):
                 return
                 
             # Save quest to database
-            async with aiosqlite.connect("leveling.db") as db:
+            async with database.session() as db:
                 # Deactivate any existing reaction quests
                 await db.execute('UPDATE daily_quests SET active = 0 WHERE quest_type = "reaction" AND active = 1')
                 
@@ -5415,7 +4894,7 @@ class DailyQuestView(discord.ui.View):
             return
             
         # Check if the user has completed any quests that haven't been claimed
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             cursor = await db.execute('''
                 SELECT
                     q.rowid AS quest_id,
@@ -5447,17 +4926,19 @@ class DailyQuestView(discord.ui.View):
         # Respond to the interaction before any database operations
         await interaction.response.defer()
         
-        # Award the rewards
-        async with aiosqlite.connect("leveling.db") as db:
+        # Mark the quests as claimed in one transaction. A quest that another
+        # click already claimed is skipped, so its rewards are only given once
+        async with database.transaction() as db:
             for quest in completed_quests:
                 quest_id, quest_type, goal, xp_reward, coin_reward, progress, completed = quest
                 
-                # Mark as claimed
-                await db.execute('''
+                cursor = await db.execute('''
                     UPDATE user_quest_progress
                     SET claimed = 1
-                    WHERE user_id = ? AND quest_id = ?
+                    WHERE user_id = ? AND quest_id = ? AND claimed = 0
                 ''', (self.user_id, quest_id))
+                if cursor.rowcount == 0:
+                    continue
                 
                 total_xp += xp_reward
                 total_coins += coin_reward
@@ -5468,123 +4949,52 @@ class DailyQuestView(discord.ui.View):
                     "xp": xp_reward,
                     "coins": coin_reward
                 })
-            
-            # Update user level, XP and coins
-            # First get current user stats
-            cursor = await db.execute(
-                'SELECT level, prestige, xp, coins FROM users WHERE user_id = ?',
-                (self.user_id,)
-            )
-            user_data = await cursor.fetchone()
-            
-            if user_data is None:
-                # User doesn't exist in database, create a new record with level up from rewards
-                # Calculate how many levels to add based on total XP
-                new_level = 1
-                remaining_xp = total_xp
-                xp_needed_for_next = calculate_xp_needed(new_level)
-                levels_gained = 0
-                level_up_coins = 0
-                
-                while remaining_xp >= xp_needed_for_next:
-                    remaining_xp -= xp_needed_for_next
-                    new_level += 1
-                    levels_gained += 1
-                    level_up_coins += xp_settings.get("level_up_coins", 150)  # Get coins per level from settings
-                    xp_needed_for_next = calculate_xp_needed(new_level)
-                
-                # Add level-up coins to total coins
-                total_with_level_coins = total_coins + level_up_coins
-                
-                await db.execute(
-                    'INSERT INTO users (user_id, level, prestige, xp, coins) VALUES (?, ?, 0, ?, ?)',
-                    (self.user_id, new_level, remaining_xp, total_with_level_coins)
-                )
-                level, prestige, xp, coins = new_level, 0, remaining_xp, total_with_level_coins
-                
-                # Send level up notification
-                if levels_gained > 0:
-                    # Create a rich embed for level up
-                    embed = discord.Embed(
-                        title="🎊 LEVEL UP! 🎊",
-                        description=f"<@{self.user_id}> has reached **level {new_level}**!",
-                        color=discord.Color.gold()
-                    )
-                    embed.set_thumbnail(url=interaction.user.display_avatar.url)
-                    embed.add_field(name="Quest Rewards", 
-                                    value=f"✨ +{total_xp} XP\n🪙 +{total_coins} Coins from quests\n🎊 +{level_up_coins} Coins from leveling up!", 
-                                    inline=False)
-                    
-                    # Send to the current channel
-                    await interaction.channel.send(embed=embed)
-                    
-                    # Try to send to the dedicated level-up announcements channel if it exists
-                    level_channel = bot.get_channel(1348430879363735602)  # XP level up channel
-                    if level_channel and level_channel.id != interaction.channel.id:
-                        await level_channel.send(embed=embed)
+        
+        if not quest_details:
+            await interaction.followup.send("❌ These quest rewards were already claimed!", ephemeral=True)
+            return
+        
+        # Update user level, XP and coins through the leveling engine
+        result = await grant_xp(self.user_id, total_xp, coins=total_coins, reason="quest_reward")
+        level, prestige, xp, coins = result["level"], result["prestige"], result["xp"], result["coins"]
+        old_level = level - result["levels_gained"]
+        level_up_coins = result["coins_awarded"]
+        
+        # Send level up notification if the user leveled up
+        if result["levels_gained"] > 0:
+            # Create a rich embed for level up
+            if result["prestiges_gained"]:
+                description = f"<@{self.user_id}> reached **Prestige {prestige}** and is now **level {level}**!"
             else:
-                level, prestige, xp, coins = user_data
-                old_level = level
-                
-                # Add coins right away
-                new_coins = coins + total_coins
-                
-                # Calculate level ups and rewards
-                old_level = level
-                levels_gained = 0
-                level_up_coins = 0
-                new_xp = xp + total_xp
-                
-                # Check for level ups based on new XP
-                while new_xp >= calculate_xp_needed(level):
-                    new_xp -= calculate_xp_needed(level)
-                    level += 1
-                    levels_gained += 1
-                    level_up_coins += xp_settings.get("level_up_coins", 150)  # Get coins per level from settings
-                
-                # Add both quest coins and level-up coins
-                total_with_level_coins = total_coins + level_up_coins
-                new_coins = coins + total_with_level_coins
-                
-                # Update the user's record
-                await db.execute(
-                    'UPDATE users SET level = ?, xp = ?, coins = ? WHERE user_id = ?',
-                    (level, new_xp, new_coins, self.user_id)
-                )
-                
-                # Send level up notification if level increased
-                if level > old_level:
-                    # Create a rich embed for level up
-                    embed = discord.Embed(
-                        title="🎊 LEVEL UP! 🎊",
-                        description=f"<@{self.user_id}> has advanced from level {old_level} to **level {level}**!",
-                        color=discord.Color.gold()
-                    )
-                    embed.set_thumbnail(url=interaction.user.display_avatar.url)
-                    embed.add_field(name="Quest Rewards", 
-                                   value=f"✨ +{total_xp} XP\n🪙 +{total_coins} Coins from quests\n🎊 +{level_up_coins} Coins from leveling up!", 
-                                   inline=False)
-                    
-                    # Calculate new benefits or unlocks if any
-                    level_benefits = ""
-                    if level % 5 == 0:  # Every 5 levels
-                        level_benefits = f"🏆 You've reached a milestone level! Special perks may be available."
-                    
-                    if level_benefits:
-                        embed.add_field(name="Level Benefits", value=level_benefits, inline=False)
-                    
-                    # Send to the current channel
-                    await interaction.channel.send(embed=embed)
-                    
-                    # Try to send to the dedicated level-up announcements channel if it exists
-                    level_channel = bot.get_channel(1348430879363735602)  # XP level up channel
-                    if level_channel and level_channel.id != interaction.channel.id:
-                        await level_channel.send(embed=embed)
-                
-            await db.commit()
+                description = f"<@{self.user_id}> has advanced from level {old_level} to **level {level}**!"
+            embed = discord.Embed(
+                title="🎊 LEVEL UP! 🎊",
+                description=description,
+                color=discord.Color.gold()
+            )
+            embed.set_thumbnail(url=interaction.user.display_avatar.url)
+            embed.add_field(name="Quest Rewards", 
+                           value=f"✨ +{total_xp} XP\n🪙 +{total_coins} Coins from quests\n🎊 +{level_up_coins} Coins from leveling up!", 
+                           inline=False)
+            
+            # Calculate new benefits or unlocks if any
+            level_benefits = ""
+            if level % 5 == 0:  # Every 5 levels
+                level_benefits = f"🏆 You've reached a milestone level! Special perks may be available."
+            
+            if level_benefits:
+                embed.add_field(name="Level Benefits", value=level_benefits, inline=False)
+            
+            # Send to the current channel
+            await interaction.channel.send(embed=embed)
+            
+            # Try to send to the dedicated level-up announcements channel if it exists
+            level_channel = bot.get_channel(1348430879363735602)  # XP level up channel
+            if level_channel and level_channel.id != interaction.channel.id:
+                await level_channel.send(embed=embed)
         
         # Send a message with the rewards
-        reward_message = f"🎉 You've claimed rewards from {len(completed_quests)} quests!\n\n"
+        reward_message = f"🎉 You've claimed rewards from {len(quest_details)} quests!\n\n"
         reward_message += f"**Total Rewards:**\n"
         reward_message += f"✨ XP: +{total_xp}\n"
         reward_message += f"🪙 Coins: +{total_coins} from quests\n"
@@ -5614,7 +5024,7 @@ class DailyQuestView(discord.ui.View):
         
         # If we don't have quest data, we need to fetch it
         if not self.quest_data:
-            async with aiosqlite.connect("leveling.db") as db:
+            async with database.session() as db:
                 cursor = await db.execute('''
                     SELECT
                         p.quest_id,
@@ -5643,7 +5053,7 @@ class DailyQuestView(discord.ui.View):
         
         # Update all quests to be completed
         updated = False
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             for quest in quests_to_update:
                 quest_id = quest[0]
                 goal_amount = quest[2]
@@ -5853,7 +5263,7 @@ async def editleveling(interaction: discord.Interaction):
             print(f"⚠️ Warning: Fallback reset also failed: {reset_error}")
 
         # Even if the repair functions failed, attempt to create the table directly
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             try:
                 print("Creating leveling_settings table directly as final fallback...")
                 # Force create the table if it doesn't exist
@@ -5945,6 +5355,8 @@ async def editleveling(interaction: discord.Interaction):
                         
                     # Convert to dict and update global xp_settings
                     settings = dict(settings_list)
+                    # The repair may have changed the table, so refresh the settings cache
+                    leveling_settings.update(settings)
                     xp_settings = settings.copy()  # Update the global settings
                     print(f"✅ Loaded settings: {xp_settings}")
                 except Exception as select_error:
@@ -6075,36 +5487,20 @@ async def editleveling(interaction: discord.Interaction):
                     raise ValueError("Value must be positive")
                 
                 # Import our settings manager
-                from leveling_settings_manager import save_setting, load_settings, backup_database
+                from leveling_settings_manager import backup_database
                 
                 # Create a backup first for safety
                 await backup_database()
                 
-                # Save the setting using our manager
+                # Save the setting using our manager; the settings cache updates
+                # xp_settings, xp_config and voice_rewards once it is saved
                 success = await save_setting(self.setting, new_value)
                 if not success:
                     raise Exception(f"Failed to save setting {self.setting}")
                 
-                # Reload all settings to ensure consistency
-                updated_settings = await load_settings()
-                
-                # Update both the global variable and the class attribute
-                global xp_settings
-                xp_settings.update(updated_settings)  # Update in place to ensure all references are updated
+                updated_settings = leveling_settings.as_dict()
                 SettingData.current_settings = updated_settings.copy()
                 
-                # Also update specific settings for backward compatibility
-                if self.setting == "xp_min":
-                    xp_config["min_xp"] = new_value
-                elif self.setting == "xp_max":
-                    xp_config["max_xp"] = new_value
-                elif self.setting == "cooldown_seconds": 
-                    xp_config["cooldown"] = new_value
-                elif self.setting == "voice_xp_per_minute":
-                    voice_rewards["xp_per_minute"] = new_value
-                elif self.setting == "voice_coins_per_minute":
-                    voice_rewards["coins_per_minute"] = new_value
-                
                 print(f"✅ Updated {self.setting} to {new_value}. New settings: {xp_settings}")
                 
                 # Create a new embed with updated settings
@@ -6212,47 +5608,30 @@ async def payvoicetime(interaction: discord.Interaction, member: discord.Member
     try:
         await interaction.response.defer(ephemeral=True)
         
-        async with aiosqlite.connect("leveling.db") as db:
-            # Check if user exists
-            cursor = await db.execute('SELECT level, xp FROM users WHERE user_id = ?', (member.id,))
-            user_data = await cursor.fetchone()
+        # Check if user exists
+        is_new_user = await user_cache.get(member.id) is None
+        
+        # Add the XP and coins through the leveling engine so level-ups are applied
+        result = await grant_xp(member.id, xp_to_add, coins=coins_to_add, reason="voice")
+        
+        if is_new_user:
+            await interaction.followup.send(
+                f"✅ Added {coins_to_add} coins and {xp_to_add} XP to {member.mention} for {hours}h {minutes}m of voice time.\n"
+                f"(Created new user record as they didn't exist in the database)",
+                ephemeral=True
+            )
+        else:
+            await interaction.followup.send(
+                f"✅ Added {coins_to_add} coins and {xp_to_add} XP to {member.mention} for {hours}h {minutes}m of voice time.",
+                ephemeral=True
+            )
             
-            if not user_data:
-                # Create user if they don't exist
-                await db.execute(
-                    'INSERT INTO users (user_id, level, xp, coins) VALUES (?, ?, ?, ?)',
-                    (member.id, 1, xp_to_add, coins_to_add)
-                )
-                await db.commit()
-                
-                await interaction.followup.send(
-                    f"✅ Added {coins_to_add} coins and {xp_to_add} XP to {member.mention} for {hours}h {minutes}m of voice time.\n"
-                    f"(Created new user record as they didn't exist in the database)",
-                    ephemeral=True
-                )
-            else:
-                # Update existing user
-                await db.execute(
-                    'UPDATE users SET coins = coins + ?, xp = xp + ? WHERE user_id = ?',
-                    (coins_to_add, xp_to_add, member.id)
-                )
-                await db.commit()
-                
-                await interaction.followup.send(
-                    f"✅ Added {coins_to_add} coins and {xp_to_add} XP to {member.mention} for {hours}h {minutes}m of voice time.",
-                    ephemeral=True
-                )
-                
-            # Try to notify the user via DM
-            try:
-                user = await bot.fetch_user(member.id)
-                if user:
-                    await user.send(
-                        f"🎙️ You've been awarded {coins_to_add} coins and {xp_to_add} XP for {hours}h {minutes}m of voice time!"
-                    )
-            except Exception as e:
-                print(f"Failed to send DM to {member.name}: {e}")
-    
+        # Notify the user via DM
+        outbox.send_dm(
+            member.id,
+            f"🎙️ You've been awarded {coins_to_add} coins and {xp_to_add} XP for {hours}h {minutes}m of voice time!"
+        )
+
     except Exception as e:
         await interaction.followup.send(f"❌ An error occurred: {e}", ephemeral=True)
         print(f"Error in payvoicetime command: {e}")
@@ -6260,7 +5639,7 @@ async def payvoicetime(interaction: discord.Interaction, member: discord.Member
 @bot.tree.command(name="removedq", description="Remove an existing daily quest")
 async def removedq(interaction: discord.Interaction):
     # Check if there are any active quests to remove
-    async with aiosqlite.connect("leveling.db") as db:
+    async with database.session() as db:
         cursor = await db.execute('''
             SELECT 
                 rowid, 
@@ -6384,7 +5763,7 @@ async def removedq(interaction: discord.Interaction):
         @discord.ui.button(label="Confirm Removal", style=discord.ButtonStyle.danger)
         async def confirm(self, interaction: discord.Interaction, button: discord.ui.Button):
             try:
-                async with aiosqlite.connect("leveling.db") as db:
+                async with database.transaction() as db:
                     # First, deactivate the quest
                     await db.execute('''
                         UPDATE daily_quests 
@@ -6398,8 +5777,6 @@ async def removedq(interaction: discord.Interaction):
                         SET completed = 1, claimed = 1
                         WHERE quest_id = ? AND completed = 0
                     ''', (self.quest_id,))
-                    
-                    await db.commit()
                 
                 success_embed = discord.Embed(
                     title="✅ Quest Removed",
@@ -6430,7 +5807,7 @@ async def check_daily_quests(user_id, channel=None, user=None, interaction=None)
     
     try:
         # Check if user has active quests
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             # Get all active quests from the system
             cursor = await db.execute('SELECT daily_quests.rowid, quest_type, goal_amount, xp_reward, coin_reward FROM daily_quests WHERE active = 1')
             active_quests = await cursor.fetchall()
@@ -6620,34 +5997,15 @@ async def on_reaction_add(reaction, user):
     # Ignore bot reactions
     if user.bot:
         return
-        
-    # Get the current date/time
-    today = datetime.now().strftime("%Y-%m-%d")
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
-    # Use the database pool for more reliable access
-    try:
-        from db_pool import get_db_pool
-        db_pool = await get_db_pool()
+    # Hand the reaction to whichever drop is waiting for it
+    reaction_router.dispatch(reaction, user)
         
-        # Track daily reaction count in server_stats 
-        await db_pool.execute('''
-            INSERT INTO server_stats (date, reaction_count, last_updated)
-            VALUES (?, 1, ?)
-            ON CONFLICT(date) DO UPDATE SET
-            reaction_count = reaction_count + 1,
-            last_updated = ?
-        ''', (today, current_time, current_time))
-        
-        # Store individual user reaction data
-        emoji_str = str(reaction.emoji)
-        message_id = reaction.message.id
-        
-        # Store in user_reactions table for tracking
-        await db_pool.execute('''
-            INSERT INTO user_reactions (user_id, message_id, emoji, timestamp)
-            VALUES (?, ?, ?, ?)
-        ''', (user.id, message_id, emoji_str, current_time))
+    # Store the reaction, its server_stats count and the rollups through the write buffer
+    try:
+        from write_buffer import get_write_buffer
+        write_buffer = await get_write_buffer()
+        write_buffer.log_reaction(user.id, reaction.message.id, str(reaction.emoji))
     except Exception as e:
         print(f"Error recording reaction data: {e}")
     
@@ -6658,7 +6016,7 @@ async def on_reaction_add(reaction, user):
         db_pool = await get_db_pool()
         
         # Check if the user has an active reaction quest
-        cursor = await db_pool.execute('''
+        quest_data = await db_pool.fetchone('''
                 SELECT
                     p.quest_id,
                     q.goal_amount,
@@ -6673,8 +6031,6 @@ async def on_reaction_add(reaction, user):
                     AND p.expires_at > ? AND p.completed = 0
             ''', (user.id, datetime.now().timestamp()))
         
-        quest_data = await cursor.fetchone()
-        
         if quest_data:
             quest_id, goal, current_progress, completed = quest_data
             
@@ -6690,14 +6046,11 @@ async def on_reaction_add(reaction, user):
                 
             # Send notification when quest is completed
             if is_completed and not completed:
-                try:
-                    await user.send(
-                        f"🎉 **Quest Completed!** You've completed your daily reaction quest! "
-                        f"Use the /dailyquest command to view and claim your rewards."
-                    )
-                except:
-                    # Can't DM the user, continue silently
-                    pass
+                outbox.send_dm(
+                    user.id,
+                    f"🎉 **Quest Completed!** You've completed your daily reaction quest! "
+                    f"Use the /dailyquest command to view and claim your rewards."
+                )
     except Exception as e:
         print(f"Error tracking reaction quest progress: {e}")
 
@@ -6729,7 +6082,7 @@ async def on_voice_state_update(member, before, after):
         
         # Save to database for persistence across restarts
         try:
-            async with aiosqlite.connect("leveling.db") as db:
+            async with database.session() as db:
                 await db.execute('''
                     INSERT OR REPLACE INTO voice_sessions
                     (user_id, channel_id, guild_id, join_time)
@@ -6747,7 +6100,7 @@ async def on_voice_state_update(member, before, after):
         
         # Remove from database when they leave
         try:
-            async with aiosqlite.connect("leveling.db") as db:
+            async with database.session() as db:
                 await db.execute('''
                     DELETE FROM voice_sessions WHERE user_id = ?
                 ''', (member.id,))
@@ -6766,22 +6119,13 @@ async def on_voice_state_update(member, before, after):
                 voice_xp = int(duration // 60) * 2  # 2 XP per minute
                 
                 if voice_coins > 0 or voice_xp > 0:  # Only update if they earned at least something
-                    async with aiosqlite.connect("leveling.db") as db:
+                    if await user_cache.get(member.id) is not None:
                         # Update both XP and coins at once
-                        await db.execute(
-                            'UPDATE users SET coins = coins + ?, xp = xp + ? WHERE user_id = ?',
-                            (voice_coins, voice_xp, member.id))
-                        await db.commit()
+                        await user_cache.apply(member.id, reason="voice", coins=voice_coins, xp=voice_xp)
                         print(f"Added {voice_coins} coins and {voice_xp} XP to {member.name} for {duration:.1f} seconds in voice channel")
                         
-                        # Try to send a DM about the rewards
-                        try:
-                            user = await bot.fetch_user(member.id)
-                            if user:
-                                await user.send(f"🎙️ Thanks for being active in voice channels! You earned {voice_coins} coins and {voice_xp} XP for spending {int(duration // 60)} minutes in voice chat.")
-                        except Exception as dm_error:
-                            # Don't worry if DM fails
-                            print(f"Failed to send voice rewards DM to {member.name}: {dm_error}")
+                        # Send a DM about the rewards
+                        outbox.send_dm(member.id, f"🎙️ Thanks for being active in voice channels! You earned {voice_coins} coins and {voice_xp} XP for spending {int(duration // 60)} minutes in voice chat.")
             except Exception as e:
                 print(f"Error in voice activity tracking: {e}")
             
@@ -6806,50 +6150,41 @@ async def on_voice_state_update(member, before, after):
                         # No longer track voice activity for activity events - only count messages
                         activity_coins_earned = 0  # Always 0 to follow "1 message = 1 coin" rule
                         
-                        async with aiosqlite.connect("leveling.db") as db:
-                            # Get current user data
-                            cursor = await db.execute('SELECT level, xp, coins, prestige FROM users WHERE user_id = ?', (member.id,))
-                            user_data = await cursor.fetchone()
-                            
+                        # Get current user data from the shared user cache
+                        user_data = await user_cache.get(member.id)
+                        
+                        async with database.session() as db:
                             if user_data:
-                                level, xp, coins, prestige = user_data
+                                level, xp, coins, prestige = user_data["level"], user_data["xp"], user_data["coins"], user_data["prestige"]
                                 
                                 # Update XP and coins
                                 new_xp = xp + xp_earned
                                 new_coins = coins + coins_earned
                                 
-                                # Check for level up
-                                xp_needed = calculate_xp_needed(level)
-                                new_level = level
+                                # Resolve level-ups and prestige through the leveling engine
                                 level_up_message = ""
-                                levels_gained = 0
-                                coins_for_leveling = 0
-                                
-                                # Get level up coins from database settings
                                 level_up_coins = xp_settings.get("level_up_coins", 150)  # Default to 150 if not found
+                                result = resolve_level_ups(level, prestige, new_xp)
+                                new_level, new_xp = result["level"], result["xp"]
+                                levels_gained = result["levels_gained"]
+                                coins_for_leveling = result["coins_awarded"]
                                 
-                                while new_xp >= xp_needed:
-                                    new_xp -= xp_needed
-                                    new_level += 1
-                                    levels_gained += 1
-                                    coins_for_leveling += level_up_coins  # Add dynamic coins per level gained
-                                    
-                                    # Check for prestige (at level 101)
-                                    if new_level == 101:
-                                        new_level = 1
-                                        prestige += 1
-                                        level_up_message = f"🌟 **PRESTIGE UP!** 🌟\n{member.mention} advanced to Prestige {prestige}! (+{level_up_coins} 🪙)"
-                                        
-                                    # Update XP needed for next level
-                                    xp_needed = calculate_xp_needed(new_level)
+                                if result["prestiges_gained"]:
+                                    prestige = result["prestige"]
+                                    level_up_message = f"🌟 **PRESTIGE UP!** 🌟\n{member.mention} advanced to Prestige {prestige}! (+{level_up_coins} 🪙)"
                                 
                                 # Add leveling coins to total coins
                                 new_coins += coins_for_leveling
                                 
-                                # Update the database with all values
-                                await db.execute(
-                                    'UPDATE users SET level = ?, xp = ?, coins = ?, prestige = ?, activity_coins = activity_coins + ? WHERE user_id = ?',
-                                    (new_level, new_xp, new_coins, prestige, activity_coins_earned, member.id)
+                                # Update the cached user with all values
+                                await user_cache.apply(
+                                    member.id,
+                                    reason="voice",
+                                    level=new_level - level,
+                                    xp=new_xp - xp,
+                                    coins=new_coins - coins,
+                                    prestige=prestige - user_data["prestige"],
+                                    activity_coins=activity_coins_earned
                                 )
                                 
                                 # Initialize level_channel variable
@@ -6869,9 +6204,12 @@ async def on_voice_state_update(member, before, after):
                                     
                             else:
                                 # Create new user entry with activity coins
-                                await db.execute(
-                                    'INSERT INTO users (user_id, level, xp, coins, prestige, activity_coins) VALUES (?, ?, ?, ?, ?, ?)',
-                                    (member.id, 1, xp_earned, coins_earned, 0, activity_coins_earned)
+                                await user_cache.apply(
+                                    member.id,
+                                    reason="voice",
+                                    xp=xp_earned,
+                                    coins=coins_earned,
+                                    activity_coins=activity_coins_earned
                                 )
                             
                             # Update voice quest progress
@@ -6914,28 +6252,21 @@ async def on_voice_state_update(member, before, after):
                             
                             # Send notification about XP and coins earned if substantial amount
                             if minutes_spent >= 5:  # Only notify for 5+ minutes
-                                try:
-                                    # Add level up info to the DM message if applicable
-                                    level_info = ""
-                                    if levels_gained > 0:
-                                        level_info = f"\n🎊 You've leveled up to level {new_level}! (+{coins_for_leveling} 🪙 for leveling up)"
-                                    
-                                    # DM the user
-                                    await member.send(f"You earned {xp_earned} XP and {coins_earned} coins for spending {minutes_spent} minutes in voice channels! ({voice_rewards['xp_per_minute']} XP and {voice_rewards['coins_per_minute']} coin per minute){level_info}")
-                                except Exception as e:
-                                    # Failed to DM, ignore
-                                    print(f"Failed to DM {member.name}: {e}")
+                                # Add level up info to the DM message if applicable
+                                level_info = ""
+                                if levels_gained > 0:
+                                    level_info = f"\n🎊 You've leveled up to level {new_level}! (+{coins_for_leveling} 🪙 for leveling up)"
+                                
+                                # DM the user
+                                outbox.send_dm(member.id, f"You earned {xp_earned} XP and {coins_earned} coins for spending {minutes_spent} minutes in voice channels! ({voice_rewards['xp_per_minute']} XP and {voice_rewards['coins_per_minute']} coin per minute){level_info}")
                                 
                                 # Send notification when quest is completed
                                 if is_completed and not completed:
-                                    try:
-                                        await member.send(
-                                            f"🎉 **Quest Completed!** You've completed your daily voice quest! "
-                                            f"Use the /dailyquest command to view and claim your rewards."
-                                        )
-                                    except:
-                                        # Can't DM the user, continue silently
-                                        pass
+                                    outbox.send_dm(
+                                        member.id,
+                                        f"🎉 **Quest Completed!** You've completed your daily voice quest! "
+                                        f"Use the /dailyquest command to view and claim your rewards."
+                                    )
                 
                 # Clean up the tracker
                 del voice_time_tracker[member.id]
@@ -6952,80 +6283,34 @@ async def on_voice_state_update(member, before, after):
 
 @bot.tree.command(name="serverstats", description="View server message and user activity statistics")
 async def serverstats(interaction: discord.Interaction):
-    today = datetime.now().strftime("%Y-%m-%d")
+    # Message timestamps and the rollups are kept in UTC
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     current_time = datetime.now().strftime("%H:%M:%S")
     
-    async with aiosqlite.connect("leveling.db") as db:
-        # Get today's message count from message_log for persistence across bot restarts
-        cursor = await db.execute('''
-            SELECT COUNT(*) 
-            FROM message_log 
-            WHERE DATE(timestamp) = DATE('now')
-        ''')
-        today_message_count = await cursor.fetchone()
-        today_message_count = today_message_count[0] if today_message_count else 0
-        
-        # Get today's reaction count from server_stats
-        cursor = await db.execute('SELECT reaction_count, last_updated FROM server_stats WHERE date = ?', (today,))
-        reaction_stats = await cursor.fetchone()
-        
-        if not reaction_stats:
-            reaction_count = 0
-            last_updated = None
-        else:
-            reaction_count = reaction_stats[0]
-            last_updated = reaction_stats[1]
-        
-        # Get total server statistics (all time)
-        cursor = await db.execute('SELECT COUNT(*) FROM message_log')
-        total_messages = await cursor.fetchone()
-        total_messages = total_messages[0] if total_messages else 0
-        
-        cursor = await db.execute('SELECT SUM(reaction_count) FROM server_stats')
-        total_reactions = await cursor.fetchone()
-        total_reactions = total_reactions[0] if total_reactions and total_reactions[0] is not None else 0
-        
-        # Get user count statistics
-        cursor = await db.execute('SELECT COUNT(*) FROM users')
-        user_count = await cursor.fetchone()
-        user_count = user_count[0] if user_count else 0
-        
-        # Get active users (users who sent at least one message today)
-        cursor = await db.execute('''
-            SELECT COUNT(DISTINCT user_id) 
-            FROM message_log 
-            WHERE DATE(timestamp) = DATE('now')
-        ''')
-        active_users = await cursor.fetchone()
-        active_users = active_users[0] if active_users else 0
-        
-        # Get message statistics by hour for today
-        cursor = await db.execute('''
-            SELECT strftime('%H', timestamp) as hour, COUNT(*) 
-            FROM message_log 
-            WHERE DATE(timestamp) = DATE('now') 
-            GROUP BY hour 
-            ORDER BY hour
-        ''')
-        hourly_stats = await cursor.fetchall()
-        
-        # Calculate most active hour
-        most_active_hour = max(hourly_stats, key=lambda x: x[1]) if hourly_stats else (None, 0)
-        
-        # Get the most recent update time
-        cursor = await db.execute('''
-            SELECT MAX(timestamp) 
-            FROM message_log
-        ''')
-        most_recent = await cursor.fetchone()
-        most_recent_timestamp = most_recent[0] if most_recent and most_recent[0] else None
+    # Read today's and all-time stats from the rollups instead of the raw logs
+    day_stats = await stats_rollups.get_day_stats(today)
+    today_message_count = day_stats["message_count"]
+    reaction_count = day_stats["reaction_count"]
+    active_users = day_stats["active_users"]
+    
+    totals = await stats_rollups.get_totals()
+    total_messages = totals["message_count"]
+    total_reactions = totals["reaction_count"]
+    most_recent_timestamp = totals["last_message_at"]
+    
+    # Get user count statistics
+    user_count = await database.fetchval('SELECT COUNT(*) FROM users', default=0)
+    
+    # Get message statistics by hour for today and the most active hour
+    hourly_stats = await stats_rollups.get_hourly_messages(today)
+    most_active_hour = max(hourly_stats, key=lambda x: x[1]) if hourly_stats else (None, 0)
             
     # Format the last updated time and calculate time since last update
     if most_recent_timestamp:
         last_updated_text = most_recent_timestamp
         try:
             last_updated_time = datetime.strptime(most_recent_timestamp, "%Y-%m-%d %H:%M:%S")
-            now = datetime.now()
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
             diff = now - last_updated_time
             hours, remainder = divmod(diff.seconds, 3600)
             minutes, seconds = divmod(remainder, 60)
@@ -7081,20 +6366,23 @@ async def resetstats(interaction: discord.Interaction):
         await interaction.response.send_message("❌ Only Staff can reset server stats!", ephemeral=True)
         return
         
-    today = datetime.now().strftime("%Y-%m-%d")
-    today_start = f"{today} 00:00:00"
-    today_end = f"{today} 23:59:59"
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    tomorrow = (datetime.now(timezone.utc) + timedelta(days=1)).strftime("%Y-%m-%d")
     
-    async with aiosqlite.connect("leveling.db") as db:
+    # Write out buffered messages and reactions first so they are reset too
+    from write_buffer import write_buffer
+    await write_buffer.flush()
+    
+    async with database.transaction() as db:
         # Delete today's message logs for complete reset
         await db.execute('''
             DELETE FROM message_log
-            WHERE timestamp BETWEEN ? AND ?
-        ''', (today_start, today_end))
+            WHERE timestamp >= ? AND timestamp < ?
+        ''', (today, tomorrow))
         
-        # Also reset server_stats for consistency
+        # Also reset server_stats and the rollups for consistency
         await db.execute('DELETE FROM server_stats WHERE date = ?', (today,))
-        await db.commit()
+        await stats_rollups.reset_day(db, today)
         
     await interaction.response.send_message("✅ Today's server stats have been reset! Message logs and reaction counts for today have been cleared.", ephemeral=True)
 
@@ -7115,35 +6403,44 @@ async def useractivity(interaction: discord.Interaction, member: discord.Member
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
         # Get message count (total and recent)
-        cursor = await db_pool.execute('''
+        total_messages = await db_pool.fetchone('''
             SELECT COUNT(*) 
             FROM message_log 
             WHERE user_id = ?
         ''', (member.id,))
-        total_messages = await cursor.fetchone()
         total_messages = total_messages[0] if total_messages else 0
         
+        # Messages and reactions older than the retention horizon are kept as daily counters
+        compacted = await db_pool.fetchone('''
+            SELECT COALESCE(SUM(message_count), 0), COALESCE(SUM(reaction_count), 0),
+                   MAX(CASE WHEN message_count > 0 THEN date END),
+                   MAX(CASE WHEN reaction_count > 0 THEN date END)
+            FROM user_daily_activity
+            WHERE user_id = ?
+        ''', (member.id,))
+        compacted_messages, compacted_reactions, compacted_last_message, compacted_last_reaction = compacted or (0, 0, None, None)
+        total_messages += compacted_messages
+        
         # Get recent messages (last 7 days)
-        cursor = await db_pool.execute('''
+        recent_messages = await db_pool.fetchone('''
             SELECT COUNT(*) 
             FROM message_log 
             WHERE user_id = ? AND timestamp > datetime('now', '-7 days')
         ''', (member.id,))
-        recent_messages = await cursor.fetchone()
         recent_messages = recent_messages[0] if recent_messages else 0
         
         # Get last message time
-        cursor = await db_pool.execute('''
+        last_message_time = await db_pool.fetchone('''
             SELECT MAX(timestamp)
             FROM message_log
             WHERE user_id = ?
         ''', (member.id,))
-        last_message_time = await cursor.fetchone()
+        last_message_time = last_message_time[0] if last_message_time and last_message_time[0] else compacted_last_message
         
         # Format last message time more nicely
-        if last_message_time and last_message_time[0]:
+        if last_message_time:
             # Parse the timestamp from database
-            timestamp = datetime.fromisoformat(last_message_time[0].replace('Z', '+00:00'))
+            timestamp = datetime.fromisoformat(last_message_time.replace('Z', '+00:00'))
             
             # Calculate time difference
             time_diff = datetime.now() - timestamp
@@ -7160,41 +6457,39 @@ async def useractivity(interaction: discord.Interaction, member: discord.Member
             last_active = "No messages found"
         
         # Get reaction count
-        cursor = await db_pool.execute('''
+        total_reactions = await db_pool.fetchone('''
             SELECT COUNT(*) 
             FROM user_reactions 
             WHERE user_id = ?
         ''', (member.id,))
-        total_reactions = await cursor.fetchone()
         total_reactions = total_reactions[0] if total_reactions else 0
+        total_reactions += compacted_reactions
         
         # Get recent reactions (last 7 days)
-        cursor = await db_pool.execute('''
+        recent_reactions = await db_pool.fetchone('''
             SELECT COUNT(*) 
             FROM user_reactions 
             WHERE user_id = ? AND timestamp > datetime('now', '-7 days')
         ''', (member.id,))
-        recent_reactions = await cursor.fetchone()
         recent_reactions = recent_reactions[0] if recent_reactions else 0
         
         # Get last reaction time
-        cursor = await db_pool.execute('''
+        last_reaction_time = await db_pool.fetchone('''
             SELECT MAX(timestamp)
             FROM user_reactions
             WHERE user_id = ?
         ''', (member.id,))
-        last_reaction_time = await cursor.fetchone()
-        last_reaction = "No reactions found" if not last_reaction_time or not last_reaction_time[0] else last_reaction_time[0]
+        last_reaction_time = last_reaction_time[0] if last_reaction_time and last_reaction_time[0] else compacted_last_reaction
+        last_reaction = "No reactions found" if not last_reaction_time else last_reaction_time
         
         # Voice channel functionality has been removed
         
         # Get user's level information
-        cursor = await db_pool.execute('''
+        user_data = await db_pool.fetchone('''
             SELECT level, xp, prestige, coins, activity_coins
             FROM users
             WHERE user_id = ?
         ''', (member.id,))
-        user_data = await cursor.fetchone()
         
         if user_data:
             level, xp, prestige, coins, activity_coins = user_data
@@ -7269,12 +6564,8 @@ async def get_user_name_from_db(user_id):
         ''', (user_id,))
         
         if user_record:
-            # Try to fetch user from Discord API
-            try:
-                user = await bot.fetch_user(user_id)
-                return user.name
-            except:
-                pass
+            # Resolve the name through the shared name cache
+            return await user_names.get_name(bot, user_id)
         
         # Fall back to generic ID if nothing found
         return f"User {user_id}"
@@ -7757,6 +7048,72 @@ class CheckWarningsModal(discord.ui.Modal, title="Check Member Warnings"):
         except Exception as e:
             await interaction.followup.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
 
+# Remaining countdown time as e.g. "1 day, 2 hours, 5 minutes"
+def format_countdown_time(remaining):
+    days, remainder = divmod(int(remaining), 86400)
+    hours, remainder = divmod(remainder, 3600)
+    minutes, seconds = divmod(remainder, 60)
+
+    time_parts = []
+    if days > 0:
+        time_parts.append(f"{days} day{'s' if days != 1 else ''}")
+    if hours > 0:
+        time_parts.append(f"{hours} hour{'s' if hours != 1 else ''}")
+    if minutes > 0:
+        time_parts.append(f"{minutes} minute{'s' if minutes != 1 else ''}")
+    if seconds > 0 and not (days > 0 or hours > 0 or minutes > 0):
+        time_parts.append(f"{seconds} second{'s' if seconds != 1 else ''}")
+
+    return ", ".join(time_parts)
+
+
+# Send a countdown update and schedule the next one, or the final message once it has ended
+async def countdown_tick_job(job):
+    countdown = job.payload
+    countdown_id = countdown["countdown_id"]
+    end_time = countdown["end_time"]
+    target_channel = bot.get_channel(countdown["channel_id"])
+    remaining = end_time - time.time()
+
+    if remaining >= 1:
+        # Schedule the next update first so a failed send doesn't end the countdown
+        next_tick = await scheduler.schedule(
+            "countdown_tick", min(time.time() + countdown["interval"], end_time), countdown)
+        if countdown_id in active_countdowns:
+            active_countdowns[countdown_id]["job_id"] = next_tick
+
+        update_embed = discord.Embed(
+            title="⏰ Countdown Update",
+            description=f"Time remaining: **{format_countdown_time(remaining)}**",
+            color=discord.Color.gold()
+        )
+        update_embed.add_field(
+            name="⏱️ Ends At",
+            value=f"<t:{int(end_time)}:F> (<t:{int(end_time)}:R>)"
+        )
+        try:
+            if target_channel:
+                await target_channel.send(embed=update_embed)
+        except Exception as e:
+            print(f"Error sending countdown update: {e}")
+        return
+
+    # Remove countdown from active countdowns
+    active_countdowns.pop(countdown_id, None)
+    try:
+        final_embed = discord.Embed(
+            title="⏰ Countdown Finished!",
+            description="The countdown has ended!",
+            color=discord.Color.green()
+        )
+        if target_channel:
+            await target_channel.send(embed=final_embed)
+    except Exception as e:
+        print(f"Error sending final countdown message: {e}")
+
+scheduler.register("countdown_tick", countdown_tick_job)
+
+
 # Countdown command
 @bot.tree.command(name="countdown", description="Start a countdown timer that will send messages at specified intervals")
 async def countdown(
@@ -7858,15 +7215,6 @@ async def countdown(
     # Calculate end time
     end_time = discord.utils.utcnow() + timedelta(seconds=total_seconds)
     
-    # Store countdown info
-    active_countdowns[countdown_id] = {
-        "channel_id": channel.id,
-        "end_time": end_time,
-        "interval": interval_seconds,
-        "last_message": discord.utils.utcnow(),
-        "total_seconds": total_seconds
-    }
-    
     # Create confirmation embed
     embed = discord.Embed(
         title="⏰ Countdown Timer Started",
@@ -7899,26 +7247,9 @@ async def countdown(
     await interaction.response.send_message(embed=embed)
     
     # Send initial countdown message to the target channel
-    remaining = total_seconds
-    days, remainder = divmod(remaining, 86400)
-    hours, remainder = divmod(remainder, 3600)
-    minutes, seconds = divmod(remainder, 60)
-    
-    time_parts = []
-    if days > 0:
-        time_parts.append(f"{days} day{'s' if days != 1 else ''}")
-    if hours > 0:
-        time_parts.append(f"{hours} hour{'s' if hours != 1 else ''}")
-    if minutes > 0:
-        time_parts.append(f"{minutes} minute{'s' if minutes != 1 else ''}")
-    if seconds > 0 and not (days > 0 or hours > 0 or minutes > 0):
-        time_parts.append(f"{seconds} second{'s' if seconds != 1 else ''}")
-    
-    time_str = ", ".join(time_parts)
-    
     initial_embed = discord.Embed(
         title="⏰ Countdown Started",
-        description=f"Time remaining: **{time_str}**",
+        description=f"Time remaining: **{format_countdown_time(total_seconds)}**",
         color=discord.Color.gold()
     )
     
@@ -7928,89 +7259,18 @@ async def countdown(
     )
     
     # Send initial message
-    countdown_msg = await channel.send(embed=initial_embed)
-    
-    # Start countdown task
-    async def countdown_task():
-        try:
-            # Continue until countdown is done
-            while discord.utils.utcnow() < end_time:
-                # Wait for the next interval
-                await asyncio.sleep(interval_seconds)
-                
-                # Get remaining time
-                remaining = (end_time - discord.utils.utcnow()).total_seconds()
-                if remaining <= 0:
-                    break
-                
-                # Calculate time components
-                days, remainder = divmod(int(remaining), 86400)
-                hours, remainder = divmod(remainder, 3600)
-                minutes, seconds = divmod(remainder, 60)
-                
-                time_parts = []
-                if days > 0:
-                    time_parts.append(f"{days} day{'s' if days != 1 else ''}")
-                if hours > 0:
-                    time_parts.append(f"{hours} hour{'s' if hours != 1 else ''}")
-                if minutes > 0:
-                    time_parts.append(f"{minutes} minute{'s' if minutes != 1 else ''}")
-                if seconds > 0 and not (days > 0 or hours > 0 or minutes > 0):
-                    time_parts.append(f"{seconds} second{'s' if seconds != 1 else ''}")
-                
-                time_str = ", ".join(time_parts)
-                
-                # Create update embed
-                update_embed = discord.Embed(
-                    title="⏰ Countdown Update",
-                    description=f"Time remaining: **{time_str}**",
-                    color=discord.Color.gold()
-                )
-                
-                update_embed.add_field(
-                    name="⏱️ Ends At",
-                    value=f"<t:{int(end_time.timestamp())}:F> (<t:{int(end_time.timestamp())}:R>)"
-                )
-                
-                # Send update
-                try:
-                    target_channel = bot.get_channel(channel.id)
-                    if target_channel:
-                        await target_channel.send(embed=update_embed)
-                except Exception as e:
-                    print(f"Error sending countdown update: {e}")
-            
-            # Final message
-            try:
-                final_embed = discord.Embed(
-                    title="⏰ Countdown Finished!",
-                    description="The countdown has ended!",
-                    color=discord.Color.green()
-                )
-                
-                target_channel = bot.get_channel(channel.id)
-                if target_channel:
-                    await target_channel.send(embed=final_embed)
-            except Exception as e:
-                print(f"Error sending final countdown message: {e}")
-                
-            # Remove countdown from active countdowns
-            if countdown_id in active_countdowns:
-                del active_countdowns[countdown_id]
-                
-        except asyncio.CancelledError:
-            # Handle cancellation
-            if countdown_id in active_countdowns:
-                del active_countdowns[countdown_id]
-            print(f"Countdown {countdown_id} cancelled")
-        except Exception as e:
-            print(f"Error in countdown task: {e}")
-            # Clean up on error
-            if countdown_id in active_countdowns:
-                del active_countdowns[countdown_id]
+    await channel.send(embed=initial_embed)
     
-    # Start the countdown task
-    bot.loop.create_task(countdown_task())
+    # Updates are sent by scheduled jobs, which survive a restart
+    countdown = {
+        "countdown_id": countdown_id,
+        "channel_id": channel.id,
+        "end_time": end_time.timestamp(),
+        "interval": interval_seconds,
+    }
+    job_id = await scheduler.schedule(
+        "countdown_tick", min(time.time() + interval_seconds, countdown["end_time"]), countdown)
+    active_countdowns[countdown_id] = {**countdown, "job_id": job_id}
 
 # Status command to control bot status messages
 @bot.tree.command(name="status", description="Send a status message or update the bot status")
@@ -8077,6 +7337,25 @@ async def status_command(
     else:
         await interaction.followup.send(f"❌ Failed to send status message. Please check the logs.", ephemeral=True)
 
+# Flush buffered message writes before the bot closes
+original_close = bot.close
+async def close_with_flush():
+    try:
+        from write_buffer import write_buffer
+        await write_buffer.close()
+    except Exception as e:
+        print(f"❌ Error flushing write buffer on shutdown: {e}")
+    try:
+        await scheduler.close()
+    except Exception as e:
+        print(f"❌ Error stopping the scheduler on shutdown: {e}")
+    try:
+        await outbox.close()
+    except Exception as e:
+        print(f"❌ Error sending queued messages on shutdown: {e}")
+    await original_close()
+bot.close = close_with_flush
+
 # Define shutdown handlers
 def handle_exit_signal(signum, frame):
     """Handle exit signals to gracefully shut down the bot"""
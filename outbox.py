@@ -0,0 +1,258 @@
+"""
+Outbox for messages the bot sends outside of interaction responses
+Handlers queue DMs and channel notifications instead of sending them inline.
+A few worker tasks send them, spacing messages per route, backing off on rate
+limits and retrying failures, and plain DMs to the same user within a short
+window are combined into one digest message
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger('outbox')
+
+# Discord limits for a single message
+MAX_CONTENT_LENGTH = 2000
+MAX_EMBEDS = 10
+
+# Targets a message can be sent to; together with the target ID they form its route
+DM = "dm"
+CHANNEL = "channel"
+
+# HTTP statuses that won't change by trying again, e.g. a user with closed DMs
+PERMANENT_STATUSES = (400, 403, 404)
+
+
+class Outbox:
+    """Queue of outgoing messages sent by a pool of worker tasks"""
+
+    def __init__(self, bot=None, names=None, workers: int = 3, coalesce_seconds: float = 5.0,
+                 route_interval: float = 1.0, max_attempts: int = 4, retry_delay: float = 2.0):
+        self.bot = bot
+        self.names = names
+        self.worker_count = workers
+        self.coalesce_seconds = coalesce_seconds
+        self.route_interval = route_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.workers: List[asyncio.Task] = []
+        # Plain DMs waiting for their user's coalescing window to close
+        self.digests: Dict[int, Dict[str, list]] = {}
+        self.digest_timers: Dict[int, asyncio.TimerHandle] = {}
+        # Earliest time the next message may be sent on each route
+        self.route_ready: Dict[Tuple[str, int], float] = {}
+        self.in_flight = 0
+        # Failed messages waiting for their retry delay
+        self.retrying = 0
+        self.stats: Dict[str, int] = {
+            "queued": 0,
+            "coalesced": 0,
+            "sent": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "dropped": 0,
+            "largest_queue": 0,
+        }
+
+    async def _get_names(self):
+        if self.names is None:
+            from user_names import get_user_names
+            self.names = await get_user_names()
+        return self.names
+
+    def start(self, bot=None):
+        """Start the worker tasks; safe to call again, e.g. from on_ready"""
+        if bot is not None:
+            self.bot = bot
+        self.workers = [worker for worker in self.workers if not worker.done()]
+        while len(self.workers) < self.worker_count:
+            self.workers.append(asyncio.create_task(self._worker()))
+
+    def send_dm(self, user_id: int, content: Optional[str] = None, embed=None, view=None,
+                coalesce: bool = True):
+        """Queue a DM to a user
+
+        Messages without a view are held for a few seconds and sent together
+        with the user's other DMs from that window. Views belong to a single
+        message, so DMs with one are sent on their own, as are DMs queued
+        with coalesce=False.
+        """
+        if not coalesce or view is not None or self.coalesce_seconds <= 0:
+            self._enqueue(self._message(DM, user_id, content, [embed] if embed else [], view))
+            return
+
+        digest = self.digests.get(user_id)
+        if digest is None:
+            digest = self.digests[user_id] = {"lines": [], "embeds": []}
+            loop = asyncio.get_running_loop()
+            self.digest_timers[user_id] = loop.call_later(self.coalesce_seconds, self._flush_digest, user_id)
+        else:
+            self.stats["coalesced"] += 1
+        if content:
+            digest["lines"].append(content)
+        if embed is not None:
+            digest["embeds"].append(embed)
+
+    def send_channel(self, channel_id: int, content: Optional[str] = None, embed=None, view=None):
+        """Queue a message to a channel"""
+        self._enqueue(self._message(CHANNEL, channel_id, content, [embed] if embed else [], view))
+
+    def _message(self, kind: str, target: int, content: Optional[str], embeds: list, view) -> Dict[str, Any]:
+        return {
+            "route": (kind, target),
+            "content": content,
+            "embeds": embeds,
+            "view": view,
+            "attempts": 0,
+        }
+
+    def _enqueue(self, message: Dict[str, Any]):
+        self.queue.put_nowait(message)
+        self.stats["queued"] += 1
+        self.stats["largest_queue"] = max(self.stats["largest_queue"], self.queue.qsize())
+
+    def _flush_digest(self, user_id: int):
+        self.digest_timers.pop(user_id, None)
+        digest = self.digests.pop(user_id, None)
+        if digest is None:
+            return
+
+        # Split the digest into as few messages as Discord's limits allow
+        chunks: List[str] = []
+        for line in digest["lines"]:
+            while len(line) > MAX_CONTENT_LENGTH:
+                chunks.append(line[:MAX_CONTENT_LENGTH])
+                line = line[MAX_CONTENT_LENGTH:]
+            if chunks and len(chunks[-1]) + 1 + len(line) <= MAX_CONTENT_LENGTH:
+                chunks[-1] += "\n" + line
+            else:
+                chunks.append(line)
+        embeds = digest["embeds"]
+        embed_chunks = [embeds[i:i + MAX_EMBEDS] for i in range(0, len(embeds), MAX_EMBEDS)]
+
+        for i in range(max(len(chunks), len(embed_chunks))):
+            content = chunks[i] if i < len(chunks) else None
+            message_embeds = embed_chunks[i] if i < len(embed_chunks) else []
+            self._enqueue(self._message(DM, user_id, content, message_embeds, None))
+
+    async def _worker(self):
+        while True:
+            message = await self.queue.get()
+            self.in_flight += 1
+            try:
+                await self._deliver(message)
+            except Exception as e:
+                logger.error(f"Outbox worker failed on {message['route']}: {e}")
+            finally:
+                self.in_flight -= 1
+                self.queue.task_done()
+
+    async def _deliver(self, message: Dict[str, Any]):
+        route = message["route"]
+
+        # Reserve the route's next slot so messages to one target stay spaced out
+        now = time.monotonic()
+        if len(self.route_ready) > 10000:
+            self.route_ready = {key: ready for key, ready in self.route_ready.items() if ready > now}
+        ready = max(now, self.route_ready.get(route, now))
+        self.route_ready[route] = ready + self.route_interval
+        if ready > now:
+            await asyncio.sleep(ready - now)
+
+        message["attempts"] += 1
+        try:
+            await self._send(message)
+        except Exception as e:
+            status = getattr(e, "status", None)
+            permanent = status in PERMANENT_STATUSES or isinstance(e, LookupError)
+            if permanent or message["attempts"] >= self.max_attempts:
+                self.stats["dropped"] += 1
+                logger.warning(f"Dropped message to {route[0]} {route[1]} after {message['attempts']} attempts: {e}")
+                return
+
+            delay = self.retry_delay * 2 ** (message["attempts"] - 1)
+            retry_after = getattr(e, "retry_after", None)
+            if status == 429 or retry_after is not None:
+                # Hold the whole route until Discord lets us send again
+                self.stats["rate_limited"] += 1
+                delay = max(delay, retry_after or 0)
+                self.route_ready[route] = max(self.route_ready.get(route, 0), time.monotonic() + delay)
+            self.stats["retries"] += 1
+            self.retrying += 1
+            asyncio.get_running_loop().call_later(delay, self._retry, message)
+            return
+
+        self.stats["sent"] += 1
+
+    def _retry(self, message: Dict[str, Any]):
+        self.retrying -= 1
+        self.queue.put_nowait(message)
+
+    async def _send(self, message: Dict[str, Any]):
+        kind, target = message["route"]
+        if kind == DM:
+            names = await self._get_names()
+            destination = await names.fetch_user(self.bot, target)
+        else:
+            destination = self.bot.get_channel(target) or await self.bot.fetch_channel(target)
+        if destination is None:
+            raise LookupError(f"Unknown {kind} {target}")
+
+        kwargs: Dict[str, Any] = {}
+        if message["content"]:
+            kwargs["content"] = message["content"]
+        if message["embeds"]:
+            kwargs["embeds"] = message["embeds"]
+        if message["view"] is not None:
+            kwargs["view"] = message["view"]
+        await destination.send(**kwargs)
+
+    async def flush(self, timeout: Optional[float] = None):
+        """Send the held digests now and wait until the queue is empty"""
+        for user_id in list(self.digests):
+            timer = self.digest_timers.pop(user_id, None)
+            if timer is not None:
+                timer.cancel()
+            self._flush_digest(user_id)
+        await asyncio.wait_for(self._drain(), timeout)
+
+    async def _drain(self):
+        while True:
+            await self.queue.join()
+            if not self.retrying:
+                return
+            await asyncio.sleep(0.05)
+
+    async def close(self, timeout: float = 10.0):
+        """Send what is still queued, then stop the workers"""
+        try:
+            await self.flush(timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Outbox closed with {self.queue.qsize()} unsent messages")
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get statistics about the outbox, including its current depth"""
+        return {
+            **self.stats,
+            "queue_depth": self.queue.qsize(),
+            "in_flight": self.in_flight,
+            "held_digests": len(self.digests),
+            "retrying": self.retrying,
+        }
+
+
+# Singleton outbox instance
+outbox = Outbox()
+
+# Helper function to get the outbox
+async def get_outbox() -> Outbox:
+    """Get the shared outgoing message queue"""
+    return outbox
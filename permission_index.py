@@ -0,0 +1,161 @@
+"""
+Precompiled command permissions
+The command permissions, role section assignments and role groups are
+compiled into one set of allowed role IDs and one set of allowed role group
+names per command, so checking a member is a set intersection instead of
+walking every permission list on each command. The index is rebuilt
+whenever the permissions change. Each member's roles and decisions are
+cached too, so repeated commands from the same member don't fetch the
+member from Discord or check their roles again
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Iterable, Mapping, Optional
+
+logger = logging.getLogger('permission_index')
+
+EVERYONE = "everyone"
+OWNER_ROLE = "owner"
+# Commands the owner role can't use through its role alone
+OWNER_EXCLUDED_COMMANDS = frozenset({"backup", "permission"})
+
+
+def role_group(role_name: str) -> str:
+    """The role group a role name belongs to, e.g. "Engagement Team" -> "engagement_team" """
+    return role_name.replace(' ', '_').lower()
+
+
+class PermissionIndex:
+    """Allowed role IDs and role groups per command"""
+
+    def __init__(self, max_members: int = 5000):
+        self.max_members = max_members
+        # Member ID -> {"role_ids", "role_names", "decisions"}, least recently used first
+        self.members: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self.known_commands: FrozenSet[str] = frozenset()
+        self.public_commands: FrozenSet[str] = frozenset()
+        self.allowed_role_ids: Dict[str, FrozenSet[int]] = {}
+        self.allowed_groups: Dict[str, FrozenSet[str]] = {}
+        self.stats: Dict[str, int] = {
+            "rebuilds": 0,
+            "checks": 0,
+            "decision_hits": 0,
+            "member_evictions": 0,
+        }
+
+    def rebuild(self, command_permissions: Mapping[str, Iterable], role_section_assignments: Mapping[int, Iterable[str]],
+                role_permissions: Mapping[str, Iterable[str]]):
+        """Compile the permission data, replacing the previous index
+
+        command_permissions maps commands to "everyone" and role IDs (as ints
+        or numeric strings), role_section_assignments maps role IDs to the
+        sections given to them and role_permissions maps sections, which are
+        also role group names, to their commands.
+        """
+        role_ids: Dict[str, set] = {}
+        public = set()
+        for command, permissions in command_permissions.items():
+            ids = role_ids.setdefault(command, set())
+            for permission in permissions:
+                if permission == EVERYONE:
+                    public.add(command)
+                elif isinstance(permission, int):
+                    ids.add(permission)
+                elif isinstance(permission, str) and permission.isdigit():
+                    ids.add(int(permission))
+
+        groups: Dict[str, set] = {}
+        for section, commands in role_permissions.items():
+            for command in commands:
+                groups.setdefault(command, set()).add(section)
+
+        for role_id, sections in role_section_assignments.items():
+            if isinstance(role_id, str):
+                if not role_id.isdigit():
+                    continue
+                role_id = int(role_id)
+            for section in sections:
+                for command in role_permissions.get(section, ()):
+                    role_ids.setdefault(command, set()).add(role_id)
+
+        # Only commands with an entry in command_permissions can be granted to roles
+        self.known_commands = frozenset(command_permissions)
+        self.public_commands = frozenset(public)
+        self.allowed_role_ids = {command: frozenset(ids) for command, ids in role_ids.items()}
+        self.allowed_groups = {command: frozenset(sections) for command, sections in groups.items()}
+        # Every cached decision was made against the old permissions
+        for member in self.members.values():
+            member["decisions"].clear()
+        self.stats["rebuilds"] += 1
+        logger.info(f"Compiled permissions for {len(self.known_commands)} commands")
+
+    def allows(self, command: str, role_ids: Iterable[int], role_names: Iterable[str]) -> bool:
+        """Whether a member with these roles may use command"""
+        self.stats["checks"] += 1
+        role_names = list(role_names)
+        if command not in OWNER_EXCLUDED_COMMANDS and any(name.lower() == OWNER_ROLE for name in role_names):
+            return True
+        if command not in self.known_commands:
+            return False
+        if command in self.public_commands:
+            return True
+
+        allowed_ids = self.allowed_role_ids.get(command)
+        if allowed_ids and not allowed_ids.isdisjoint(role_ids):
+            return True
+        allowed_groups = self.allowed_groups.get(command)
+        return bool(allowed_groups) and not allowed_groups.isdisjoint(role_group(name) for name in role_names)
+
+    def remember_member(self, member_id: int, role_ids: Iterable[int], role_names: Iterable[str]):
+        """Cache a member's roles, dropping their decisions if the roles changed"""
+        role_ids = frozenset(role_ids)
+        role_names = tuple(role_names)
+        member = self.members.get(member_id)
+        if member is not None and member["role_ids"] == role_ids and member["role_names"] == role_names:
+            self.members.move_to_end(member_id)
+            return
+        self.members[member_id] = {"role_ids": role_ids, "role_names": role_names, "decisions": {}}
+        self.members.move_to_end(member_id)
+        if len(self.members) > self.max_members:
+            self.members.popitem(last=False)
+            self.stats["member_evictions"] += 1
+
+    def knows_member(self, member_id: int) -> bool:
+        """Whether a member's roles are cached"""
+        return member_id in self.members
+
+    def member_allows(self, member_id: int, command: str) -> Optional[bool]:
+        """Whether a cached member may use command, or None if their roles aren't cached"""
+        member = self.members.get(member_id)
+        if member is None:
+            return None
+        self.members.move_to_end(member_id)
+        decision = member["decisions"].get(command)
+        if decision is not None:
+            self.stats["decision_hits"] += 1
+            return decision
+        decision = self.allows(command, member["role_ids"], member["role_names"])
+        member["decisions"][command] = decision
+        return decision
+
+    def forget_member(self, member_id: int):
+        """Drop a member's cached roles and decisions, e.g. after their roles changed"""
+        self.members.pop(member_id, None)
+
+    def forget_members(self):
+        """Drop every cached member, e.g. after a role was renamed or deleted"""
+        self.members.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get statistics about the permission index"""
+        return {**self.stats, "commands": len(self.known_commands), "cached_members": len(self.members)}
+
+
+# Singleton permission index instance
+permission_index = PermissionIndex()
+
+# Helper function to get the permission index
+async def get_permission_index() -> PermissionIndex:
+    """Get the shared permission index"""
+    return permission_index
@@ -0,0 +1,211 @@
+"""
+In-memory ranking of users for the leaderboards
+Every user's XP, coins and activity coins are kept in sorted arrays, updated
+with the same deltas the user cache sends to the write buffer, so top lists
+and rank lookups are served with a bisect instead of sorting the users table
+"""
+
+import asyncio
+import logging
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Set, Tuple, Any
+
+from user_cache import DEFAULT_USER
+
+logger = logging.getLogger('rankings')
+
+# Leaderboards and the users columns they are ranked by, most significant first
+BOARDS: Dict[str, Tuple[str, ...]] = {
+    "xp": ("prestige", "level", "xp"),
+    "coins": ("coins",),
+    "activity": ("activity_coins",),
+}
+
+RANKED_COLUMNS = ("prestige", "level", "xp", "coins", "activity_coins")
+
+
+class RankedIndex:
+    """Users sorted by a composite score, highest first
+
+    Keys are the negated score followed by the user ID, so ascending order is
+    rank order and ties are broken by user ID.
+    """
+
+    def __init__(self):
+        self.keys: List[tuple] = []
+        self.user_keys: Dict[int, tuple] = {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def update(self, user_id: int, score: tuple):
+        """Set a user's score"""
+        key = tuple(-value for value in score) + (user_id,)
+        old = self.user_keys.get(user_id)
+        if old == key:
+            return
+        if old is not None:
+            del self.keys[bisect_left(self.keys, old)]
+        insort(self.keys, key)
+        self.user_keys[user_id] = key
+
+    def remove(self, user_id: int):
+        """Take a user off the index"""
+        old = self.user_keys.pop(user_id, None)
+        if old is not None:
+            del self.keys[bisect_left(self.keys, old)]
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """1-based rank of a user, or None if they aren't ranked"""
+        key = self.user_keys.get(user_id)
+        if key is None:
+            return None
+        return bisect_left(self.keys, key) + 1
+
+    def page(self, limit: int, offset: int = 0) -> List[Tuple[int, tuple]]:
+        """(user_id, score) of the users ranked offset + 1 to offset + limit"""
+        return [(key[-1], tuple(-value for value in key[:-1]))
+                for key in self.keys[offset:offset + limit]]
+
+
+class Rankings:
+    """Leaderboards of all users, loaded once and kept up to date in memory
+
+    The user cache reports every buffered change through apply(). Users whose
+    row was written directly are reloaded on the next read after
+    invalidate(), and clear() reloads everything, e.g. after a bulk reset.
+    """
+
+    def __init__(self, pool=None, buffer=None):
+        self.pool = pool
+        self.buffer = buffer
+        self.users: Dict[int, Dict[str, Any]] = {}
+        self.boards: Dict[str, RankedIndex] = {name: RankedIndex() for name in BOARDS}
+        self.stale_users: Set[int] = set()
+        self.loaded = False
+        # Bumped by clear() so a load that was already running isn't trusted
+        self.generation = 0
+        self.lock = asyncio.Lock()
+
+    async def _get_pool(self):
+        if self.pool is None:
+            from db_pool import get_db_pool
+            self.pool = await get_db_pool()
+        return self.pool
+
+    async def _get_buffer(self):
+        if self.buffer is None:
+            from write_buffer import get_write_buffer
+            self.buffer = await get_write_buffer()
+        return self.buffer
+
+    def _set_user(self, user_id: int, values: Dict[str, Any]):
+        self.users[user_id] = values
+        for name, columns in BOARDS.items():
+            self.boards[name].update(user_id, tuple(values[column] for column in columns))
+
+    def _remove_user(self, user_id: int):
+        self.users.pop(user_id, None)
+        for board in self.boards.values():
+            board.remove(user_id)
+
+    async def _read_users(self, user_ids: Optional[List[int]] = None) -> Dict[int, Dict[str, Any]]:
+        """Read users from the database with their pending buffered changes applied"""
+        pool = await self._get_pool()
+        buffer = await self._get_buffer()
+        query = f'SELECT user_id, {", ".join(RANKED_COLUMNS)} FROM users'
+        parameters = ()
+        if user_ids is not None:
+            query += f' WHERE user_id IN ({", ".join("?" * len(user_ids))})'
+            parameters = tuple(user_ids)
+
+        # Hold the flush lock so pending deltas can't reach the table in between
+        async with buffer.flush_lock:
+            rows = await pool.fetchall(query, parameters)
+            users = {row[0]: dict(zip(RANKED_COLUMNS, row[1:])) for row in rows}
+            pending_ids = buffer.user_deltas.keys() if user_ids is None else user_ids
+            for user_id in pending_ids:
+                if user_id not in buffer.user_deltas:
+                    continue
+                values = users.setdefault(user_id, {column: DEFAULT_USER[column] for column in RANKED_COLUMNS})
+                for column, amount in buffer.pending_user_delta(user_id).items():
+                    if column in values:
+                        values[column] += amount
+        return users
+
+    async def load(self):
+        """Load every user's scores, or reload the ones changed directly"""
+        async with self.lock:
+            if not self.loaded:
+                generation = self.generation
+                self.stale_users.clear()
+                users = await self._read_users()
+                self.users = {}
+                self.boards = {name: RankedIndex() for name in BOARDS}
+                for user_id, values in users.items():
+                    self._set_user(user_id, values)
+                self.loaded = generation == self.generation
+                logger.info(f"Loaded rankings for {len(self.users)} users")
+            elif self.stale_users:
+                user_ids = list(self.stale_users)
+                self.stale_users.clear()
+                users = await self._read_users(user_ids)
+                for user_id in user_ids:
+                    if user_id in users:
+                        self._set_user(user_id, users[user_id])
+                    else:
+                        self._remove_user(user_id)
+
+    def apply(self, user_id: int, deltas: Dict[str, Any]):
+        """Add a buffered change of a user's row to their scores"""
+        if not self.loaded:
+            return
+        values = self.users.get(user_id)
+        values = dict(values) if values else {column: DEFAULT_USER[column] for column in RANKED_COLUMNS}
+        changed = user_id not in self.users
+        for column, amount in deltas.items():
+            if column in values and amount:
+                values[column] += amount
+                changed = True
+        if changed:
+            self._set_user(user_id, values)
+
+    def invalidate(self, user_id: int):
+        """Reload a user on next use after their row was changed directly"""
+        self.stale_users.add(user_id)
+
+    def clear(self):
+        """Reload every user on next use, e.g. after a bulk update of the users table"""
+        self.loaded = False
+        self.generation += 1
+
+    async def top(self, board: str, limit: int = 10, offset: int = 0) -> List[Tuple[int, tuple]]:
+        """(user_id, score) of a page of a leaderboard
+
+        Scores hold the board's columns in the order of BOARDS.
+        """
+        if not self.loaded or self.stale_users:
+            await self.load()
+        return self.boards[board].page(limit, offset)
+
+    async def count(self, board: str) -> int:
+        """Number of users ranked on a leaderboard"""
+        if not self.loaded or self.stale_users:
+            await self.load()
+        return len(self.boards[board])
+
+    async def rank(self, board: str, user_id: int) -> Tuple[Optional[int], int]:
+        """A user's rank on a leaderboard, or None, and the number of ranked users"""
+        if not self.loaded or self.stale_users:
+            await self.load()
+        index = self.boards[board]
+        return index.rank(user_id), len(index)
+
+
+# Singleton rankings instance
+rankings = Rankings()
+
+# Helper function to get the rankings
+async def get_rankings() -> Rankings:
+    """Get the shared leaderboard rankings"""
+    return rankings
@@ -0,0 +1,84 @@
+"""
+Reaction router for drop claims
+Waiters are registered under the message ID and emoji they are waiting
+for, and on_reaction_add hands each reaction to the router, which looks up
+its key and wakes every waiter for it. bot.wait_for("reaction_add") runs
+every pending check predicate on every reaction in the server, so its cost
+grows with the number of drops open at once; a lookup here costs the same
+however many are open
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger('reaction_router')
+
+ReactionKey = Tuple[int, str]
+
+
+class ReactionRouter:
+    """Waiters for reactions, keyed by (message ID, emoji)"""
+
+    def __init__(self):
+        self.waiters: Dict[ReactionKey, List[asyncio.Future]] = {}
+        self.stats: Dict[str, int] = {
+            "dispatched": 0,
+            "matched": 0,
+            "timeouts": 0,
+        }
+
+    def _discard(self, key: ReactionKey, future: asyncio.Future):
+        waiters = self.waiters.get(key)
+        if waiters is None:
+            return
+        if future in waiters:
+            waiters.remove(future)
+        if not waiters:
+            del self.waiters[key]
+
+    async def wait(self, message_id: int, emoji: str, timeout: Optional[float] = None) -> Tuple[Any, Any]:
+        """Wait for a user to react to a message with emoji and return (reaction, user)
+
+        Raises asyncio.TimeoutError if nobody reacts in time, like
+        bot.wait_for. Reactions from bots never reach the router.
+        """
+        key = (message_id, emoji)
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(key, []).append(future)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise
+        finally:
+            self._discard(key, future)
+
+    def dispatch(self, reaction, user) -> bool:
+        """Wake the waiters for this reaction; returns True if there were any
+
+        Each waiter gets the first reaction after it started waiting, so a
+        drop is only claimed once even when several users react together.
+        """
+        self.stats["dispatched"] += 1
+        waiters = self.waiters.pop((reaction.message.id, str(reaction.emoji)), None)
+        if not waiters:
+            return False
+        for future in waiters:
+            if not future.done():
+                future.set_result((reaction, user))
+        self.stats["matched"] += 1
+        return True
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get statistics about the reaction router"""
+        return {**self.stats, "waiting": sum(len(waiters) for waiters in self.waiters.values())}
+
+
+# Singleton reaction router instance
+reaction_router = ReactionRouter()
+
+# Helper function to get the reaction router
+async def get_reaction_router() -> ReactionRouter:
+    """Get the shared reaction router"""
+    return reaction_router
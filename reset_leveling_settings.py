@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
-import sqlite3
 import asyncio
-import aiosqlite
+import database
 
 async def reset_leveling_settings():
     """Ensure the leveling_settings table exists with all required fields"""
@@ -9,23 +8,20 @@ async def reset_leveling_settings():
         # First, check if the table exists and back up any existing settings
         existing_settings = {}
         try:
-            async with aiosqlite.connect("leveling.db") as db:
-                # Check if table exists
-                cursor = await db.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='leveling_settings'")
-                table_exists = await cursor.fetchone()
-                
-                if table_exists:
-                    print("📋 leveling_settings table exists, backing up values...")
-                    cursor = await db.execute('SELECT setting_name, value FROM leveling_settings')
-                    rows = await cursor.fetchall()
-                    if rows:
-                        existing_settings = {name: value for name, value in rows}
-                        print(f"📋 Backed up {len(existing_settings)} existing settings")
-                        if 'level_up_coins' in existing_settings:
-                            print(f"🔰 Existing level_up_coins = {existing_settings['level_up_coins']}")
+            # Check if table exists
+            table_exists = await database.fetchone("SELECT name FROM sqlite_master WHERE type='table' AND name='leveling_settings'")
+
+            if table_exists:
+                print("📋 leveling_settings table exists, backing up values...")
+                rows = await database.fetchall('SELECT setting_name, value FROM leveling_settings')
+                if rows:
+                    existing_settings = {name: value for name, value in rows}
+                    print(f"📋 Backed up {len(existing_settings)} existing settings")
+                    if 'level_up_coins' in existing_settings:
+                        print(f"🔰 Existing level_up_coins = {existing_settings['level_up_coins']}")
         except Exception as e:
             print(f"⚠️ Warning checking existing table: {e}")
-        
+
         # Default settings to use for missing values
         default_settings = [
             ("xp_min", 5),
@@ -41,9 +37,9 @@ async def reset_leveling_settings():
             ("level_up_xp_base", 50),
             ("enabled", 1)
         ]
-        
-        # Now create/recreate the table
-        async with aiosqlite.connect("leveling.db") as db:
+
+        # Now create the table and fill it through the single writer
+        async with database.transaction() as db:
             # Create the table if it doesn't exist
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS leveling_settings (
@@ -51,43 +47,44 @@ async def reset_leveling_settings():
                     value INTEGER NOT NULL
                 )
             ''')
-            
+
             # Check if table has any data
             cursor = await db.execute('SELECT COUNT(*) FROM leveling_settings')
             count = await cursor.fetchone()
-            
+
             if count and count[0] > 0:
                 print(f"✅ Table already has {count[0]} settings, will preserve existing values")
-            else:
-                print("🆕 Empty table, will populate with default values")
-                
-                # Insert settings, using existing values where available
-                for setting_name, default_value in default_settings:
-                    # Use existing value if available
-                    value = existing_settings.get(setting_name, default_value)
-                    
-                    await db.execute(
-                        'INSERT OR REPLACE INTO leveling_settings (setting_name, value) VALUES (?, ?)',
-                        (setting_name, value)
-                    )
-                
-                await db.commit()
-                print("✅ Successfully initialized leveling_settings table while preserving existing values")
-                
-                # Verify the data
-                cursor = await db.execute('SELECT COUNT(*) FROM leveling_settings')
-                count = await cursor.fetchone()
-                print(f"✅ Verified table contains {count[0]} settings")
-                
-                # Specifically log level_up_coins
-                cursor = await db.execute('SELECT value FROM leveling_settings WHERE setting_name = "level_up_coins"')
-                luc = await cursor.fetchone()
-                if luc:
-                    print(f"💰 Current level_up_coins value: {luc[0]}")
-    
+                return
+
+            print("🆕 Empty table, will populate with default values")
+
+            # Insert settings, using existing values where available
+            await db.executemany(
+                'INSERT OR REPLACE INTO leveling_settings (setting_name, value) VALUES (?, ?)',
+                [(setting_name, existing_settings.get(setting_name, default_value))
+                 for setting_name, default_value in default_settings]
+            )
+
+        print("✅ Successfully initialized leveling_settings table while preserving existing values")
+
+        # Verify the data
+        count = await database.fetchval('SELECT COUNT(*) FROM leveling_settings')
+        print(f"✅ Verified table contains {count} settings")
+
+        # Specifically log level_up_coins
+        luc = await database.fetchval('SELECT value FROM leveling_settings WHERE setting_name = ?', ("level_up_coins",))
+        if luc is not None:
+            print(f"💰 Current level_up_coins value: {luc}")
+
     except Exception as e:
         print(f"❌ Error managing leveling settings table: {e}")
 
+async def main():
+    try:
+        await reset_leveling_settings()
+    finally:
+        await (await database.get_pool()).close()
+
 # For direct execution
 if __name__ == "__main__":
-    asyncio.run(reset_leveling_settings())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,202 @@
+"""
+Persistent scheduler for timed jobs such as giveaway ends and countdowns
+Jobs are stored in the scheduled_jobs table and kept in an in-memory heap
+ordered by due time. One task sleeps until the earliest job is due and runs
+its handler, so pending timers cost a heap entry instead of a sleeping
+coroutine each, and jobs still pending when the bot stops are restored and
+run after it starts again
+"""
+
+import asyncio
+import heapq
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+logger = logging.getLogger('scheduler')
+
+SCHEDULED_JOBS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS scheduled_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        due_at REAL NOT NULL,
+        payload TEXT NOT NULL,
+        created_at REAL NOT NULL
+    )
+'''
+
+SCHEDULER_TABLES = [
+    SCHEDULED_JOBS_TABLE,
+    'CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_due ON scheduled_jobs (due_at)',
+]
+
+
+class Job(NamedTuple):
+    id: int
+    kind: str
+    due_at: float
+    payload: Dict[str, Any]
+
+
+# Called with the job once it is due
+JobHandler = Callable[[Job], Awaitable[None]]
+
+
+class Scheduler:
+    """Runs stored jobs at their due time from a single task
+
+    A job's row is deleted once its handler has finished, so a job whose
+    handler was interrupted by a restart runs again; handlers should
+    tolerate that. Jobs of a kind without a registered handler are dropped
+    when they come due.
+    """
+
+    def __init__(self, pool=None, clock: Callable[[], float] = time.time):
+        self.pool = pool
+        self.clock = clock
+        self.handlers: Dict[str, JobHandler] = {}
+        self.jobs: Dict[int, Job] = {}
+        # (due_at, job_id) entries; cancelled jobs are skipped when popped
+        self.heap: List[Tuple[float, int]] = []
+        self.wakeup: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+        self.running: Set[asyncio.Task] = set()
+        self.restored = False
+        self.stats: Dict[str, int] = {
+            "scheduled": 0,
+            "cancelled": 0,
+            "fired": 0,
+            "failed": 0,
+            "restored": 0,
+        }
+
+    async def _get_pool(self):
+        if self.pool is None:
+            from db_pool import get_db_pool
+            self.pool = await get_db_pool()
+        return self.pool
+
+    def register(self, kind: str, handler: JobHandler):
+        """Run handler for every job of this kind"""
+        self.handlers[kind] = handler
+
+    def _add(self, job: Job):
+        self.jobs[job.id] = job
+        heapq.heappush(self.heap, (job.due_at, job.id))
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    async def schedule(self, kind: str, due_at: float, payload: Optional[Dict[str, Any]] = None) -> int:
+        """Store a job to run at due_at (a Unix timestamp) and return its ID"""
+        payload = payload or {}
+        pool = await self._get_pool()
+        cursor = await pool.execute(
+            'INSERT INTO scheduled_jobs (kind, due_at, payload, created_at) VALUES (?, ?, ?, ?)',
+            (kind, due_at, json.dumps(payload), self.clock()))
+        job = Job(cursor.lastrowid, kind, due_at, payload)
+        self._add(job)
+        self.stats["scheduled"] += 1
+        return job.id
+
+    async def cancel(self, job_id: int) -> bool:
+        """Remove a pending job; returns False if it already ran or doesn't exist"""
+        job = self.jobs.pop(job_id, None)
+        if job is None:
+            return False
+        pool = await self._get_pool()
+        await pool.execute('DELETE FROM scheduled_jobs WHERE id = ?', (job_id,))
+        self.stats["cancelled"] += 1
+        return True
+
+    def pending(self, kind: Optional[str] = None) -> List[Job]:
+        """Pending jobs, optionally of one kind, soonest first"""
+        jobs = [job for job in self.jobs.values() if kind is None or job.kind == kind]
+        return sorted(jobs, key=lambda job: (job.due_at, job.id))
+
+    async def restore(self) -> int:
+        """Load the stored jobs, e.g. after a restart; overdue jobs run right away
+
+        Only loads once, so it is safe to call from on_ready.
+        """
+        if self.restored:
+            return 0
+        pool = await self._get_pool()
+        rows = await pool.fetchall('SELECT id, kind, due_at, payload FROM scheduled_jobs')
+        for job_id, kind, due_at, payload in rows:
+            if job_id not in self.jobs:
+                self._add(Job(job_id, kind, due_at, json.loads(payload)))
+        self.restored = True
+        self.stats["restored"] += len(rows)
+        logger.info(f"Restored {len(rows)} scheduled jobs")
+        return len(rows)
+
+    def start(self):
+        """Start the scheduler task; safe to call again, e.g. from on_ready"""
+        if self.task is not None and not self.task.done():
+            return
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            now = self.clock()
+            while self.heap and self.heap[0][0] <= now:
+                _, job_id = heapq.heappop(self.heap)
+                job = self.jobs.pop(job_id, None)
+                if job is None:
+                    continue
+                task = asyncio.create_task(self._fire(job))
+                self.running.add(task)
+                task.add_done_callback(self.running.discard)
+
+            timeout = self.heap[0][0] - now if self.heap else None
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, job: Job):
+        handler = self.handlers.get(job.kind)
+        try:
+            if handler is None:
+                logger.warning(f"Dropping job {job.id}: no handler for {job.kind}")
+            else:
+                await handler(job)
+                self.stats["fired"] += 1
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.error(f"Scheduled {job.kind} job {job.id} failed: {e}")
+        try:
+            pool = await self._get_pool()
+            await pool.execute('DELETE FROM scheduled_jobs WHERE id = ?', (job.id,))
+        except Exception as e:
+            logger.error(f"Could not remove finished job {job.id}: {e}")
+
+    async def close(self, timeout: float = 10.0):
+        """Stop the scheduler, letting handlers that already started finish
+
+        Jobs that aren't due yet stay stored and are restored on the next start.
+        """
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.running:
+            done, pending = await asyncio.wait(self.running, timeout=timeout)
+            for task in pending:
+                task.cancel()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get statistics about the scheduler"""
+        return {**self.stats, "pending": len(self.jobs), "running": len(self.running)}
+
+
+# Singleton scheduler instance
+scheduler = Scheduler()
+
+# Helper function to get the scheduler
+async def get_scheduler() -> Scheduler:
+    """Get the shared job scheduler"""
+    return scheduler
@@ -1,9 +1,111 @@
 
-import aiosqlite
+import database
+from stats_rollups import ROLLUP_TABLES
+from compaction import USER_DAILY_ACTIVITY_TABLE
+from user_names import USER_NAMES_TABLE
+from ledger import LEDGER_TABLES, rename_legacy_transactions
+from scheduler import SCHEDULER_TABLES
+from level_roles import DEFAULT_LEVEL_ROLES
+
+# Versioned schema migrations, applied in order once each
+# The schema version is tracked in SQLite's PRAGMA user_version
+# A step is either an SQL statement or an async function taking the connection
+SCHEMA_MIGRATIONS = [
+    (1, "Index message_log and user_reactions by user and time", [
+        '''
+            CREATE TABLE IF NOT EXISTS user_reactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                message_id INTEGER NOT NULL,
+                emoji TEXT NOT NULL,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_message_log_user_time ON message_log (user_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_message_log_time ON message_log (timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_user_reactions_user_time ON user_reactions (user_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_user_reactions_time ON user_reactions (timestamp)',
+    ]),
+    (2, "Add hourly and daily stats rollups", ROLLUP_TABLES + [
+        # Backfill the rollups from the raw logs
+        '''
+            INSERT OR IGNORE INTO stats_hourly_users (hour, user_id)
+            SELECT DISTINCT substr(timestamp, 1, 13), user_id FROM message_log
+        ''',
+        '''
+            INSERT OR IGNORE INTO stats_daily_users (date, user_id)
+            SELECT DISTINCT substr(timestamp, 1, 10), user_id FROM message_log
+        ''',
+        '''
+            INSERT OR REPLACE INTO stats_hourly (hour, message_count, reaction_count, active_users)
+            SELECT hour, SUM(messages), SUM(reactions), SUM(users) FROM (
+                SELECT substr(timestamp, 1, 13) AS hour, COUNT(*) AS messages, 0 AS reactions,
+                       COUNT(DISTINCT user_id) AS users
+                FROM message_log GROUP BY hour
+                UNION ALL
+                SELECT substr(timestamp, 1, 13), 0, COUNT(*), 0 FROM user_reactions GROUP BY 1
+            ) GROUP BY hour
+        ''',
+        # Daily reaction counts come from server_stats, which the dashboard used so far
+        '''
+            INSERT OR REPLACE INTO stats_daily (date, message_count, reaction_count, active_users)
+            SELECT date, SUM(messages), SUM(reactions), SUM(users) FROM (
+                SELECT substr(timestamp, 1, 10) AS date, COUNT(*) AS messages, 0 AS reactions,
+                       COUNT(DISTINCT user_id) AS users
+                FROM message_log GROUP BY date
+                UNION ALL
+                SELECT date, 0, reaction_count, 0 FROM server_stats
+            ) GROUP BY date
+        ''',
+        '''
+            INSERT OR REPLACE INTO stats_totals (id, message_count, reaction_count, last_message_at)
+            VALUES (
+                1,
+                (SELECT COUNT(*) FROM message_log),
+                (SELECT COALESCE(SUM(reaction_count), 0) FROM server_stats),
+                (SELECT MAX(timestamp) FROM message_log)
+            )
+        ''',
+    ]),
+    (3, "Add per-user daily counters for compacted activity logs", [
+        USER_DAILY_ACTIVITY_TABLE,
+    ]),
+    (4, "Remember user display names", [
+        USER_NAMES_TABLE,
+    ]),
+    (5, "Add the coin ledger and balance snapshots", [rename_legacy_transactions] + LEDGER_TABLES + [
+        # Opening balances, so the ledger adds up from the moment it starts
+        '''
+            INSERT INTO balance_snapshots (taken_at, last_transaction_id, user_count, total_coins)
+            SELECT strftime('%s', 'now'), 0, COUNT(*), COALESCE(SUM(coins), 0) FROM users
+        ''',
+        '''
+            INSERT INTO balance_snapshot_rows (user_id, snapshot_id, coins)
+            SELECT user_id, (SELECT MAX(id) FROM balance_snapshots), coins FROM users
+        ''',
+    ]),
+    (6, "Add the scheduled jobs table", SCHEDULER_TABLES),
+]
+
+async def run_migrations():
+    """Apply the schema migrations newer than the database's schema version"""
+    version = await database.fetchval('PRAGMA user_version', default=0)
+    for migration_version, description, statements in SCHEMA_MIGRATIONS:
+        if migration_version <= version:
+            continue
+        # Each migration and its version bump are committed together
+        async with database.transaction() as db:
+            for statement in statements:
+                if callable(statement):
+                    await statement(db)
+                else:
+                    await db.execute(statement)
+            await db.execute(f'PRAGMA user_version = {migration_version}')
+        print(f"Applied schema migration {migration_version}: {description}")
 
 async def setup_db():
     try:
-        async with aiosqlite.connect("leveling.db") as db:
+        async with database.session() as db:
             # Create users table
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS users (
@@ -69,12 +171,13 @@ async def setup_db():
             ''')
             
             # Create server stats table for message tracking
+            # (same schema as in main.setup_db; the write buffer upserts on date)
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS server_stats (
-                    guild_id INTEGER NOT NULL,
-                    date TEXT NOT NULL,
-                    total_messages INTEGER DEFAULT 0,
-                    PRIMARY KEY (guild_id, date)
+                    date TEXT PRIMARY KEY,
+                    message_count INTEGER DEFAULT 0,
+                    reaction_count INTEGER DEFAULT 0,
+                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
             
@@ -141,30 +244,7 @@ async def setup_db():
             count = await cursor.fetchone()
 
             if count[0] == 0:
-                default_level_roles = {
-                    5: 1339331106557657089,
-                    10: 1339332632860950589,
-                    15: 1339333949201186878,
-                    20: 1339571891848876075,
-                    25: 1339572201430454272,
-                    30: 1339572204433838142,
-                    35: 1339572206895894602,
-                    40: 1339572209848680458,
-                    45: 1339572212285575199,
-                    50: 1339572214881714176,
-                    55: 1339574559136944240,
-                    60: 1339574564685873245,
-                    65: 1339574564983804018,
-                    70: 1339574565780590632,
-                    75: 1339574566669783180,
-                    80: 1339574568276332564,
-                    85: 1339574568586842112,
-                    90: 1339574569417048085,
-                    95: 1339576526458322954,
-                    100: 1339576529377820733
-                }
-
-                for level, role_id in default_level_roles.items():
+                for level, role_id in DEFAULT_LEVEL_ROLES.items():
                     await db.execute(
                         'INSERT INTO level_roles (level, role_id) VALUES (?, ?)',
                         (level, role_id)
@@ -244,6 +324,9 @@ async def setup_db():
             
             await db.commit()
 
+        # Bring the schema up to date
+        await run_migrations()
+
     except Exception as e:
         print(f"Error in initial DB setup: {e}")
         raise e
@@ -0,0 +1,199 @@
+"""
+Hourly and daily rollups of server activity
+Message and reaction counts and the sets of active users are collected by the
+write buffer and added to the rollup tables on every flush, so the stats
+dashboard reads a few rows instead of scanning message_log
+"""
+
+import logging
+from typing import Dict, List, Optional, Set, Tuple, Any
+
+import database
+
+logger = logging.getLogger('stats_rollups')
+
+# Rollup keys are cut from UTC timestamps formatted as "%Y-%m-%d %H:%M:%S"
+HOUR_KEY_LENGTH = 13
+DATE_KEY_LENGTH = 10
+
+# Rollup tables; the *_users tables hold the set of users active in each period
+ROLLUP_TABLES = [
+    '''
+        CREATE TABLE IF NOT EXISTS stats_hourly (
+            hour TEXT PRIMARY KEY,
+            message_count INTEGER DEFAULT 0,
+            reaction_count INTEGER DEFAULT 0,
+            active_users INTEGER DEFAULT 0
+        )
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS stats_hourly_users (
+            hour TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            PRIMARY KEY (hour, user_id)
+        ) WITHOUT ROWID
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS stats_daily (
+            date TEXT PRIMARY KEY,
+            message_count INTEGER DEFAULT 0,
+            reaction_count INTEGER DEFAULT 0,
+            active_users INTEGER DEFAULT 0
+        )
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS stats_daily_users (
+            date TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            PRIMARY KEY (date, user_id)
+        ) WITHOUT ROWID
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS stats_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            message_count INTEGER DEFAULT 0,
+            reaction_count INTEGER DEFAULT 0,
+            last_message_at TEXT
+        )
+    ''',
+]
+
+
+class StatsRollup:
+    """Rollup increments collected between two write buffer flushes"""
+
+    def __init__(self):
+        self.hourly: Dict[str, List[int]] = {}
+        self.daily: Dict[str, List[int]] = {}
+        self.hourly_users: Dict[str, Set[int]] = {}
+        self.daily_users: Dict[str, Set[int]] = {}
+        self.messages = 0
+        self.reactions = 0
+        self.last_message_at: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self.hourly) + len(self.daily)
+
+    def add_message(self, user_id: int, utc_time: str):
+        """Count a message sent at a UTC timestamp"""
+        hour, date = utc_time[:HOUR_KEY_LENGTH], utc_time[:DATE_KEY_LENGTH]
+        self.hourly.setdefault(hour, [0, 0])[0] += 1
+        self.daily.setdefault(date, [0, 0])[0] += 1
+        self.hourly_users.setdefault(hour, set()).add(user_id)
+        self.daily_users.setdefault(date, set()).add(user_id)
+        self.messages += 1
+        if self.last_message_at is None or utc_time > self.last_message_at:
+            self.last_message_at = utc_time
+
+    def add_reaction(self, utc_time: str):
+        """Count a reaction added at a UTC timestamp"""
+        self.hourly.setdefault(utc_time[:HOUR_KEY_LENGTH], [0, 0])[1] += 1
+        self.daily.setdefault(utc_time[:DATE_KEY_LENGTH], [0, 0])[1] += 1
+        self.reactions += 1
+
+    def merge(self, other: "StatsRollup"):
+        """Add the increments of another rollup, e.g. one whose flush failed"""
+        for mine, theirs in ((self.hourly, other.hourly), (self.daily, other.daily)):
+            for key, (messages, reactions) in theirs.items():
+                counts = mine.setdefault(key, [0, 0])
+                counts[0] += messages
+                counts[1] += reactions
+        for mine, theirs in ((self.hourly_users, other.hourly_users), (self.daily_users, other.daily_users)):
+            for key, users in theirs.items():
+                mine.setdefault(key, set()).update(users)
+        self.messages += other.messages
+        self.reactions += other.reactions
+        if other.last_message_at and (self.last_message_at is None or other.last_message_at > self.last_message_at):
+            self.last_message_at = other.last_message_at
+
+    async def write(self, connection):
+        """Add the collected increments to the rollup tables"""
+        await self._write_level(connection, "stats_hourly", "hour", self.hourly, self.hourly_users)
+        await self._write_level(connection, "stats_daily", "date", self.daily, self.daily_users)
+
+        if self.messages or self.reactions:
+            await connection.execute('''
+                INSERT INTO stats_totals (id, message_count, reaction_count, last_message_at)
+                VALUES (1, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                message_count = message_count + excluded.message_count,
+                reaction_count = reaction_count + excluded.reaction_count,
+                last_message_at = COALESCE(MAX(excluded.last_message_at, last_message_at), last_message_at, excluded.last_message_at)
+            ''', (self.messages, self.reactions, self.last_message_at))
+
+    async def _write_level(self, connection, table: str, key: str,
+                           counts: Dict[str, List[int]], users: Dict[str, Set[int]]):
+        if counts:
+            await connection.executemany(f'''
+                INSERT INTO {table} ({key}, message_count, reaction_count)
+                VALUES (?, ?, ?)
+                ON CONFLICT({key}) DO UPDATE SET
+                message_count = message_count + excluded.message_count,
+                reaction_count = reaction_count + excluded.reaction_count
+            ''', [(period, messages, reactions) for period, (messages, reactions) in counts.items()])
+
+        # Only users that weren't in the period's set yet raise its active user count
+        for period, user_ids in users.items():
+            cursor = await connection.executemany(
+                f'INSERT OR IGNORE INTO {table}_users ({key}, user_id) VALUES (?, ?)',
+                [(period, user_id) for user_id in user_ids])
+            if cursor.rowcount > 0:
+                await connection.execute(
+                    f'UPDATE {table} SET active_users = active_users + ? WHERE {key} = ?',
+                    (cursor.rowcount, period))
+
+
+async def get_day_stats(date: str) -> Dict[str, int]:
+    """Messages, reactions and active users of a UTC date ("%Y-%m-%d")"""
+    row = await database.fetchone(
+        'SELECT message_count, reaction_count, active_users FROM stats_daily WHERE date = ?', (date,))
+    message_count, reaction_count, active_users = row or (0, 0, 0)
+    return {
+        "message_count": message_count,
+        "reaction_count": reaction_count,
+        "active_users": active_users,
+    }
+
+
+async def get_hourly_messages(date: str) -> List[Tuple[str, int]]:
+    """(hour "HH", message count) for every hour of a UTC date with activity"""
+    rows = await database.fetchall('''
+        SELECT hour, message_count FROM stats_hourly
+        WHERE hour >= ? AND hour <= ? AND message_count > 0
+        ORDER BY hour
+    ''', (f"{date} 00", f"{date} 23"))
+    return [(hour[DATE_KEY_LENGTH + 1:], count) for hour, count in rows]
+
+
+async def get_totals() -> Dict[str, Any]:
+    """All-time message and reaction counts and the time of the latest message"""
+    row = await database.fetchone(
+        'SELECT message_count, reaction_count, last_message_at FROM stats_totals WHERE id = 1')
+    message_count, reaction_count, last_message_at = row or (0, 0, None)
+    return {
+        "message_count": message_count,
+        "reaction_count": reaction_count,
+        "last_message_at": last_message_at,
+    }
+
+
+async def reset_day(connection, date: str):
+    """Remove a UTC date from the rollups and the all-time totals
+
+    Runs on the connection of the caller's transaction.
+    """
+    cursor = await connection.execute(
+        'SELECT message_count, reaction_count FROM stats_daily WHERE date = ?', (date,))
+    row = await cursor.fetchone()
+    if row:
+        await connection.execute('''
+            UPDATE stats_totals
+            SET message_count = MAX(message_count - ?, 0), reaction_count = MAX(reaction_count - ?, 0)
+            WHERE id = 1
+        ''', row)
+
+    hour_range = (f"{date} 00", f"{date} 23")
+    await connection.execute('DELETE FROM stats_daily WHERE date = ?', (date,))
+    await connection.execute('DELETE FROM stats_daily_users WHERE date = ?', (date,))
+    await connection.execute('DELETE FROM stats_hourly WHERE hour >= ? AND hour <= ?', hour_range)
+    await connection.execute('DELETE FROM stats_hourly_users WHERE hour >= ? AND hour <= ?', hour_range)
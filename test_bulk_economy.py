@@ -0,0 +1,86 @@
+"""
+Test script to verify server-wide coin grants.
+This script:
+1. Creates a temporary database with users, some of them cached or buffered
+2. Grants coins to everyone in one update
+3. Checks every balance, including buffered and newly created users
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+
+from bulk_economy import grant_coins_to_all
+from db_pool import DatabasePool
+from ledger import LEDGER_TABLES
+from rankings import Rankings
+from user_cache import UserCache
+from write_buffer import WriteBuffer
+
+
+async def run_grant(path):
+    pool = DatabasePool(path, max_connections=2)
+    buffer = WriteBuffer(pool=pool)
+    rankings = Rankings(pool=pool, buffer=buffer)
+    cache = UserCache(pool=pool, buffer=buffer, rankings=rankings)
+    try:
+        # A cached user with a pending change and a user that only exists in the buffer
+        await cache.get(1)
+        await cache.apply(1, coins=5)
+        await cache.get(1001, create=True)
+
+        stages = []
+
+        async def progress(stage, count):
+            stages.append((stage, count))
+
+        count = await grant_coins_to_all(50, "test", progress=progress, pool=pool, buffer=buffer, cache=cache)
+        assert count == 1001
+        assert stages == [("flushing", 0), ("updating", 0), ("done", 1001)]
+
+        # The cache was cleared, so balances are read again with the grant
+        assert (await cache.get(1))["coins"] == 1 * 10 + 5 + 50
+        assert (await cache.get(1001))["coins"] == 50
+        assert (await rankings.rank("coins", 1001))[0] > 0
+    finally:
+        await pool.close()
+
+
+def test_grant_coins_to_all():
+    """One update adds the coins to every user, buffered ones included"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.db")
+        conn = sqlite3.connect(path)
+        conn.execute('''
+            CREATE TABLE users (
+                user_id INTEGER PRIMARY KEY,
+                level INTEGER DEFAULT 1,
+                prestige INTEGER DEFAULT 0,
+                xp INTEGER DEFAULT 0,
+                total_messages INTEGER DEFAULT 0,
+                coins INTEGER DEFAULT 0,
+                invites INTEGER DEFAULT 0,
+                activity_coins FLOAT DEFAULT 0
+            )
+        ''')
+        conn.executemany('INSERT INTO users (user_id, coins) VALUES (?, ?)',
+                         [(user_id, user_id * 10) for user_id in range(1, 1001)])
+        for statement in LEDGER_TABLES:
+            conn.execute(statement)
+        conn.commit()
+        conn.close()
+
+        asyncio.run(run_grant(path))
+
+        conn = sqlite3.connect(path)
+        assert conn.execute('SELECT coins FROM users WHERE user_id = 500').fetchone()[0] == 5050
+        assert conn.execute('SELECT SUM(coins) FROM users').fetchone()[0] == sum(i * 10 for i in range(1, 1001)) + 5 + 50 * 1001
+        # One ledger row per user for the grant, plus the buffered change
+        assert conn.execute("SELECT COUNT(*), SUM(amount) FROM coin_transactions WHERE reason = 'test'").fetchone() == (1001, 50 * 1001)
+        conn.close()
+
+
+if __name__ == "__main__":
+    test_grant_coins_to_all()
+    print("✅ Coins were granted to every user in one update")
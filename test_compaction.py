@@ -0,0 +1,98 @@
+"""
+Test script to verify the activity log compaction.
+This script:
+1. Logs old and recent messages and reactions
+2. Compacts with a small batch size and checks old rows were folded into daily counters
+3. Checks recent rows are kept and incremental vacuum was enabled
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timezone
+
+from compaction import LogCompactor, USER_DAILY_ACTIVITY_TABLE
+from db_pool import DatabasePool
+from stats_rollups import ROLLUP_TABLES
+
+NOW = datetime(2025, 6, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def create_database(path):
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE message_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE user_reactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            emoji TEXT NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    ''')
+    for statement in ROLLUP_TABLES + [USER_DAILY_ACTIVITY_TABLE]:
+        conn.execute(statement)
+
+    # 25 old messages on two days, 3 recent ones
+    messages = [(1, 10, f'2025-01-02 10:{minute:02d}:00') for minute in range(15)]
+    messages += [(2, 10, f'2025-01-03 09:{minute:02d}:00') for minute in range(10)]
+    messages += [(1, 10, '2025-05-30 08:00:00'), (2, 10, '2025-05-31 08:00:00'), (2, 10, '2025-05-31 09:00:00')]
+    conn.executemany('INSERT INTO message_log (user_id, channel_id, timestamp) VALUES (?, ?, ?)', messages)
+    conn.executemany('INSERT INTO user_reactions (user_id, message_id, emoji, timestamp) VALUES (?, ?, ?, ?)', [
+        (1, 100, '👍', '2025-01-02 11:00:00'),
+        (1, 101, '👍', '2025-05-31 11:00:00'),
+    ])
+    conn.executemany('INSERT INTO stats_daily_users (date, user_id) VALUES (?, ?)', [
+        ('2025-01-02', 1), ('2025-05-31', 2),
+    ])
+    # Already compacted counters are added to, not replaced
+    conn.execute("INSERT INTO user_daily_activity (user_id, date, message_count) VALUES (1, '2025-01-02', 5)")
+    conn.commit()
+    conn.close()
+
+
+async def run_compaction(path):
+    pool = DatabasePool(path, max_connections=2)
+    try:
+        compactor = LogCompactor(pool, retention_days=30, batch_size=4)
+        removed = await compactor.compact(now=NOW)
+        assert removed["message_log"] == 25, removed
+        assert removed["user_reactions"] == 1, removed
+        assert removed["stats_daily_users"] == 1, removed
+        # 25 rows in batches of 4 take 7 batches, plus one for the reactions
+        assert compactor.get_stats()["batches"] == 8, compactor.get_stats()
+
+        # Running again finds nothing left to compact
+        removed = await compactor.compact(now=NOW)
+        assert removed["message_log"] == 0 and removed["user_reactions"] == 0, removed
+    finally:
+        await pool.close()
+
+
+def test_compaction_folds_old_rows():
+    """Rows past the retention horizon become daily counters and the rest stay raw"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.db")
+        create_database(path)
+        asyncio.run(run_compaction(path))
+
+        conn = sqlite3.connect(path)
+        counters = conn.execute(
+            'SELECT user_id, date, message_count, reaction_count FROM user_daily_activity ORDER BY user_id, date').fetchall()
+        assert counters == [(1, '2025-01-02', 20, 1), (2, '2025-01-03', 10, 0)], counters
+        assert conn.execute('SELECT COUNT(*) FROM message_log').fetchone()[0] == 3
+        assert conn.execute('SELECT COUNT(*) FROM user_reactions').fetchone()[0] == 1
+        assert conn.execute('SELECT date FROM stats_daily_users').fetchall() == [('2025-05-31',)]
+        assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+        conn.close()
+
+
+if __name__ == "__main__":
+    test_compaction_folds_old_rows()
+    print("✅ Activity log compaction folded old rows into daily counters")
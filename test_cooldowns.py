@@ -0,0 +1,54 @@
+"""
+Test script to verify the shared cooldowns.
+This script:
+1. Uses a plain cooldown and checks the remaining time
+2. Uses a burst limit and checks uses recover one at a time
+3. Checks expired keys are dropped
+"""
+
+from cooldowns import Cooldowns
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cooldowns():
+    """Keys are limited for their cooldown and forgotten once it has passed"""
+    clock = FakeClock()
+    cooldowns = Cooldowns(clock=clock)
+
+    # A plain cooldown
+    assert cooldowns.hit(("coinflip", 1), 3) == 0
+    assert cooldowns.hit(("coinflip", 1), 3) == 3
+    assert cooldowns.hit(("roulette", 1), 3) == 0
+    clock.now += 2
+    assert cooldowns.remaining(("coinflip", 1), 3) == 1
+    clock.now += 1
+    assert cooldowns.hit(("coinflip", 1), 3) == 0
+
+    # A burst of three uses, then one more every 10 seconds
+    for _ in range(3):
+        assert cooldowns.hit(("xp", 2), 10, burst=3) == 0
+    assert cooldowns.hit(("xp", 2), 10, burst=3) == 10
+    clock.now += 10
+    assert cooldowns.hit(("xp", 2), 10, burst=3) == 0
+    assert cooldowns.hit(("xp", 2), 10, burst=3) == 10
+
+    # Every key has recovered after 30 seconds and is dropped on the next use
+    clock.now += 30
+    assert cooldowns.hit(("xp", 3), 5) == 0
+    assert len(cooldowns) == 1
+    assert cooldowns.get_stats()["heap_size"] == 1
+
+    cooldowns.reset(("xp", 3))
+    assert cooldowns.hit(("xp", 3), 5) == 0
+
+
+if __name__ == "__main__":
+    test_cooldowns()
+    print("✅ Cooldowns limited and expired keys correctly")
@@ -0,0 +1,69 @@
+"""
+Test script to verify the data access layer.
+This script:
+1. Runs reads and writes through a session like the command handlers do
+2. Checks a transaction block commits together or not at all
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+
+import database
+from db_pool import DatabasePool
+
+
+async def run_database(path):
+    database.pool = DatabasePool(path, max_connections=2)
+    try:
+        async with database.session() as db:
+            await db.execute('CREATE TABLE users (user_id INTEGER PRIMARY KEY, coins INTEGER)')
+            await db.execute('INSERT INTO users (user_id, coins) VALUES (1, 100), (2, 0)')
+            await db.commit()
+
+            # Reads see the committed writes and return a cursor-like result
+            cursor = await db.execute('SELECT user_id, coins FROM users ORDER BY user_id')
+            assert await cursor.fetchone() == (1, 100)
+            assert await cursor.fetchall() == [(2, 0)]
+
+        # A transaction block is committed as one unit
+        async with database.transaction() as db:
+            await db.execute('UPDATE users SET coins = coins - 40 WHERE user_id = 1')
+            await db.execute('UPDATE users SET coins = coins + 40 WHERE user_id = 2')
+        assert await database.fetchall('SELECT coins FROM users ORDER BY user_id') == [(60,), (40,)]
+
+        # ...and rolled back completely when the block raises
+        try:
+            async with database.transaction() as db:
+                await db.execute('UPDATE users SET coins = coins - 40 WHERE user_id = 1')
+                raise ValueError("transfer failed")
+        except ValueError:
+            pass
+        assert await database.fetchval('SELECT coins FROM users WHERE user_id = 1') == 60
+        assert await database.fetchval('SELECT coins FROM users WHERE user_id = 3', default=0) == 0
+        assert await database.fetchmany('SELECT user_id FROM users ORDER BY user_id', size=1) == [(1,)]
+    finally:
+        await database.pool.close()
+        database.pool = None
+
+
+def test_database_session_and_transaction():
+    """Sessions route reads and writes; transactions are atomic"""
+    assert database.is_read_statement("  select 1")
+    assert database.is_read_statement("PRAGMA table_info(users)")
+    assert not database.is_read_statement("PRAGMA journal_mode = WAL")
+    assert not database.is_read_statement("UPDATE users SET coins = 0")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.db")
+        asyncio.run(run_database(path))
+
+        conn = sqlite3.connect(path)
+        assert conn.execute('SELECT SUM(coins) FROM users').fetchone()[0] == 100
+        conn.close()
+
+
+if __name__ == "__main__":
+    test_database_session_and_transaction()
+    print("✅ Data access layer routed all queries correctly")
@@ -0,0 +1,76 @@
+"""
+Test script to verify the connection pool hands out connections fairly.
+This script:
+1. Holds every connection of a small pool
+2. Queues several waiters and releases connections one at a time
+3. Checks waiters are served in order and the wait histogram is filled
+4. Checks timed out or cancelled waiters never lose a connection
+"""
+
+import asyncio
+import os
+import tempfile
+
+from db_pool import DatabasePool
+
+
+async def run_pool(path):
+    pool = DatabasePool(path, max_connections=2, timeout=0.5)
+    first = await pool.acquire()
+    second = await pool.acquire()
+
+    # Waiters queue up in FIFO order while all connections are busy
+    order = []
+
+    async def waiter(name):
+        index, _ = await pool.acquire()
+        order.append(name)
+        await asyncio.sleep(0.01)
+        await pool.release(index)
+
+    tasks = [asyncio.create_task(waiter(name)) for name in ("a", "b", "c")]
+    await asyncio.sleep(0.01)
+    assert (await pool.get_stats())["waiting"] == 3
+
+    await pool.release(first[0])
+    await asyncio.gather(*tasks)
+    assert order == ["a", "b", "c"]
+
+    # A real timeout is raised when no connection is released in time
+    held = await pool.acquire()
+    try:
+        await pool.acquire()
+        assert False, "acquire should have timed out"
+    except TimeoutError:
+        pass
+    await pool.release(held[0])
+
+    # A waiter cancelled right after being handed a connection gives it back
+    held = await pool.acquire()
+    task = asyncio.create_task(pool.acquire())
+    await asyncio.sleep(0.01)
+    await pool.release(held[0])
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    assert len(pool.idle) == 1
+    await pool.release(second[0])
+
+    stats = await pool.get_stats()
+    assert stats["timeouts"] == 1
+    assert stats["idle_connections"] == 2
+    assert sum(stats["wait_histogram_ms"].values()) == stats["connections_used"] == 7
+    await pool.close()
+
+
+def test_pool_fifo_and_timeout():
+    """Waiting acquires are served in order and time out after the pool timeout"""
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run_pool(os.path.join(tmp, "test.db")))
+
+
+if __name__ == "__main__":
+    test_pool_fifo_and_timeout()
+    print("✅ Connection pool served waiters in order")
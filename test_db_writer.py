@@ -0,0 +1,70 @@
+"""
+Test script to verify all writes go through the single database writer.
+This script:
+1. Sends many concurrent writes and checks they are group-committed
+2. Checks a failing job is rolled back without losing the rest of its batch
+3. Checks pooled connections are read-only
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+
+from db_pool import DatabasePool
+
+
+async def run_writer(path):
+    pool = DatabasePool(path, max_connections=2)
+    await pool.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, value INTEGER)')
+
+    # Concurrent writes are grouped into fewer commits
+    commits_before = pool.writer.stats["commits"]
+    await asyncio.gather(*[
+        pool.execute('INSERT INTO items (id, value) VALUES (?, ?)', (i, i)) for i in range(50)
+    ])
+    assert pool.writer.stats["commits"] - commits_before < 50
+    assert (await pool.fetchone('SELECT COUNT(*) FROM items'))[0] == 50
+
+    # A failing closure is rolled back on its own
+    async def failing(connection):
+        await connection.execute('UPDATE items SET value = -1')
+        raise ValueError("boom")
+
+    async def total(connection):
+        cursor = await connection.execute('SELECT SUM(value) FROM items')
+        return (await cursor.fetchone())[0]
+
+    results = await asyncio.gather(
+        pool.write(failing),
+        pool.execute('INSERT INTO items (id, value) VALUES (50, 50)'),
+        pool.write(total),
+        return_exceptions=True)
+    assert isinstance(results[0], ValueError)
+    assert results[2] == sum(range(51))
+
+    # Pooled connections can't write
+    async with pool.connection() as connection:
+        try:
+            await connection.execute('DELETE FROM items')
+            assert False, "pooled connections should be read-only"
+        except sqlite3.OperationalError:
+            pass
+
+    await pool.close()
+
+
+def test_single_writer():
+    """Writes are serialized and group-committed by the writer"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.db")
+        asyncio.run(run_writer(path))
+
+        conn = sqlite3.connect(path)
+        assert conn.execute('SELECT COUNT(*), SUM(value) FROM items').fetchone() == (51, sum(range(51)))
+        conn.close()
+
+
+if __name__ == "__main__":
+    test_single_writer()
+    print("✅ Database writer serialized all writes")
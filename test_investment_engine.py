@@ -0,0 +1,191 @@
+"""
+Test script to verify the investment accrual.
+This script:
+1. Accrues an investment over a week in one step and hour by hour
+2. Checks both give the same maintenance, coins and update time
+3. Checks income stops once maintenance drops below the pause threshold
+4. Steps many investments at once and checks healthy ones match accrue()
+5. Replays two weeks twice with the same seed and checks the reports match
+6. Checks settling stops above the warning threshold and leaves the rest to the periodic pass
+7. Collects the same investment twice at once and checks it is only paid once
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+
+import database
+from db_pool import DatabasePool
+from investment_engine import (
+    accrue, accrue_until_warning, earning_hours, healthy_hours, InvestmentEngine, SECONDS_PER_HOUR,
+    take_collected_coins
+)
+
+INVESTMENTS = {
+    "shop": {"hourly_return": 10, "max_holding": 200, "maintenance_drain": 3},
+    "company": {"hourly_return": 100, "max_holding": 600, "maintenance_drain": 3.5},
+}
+RISK_EVENTS = {
+    "shop": ["A fire broke out", "An earthquake hit the shop"],
+    "company": ["A lawsuit was filed", "An earthquake hit the offices"],
+}
+
+
+def test_accrue_is_path_independent():
+    """Settling once or every hour gives the same investment state"""
+    start = 1_700_000_000.0
+    now = start + 170 * SECONDS_PER_HOUR + 1234
+    for hourly_return, max_holding, drain in ((10, 200, 3), (100, 600, 3.5), (50, 300, 2.5)):
+        once = accrue(100, 0, start, now, hourly_return, max_holding, drain)
+
+        state = (100, 0, start)
+        hours = 0
+        for step in range(1, 172):
+            maintenance, coins, updated, passed = accrue(*state, min(now, start + step * SECONDS_PER_HOUR),
+                                                         hourly_return, max_holding, drain)
+            state = (maintenance, coins, updated)
+            hours += passed
+
+        assert once[3] == hours == 170
+        assert abs(once[0] - state[0]) < 1e-9 and once[1:3] == state[1:], (once, state)
+        # The partial hour is kept for the next update
+        assert once[2] == start + 170 * SECONDS_PER_HOUR
+
+
+def test_income_pauses_below_threshold():
+    """Hours that start below 25% maintenance earn nothing"""
+    assert earning_hours(30, 5, 10) == 2  # 30% and 25% earn, 20% doesn't
+    assert earning_hours(24, 1, 10) == 0
+    assert earning_hours(100, 0, 10) == 10
+
+    maintenance, coins, _, hours = accrue(30, 0, 0, 10 * SECONDS_PER_HOUR, 10, 1000, 5)
+    assert (maintenance, coins, hours) == (0, 20, 10)
+
+    # Coins are capped at the storage and never taken away by the cap
+    assert accrue(100, 190, 0, 5 * SECONDS_PER_HOUR, 10, 200, 1)[1] == 200
+    assert accrue(100, 250, 0, 5 * SECONDS_PER_HOUR, 10, 200, 1)[1] == 250
+
+
+def test_settling_stops_above_warning():
+    """Settling never takes maintenance to the warning threshold, so the periodic pass sees the drop"""
+    assert healthy_hours(100, 3, 100) == 16  # 52% after 16 hours, 49% after 17
+    assert healthy_hours(56, 3, 100) == 1  # Exactly 50% is already the warning zone
+    assert healthy_hours(50, 3, 100) == 0
+    assert healthy_hours(80, 0, 7) == 7
+
+    # Settled every hour for a day, the investment stops at 52% and the rest stays due
+    state = (100, 0, 0.0)
+    for hour in range(1, 25):
+        maintenance, coins, updated, _ = accrue_until_warning(*state, hour * SECONDS_PER_HOUR, 10, 1000, 3)
+        state = (maintenance, coins, updated)
+    assert state == (52, 160, 16 * SECONDS_PER_HOUR)
+
+    # The same hours as accrue() while the investment stays healthy
+    assert accrue_until_warning(100, 0, 0, 5 * SECONDS_PER_HOUR, 10, 1000, 3) == accrue(
+        100, 0, 0, 5 * SECONDS_PER_HOUR, 10, 1000, 3)
+
+    # The periodic pass then finds it due, drains it below the threshold and reminds the owner
+    engine = InvestmentEngine(INVESTMENTS, RISK_EVENTS, seed=1)
+    columns = engine.load([(1, 1, "shop", state[0], state[1], state[2])])
+    outcome, = engine.step(columns, 24 * SECONDS_PER_HOUR)
+    assert outcome["reminder"] and outcome["drained_maintenance"] == 52 - 3 * 8
+
+
+def test_engine_step():
+    """Stepping the columns advances every due investment in one pass"""
+    start = 1_700_000_000.0
+    rows = [(i, 100 + i, "shop" if i % 2 else "company", 100 - i * 3, i * 10, start) for i in range(30)]
+    rows.append((99, 1, "unknown", 100, 0, start))
+    engine = InvestmentEngine(INVESTMENTS, RISK_EVENTS, seed=7)
+    columns = engine.load(rows)
+    assert len(columns) == 30
+
+    now = start + 5 * SECONDS_PER_HOUR
+    outcomes = engine.step(columns, now)
+    assert len(outcomes) == 30
+    for outcome in outcomes:
+        inv_id, _, inv_type, maintenance, coins, updated = rows[outcome["index"]]
+        settings = INVESTMENTS[inv_type]
+        expected = accrue(maintenance, coins, updated, now, settings["hourly_return"],
+                          settings["max_holding"], settings["maintenance_drain"])
+        assert outcome["drained_maintenance"] == expected[0]
+        if outcome["risk_type"] is None:
+            assert (columns.maintenance[outcome["index"]], columns.coins[outcome["index"]]) == expected[:2]
+        else:
+            assert outcome["drained_maintenance"] < 25
+            assert outcome["risk_event"] in RISK_EVENTS[inv_type]
+        assert outcome["shutdown"] == (columns.maintenance[outcome["index"]] <= 0)
+
+    # Nothing is due again until another hour has passed
+    assert engine.step(columns, now + 10) == []
+
+
+def test_engine_replay_is_deterministic():
+    """A seeded replay of two weeks gives the same report every time"""
+    start = 0.0
+    rows = [(i, i, "shop" if i % 2 else "company", 100, 0, start) for i in range(200)]
+
+    def collect_and_repair(columns, now):
+        # Half of the owners collect and repair once a day
+        if now % (24 * SECONDS_PER_HOUR) == 0:
+            for i in range(0, len(columns), 2):
+                columns.coins[i] = 0
+                columns.maintenance[i] = 100
+
+    reports = [InvestmentEngine(INVESTMENTS, RISK_EVENTS, seed=42).replay(rows, start, 14 * 24, on_step=collect_and_repair)
+               for _ in range(2)]
+    first, second = [{key: value for key, value in report.items() if key != "final"} for report in reports]
+    assert first == second
+    assert first["steps"] == 14 * 24 * 2
+    assert first["income"] > 0 and first["shutdowns"] > 0 and first["regular_events"] > 0
+    # Owners who repair every day never shut down
+    final = reports[0]["final"]
+    assert all(final.maintenance[i] > 0 for i in range(0, len(final), 2))
+
+
+async def run_concurrent_collects(path):
+    database.pool = DatabasePool(path, max_connections=2)
+    try:
+        results = await asyncio.gather(take_collected_coins(1, 150), take_collected_coins(1, 150))
+        assert sorted(results) == [False, True]
+        # Coins read before a risk event halved them can't be taken either
+        assert not await take_collected_coins(2, 80)
+    finally:
+        await database.pool.close()
+        database.pool = None
+
+
+def test_collect_pays_once():
+    """Two collects of the same storage pay out once"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.db")
+        conn = sqlite3.connect(path)
+        conn.execute('''
+            CREATE TABLE investments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                investment_type TEXT NOT NULL,
+                collected_coins INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        conn.executemany('INSERT INTO investments (id, user_id, investment_type, collected_coins) VALUES (?, ?, ?, ?)',
+                         [(1, 1, "shop", 150), (2, 1, "company", 40)])
+        conn.commit()
+        conn.close()
+
+        asyncio.run(run_concurrent_collects(path))
+
+        conn = sqlite3.connect(path)
+        assert conn.execute("SELECT id, collected_coins FROM investments ORDER BY id").fetchall() == [(1, 0), (2, 40)]
+        conn.close()
+
+
+if __name__ == "__main__":
+    test_accrue_is_path_independent()
+    test_income_pauses_below_threshold()
+    test_engine_step()
+    test_engine_replay_is_deterministic()
+    test_settling_stops_above_warning()
+    test_collect_pays_once()
+    print("✅ Investment accrual and simulation are consistent and deterministic")
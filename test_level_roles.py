@@ -0,0 +1,63 @@
+"""
+Test script to verify the cached level roles mapping.
+This script:
+1. Loads level roles from a temporary database
+2. Checks which roles to add and remove for several levels
+3. Changes the table and checks the mapping is reloaded after invalidation
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+
+from db_pool import DatabasePool
+from level_roles import LevelRoles, DEFAULT_LEVEL_ROLES
+
+
+async def run_level_roles(path):
+    pool = DatabasePool(path, max_connections=1)
+    roles = LevelRoles(pool=pool)
+
+    # Below the first threshold nothing is added or removed
+    assert await roles.roles_for_level(4) == (None, set())
+
+    current, remove = await roles.roles_for_level(12)
+    assert current == (10, 1010)
+    assert remove == {1005, 1020}
+
+    # Only roles above the level are removed when lower roles are kept
+    current, remove = await roles.roles_for_level(12, remove_lower=False)
+    assert current == (10, 1010) and remove == {1020}
+
+    # Changes to the table are only picked up after invalidation
+    await pool.execute('INSERT INTO level_roles (level, role_id) VALUES (15, 1015)')
+    assert await roles.role_for_level(16) == (10, 1010)
+    roles.invalidate()
+    assert await roles.role_for_level(16) == (15, 1015)
+
+    # An empty table falls back to the default mapping
+    await pool.execute('DELETE FROM level_roles')
+    roles.invalidate()
+    assert await roles.get_mapping() == DEFAULT_LEVEL_ROLES
+
+    await pool.close()
+
+
+def test_level_roles():
+    """Level roles are resolved from the cached mapping"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.db")
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE level_roles (level INTEGER PRIMARY KEY, role_id INTEGER NOT NULL)')
+        conn.executemany('INSERT INTO level_roles (level, role_id) VALUES (?, ?)',
+                         [(5, 1005), (10, 1010), (20, 1020)])
+        conn.commit()
+        conn.close()
+
+        asyncio.run(run_level_roles(path))
+
+
+if __name__ == "__main__":
+    test_level_roles()
+    print("✅ Level roles resolved correctly from the cache")
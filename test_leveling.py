@@ -0,0 +1,56 @@
+"""
+Test script to verify the leveling engine matches the level-by-level loop.
+This script compares leveling.apply_xp against the original while loop
+for random users and XP grants, including prestige wrap-around.
+"""
+
+import random
+
+import leveling
+
+
+def loop_level_up(level, prestige, xp, base, level_up_coins):
+    """Reference implementation: the original on_message level-up loop"""
+    coins_awarded = 0
+    levels_gained = 0
+    while xp >= leveling.xp_needed(level, base):
+        xp -= leveling.xp_needed(level, base)
+        level += 1
+        coins_awarded += level_up_coins
+        levels_gained += 1
+        if level >= 101:
+            level = 1
+            prestige += 1
+    return level, prestige, xp, levels_gained, coins_awarded
+
+
+def test_apply_xp_matches_loop():
+    """Closed-form level-ups give the same result as the loop"""
+    rng = random.Random(1234)
+    for _ in range(2000):
+        base = rng.choice([25, 50, 75])
+        level = rng.randint(1, 100)
+        prestige = rng.randint(0, 3)
+        xp = rng.randint(0, leveling.xp_needed(level, base))
+        gained = rng.choice([0, rng.randint(0, 500), rng.randint(0, 1_000_000)])
+
+        expected = loop_level_up(level, prestige, xp + gained, base, 150)
+        result = leveling.apply_xp(level, prestige, xp, gained, base, 150)
+        actual = (result["level"], result["prestige"], result["xp"],
+                  result["levels_gained"], result["coins_awarded"])
+        assert actual == expected, (level, prestige, xp, gained, base)
+
+
+def test_add_and_remove_levels():
+    """Whole levels wrap into prestige and never drop below level 1"""
+    result = leveling.add_levels(99, 0, 3, 10)
+    assert (result["level"], result["prestige"], result["coins_awarded"]) == (2, 1, 30)
+
+    result = leveling.remove_levels(5, 10)
+    assert (result["level"], result["levels_removed"]) == (1, 4)
+
+
+if __name__ == "__main__":
+    test_apply_xp_matches_loop()
+    test_add_and_remove_levels()
+    print("✅ Leveling engine matches the level-up loop")
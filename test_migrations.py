@@ -0,0 +1,113 @@
+"""
+Test script to verify the versioned schema migrations.
+This script:
+1. Sets up a database with some logged messages and checks the indexes were created once
+2. Checks the stats queries use the indexes instead of scanning
+3. Checks the stats rollups were backfilled from the logs
+4. Migrates a database that has the old coin_transactions table
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+
+import database
+from db_pool import DatabasePool
+from setup_db_updated import setup_db, SCHEMA_MIGRATIONS
+
+
+async def run_setup(path):
+    database.pool = DatabasePool(path, max_connections=1)
+    try:
+        await setup_db()
+        # Running the setup again must not re-apply anything
+        await setup_db()
+        assert await database.fetchval('PRAGMA user_version') == SCHEMA_MIGRATIONS[-1][0]
+    finally:
+        await database.pool.close()
+        database.pool = None
+
+
+def test_migrations_add_indexes():
+    """Migrations add the activity indexes and rollups, and the date filters use the indexes"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.db")
+        conn = sqlite3.connect(path)
+        conn.executescript('''
+            CREATE TABLE message_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                channel_id INTEGER NOT NULL,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            INSERT INTO message_log (user_id, channel_id, timestamp) VALUES
+                (1, 10, '2025-01-02 10:00:00'), (1, 10, '2025-01-02 10:05:00'),
+                (2, 10, '2025-01-02 11:00:00'), (2, 10, '2025-01-03 09:00:00');
+        ''')
+        conn.close()
+        asyncio.run(run_setup(path))
+
+        conn = sqlite3.connect(path)
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {"idx_message_log_user_time", "idx_message_log_time",
+                "idx_user_reactions_user_time", "idx_user_reactions_time"} <= indexes
+        # The ledger starts from one opening snapshot, even when setup runs twice
+        assert "idx_coin_transactions_user" in indexes
+        assert conn.execute("SELECT COUNT(*) FROM balance_snapshots").fetchone()[0] == 1
+
+        plan = conn.execute('''
+            EXPLAIN QUERY PLAN SELECT COUNT(*) FROM message_log
+            WHERE timestamp >= DATE('now') AND timestamp < DATE('now', '+1 day')
+        ''').fetchall()
+        assert any("idx_message_log_time" in row[-1] for row in plan), plan
+
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT COUNT(*) FROM user_reactions WHERE user_id = ?", (1,)).fetchall()
+        assert any("idx_user_reactions_user_time" in row[-1] for row in plan), plan
+
+        assert conn.execute("SELECT message_count, active_users FROM stats_daily WHERE date = '2025-01-02'").fetchone() == (3, 2)
+        assert conn.execute("SELECT message_count, active_users FROM stats_hourly WHERE hour = '2025-01-02 10'").fetchone() == (2, 1)
+        assert conn.execute("SELECT message_count, last_message_at FROM stats_totals").fetchone() == (4, '2025-01-03 09:00:00')
+        conn.close()
+
+
+def test_migrations_rename_legacy_transactions():
+    """An old coin_transactions table is kept aside and the ledger created in its place"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.db")
+        conn = sqlite3.connect(path)
+        conn.executescript('''
+            CREATE TABLE message_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                channel_id INTEGER NOT NULL,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE TABLE coin_transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                amount INTEGER NOT NULL,
+                transaction_type TEXT NOT NULL,
+                timestamp REAL NOT NULL,
+                description TEXT
+            );
+            INSERT INTO coin_transactions (user_id, amount, transaction_type, timestamp, description)
+            VALUES (1, 50, 'daily', 1700000000, 'Daily reward');
+        ''')
+        conn.close()
+        asyncio.run(run_setup(path))
+
+        conn = sqlite3.connect(path)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(coin_transactions)")}
+        assert {"reason", "created_at"} <= columns
+        assert conn.execute("SELECT user_id, amount, transaction_type FROM coin_transactions_legacy").fetchall() == [
+            (1, 50, 'daily')]
+        assert conn.execute("SELECT COUNT(*) FROM scheduled_jobs").fetchone()[0] == 0
+        conn.close()
+
+
+if __name__ == "__main__":
+    test_migrations_add_indexes()
+    test_migrations_rename_legacy_transactions()
+    print("✅ Schema migrations created the activity indexes")
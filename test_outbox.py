@@ -0,0 +1,111 @@
+"""
+Test script to verify the outgoing message queue.
+This script:
+1. Queues several DMs to one user and checks they arrive as one digest
+2. Checks DMs with a view and channel messages are sent on their own
+3. Checks rate-limited sends are retried and closed DMs are dropped
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+from types import SimpleNamespace
+
+from db_pool import DatabasePool
+from outbox import Outbox
+from user_names import UserNames, USER_NAMES_TABLE
+
+
+class SendError(Exception):
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class FakeDestination:
+    def __init__(self, failures=()):
+        self.sent = []
+        self.failures = list(failures)
+        self.name = "someone"
+
+    async def send(self, **kwargs):
+        if self.failures:
+            raise self.failures.pop(0)
+        self.sent.append(kwargs)
+
+
+class FakeBot:
+    def __init__(self, users, channels):
+        self.users = users
+        self.channels = channels
+
+    def get_user(self, user_id):
+        return self.users.get(user_id)
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+
+async def run_outbox(path):
+    alice = FakeDestination()
+    limited = FakeDestination([SendError(429, retry_after=0.02)])
+    closed = FakeDestination([SendError(403)])
+    admins = FakeDestination()
+    bot = FakeBot({1: alice, 2: limited, 3: closed}, {10: admins})
+
+    pool = DatabasePool(path, max_connections=1)
+    outbox = Outbox(bot, names=UserNames(pool=pool), workers=2, coalesce_seconds=0.05,
+                    route_interval=0, retry_delay=0.01)
+    outbox.start()
+    try:
+        await check_outbox(outbox, alice, limited, closed, admins)
+    finally:
+        await outbox.close(timeout=5)
+        await pool.close()
+
+
+async def check_outbox(outbox, alice, limited, closed, admins):
+    embed = SimpleNamespace(title="report")
+    outbox.send_dm(1, "first")
+    outbox.send_dm(1, "second")
+    outbox.send_dm(1, embed=embed)
+    view = SimpleNamespace(name="buttons")
+    outbox.send_dm(1, "pick one", view=view)
+    outbox.send_dm(2, "hello")
+    outbox.send_dm(3, "hello")
+    outbox.send_channel(10, content="new purchase", embed=embed)
+
+    # Handlers only queue, nothing has been sent yet
+    assert alice.sent == [] and outbox.get_stats()["held_digests"] == 3
+
+    await outbox.close(timeout=5)
+
+    assert {"content": "pick one", "view": view} in alice.sent
+    assert {"content": "first\nsecond", "embeds": [embed]} in alice.sent
+    assert len(alice.sent) == 2
+    assert limited.sent == [{"content": "hello"}]
+    assert closed.sent == []
+    assert admins.sent == [{"content": "new purchase", "embeds": [embed]}]
+
+    stats = outbox.get_stats()
+    assert stats["coalesced"] == 2 and stats["rate_limited"] == 1 and stats["dropped"] == 1, stats
+    assert stats["sent"] == 4 and stats["queue_depth"] == 0, stats
+
+
+def test_outbox():
+    """Queued messages are coalesced per user, retried on rate limits and sent by the workers"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.db")
+        conn = sqlite3.connect(path)
+        conn.execute(USER_NAMES_TABLE)
+        conn.commit()
+        conn.close()
+
+        asyncio.run(run_outbox(path))
+
+
+if __name__ == "__main__":
+    test_outbox()
+    print("✅ Outbox coalesced, retried and sent the queued messages")
@@ -0,0 +1,93 @@
+"""
+Test script to verify the precompiled permission index.
+This script:
+1. Compiles command permissions, section assignments and role groups
+2. Checks members by role ID, role group name and the owner role
+3. Checks a rebuild picks up changed permissions
+4. Caches members' roles and decisions until they change
+"""
+
+from permission_index import PermissionIndex
+
+STAFF = 1338482857974169683
+HELPER = 42
+
+ROLE_PERMISSIONS = {
+    "moderator": ["warn", "mute"],
+    "gm": ["gcreate", "mute"],
+    "owner": [],
+}
+
+
+def test_permission_index():
+    """Members are allowed by role ID, section, role group, the owner role or public access"""
+    command_permissions = {
+        "rank": ["everyone"],
+        "warn": [STAFF, "7"],
+        "mute": [],
+        "backup": [STAFF],
+        "gcreate": [],
+    }
+    role_section_assignments = {HELPER: ["gm"]}
+    index = PermissionIndex()
+    index.rebuild(command_permissions, role_section_assignments, ROLE_PERMISSIONS)
+
+    assert index.allows("rank", [], [])
+    assert index.allows("warn", [STAFF], ["Staff"])
+    assert index.allows("warn", [7], [])
+    assert not index.allows("warn", [HELPER], ["Helper"])
+    # Through the section assigned to the role
+    assert index.allows("gcreate", [HELPER], ["Helper"])
+    # Through the role's name matching a role group
+    assert index.allows("mute", [99], ["Moderator"])
+    # The owner role can use everything except backup and permission
+    assert index.allows("gcreate", [1], ["Owner"])
+    assert not index.allows("backup", [1], ["Owner"])
+    # Roles can't be granted commands without permission entries
+    assert not index.allows("coindrop", [99], ["Moderator"])
+
+    command_permissions["warn"].append(HELPER)
+    command_permissions["rank"].remove("everyone")
+    index.rebuild(command_permissions, role_section_assignments, ROLE_PERMISSIONS)
+    assert index.allows("warn", [HELPER], [])
+    assert not index.allows("rank", [], [])
+    assert index.get_stats()["rebuilds"] == 2
+
+
+def test_member_decisions():
+    """Decisions are cached per member until their roles or the permissions change"""
+    command_permissions = {"warn": [STAFF], "rank": ["everyone"]}
+    index = PermissionIndex(max_members=2)
+    index.rebuild(command_permissions, {}, ROLE_PERMISSIONS)
+
+    assert index.member_allows(1, "warn") is None
+    index.remember_member(1, [STAFF], ["Staff"])
+    assert index.member_allows(1, "warn") is True
+    assert index.member_allows(1, "warn") is True
+    assert index.get_stats()["decision_hits"] == 1
+
+    # Remembering the same roles keeps the decisions, new roles drop them
+    index.remember_member(1, [STAFF], ["Staff"])
+    assert index.members[1]["decisions"] == {"warn": True}
+    index.remember_member(1, [], ["Staff"])
+    assert index.members[1]["decisions"] == {}
+    assert index.member_allows(1, "warn") is False
+
+    # Permission edits drop every decision
+    command_permissions["warn"].append("everyone")
+    index.rebuild(command_permissions, {}, ROLE_PERMISSIONS)
+    assert index.member_allows(1, "warn") is True
+
+    index.forget_member(1)
+    assert not index.knows_member(1)
+
+    # The cache is bounded and evicts the least recently used member
+    for member_id in (2, 3, 4):
+        index.remember_member(member_id, [], [])
+    assert not index.knows_member(2) and index.knows_member(4)
+
+
+if __name__ == "__main__":
+    test_permission_index()
+    test_member_decisions()
+    print("✅ Permission index allowed and denied the expected members")
@@ -0,0 +1,95 @@
+"""
+Test script to verify the in-memory leaderboard rankings.
+This script:
+1. Loads the rankings and checks the top lists match ORDER BY on the users table
+2. Changes users through the user cache and checks ranks move without a reload
+3. Changes a user directly and checks invalidate() picks the new row up
+"""
+
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+
+from db_pool import DatabasePool
+from ledger import LEDGER_TABLES
+from rankings import Rankings
+from user_cache import UserCache
+from write_buffer import WriteBuffer
+
+
+async def run_rankings(path):
+    pool = DatabasePool(path, max_connections=2)
+    buffer = WriteBuffer(pool=pool)
+    rankings = Rankings(pool=pool, buffer=buffer)
+    cache = UserCache(pool=pool, buffer=buffer, rankings=rankings)
+    try:
+        top = await rankings.top("xp", 10)
+        rows = await pool.fetchall(
+            'SELECT user_id, prestige, level, xp FROM users ORDER BY prestige DESC, level DESC, xp DESC, user_id LIMIT 10')
+        assert [(user_id, score) for user_id, score in top] == [(row[0], row[1:]) for row in rows]
+
+        # Pages continue where the previous one stopped
+        second_page = await rankings.top("coins", 10, offset=10)
+        rows = await pool.fetchall('SELECT user_id, coins FROM users ORDER BY coins DESC, user_id LIMIT 10 OFFSET 10')
+        assert second_page == [(row[0], (row[1],)) for row in rows]
+
+        # A buffered change moves the user to the top before any flush
+        await cache.get(50)
+        await cache.apply(50, coins=1_000_000)
+        assert (await rankings.top("coins", 1))[0][0] == 50
+        assert await rankings.rank("coins", 50) == (1, 100)
+
+        # New users are ranked as soon as they are created
+        await cache.get(500, create=True)
+        assert (await rankings.rank("xp", 500))[1] == 101
+
+        # A direct write is picked up after invalidating the user
+        await buffer.flush()
+        await pool.execute('UPDATE users SET prestige = 9 WHERE user_id = 7')
+        cache.invalidate(7)
+        assert await rankings.rank("xp", 7) == (1, 101)
+
+        # A bulk reset reloads everything
+        await pool.execute('UPDATE users SET activity_coins = 0')
+        cache.clear()
+        assert [score for _, score in await rankings.top("activity", 3)] == [(0,), (0,), (0,)]
+    finally:
+        await buffer.flush()
+        await pool.close()
+
+
+def test_rankings():
+    """The leaderboards follow the users table and every change made to it"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.db")
+        conn = sqlite3.connect(path)
+        conn.execute('''
+            CREATE TABLE users (
+                user_id INTEGER PRIMARY KEY,
+                level INTEGER DEFAULT 1,
+                prestige INTEGER DEFAULT 0,
+                xp INTEGER DEFAULT 0,
+                total_messages INTEGER DEFAULT 0,
+                coins INTEGER DEFAULT 0,
+                invites INTEGER DEFAULT 0,
+                activity_coins FLOAT DEFAULT 0
+            )
+        ''')
+        rng = random.Random(7)
+        conn.executemany(
+            'INSERT INTO users (user_id, level, prestige, xp, coins, activity_coins) VALUES (?, ?, ?, ?, ?, ?)',
+            [(user_id, rng.randint(1, 20), rng.randint(0, 2), rng.randint(0, 500),
+              rng.randint(0, 1000), rng.randint(0, 50) / 2) for user_id in range(1, 101)])
+        for statement in LEDGER_TABLES:
+            conn.execute(statement)
+        conn.commit()
+        conn.close()
+
+        asyncio.run(run_rankings(path))
+
+
+if __name__ == "__main__":
+    test_rankings()
+    print("✅ Leaderboard rankings followed the users table")
@@ -0,0 +1,58 @@
+"""
+Test script to verify the reaction router.
+This script:
+1. Waits for a reaction and checks only the matching message and emoji wake it
+2. Checks a drop is only claimed by the first of several reactions
+3. Checks timed out and cancelled waiters are removed
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from reaction_router import ReactionRouter
+
+
+def make_reaction(message_id, emoji):
+    return SimpleNamespace(message=SimpleNamespace(id=message_id), emoji=emoji)
+
+
+async def run_router():
+    router = ReactionRouter()
+
+    waiter = asyncio.create_task(router.wait(1, "🎁", timeout=1))
+    await asyncio.sleep(0)
+    assert not router.dispatch(make_reaction(1, "✅"), "someone")
+    assert not router.dispatch(make_reaction(2, "🎁"), "someone")
+    assert router.dispatch(make_reaction(1, "🎁"), "first")
+    # A second reaction finds nobody waiting, so the drop has one winner
+    assert not router.dispatch(make_reaction(1, "🎁"), "second")
+    reaction, user = await waiter
+    assert user == "first" and reaction.message.id == 1
+
+    # Nobody reacts in time
+    try:
+        await router.wait(3, "💰", timeout=0.01)
+        assert False, "expected a timeout"
+    except asyncio.TimeoutError:
+        pass
+
+    # A cancelled waiter, e.g. when a drop's reminder timer fires first
+    waiter = asyncio.create_task(router.wait(4, "✅"))
+    await asyncio.sleep(0)
+    assert router.get_stats()["waiting"] == 1
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+
+    stats = router.get_stats()
+    assert stats["waiting"] == 0 and not router.waiters
+    assert stats["matched"] == 1 and stats["timeouts"] == 1
+
+
+def test_reaction_router():
+    """Reactions wake the waiters for their message and emoji exactly once"""
+    asyncio.run(run_router())
+
+
+if __name__ == "__main__":
+    test_reaction_router()
+    print("✅ Reactions were routed to the drops waiting for them")
@@ -0,0 +1,106 @@
+"""
+Test script to verify the in-memory leveling settings.
+This script:
+1. Loads the settings from a temporary database into the cache
+2. Saves a setting and checks the cache and subscribers see the new value
+3. Checks get_setting is answered from memory once loaded
+4. Creates and fills the settings table through the shared pool at startup
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+
+import database
+from db_pool import DatabasePool
+from leveling_settings_manager import (
+    DEFAULT_SETTINGS_DICT, LevelingSettings, get_setting, leveling_settings, load_settings, save_setting
+)
+from reset_leveling_settings import reset_leveling_settings
+
+
+async def run_settings_cache(path):
+    database.pool = DatabasePool(path, max_connections=2)
+    changes = []
+    leveling_settings.subscribe(lambda name, value: changes.append((name, value)))
+    try:
+        settings = await load_settings()
+        assert settings["level_up_xp_base"] == 80
+        assert leveling_settings.loaded and leveling_settings.get_int("level_up_xp_base") == 80
+        assert ("level_up_xp_base", 80) in changes
+
+        # Saving updates the cache and tells the subscribers
+        assert await save_setting("voice_xp_per_minute", 4)
+        assert leveling_settings.get_int("voice_xp_per_minute") == 4
+        assert changes[-1] == ("voice_xp_per_minute", 4)
+
+        # Reads no longer touch the database
+        await database.pool.execute('UPDATE leveling_settings SET value = 1 WHERE setting_name = ?', ("xp_min",))
+        assert await get_setting("xp_min") == 5
+        assert await get_setting("unknown_setting", 9) == 9
+    finally:
+        await database.pool.close()
+        database.pool = None
+        leveling_settings.subscribers.clear()
+        leveling_settings.values = dict(DEFAULT_SETTINGS_DICT)
+        leveling_settings.loaded = False
+
+
+def test_settings_cache():
+    """Settings are loaded once, served from memory and updated on save"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.db")
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE leveling_settings (setting_name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        conn.executemany('INSERT INTO leveling_settings (setting_name, value) VALUES (?, ?)',
+                         [("xp_min", 5), ("level_up_xp_base", 80), ("voice_xp_per_minute", 2)])
+        conn.commit()
+        conn.close()
+
+        asyncio.run(run_settings_cache(path))
+
+        conn = sqlite3.connect(path)
+        assert conn.execute("SELECT value FROM leveling_settings WHERE setting_name = 'voice_xp_per_minute'").fetchone() == (4,)
+        conn.close()
+
+
+def test_typed_accessors():
+    """Unknown settings fall back to the given and then the built-in defaults"""
+    settings = LevelingSettings()
+    assert settings.get_int("level_up_coins") == 150
+    assert settings.get_int("missing", 3) == 3
+    assert settings.get_bool("enabled")
+    settings.update({"enabled": 0})
+    assert not settings.get_bool("enabled")
+
+
+async def run_reset_settings(path):
+    database.pool = DatabasePool(path, max_connections=2)
+    try:
+        await reset_leveling_settings()
+        await database.pool.execute('UPDATE leveling_settings SET value = 200 WHERE setting_name = ?', ("level_up_coins",))
+        # Running it again keeps the existing values
+        await reset_leveling_settings()
+    finally:
+        await database.pool.close()
+        database.pool = None
+
+
+def test_reset_leveling_settings():
+    """The startup check creates the defaults once and keeps changed values"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.db")
+        asyncio.run(run_reset_settings(path))
+
+        conn = sqlite3.connect(path)
+        assert conn.execute("SELECT COUNT(*) FROM leveling_settings").fetchone()[0] == 12
+        assert conn.execute("SELECT value FROM leveling_settings WHERE setting_name = 'level_up_coins'").fetchone() == (200,)
+        conn.close()
+
+
+if __name__ == "__main__":
+    test_settings_cache()
+    test_typed_accessors()
+    test_reset_leveling_settings()
+    print("✅ Leveling settings were cached and updated on save")
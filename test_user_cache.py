@@ -0,0 +1,122 @@
+"""
+Test script to verify the user state cache stays consistent with the database.
+This script:
+1. Loads a user through the cache and changes it in memory
+2. Invalidates the user and checks pending deltas are still visible
+3. Flushes the write buffer and checks the users table
+4. Races debits and transfers for the same coins
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+
+from db_pool import DatabasePool
+from ledger import LEDGER_TABLES
+from user_cache import UserCache
+from write_buffer import WriteBuffer
+
+
+async def run_user_cache(path):
+    pool = DatabasePool(path, max_connections=2)
+    buffer = WriteBuffer(pool=pool)
+    cache = UserCache(pool=pool, buffer=buffer, max_size=2)
+
+    state = await cache.get(1)
+    assert state["coins"] == 100 and state["level"] == 5
+
+    await cache.apply(1, coins=50, xp=10)
+    assert (await cache.get(1))["coins"] == 150
+
+    # Reloading from the database must include the not yet flushed delta
+    cache.invalidate(1)
+    assert (await cache.get(1))["coins"] == 150
+
+    # Unknown users are only created when asked to
+    assert await cache.get(2) is None
+    created = await cache.get(2, create=True)
+    assert created["level"] == 1 and created["coins"] == 0
+
+    # The cache is bounded and evicts the least recently used user
+    await cache.get(3, create=True)
+    assert 1 not in cache.users
+
+    await buffer.flush()
+    await pool.close()
+
+
+def create_test_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE users (
+            user_id INTEGER PRIMARY KEY,
+            level INTEGER DEFAULT 1,
+            prestige INTEGER DEFAULT 0,
+            xp INTEGER DEFAULT 0,
+            total_messages INTEGER DEFAULT 0,
+            coins INTEGER DEFAULT 0,
+            invites INTEGER DEFAULT 0,
+            activity_coins FLOAT DEFAULT 0
+        )
+    ''')
+    conn.execute("INSERT INTO users (user_id, level, coins) VALUES (1, 5, 100)")
+    for statement in LEDGER_TABLES:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+
+
+def test_user_cache():
+    """Cached users reflect in-memory changes and write them back on flush"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.db")
+        create_test_db(path)
+        asyncio.run(run_user_cache(path))
+
+        conn = sqlite3.connect(path)
+        assert conn.execute("SELECT coins, xp FROM users WHERE user_id = 1").fetchone() == (150, 10)
+        assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 3
+        # Every coin change was recorded in the ledger
+        assert conn.execute("SELECT SUM(amount) FROM coin_transactions WHERE user_id = 1").fetchone()[0] == 50
+        conn.close()
+
+
+async def run_conditional_debits(path):
+    pool = DatabasePool(path, max_connections=2)
+    buffer = WriteBuffer(pool=pool)
+    cache = UserCache(pool=pool, buffer=buffer)
+
+    # Three 40 coin bets race for 100 coins; only two can be taken
+    results = await asyncio.gather(*(cache.try_debit(1, 40, "coinflip_bet") for _ in range(3)))
+    assert sorted(result for result in results if result is not None) == [20, 60]
+    assert results.count(None) == 1
+    assert await cache.try_debit(2, 1) is None
+
+    # A transfer moves the coins only if the sender still has them
+    assert await cache.transfer(1, 3, 15) == (5, 15)
+    assert await cache.transfer(1, 3, 15) is None
+
+    await buffer.flush()
+    await pool.close()
+
+
+def test_conditional_debits():
+    """Debits and transfers never take more coins than the user has"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.db")
+        create_test_db(path)
+        asyncio.run(run_conditional_debits(path))
+
+        conn = sqlite3.connect(path)
+        assert conn.execute("SELECT user_id, coins FROM users ORDER BY user_id").fetchall() == [(1, 5), (3, 15)]
+        assert conn.execute(
+            "SELECT reason, SUM(amount) FROM coin_transactions GROUP BY reason ORDER BY reason").fetchall() == [
+            ("coinflip_bet", -80), ("transfer_received", 15), ("transfer_sent", -15)]
+        conn.close()
+
+
+if __name__ == "__main__":
+    test_user_cache()
+    test_conditional_debits()
+    print("✅ User cache kept the users table consistent")
@@ -0,0 +1,100 @@
+"""
+Test script to verify the user name cache.
+This script:
+1. Resolves names from the guild member cache without fetching
+2. Fetches the remaining users concurrently and stores their names
+3. Checks a new cache reads the stored names instead of fetching again
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+from types import SimpleNamespace
+
+from db_pool import DatabasePool
+from user_names import UserNames, USER_NAMES_TABLE
+
+
+class FakeBot:
+    """Bot that knows a few users and counts how often it is asked"""
+
+    def __init__(self, known):
+        self.known = known
+        self.fetches = 0
+        self.running = 0
+        self.most_running = 0
+
+    def get_user(self, user_id):
+        return None
+
+    async def fetch_user(self, user_id):
+        self.fetches += 1
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        if user_id not in self.known:
+            raise LookupError(f"Unknown user {user_id}")
+        return SimpleNamespace(id=user_id, name=self.known[user_id])
+
+
+class FakeGuild:
+    def __init__(self, members):
+        self.members = members
+
+    def get_member(self, user_id):
+        name = self.members.get(user_id)
+        return SimpleNamespace(display_name=name) if name else None
+
+
+async def run_user_names(path):
+    pool = DatabasePool(path, max_connections=2)
+    try:
+        bot = FakeBot({2: "bob", 3: "carol", 4: "dave"})
+        guild = FakeGuild({1: "Alice"})
+        names = UserNames(pool=pool)
+
+        resolved = await names.get_names(bot, [1, 2, 3, 4, 5, 2], guild)
+        assert resolved == {1: "Alice", 2: "bob", 3: "carol", 4: "dave", 5: "User 5"}
+        # The four unknown users were fetched together, once each
+        assert bot.fetches == 4 and bot.most_running == 4
+
+        # Names are remembered in memory
+        assert await names.get_name(bot, 3) == "carol"
+        assert bot.fetches == 4
+
+        # A fresh cache reads them from the table
+        fresh = UserNames(pool=pool)
+        assert await fresh.get_names(bot, [2, 4]) == {2: "bob", 4: "dave"}
+        assert bot.fetches == 4 and fresh.get_stats()["table_hits"] == 2
+
+        # Expired names are fetched again
+        await pool.execute('UPDATE user_names SET updated_at = ? WHERE user_id = 2', (time.time() - 10 ** 6,))
+        fresh = UserNames(pool=pool)
+        assert await fresh.get_name(bot, 2) == "bob"
+        assert bot.fetches == 5
+    finally:
+        await pool.close()
+
+
+def test_user_names():
+    """Names come from the guild, memory or table first and are fetched in one batch"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.db")
+        conn = sqlite3.connect(path)
+        conn.execute(USER_NAMES_TABLE)
+        conn.commit()
+        conn.close()
+
+        asyncio.run(run_user_names(path))
+
+        conn = sqlite3.connect(path)
+        assert conn.execute('SELECT COUNT(*) FROM user_names').fetchone()[0] == 3
+        conn.close()
+
+
+if __name__ == "__main__":
+    test_user_names()
+    print("✅ User name cache resolved names with one batch of fetches")
@@ -0,0 +1,160 @@
+"""
+Test script to verify the write-behind buffer batches message writes correctly.
+This script:
+1. Creates a temporary database with the message tables
+2. Buffers messages and user deltas
+3. Flushes them and checks the resulting rows
+4. Checks a batch that keeps failing is written part by part
+5. Checks server_stats counts by the UTC date like the logs and rollups
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from db_pool import DatabasePool
+from stats_rollups import ROLLUP_TABLES
+from write_buffer import WriteBuffer
+
+
+def create_test_db(path):
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE users (
+            user_id INTEGER PRIMARY KEY,
+            level INTEGER DEFAULT 1,
+            prestige INTEGER DEFAULT 0,
+            xp INTEGER DEFAULT 0,
+            total_messages INTEGER DEFAULT 0,
+            coins INTEGER DEFAULT 0,
+            invites INTEGER DEFAULT 0,
+            activity_coins FLOAT DEFAULT 0
+        );
+        CREATE TABLE server_stats (
+            date TEXT PRIMARY KEY,
+            message_count INTEGER DEFAULT 0,
+            reaction_count INTEGER DEFAULT 0,
+            last_updated TEXT
+        );
+        CREATE TABLE message_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            channel_id INTEGER,
+            timestamp TEXT DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE user_reactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            emoji TEXT NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        INSERT INTO users (user_id, level, xp, total_messages, coins) VALUES (1, 5, 10, 3, 100);
+    ''')
+    for statement in ROLLUP_TABLES:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+
+
+async def run_buffer_flush(path):
+    pool = DatabasePool(path, max_connections=1)
+    buffer = WriteBuffer(pool=pool, max_rows=1000)
+    when = datetime(2025, 1, 2, 12, 30, 0, tzinfo=timezone.utc)
+
+    for _ in range(3):
+        buffer.log_message(1, 50, when)
+        buffer.add_user_delta(1, xp=5, total_messages=1)
+    buffer.log_message(2, 50, when)
+    buffer.add_user_delta(2, xp=7, total_messages=1, activity_coins=1)
+    buffer.log_reaction(2, 99, "👍", when)
+
+    assert buffer.pending_user_delta(1) == {"xp": 15, "total_messages": 3}
+
+    flushed = await buffer.flush()
+    assert flushed > 0
+    assert buffer.pending_rows == 0
+
+    # A second flush adds to the rollups and only counts new active users
+    buffer.log_message(1, 50, when)
+    buffer.log_message(3, 50, when)
+    await buffer.flush()
+    await pool.close()
+
+
+def test_write_buffer_flush():
+    """Buffered rows are written in one flush and user deltas are applied"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.db")
+        create_test_db(path)
+        asyncio.run(run_buffer_flush(path))
+
+        conn = sqlite3.connect(path)
+        assert conn.execute("SELECT COUNT(*) FROM message_log").fetchone()[0] == 6
+        assert conn.execute("SELECT COUNT(*) FROM user_reactions").fetchone()[0] == 1
+        assert conn.execute("SELECT message_count, reaction_count FROM server_stats WHERE date = '2025-01-02'").fetchone() == (6, 1)
+        assert conn.execute("SELECT message_count, reaction_count, active_users FROM stats_daily WHERE date = '2025-01-02'").fetchone() == (6, 1, 3)
+        assert conn.execute("SELECT message_count, reaction_count, active_users FROM stats_hourly WHERE hour = '2025-01-02 12'").fetchone() == (6, 1, 3)
+        assert conn.execute("SELECT message_count, reaction_count, last_message_at FROM stats_totals").fetchone() == (6, 1, "2025-01-02 12:30:00")
+        assert conn.execute("SELECT level, xp, total_messages, coins FROM users WHERE user_id = 1").fetchone() == (5, 25, 6, 100)
+        assert conn.execute("SELECT level, xp, total_messages, activity_coins FROM users WHERE user_id = 2").fetchone() == (1, 7, 1, 1)
+        conn.close()
+
+
+async def run_failing_flush(path):
+    pool = DatabasePool(path, max_connections=1)
+    buffer = WriteBuffer(pool=pool, max_rows=1000, max_retries=3)
+    when = datetime(2025, 1, 2, 12, 30, 0, tzinfo=timezone.utc)
+    buffer.log_message(1, 50, when)
+    buffer.add_user_delta(1, coins=10)
+
+    # The rollup tables are missing, so the whole batch fails and is kept
+    for _ in range(2):
+        try:
+            await buffer.flush()
+            assert False, "flush should have failed"
+        except Exception:
+            pass
+        assert buffer.pending_user_delta(1) == {"coins": 10}
+
+    # After max_retries the parts are written separately and the rollup is dropped
+    await buffer.flush()
+    assert buffer.pending_rows == 0
+    assert buffer.get_stats()["rows_dropped"] > 0
+    await pool.close()
+
+
+def test_write_buffer_drops_failing_parts():
+    """A batch that keeps failing is written part by part instead of growing forever"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.db")
+        create_test_db(path)
+        conn = sqlite3.connect(path)
+        conn.execute("DROP TABLE stats_hourly")
+        conn.commit()
+        conn.close()
+        asyncio.run(run_failing_flush(path))
+
+        conn = sqlite3.connect(path)
+        assert conn.execute("SELECT COUNT(*) FROM message_log").fetchone()[0] == 1
+        assert conn.execute("SELECT coins FROM users WHERE user_id = 1").fetchone()[0] == 110
+        conn.close()
+
+
+def test_server_stats_use_utc_dates():
+    """A message sent after local midnight but before UTC midnight counts for the UTC day"""
+    buffer = WriteBuffer(pool=None, max_rows=1000)
+    when = datetime(2025, 1, 3, 1, 0, 0, tzinfo=timezone(timedelta(hours=5)))
+    buffer.log_message(1, 50, when)
+    buffer.log_reaction(1, 99, "👍", when)
+    assert buffer.server_stats == {"2025-01-02": [1, 1, "2025-01-02 20:00:00"]}
+    assert buffer.message_rows[0][2].startswith("2025-01-02")
+
+
+if __name__ == "__main__":
+    test_write_buffer_flush()
+    test_write_buffer_drops_failing_parts()
+    test_server_stats_use_utc_dates()
+    print("✅ Write buffer flushed all buffered rows correctly")
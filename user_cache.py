@@ -0,0 +1,181 @@
+"""
+In-memory cache of user rows shared by the XP, coins and rank paths
+A user's row is read from SQLite once, then changed in memory while the
+changes are written back to the users table through the write buffer
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Any, Tuple
+
+logger = logging.getLogger('user_cache')
+
+USER_COLUMNS = ("level", "prestige", "xp", "total_messages", "coins", "invites", "activity_coins")
+
+# Values used for rows that don't exist yet, matching the users table defaults
+DEFAULT_USER = {
+    "level": 1,
+    "prestige": 0,
+    "xp": 0,
+    "total_messages": 0,
+    "coins": 0,
+    "invites": 0,
+    "activity_coins": 0,
+}
+
+
+class UserCache:
+    """Bounded LRU cache of users rows with write-back through the write buffer"""
+
+    def __init__(self, pool=None, buffer=None, rankings=None, max_size: int = 5000):
+        self.pool = pool
+        self.buffer = buffer
+        self.rankings = rankings
+        self.max_size = max_size
+        self.users: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self.stats: Dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+        }
+
+    async def _get_pool(self):
+        if self.pool is None:
+            from db_pool import get_db_pool
+            self.pool = await get_db_pool()
+        return self.pool
+
+    async def _get_buffer(self):
+        if self.buffer is None:
+            from write_buffer import get_write_buffer
+            self.buffer = await get_write_buffer()
+        return self.buffer
+
+    def _get_rankings(self):
+        if self.rankings is None:
+            from rankings import rankings
+            self.rankings = rankings
+        return self.rankings
+
+    async def get(self, user_id: int, create: bool = False) -> Optional[Dict[str, Any]]:
+        """Get a user's state, loading it from the database on a cache miss
+
+        Returns None for unknown users unless create is True, in which case a
+        default row is cached and created in the database on the next flush.
+        The returned dict is shared with the cache; change it through apply().
+        """
+        state = self.users.get(user_id)
+        if state is not None:
+            self.users.move_to_end(user_id)
+            self.stats["hits"] += 1
+            return state
+
+        self.stats["misses"] += 1
+        pool = await self._get_pool()
+        buffer = await self._get_buffer()
+
+        # Hold the flush lock so a flush can't move pending deltas into the
+        # table between our SELECT and applying the still pending deltas
+        async with buffer.flush_lock:
+            row = await pool.fetchone(
+                f'SELECT {", ".join(USER_COLUMNS)} FROM users WHERE user_id = ?',
+                (user_id,))
+            pending = buffer.pending_user_delta(user_id)
+
+        if row is None and user_id not in buffer.user_deltas:
+            if not create:
+                return None
+            # Register the user so the write buffer inserts the row
+            buffer.add_user_delta(user_id)
+            self._get_rankings().apply(user_id, {})
+            state = dict(DEFAULT_USER)
+        else:
+            state = dict(zip(USER_COLUMNS, row)) if row else dict(DEFAULT_USER)
+            for column, amount in pending.items():
+                state[column] += amount
+
+        # Another coroutine may have loaded the user while we were waiting
+        if user_id in self.users:
+            return self.users[user_id]
+
+        self.users[user_id] = state
+        if len(self.users) > self.max_size:
+            self.users.popitem(last=False)
+            self.stats["evictions"] += 1
+        return state
+
+    async def apply(self, user_id: int, reason: str = "other", **deltas) -> Optional[Dict[str, Any]]:
+        """Change a user's cached state and queue the same change for the database
+
+        A change to coins is also recorded in the coin ledger under reason.
+        """
+        buffer = await self._get_buffer()
+        return self._apply(buffer, user_id, reason, deltas)
+
+    def _apply(self, buffer, user_id: int, reason: str, deltas: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        buffer.add_user_delta(user_id, **deltas)
+        if deltas.get("coins"):
+            buffer.log_transaction(user_id, deltas["coins"], reason)
+        self._get_rankings().apply(user_id, deltas)
+
+        state = self.users.get(user_id)
+        if state is not None:
+            for column, amount in deltas.items():
+                state[column] += amount
+        return state
+
+    async def try_debit(self, user_id: int, amount: int, reason: str = "other") -> Optional[int]:
+        """Take amount coins from a user only if their balance covers it
+
+        The balance check and the debit happen without awaiting in between,
+        so two bets racing for the same coins can't both pass the check.
+        Returns the new balance, or None if the user can't afford it.
+        """
+        buffer = await self._get_buffer()
+        state = await self.get(user_id)
+        if state is None or state["coins"] < amount:
+            return None
+        self._apply(buffer, user_id, reason, {"coins": -amount})
+        return state["coins"]
+
+    async def transfer(self, sender_id: int, recipient_id: int, amount: int,
+                       reason: str = "transfer") -> Optional[Tuple[int, int]]:
+        """Move amount coins between two users if the sender can afford it
+
+        Both changes are queued together, so they reach the database in the
+        same flush transaction. Returns the new (sender, recipient) balances,
+        or None if the sender can't afford it.
+        """
+        buffer = await self._get_buffer()
+        recipient = await self.get(recipient_id, create=True)
+        sender = await self.get(sender_id)
+        if sender is None or sender["coins"] < amount:
+            return None
+        # The recipient may have been evicted while the sender was loaded
+        recipient_coins = recipient["coins"] + amount
+        self._apply(buffer, sender_id, f"{reason}_sent", {"coins": -amount})
+        self._apply(buffer, recipient_id, f"{reason}_received", {"coins": amount})
+        return sender["coins"], recipient_coins
+
+    def invalidate(self, user_id: int):
+        """Drop a user from the cache after their row was changed directly"""
+        self.users.pop(user_id, None)
+        self._get_rankings().invalidate(user_id)
+
+    def clear(self):
+        """Drop every cached user, e.g. after a bulk update of the users table"""
+        self.users.clear()
+        self._get_rankings().clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get statistics about the user cache"""
+        return {**self.stats, "cached_users": len(self.users)}
+
+
+# Singleton user cache instance
+user_cache = UserCache()
+
+# Helper function to get the user cache
+async def get_user_cache() -> UserCache:
+    """Get the shared user state cache"""
+    return user_cache
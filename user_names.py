@@ -0,0 +1,162 @@
+"""
+Cache of user display names for leaderboards, logs and DMs
+Names come from the guild member cache first, then from names remembered in
+memory and in the user_names table, and only the remaining users are fetched
+from Discord, all at once, so rendering a list of users costs one round trip
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Tuple
+
+logger = logging.getLogger('user_names')
+
+# How long a remembered name is trusted before it is fetched again
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+USER_NAMES_TABLE = '''
+    CREATE TABLE IF NOT EXISTS user_names (
+        user_id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    )
+'''
+
+
+def fallback_name(user_id: int) -> str:
+    """Name shown for users that couldn't be found"""
+    return f"User {user_id}"
+
+
+class UserNames:
+    """Display names by user ID, remembered in memory and in the database"""
+
+    def __init__(self, pool=None, ttl_seconds: float = DEFAULT_TTL_SECONDS, max_size: int = 10000):
+        self.pool = pool
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.names: "OrderedDict[int, Tuple[str, float]]" = OrderedDict()
+        self.stats: Dict[str, int] = {
+            "member_hits": 0,
+            "memory_hits": 0,
+            "table_hits": 0,
+            "fetches": 0,
+            "fetch_errors": 0,
+        }
+
+    async def _get_pool(self):
+        if self.pool is None:
+            from db_pool import get_db_pool
+            self.pool = await get_db_pool()
+        return self.pool
+
+    def _remember(self, user_id: int, name: str, updated_at: float):
+        self.names[user_id] = (name, updated_at)
+        self.names.move_to_end(user_id)
+        if len(self.names) > self.max_size:
+            self.names.popitem(last=False)
+
+    async def get_names(self, bot, user_ids: Iterable[int], guild=None) -> Dict[int, str]:
+        """Get the display names of several users with at most one batch of fetches"""
+        now = time.time()
+        names: Dict[int, str] = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            member = guild.get_member(user_id) if guild is not None else None
+            if member is not None:
+                names[user_id] = member.display_name
+                self.stats["member_hits"] += 1
+                continue
+            user = bot.get_user(user_id)
+            if user is not None:
+                names[user_id] = user.name
+                self.stats["member_hits"] += 1
+                continue
+            cached = self.names.get(user_id)
+            if cached is not None and now - cached[1] < self.ttl_seconds:
+                names[user_id] = cached[0]
+                self.stats["memory_hits"] += 1
+                continue
+            missing.append(user_id)
+
+        if missing:
+            pool = await self._get_pool()
+            rows = await pool.fetchall(
+                f'SELECT user_id, name, updated_at FROM user_names WHERE user_id IN ({", ".join("?" * len(missing))})',
+                tuple(missing))
+            for user_id, name, updated_at in rows:
+                if now - updated_at < self.ttl_seconds:
+                    names[user_id] = name
+                    self._remember(user_id, name, updated_at)
+                    self.stats["table_hits"] += 1
+            missing = [user_id for user_id in missing if user_id not in names]
+
+        if missing:
+            users = await asyncio.gather(*(self.fetch_user(bot, user_id, store=False) for user_id in missing))
+            fetched = []
+            for user_id, user in zip(missing, users):
+                if user is None:
+                    names[user_id] = fallback_name(user_id)
+                    continue
+                names[user_id] = user.name
+                fetched.append((user_id, user.name, now))
+            if fetched:
+                await self._store(fetched)
+
+        return names
+
+    async def get_name(self, bot, user_id: int, guild=None) -> str:
+        """Get the display name of one user"""
+        return (await self.get_names(bot, [user_id], guild))[user_id]
+
+    async def fetch_user(self, bot, user_id: int, store: bool = True):
+        """Get a user object, from the client's cache when possible, or None
+
+        Use this instead of bot.fetch_user() when the user is needed to send
+        a DM; the name is remembered on the way.
+        """
+        user = bot.get_user(user_id)
+        if user is None:
+            self.stats["fetches"] += 1
+            try:
+                user = await bot.fetch_user(user_id)
+            except Exception as e:
+                self.stats["fetch_errors"] += 1
+                logger.warning(f"Could not fetch user {user_id}: {e}")
+                return None
+        cached = self.names.get(user_id)
+        if store and (cached is None or cached[0] != user.name):
+            await self._store([(user_id, user.name, time.time())])
+        return user
+
+    async def _store(self, rows):
+        for user_id, name, updated_at in rows:
+            self._remember(user_id, name, updated_at)
+        try:
+            pool = await self._get_pool()
+            await pool.execute_many('''
+                INSERT INTO user_names (user_id, name, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET name = excluded.name, updated_at = excluded.updated_at
+            ''', rows)
+        except Exception as e:
+            # Names are only a cache, so failing to store them is not fatal
+            logger.warning(f"Could not store {len(rows)} user names: {e}")
+
+    def forget(self, user_id: int):
+        """Drop a remembered name, e.g. after the user changed it"""
+        self.names.pop(user_id, None)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get statistics about the name cache"""
+        return {**self.stats, "cached_names": len(self.names)}
+
+
+# Singleton user name cache instance
+user_names = UserNames()
+
+# Helper function to get the user name cache
+async def get_user_names() -> UserNames:
+    """Get the shared user name cache"""
+    return user_names
@@ -0,0 +1,291 @@
+"""
+Write-behind buffer for the per-message database writes
+Collects message_log and user_reactions rows, server_stats and rollup
+increments, users deltas and their coin ledger rows in memory and flushes
+them in a single transaction every few hundred milliseconds
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple, Any
+
+from ledger import INSERT_TRANSACTION
+from stats_rollups import StatsRollup
+
+logger = logging.getLogger('write_buffer')
+
+# Columns of the users table that may be changed through buffered deltas
+USER_DELTA_COLUMNS = ("level", "prestige", "xp", "total_messages", "coins", "activity_coins")
+
+
+class WriteBuffer:
+    """Buffers high-frequency writes and commits them in batches"""
+
+    def __init__(self, pool=None, flush_interval_ms: int = 500, max_rows: int = 200, max_retries: int = 5):
+        self.pool = pool
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_rows = max_rows
+        # Failed flushes in a row before the batch is written part by part
+        self.max_retries = max_retries
+        self.failed_flushes = 0
+        self.message_rows: List[Tuple[int, int, str]] = []
+        self.reaction_rows: List[Tuple[int, int, str, str]] = []
+        # date -> [message_count, reaction_count, last_updated]
+        self.server_stats: Dict[str, List[Any]] = {}
+        self.rollup = StatsRollup()
+        self.user_deltas: Dict[int, Dict[str, float]] = {}
+        # (user_id, amount, reason, created_at) rows for the coin ledger
+        self.transaction_rows: List[Tuple[int, int, str, float]] = []
+        self.flush_lock = asyncio.Lock()
+        self.wakeup = asyncio.Event()
+        self.flush_task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {
+            "flushes": 0,
+            "rows_flushed": 0,
+            "flush_errors": 0,
+            "rows_dropped": 0,
+        }
+
+    async def _get_pool(self):
+        if self.pool is None:
+            from db_pool import get_db_pool
+            self.pool = await get_db_pool()
+        return self.pool
+
+    @property
+    def pending_rows(self) -> int:
+        """Number of buffered rows waiting to be written"""
+        return (len(self.message_rows) + len(self.reaction_rows) + len(self.server_stats)
+                + len(self.rollup) + len(self.user_deltas) + len(self.transaction_rows))
+
+    def start(self):
+        """Start the background flush loop if it isn't running yet"""
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    def log_message(self, user_id: int, channel_id: int, when: Optional[datetime] = None):
+        """Buffer a message_log row and the matching server_stats and rollup increments"""
+        when = when or datetime.now()
+        # message_log.timestamp defaults to CURRENT_TIMESTAMP, which is UTC
+        utc_time = when.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        self.message_rows.append((user_id, channel_id, utc_time))
+        self.rollup.add_message(user_id, utc_time)
+        self._count_server_stats(utc_time, 0)
+        self._check_size()
+
+    def log_reaction(self, user_id: int, message_id: int, emoji: str, when: Optional[datetime] = None):
+        """Buffer a user_reactions row and the matching server_stats and rollup increments"""
+        when = when or datetime.now()
+        # Stored in UTC like message_log, so both compare against datetime('now')
+        utc_time = when.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        self.reaction_rows.append((user_id, message_id, emoji, utc_time))
+        self.rollup.add_reaction(utc_time)
+        self._count_server_stats(utc_time, 1)
+        self._check_size()
+
+    def _count_server_stats(self, utc_time: str, column: int):
+        # Keyed by the UTC date, like message_log, user_reactions and the rollups
+        counts = self.server_stats.setdefault(utc_time[:10], [0, 0, None])
+        counts[column] += 1
+        counts[2] = utc_time
+
+    def add_user_delta(self, user_id: int, **deltas):
+        """Buffer increments to a user's row, creating the row on flush if needed"""
+        pending = self.user_deltas.setdefault(user_id, {})
+        for column, amount in deltas.items():
+            if column not in USER_DELTA_COLUMNS:
+                raise ValueError(f"Unsupported users column for delta: {column}")
+            if amount:
+                pending[column] = pending.get(column, 0) + amount
+        self._check_size()
+
+    def log_transaction(self, user_id: int, amount: int, reason: str, when: Optional[float] = None):
+        """Buffer a coin ledger row; written together with the users deltas"""
+        self.transaction_rows.append((user_id, amount, reason, time.time() if when is None else when))
+        self._check_size()
+
+    def pending_user_delta(self, user_id: int) -> Dict[str, float]:
+        """Get the not yet flushed deltas for a user"""
+        return dict(self.user_deltas.get(user_id, {}))
+
+    def _check_size(self):
+        if self.pending_rows >= self.max_rows:
+            self.wakeup.set()
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing write buffer: {e}")
+
+    async def flush(self) -> int:
+        """Write all buffered rows to the database in one transaction"""
+        async with self.flush_lock:
+            if not self.pending_rows:
+                return 0
+
+            row_count = self.pending_rows
+            message_rows, self.message_rows = self.message_rows, []
+            reaction_rows, self.reaction_rows = self.reaction_rows, []
+            server_stats, self.server_stats = self.server_stats, {}
+            rollup, self.rollup = self.rollup, StatsRollup()
+            user_deltas, self.user_deltas = self.user_deltas, {}
+            transaction_rows, self.transaction_rows = self.transaction_rows, []
+
+            try:
+                pool = await self._get_pool()
+                await pool.write(lambda connection: self._write(
+                    connection, message_rows, reaction_rows, server_stats, rollup, user_deltas, transaction_rows))
+            except Exception as e:
+                self.stats["flush_errors"] += 1
+                self.failed_flushes += 1
+                if self.failed_flushes < self.max_retries or self.pool is None:
+                    # Put everything back so the next flush retries it
+                    self._restore(message_rows, reaction_rows, server_stats, rollup, user_deltas, transaction_rows)
+                    raise
+                # Something in the batch keeps failing, e.g. a table a migration
+                # didn't create, so write what still can be written on its own
+                logger.error(f"Flush failed {self.failed_flushes} times in a row, writing its parts separately: {e}")
+                self.failed_flushes = 0
+                row_count = await self._write_parts(
+                    pool, message_rows, reaction_rows, server_stats, rollup, user_deltas, transaction_rows)
+            else:
+                self.failed_flushes = 0
+
+            self.stats["flushes"] += 1
+            self.stats["rows_flushed"] += row_count
+            return row_count
+
+    async def _write(self, connection, message_rows, reaction_rows, server_stats, rollup, user_deltas,
+                     transaction_rows):
+        await self._write_server_stats(connection, server_stats)
+        await self._write_messages(connection, message_rows)
+        await self._write_reactions(connection, reaction_rows)
+        await rollup.write(connection)
+        await self._write_users(connection, user_deltas, transaction_rows)
+
+    async def _write_parts(self, pool, message_rows, reaction_rows, server_stats, rollup, user_deltas,
+                           transaction_rows) -> int:
+        """Write each part of a batch in its own job and drop the parts that fail
+
+        User deltas hold balances, so they and their ledger rows are kept for
+        the next flush instead.
+        """
+        parts = [
+            ("server_stats", len(server_stats), lambda connection: self._write_server_stats(connection, server_stats)),
+            ("message_log", len(message_rows), lambda connection: self._write_messages(connection, message_rows)),
+            ("user_reactions", len(reaction_rows), lambda connection: self._write_reactions(connection, reaction_rows)),
+            ("stats rollups", len(rollup), rollup.write),
+            ("users", len(user_deltas) + len(transaction_rows),
+             lambda connection: self._write_users(connection, user_deltas, transaction_rows)),
+        ]
+        written = 0
+        for name, row_count, job in parts:
+            if not row_count:
+                continue
+            try:
+                await pool.write(job)
+                written += row_count
+            except Exception as e:
+                if name == "users":
+                    logger.error(f"Keeping {row_count} users deltas after a failed write: {e}")
+                    self._restore([], [], {}, StatsRollup(), user_deltas, transaction_rows)
+                else:
+                    logger.error(f"Dropped {row_count} buffered {name} rows that failed to write: {e}")
+                    self.stats["rows_dropped"] += row_count
+        return written
+
+    async def _write_server_stats(self, connection, server_stats):
+        if server_stats:
+            await connection.executemany('''
+                INSERT INTO server_stats (date, message_count, reaction_count, last_updated)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(date) DO UPDATE SET
+                message_count = message_count + excluded.message_count,
+                reaction_count = reaction_count + excluded.reaction_count,
+                last_updated = excluded.last_updated
+            ''', [(date, *counts) for date, counts in server_stats.items()])
+
+    async def _write_messages(self, connection, message_rows):
+        if message_rows:
+            await connection.executemany(
+                'INSERT INTO message_log (user_id, channel_id, timestamp) VALUES (?, ?, ?)',
+                message_rows)
+
+    async def _write_reactions(self, connection, reaction_rows):
+        if reaction_rows:
+            await connection.executemany(
+                'INSERT INTO user_reactions (user_id, message_id, emoji, timestamp) VALUES (?, ?, ?, ?)',
+                reaction_rows)
+
+    async def _write_users(self, connection, user_deltas, transaction_rows):
+        if transaction_rows:
+            await connection.executemany(INSERT_TRANSACTION, transaction_rows)
+        if user_deltas:
+            await connection.executemany(
+                'INSERT OR IGNORE INTO users (user_id, level, prestige, xp, total_messages, coins, invites, activity_coins) '
+                'VALUES (?, 1, 0, 0, 0, 0, 0, 0)',
+                [(user_id,) for user_id in user_deltas])
+            for user_id, deltas in user_deltas.items():
+                if not deltas:
+                    continue
+                columns = sorted(deltas)
+                assignments = ", ".join(f"{column} = {column} + ?" for column in columns)
+                await connection.execute(
+                    f'UPDATE users SET {assignments} WHERE user_id = ?',
+                    (*[deltas[column] for column in columns], user_id))
+
+    def _restore(self, message_rows, reaction_rows, server_stats, rollup, user_deltas, transaction_rows):
+        self.message_rows = message_rows + self.message_rows
+        self.transaction_rows = transaction_rows + self.transaction_rows
+        self.reaction_rows = reaction_rows + self.reaction_rows
+        for date, (messages, reactions, last_updated) in server_stats.items():
+            if date in self.server_stats:
+                self.server_stats[date][0] += messages
+                self.server_stats[date][1] += reactions
+            else:
+                self.server_stats[date] = [messages, reactions, last_updated]
+        rollup.merge(self.rollup)
+        self.rollup = rollup
+        for user_id, deltas in user_deltas.items():
+            pending = self.user_deltas.setdefault(user_id, {})
+            for column, amount in deltas.items():
+                pending[column] = pending.get(column, 0) + amount
+
+    async def close(self):
+        """Stop the flush loop and write out anything still buffered"""
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            try:
+                await self.flush_task
+            except asyncio.CancelledError:
+                pass
+            self.flush_task = None
+        try:
+            flushed = await self.flush()
+            if flushed:
+                logger.info(f"Flushed {flushed} buffered rows on shutdown")
+        except Exception as e:
+            logger.error(f"Error flushing write buffer on shutdown: {e}")
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get statistics about the write buffer"""
+        return {**self.stats, "pending_rows": self.pending_rows}
+
+
+# Singleton write buffer instance
+write_buffer = WriteBuffer()
+
+# Helper function to get the write buffer
+async def get_write_buffer() -> WriteBuffer:
+    """Get the write buffer, starting its flush loop if necessary"""
+    write_buffer.start()
+    return write_buffer